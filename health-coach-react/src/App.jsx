@@ -3,6 +3,7 @@ import ResultsSection from "./ResultsSection";
 
 import {
   api,
+  applyPatch,
   cachePlan,
   getCachedPlan,
   getCachedSchedule,
@@ -419,34 +420,60 @@ export default function App() {
     setDietChatInput("");
 
     try {
-      const payload = {
-        profile: {
-          age: +age,
-          sex,
-          height_cm: +height,
-          weight_kg: +weight,
-          activity_level: activity,
-        },
-        goal: { type: goalType, deficit_kcal: +deficit },
-      };
-
-      const data = await api.dietChat({
-        message,
-        current_plan: plan,
-        profile: payload.profile,
-        goal: payload.goal,
-        chat_history: dietChatMessages,
-      });
+      // Reply streams into a placeholder assistant message
+      const setReply = (update) =>
+        setDietChatMessages((prev) => {
+          const next = [...prev];
+          const last = next[next.length - 1];
+          next[next.length - 1] = { ...last, text: update(last.text) };
+          return next;
+        });
+      setDietChatMessages((prev) => [
+        ...prev,
+        { role: "assistant", text: "", streaming: true },
+      ]);
 
-      if (data?.updated_plan) {
-        setPlan(data.updated_plan);
-        cachePlan(data.updated_plan);
+      // The plan is stored server-side on first chat; after that only its id,
+      // version and the message go up, and a patch comes back
+      let current = plan;
+      if (!current.plan_id) {
+        const stored = await api.createDietPlan(current);
+        current = { ...current, plan_id: stored.plan_id, version: stored.version };
       }
+      const send = (p) =>
+        api.dietChatStream(
+          { message, plan_id: p.plan_id, base_version: p.version },
+          { onToken: (t) => setReply((text) => text + t) }
+        );
+
+      let data;
+      try {
+        data = await send(current);
+      } catch (e) {
+        if (e.status !== 409 || !e.data?.plan) throw e;
+        // changed elsewhere (another tab/device): take the server's copy and retry once
+        current = {
+          ...current,
+          ...e.data.plan,
+          plan_id: e.data.plan_id,
+          version: e.data.version,
+        };
+        setReply(() => "");
+        data = await send(current);
+      }
+
+      const updated = {
+        ...applyPatch(current, data?.patch || []),
+        version: data?.version ?? current.version,
+      };
+      setPlan(updated);
+      cachePlan(updated);
       setDietChatMessages((prev) => [
-        ...prev,
+        ...prev.filter((m) => !m.streaming),
         { role: "assistant", text: data?.assistant_reply || "Plan updated." },
       ]);
     } catch (e) {
+      setDietChatMessages((prev) => prev.filter((m) => !m.streaming));
       setDietChatMsg(`Error: ${e.message}`);
     } finally {
       setIsDietChatting(false);
@@ -199,9 +199,112 @@ export const api = {
       timeoutMs: 30000,
     });
   },
+
+  // Stores a plan server-side so chat can send { plan_id, base_version } instead of the plan
+  async createDietPlan(plan) {
+    const body = withUserId({
+      plan: { meals: plan?.meals || [], workouts: plan?.workouts || [] },
+    });
+    return await fetchJSON("/diet/plans", {
+      method: "POST",
+      body: JSON.stringify(body),
+    });
+  },
+
+  // Streaming variant: calls onToken(text) as the reply arrives and resolves
+  // with the final event: { assistant_reply, updated_plan } for a current_plan,
+  // { assistant_reply, version, patch } for a stored plan_id + base_version.
+  // A stale base_version rejects with err.status = 409 and err.data = the server's plan.
+  async dietChatStream(
+    { message, plan_id, base_version, current_plan, profile, goal, chat_history },
+    { onToken, timeoutMs = 30000 } = {}
+  ) {
+    const body = withUserId(
+      plan_id
+        ? { message, plan_id, base_version }
+        : { message, current_plan, profile, goal, chat_history: chat_history || [] }
+    );
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), timeoutMs);
+
+    try {
+      const res = await fetch(`${apiBase()}/diet/chat/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+        signal: controller.signal,
+      });
+      if (!res.ok || !res.body) {
+        const text = await res.text();
+        const data = safeJsonParse(text, { raw: text });
+        throw Object.assign(new Error(buildErrorMessage(data, res)), {
+          status: res.status,
+          data,
+        });
+      }
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let final = null;
+
+      const handle = (line) => {
+        if (!line.trim()) return;
+        const event = safeJsonParse(line, null);
+        if (!event) return;
+        if (event.type === "token") onToken?.(event.text);
+        else if (event.type === "final") final = event;
+        else if (event.type === "error")
+          throw Object.assign(new Error(event.error), {
+            status: event.status,
+            data: event,
+          });
+      };
+
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.forEach(handle);
+      }
+      handle(buffer);
+
+      if (!final) throw new Error("Chat stream ended without a plan");
+      return final;
+    } catch (e) {
+      if (e.name === "AbortError")
+        throw new Error(`Request timeout after ${timeoutMs}ms`);
+      throw e;
+    } finally {
+      clearTimeout(timer);
+    }
+  },
 };
 
 // ---------- Shared utils ----------
+// Applies JSON Patch add/remove/replace ops (as sent by /diet/chat) to a copy of doc
+export function applyPatch(doc, ops = []) {
+  const out = JSON.parse(JSON.stringify(doc ?? {}));
+  for (const op of ops) {
+    const keys = op.path
+      .split("/")
+      .slice(1)
+      .map((k) => k.replace(/~1/g, "/").replace(/~0/g, "~"));
+    const last = keys.pop();
+    const target = keys.reduce((node, k) => node[k], out);
+    if (Array.isArray(target)) {
+      const i = last === "-" ? target.length : Number(last);
+      if (op.op === "add") target.splice(i, 0, op.value);
+      else if (op.op === "remove") target.splice(i, 1);
+      else target[i] = op.value;
+    } else if (op.op === "remove") delete target[last];
+    else target[last] = op.value;
+  }
+  return out;
+}
+
 export function isoTodayAt(hhmm) {
   const [h, m] = String(hhmm || "00:00")
     .split(":")
@@ -0,0 +1,51 @@
+"""Bandit choose/feedback throughput: per-call SQLite (old path) vs in-memory engine with write-behind.
+
+Uses a throwaway database. Usage: python -m scripts.bench_bandit [n_ops]
+"""
+import random, sys, tempfile, time
+from pathlib import Path
+from services.common import storage
+from services.feedback_agent.engine import BanditEngine
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+AGENT, ARMS, EPSILON = "motivation_tone", ["coach", "friendly"], 0.2
+
+tmp = Path(tempfile.mkdtemp(prefix="bench-bandit-"))
+storage.configure(tmp / "app.db")
+storage.init_db()
+for arm in ARMS:
+    storage.upsert_arm(AGENT, arm)
+
+def old_choose():
+    arms = storage.get_arms(AGENT)
+    if random.random() < EPSILON:
+        choice = random.choice(ARMS)
+    else:
+        choice = max(arms, key=lambda a: (a["reward_sum"] / a["pulls"]) if a["pulls"] else 0.0)["arm"]
+    storage.upsert_arm(AGENT, choice, pulled=True)
+    return choice
+
+def old_feedback(arm):
+    storage.record_feedback("e", "u", 5, None)
+    storage.upsert_arm(AGENT, arm, reward=1.0)
+
+def rate(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - t0)
+
+before_choose = rate(old_choose, N)
+before_feedback = rate(lambda: old_feedback("coach"), N)
+
+engine = BanditEngine(AGENT, ARMS, EPSILON, journal_dir=tmp).start()
+after_choose = rate(engine.choose, N)
+def new_feedback():
+    storage.record_feedback("e", "u", 5, None)
+    engine.reward("coach", 1.0)
+after_feedback = rate(new_feedback, N)
+engine.close()
+
+print(f"{'':12}{'before/s':>12}{'after/s':>12}{'speedup':>10}")
+print(f"{'choose':12}{before_choose:>12.0f}{after_choose:>12.0f}{after_choose / before_choose:>9.1f}x")
+print(f"{'feedback':12}{before_feedback:>12.0f}{after_feedback:>12.0f}{after_feedback / before_feedback:>9.1f}x")
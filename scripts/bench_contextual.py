@@ -0,0 +1,36 @@
+"""Contextual bandit batch scoring: per-user choose() calls vs one choose_batch() call.
+
+Usage: python -m scripts.bench_contextual [n_users]
+"""
+import random, sys, time
+from services.feedback_agent.contextual import LinUCB, featurize, featurize_batch
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+rng = random.Random(0)
+profiles = [{"age": rng.randint(18, 70), "sex": rng.choice(["M", "F"]), "height_cm": rng.randint(150, 195),
+             "weight_kg": rng.randint(50, 110), "activity_level": rng.choice(["sedentary", "light", "moderate", "active"])}
+            for _ in range(N)]
+goals = [{"type": rng.choice(["fat_loss", "muscle_gain", "endurance", "general_health"]), "deficit_kcal": rng.choice([0, 300, 500])}
+         for _ in range(N)]
+bandit = LinUCB("bench", ["coach", "friendly"])
+X = featurize_batch(profiles[:1000], goals[:1000])
+bandit.reward_batch([rng.choice(bandit.arms) for _ in range(1000)], X, [rng.random() for _ in range(1000)])
+
+n_single = min(N, 5000)
+t0 = time.perf_counter()
+for p, g in zip(profiles[:n_single], goals[:n_single]):
+    bandit.choose(featurize(p, g))
+per_user = (time.perf_counter() - t0) / n_single
+
+t0 = time.perf_counter()
+X = featurize_batch(profiles, goals)
+t_feat = time.perf_counter() - t0
+t0 = time.perf_counter()
+bandit.choose_batch(X)
+t_score = time.perf_counter() - t0
+
+print(f"users: {N}")
+print(f"per-user choose():  {per_user * N:8.3f}s  (extrapolated from {n_single})")
+print(f"featurize_batch():  {t_feat:8.3f}s")
+print(f"choose_batch():     {t_score:8.3f}s")
+print(f"speedup:            {per_user * N / (t_feat + t_score):8.1f}x")
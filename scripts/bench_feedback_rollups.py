@@ -0,0 +1,90 @@
+"""Feedback statistics from rollups vs scanning the log, over a large synthetic feedback table
+(throwaway database): backfill throughput, per-query latency and the added cost per write.
+
+Usage: python -m scripts.bench_feedback_rollups [n_rows]   (default 10M; seeding takes a while)
+"""
+import datetime, sqlite3, statistics, sys, tempfile, time
+from pathlib import Path
+import numpy as np
+from services.common import storage
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+USERS, DAYS, ARMS = 100_000, 365, ["coach", "friendly"]
+END = datetime.date(2026, 10, 17)
+
+tmp = Path(tempfile.mkdtemp(prefix="bench-rollups-"))
+storage.configure(tmp / "app.db")
+storage.init_db()
+
+# seed straight into `feedback` (bypassing the rollups), a year of ratings from USERS users
+rng = np.random.default_rng(0)
+t0 = time.perf_counter()
+con = sqlite3.connect(tmp / "app.db")
+con.execute("PRAGMA synchronous=OFF")
+dates = [str(END - datetime.timedelta(days=d)) for d in range(DAYS)]
+for lo in range(0, N, 1_000_000):
+    n = min(1_000_000, N - lo)
+    users, ratings = rng.integers(0, USERS, n), rng.integers(1, 6, n)
+    arms, days = rng.integers(0, 3, n), np.sort(rng.integers(0, DAYS, n))[::-1]
+    con.executemany("INSERT INTO feedback(event_id, user_id, rating, bandit_arm, created_at) VALUES ('e', ?, ?, ?, ?)",
+                    ((f"u{u}", int(r), ARMS[a] if a < 2 else None, f"{dates[d]} 12:00:00")
+                     for u, r, a, d in zip(users, ratings, arms, days)))
+    con.commit()
+con.close()
+print(f"seeded {N:,} rows in {time.perf_counter() - t0:.1f}s")
+
+t0 = time.perf_counter()
+rows = storage.rebuild_rollups()
+backfill_s = time.perf_counter() - t0
+print(f"backfill: {rows:,} rows in {backfill_s:.1f}s ({rows / backfill_s:,.0f} rows/s)")
+
+def timed(fn, reps:int) -> float:
+    """median ms per call"""
+    out = []
+    for _ in range(reps):
+        t = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t) * 1000)
+    return statistics.median(out)
+
+raw = sqlite3.connect(tmp / "app.db")
+trend_days = [str(END - datetime.timedelta(days=d)) for d in range(29, -1, -1)]
+SCANS = {
+    "overall": ("SELECT COUNT(*), SUM(rating) FROM feedback", ()),
+    "per arm": ("SELECT bandit_arm, COUNT(*), SUM(rating), SUM(rating = 4), SUM(rating = 5) FROM feedback "
+                "WHERE bandit_arm IS NOT NULL GROUP BY bandit_arm", ()),
+    "user": ("SELECT COUNT(*), SUM(rating) FROM feedback WHERE user_id = ?", ("u4242",)),  # indexed
+    "day": ("SELECT COUNT(*), SUM(rating) FROM feedback WHERE date(created_at) = ?", (trend_days[-1],)),
+    "arm trend 30d": ("SELECT date(created_at), COUNT(*), SUM(rating) FROM feedback WHERE bandit_arm = ? "
+                      "AND created_at >= ? GROUP BY 1", ("coach", trend_days[0])),
+}
+LOOKUPS = {
+    "overall": lambda: storage.get_rollups("all", ["*"]),
+    "per arm": lambda: storage.get_rollups("arm", ARMS),
+    "user": lambda: storage.get_rollups("user", ["u4242"]),
+    "day": lambda: storage.get_rollups("day", [trend_days[-1]]),
+    "arm trend 30d": lambda: storage.get_rollups("arm_day", [f"coach|{d}" for d in trend_days]),
+}
+print(f"{'query':16}{'scan ms':>12}{'rollup ms':>12}{'speedup':>10}")
+for name, (sql, params) in SCANS.items():
+    scan = timed(lambda: raw.execute(sql, params).fetchall(), 3)
+    roll = timed(LOOKUPS[name], 200)
+    print(f"{name:16}{scan:>12.2f}{roll:>12.3f}{scan / roll:>9.0f}x")
+
+# write path: the plain insert vs the insert plus its rollup upserts in the same transaction
+def plain_insert():
+    with storage.engine.begin() as conn:
+        conn.execute(storage.INSERT_FEEDBACK, {"e": "w", "u": "u1", "r": 4, "re": None, "a": "coach", "p": None,
+                                               "t": "2026-10-17 12:00:00"})
+
+plain = timed(plain_insert, 500)
+rolled = timed(lambda: storage.record_feedback("w", "u1", 4, None, "coach"), 500)
+batch = [{"event_id": "b", "user_id": f"u{i}", "rating": 1 + i % 5, "bandit_arm": ARMS[i % 2]} for i in range(1000)]
+many = timed(lambda: storage.record_feedback_many(batch), 5)
+print(f"write: insert {plain:.3f} ms, insert + rollups {rolled:.3f} ms per row; bulk 1000 rows {many:.1f} ms")
+
+import services.feedback_agent.app as fa
+client = fa.app.test_client()
+api = timed(lambda: client.get("/feedback/stats", query_string={"user_id": "u4242", "arm": "coach", "days": 30,
+                                                                 "end": str(END)}), 200)
+print(f"GET /feedback/stats (all + arms + user + 30-day arm trend): {api:.2f} ms")
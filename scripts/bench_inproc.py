@@ -0,0 +1,48 @@
+"""/plan/today latency (p50/p99): gateway -> agents over loopback HTTP vs in-process handlers.
+
+Runs the gateway, diet and exercise agents in this process on local ports.
+Usage: python -m scripts.bench_inproc [n_requests]
+"""
+import logging, random, sys, time
+import numpy as np
+import requests
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.common.devserver import serve_in_thread
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+
+rnd = random.Random(0)
+bodies = [{
+    "user_id": f"u{i}",
+    "profile": {"age": rnd.randint(18, 70), "sex": rnd.choice(["M", "F"]), "height_cm": rnd.uniform(150, 200),
+                "weight_kg": rnd.uniform(45, 130), "activity_level": rnd.choice(list(diet.ACTIVITY_MULT))},
+    "goal": {"type": rnd.choice(["fat_loss", "muscle_gain", "endurance", "general_health"])},
+} for i in range(N)]
+
+diet_server, diet_url = serve_in_thread(diet.app)
+exercise_server, exercise_url = serve_in_thread(exercise.app)
+gw_server, G = serve_in_thread(gw.app)
+session = requests.Session()
+
+def run(mode:str, diet_base:str, exercise_base:str):
+    gw.DIET_URL, gw.EXERCISE_URL = diet_base, exercise_base
+    for body in bodies[:100]:  # warm pools and caches
+        session.post(f"{G}/plan/today", json=body, timeout=30).raise_for_status()
+    lat = np.empty(N)
+    for i, body in enumerate(bodies):
+        t0 = time.perf_counter()
+        session.post(f"{G}/plan/today", json=body, timeout=30).raise_for_status()
+        lat[i] = time.perf_counter() - t0
+    p50, p99 = np.percentile(lat, [50, 99]) * 1000
+    print(f"{mode:8}{p50:10.2f}{p99:10.2f}{N / lat.sum():12.0f}")
+    return p50, p99
+
+print(f"{'mode':8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>12}")
+http = run("http", diet_url, exercise_url)
+local = run("inproc", "inproc://services.diet_agent.app", "inproc://services.exercise_agent.app")
+print(f"p50 {http[0] / local[0]:.1f}x, p99 {http[1] / local[1]:.1f}x faster in-process")
+for s in (diet_server, exercise_server, gw_server):
+    s.shutdown()
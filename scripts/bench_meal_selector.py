@@ -0,0 +1,26 @@
+"""Meal-selection latency as the recipe catalog grows.
+
+Usage: python -m scripts.bench_meal_selector
+"""
+import time
+import numpy as np
+from services.diet_agent.catalog import allergen_mask, macro_targets, select_meals, synthetic_catalog
+
+SIZES = [1_000, 10_000, 50_000, 100_000]
+REPS = 50
+rng = np.random.default_rng(0)
+
+print(f"{'recipes':>8} {'build ms':>9} {'p50 ms':>8} {'p99 ms':>8}")
+for n in SIZES:
+    t0 = time.perf_counter()
+    catalog = synthetic_catalog(n)
+    build_ms = (time.perf_counter() - t0) * 1000
+    samples = []
+    for _ in range(REPS):
+        kcal = float(rng.integers(1500, 3200))
+        target = macro_targets({"weight_kg": float(rng.integers(50, 110))}, {"type": "fat_loss"}, kcal)
+        diet = str(rng.choice(["balanced", "vegetarian", "vegan", "keto"]))
+        t0 = time.perf_counter()
+        select_meals(catalog, target, diet=diet, exclude_allergens=allergen_mask(["nuts"]))
+        samples.append((time.perf_counter() - t0) * 1000)
+    print(f"{n:>8} {build_ms:>9.0f} {np.percentile(samples, 50):>8.2f} {np.percentile(samples, 99):>8.2f}")
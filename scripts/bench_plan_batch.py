@@ -0,0 +1,49 @@
+"""Users/second: N x POST /plan/today vs one streamed POST /plan/batch.
+
+Runs the gateway, diet and exercise agents in-process on local ports.
+Usage: python -m scripts.bench_plan_batch [n_users]
+"""
+import json, random, sys, time
+import requests
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.common.devserver import serve_in_thread
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+rnd = random.Random(0)
+items = [{
+    "user_id": f"u{i}",
+    "profile": {"age": rnd.randint(18, 70), "sex": rnd.choice(["M", "F"]), "height_cm": rnd.uniform(150, 200),
+                "weight_kg": rnd.uniform(45, 130), "activity_level": rnd.choice(list(diet.ACTIVITY_MULT))},
+    "goal": {"type": rnd.choice(["fat_loss", "muscle_gain", "endurance", "general_health"]), "deficit_kcal": rnd.choice([0, 300, 500])},
+} for i in range(N)]
+
+servers = []
+for agent, attr in ((diet.app, "DIET_URL"), (exercise.app, "EXERCISE_URL")):
+    server, url = serve_in_thread(agent)
+    servers.append(server)
+    setattr(gw, attr, url)
+gw_server, G = serve_in_thread(gw.app)
+servers.append(gw_server)
+
+session = requests.Session()
+per_user_n = min(N, 500)
+t0 = time.perf_counter()
+for item in items[:per_user_n]:
+    session.post(f"{G}/plan/today", json=item, timeout=30).raise_for_status()
+per_user = per_user_n / (time.perf_counter() - t0)
+
+t0 = time.perf_counter()
+res = session.post(f"{G}/plan/batch", data="\n".join(json.dumps(i) for i in items),
+                   headers={"Content-Type": "application/x-ndjson"}, stream=True, timeout=120)
+lines = sum(1 for line in res.iter_lines() if line)
+batch = lines / (time.perf_counter() - t0)
+assert lines == N, lines
+
+print(f"per-user /plan/today : {per_user:10.0f} users/s  ({per_user_n} users)")
+print(f"/plan/batch (NDJSON) : {batch:10.0f} users/s  ({N} users)")
+print(f"speedup              : {batch / per_user:10.1f}x")
+for s in servers:
+    s.shutdown()
@@ -0,0 +1,49 @@
+"""/diet/chat payload and prompt size: full current_plan round trips vs a stored plan id + patch.
+
+Runs the gateway with the diet agent in-process and a fake model (no network).
+Usage: python -m scripts.bench_plan_delta [turns]
+"""
+import json, sys, tempfile
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+from services.common.llm_cache import LLMCache
+from scripts.loadtest.fake_openai import FakeClient
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+MESSAGES = ["swap dinner for something lighter", "more protein at breakfast", "no rice at lunch", "make the snack vegan"]
+
+class Recording(FakeClient):
+    def __init__(self):
+        super().__init__(latency_s=0)
+        self.prompt_chars = 0
+    def _create(self, **request):
+        self.prompt_chars += sum(len(m["content"]) for m in request["messages"])
+        return super()._create(**request)
+
+gw.DIET_URL, gw.EXERCISE_URL = "inproc://services.diet_agent.app", "inproc://services.exercise_agent.app"
+diet.LLM_CACHE = LLMCache(tempfile.mkdtemp() + "/c.db")
+client = gw.app.test_client()
+plan = client.post("/plan/today", json={"user_id": "u1", "profile": {"weight_kg": 80}, "goal": {"type": "fat_loss"}}).get_json()
+plan.pop("agents")
+plan["meals"].append({"name": "Greek Yogurt Snack", "calories": 200, "macros": {"protein": 15, "carbs": 20, "fat": 5}, "when": "16:00"})
+
+def run(stored:bool) -> tuple[int, int, int]:
+    diet.client = fake = Recording()
+    sent = received = 0
+    if stored:
+        created = client.post("/diet/plans", json={"user_id": "u1", "plan": plan}).get_json()
+        ref = {"plan_id": created["plan_id"], "base_version": created["version"]}
+    for t in range(TURNS):
+        message = f"{MESSAGES[t % len(MESSAGES)]} (turn {t})"   # distinct prompts: no LLM cache hits
+        body = {**ref, "message": message} if stored else {"message": message, "current_plan": plan}
+        res = client.post("/diet/chat", json=body)
+        sent, received = sent + len(json.dumps(body)), received + len(res.get_data())
+        if stored:
+            ref["base_version"] = res.get_json()["version"]
+    return sent, received, fake.prompt_chars
+
+print(f"{TURNS} chat turns, {len(plan['meals'])} meals + {len(plan['workouts'])} workouts")
+print(f"{'':14}{'sent B':>10}{'received B':>12}{'prompt chars':>14}")
+for name, stored in (("current_plan", False), ("plan_id+patch", True)):
+    sent, received, prompt = run(stored)
+    print(f"{name:14}{sent:>10}{received:>12}{prompt:>14}")
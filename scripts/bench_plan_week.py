@@ -0,0 +1,70 @@
+"""/plan/week cost: full regeneration vs editing one day, against seven /plan/today calls.
+
+Runs the gateway with in-process agents over synthetic catalogs (20k recipes, 100k workouts).
+Usage: python -m scripts.bench_plan_week [reps]
+"""
+import random, sys, time
+import numpy as np
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.common.horizon import DayCache
+from services.diet_agent.catalog import synthetic_catalog as synthetic_recipes
+from services.exercise_agent.catalog import synthetic_catalog as synthetic_workouts
+
+REPS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+diet.CATALOG = synthetic_recipes(20_000)
+exercise.CATALOG = synthetic_workouts(100_000)
+gw.DIET_URL, gw.EXERCISE_URL = "inproc://services.diet_agent.app", "inproc://services.exercise_agent.app"
+gw.PLAN_CACHE = None
+client = gw.app.test_client()
+rnd = random.Random(0)
+
+def body(i:int) -> dict:
+    return {"user_id": f"u{i}", "start": "2026-10-19", "equipment": ["dumbbells", "bands"],
+            "profile": {"age": rnd.randint(18, 70), "sex": rnd.choice(["M", "F"]), "height_cm": rnd.uniform(150, 200),
+                        "weight_kg": rnd.uniform(45, 130), "activity_level": rnd.choice(list(diet.ACTIVITY_MULT)),
+                        "injuries": rnd.sample(["knee", "shoulder", "wrist"], rnd.randint(0, 2))},
+            "goal": {"type": rnd.choice(["fat_loss", "muscle_gain", "endurance", "general_health"])}}
+
+def week(b:dict) -> dict:
+    # day index -> profile changes, as /plan/week overrides
+    return {**b, "overrides": {str(d): {"profile": p} for d, p in b.get("overrides", {}).items()}}
+
+def timed(name:str, fn):
+    t0 = time.perf_counter()
+    res = fn()
+    samples[name].append((time.perf_counter() - t0) * 1000)
+    assert res.status_code == 200, res.get_data()
+    agents = (res.get_json() or {}).get("agents", {})
+    recomputed[name].append(sum(a.get("computed") or 0 for a in agents.values()))
+
+def today_x7(b:dict):
+    for d in range(7):
+        client.post("/plan/today", json={k: v for k, v in b.items() if k != "start"}).close()
+    return client.get("/health")
+
+MODES = ["7x /plan/today", "week, cold", "week, unchanged", "week, edit weight", "week, edit window"]
+samples = {m: [] for m in MODES}
+recomputed = {m: [] for m in MODES}   # agent-days computed (diet + exercise), out of 14
+client.post("/plan/week", json=body(-1))  # warm imports
+for i in range(REPS):
+    diet.DAY_CACHE, exercise.DAY_CACHE = DayCache(), DayCache()
+    b = body(i)
+    timed("7x /plan/today", lambda: today_x7(b))
+    timed("week, cold", lambda: client.post("/plan/week", json=b))
+    timed("week, unchanged", lambda: client.post("/plan/week", json=b))
+    # each edit changes one random day on top of the previous request
+    weight = {**b, "overrides": {rnd.randrange(7): {"weight_kg": b["profile"]["weight_kg"] - 1.5}}}
+    timed("week, edit weight", lambda: client.post("/plan/week", json=week(weight)))
+    window = {**weight, "overrides": {**weight["overrides"]}}
+    day = rnd.randrange(7)
+    window["overrides"][day] = {**window["overrides"].get(day, {}), "time_windows": ["06:00-06:45"]}
+    timed("week, edit window", lambda: client.post("/plan/week", json=week(window)))
+
+print(f"{'':20}{'p50 ms':>9}{'p99 ms':>9}{'days computed':>15}")
+for name in MODES:
+    p50, p99 = np.percentile(samples[name], [50, 99])
+    days = f"{np.mean(recomputed[name]):.1f}" if recomputed[name] and name != MODES[0] else "14"
+    print(f"{name:20}{p50:9.2f}{p99:9.2f}{days:>15}")
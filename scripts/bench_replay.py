@@ -0,0 +1,29 @@
+"""Offline replay harness over a large synthetic feedback log (throwaway database).
+
+Usage: python -m scripts.bench_replay [n_rows]
+"""
+import sqlite3, sys, tempfile, time
+from pathlib import Path
+import numpy as np
+from services.common import storage
+from services.feedback_agent import replay
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+
+tmp = Path(tempfile.mkdtemp(prefix="bench-replay-"))
+storage.configure(tmp / "app.db")
+storage.init_db()
+rng = np.random.default_rng(0)
+arms = rng.choice(replay.ARMS, size=N)
+ratings = np.where(rng.random(N) < np.where(arms == "friendly", 0.6, 0.4), 5, rng.integers(1, 4, size=N))
+t0 = time.perf_counter()
+con = sqlite3.connect(tmp / "app.db")
+con.executemany("INSERT INTO feedback(event_id, user_id, rating, bandit_arm, propensity) VALUES ('e', ?, ?, ?, 0.5)",
+                ((f"u{i % 10000}", int(r), str(a)) for i, (r, a) in enumerate(zip(ratings, arms))))
+con.commit()
+con.close()
+print(f"seeded {N} rows in {time.perf_counter() - t0:.1f}s")
+
+t0 = time.perf_counter()
+replay.main(["--seeds", "64", "--users", "5000", "--horizon", "2000"])
+print(f"total {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,56 @@
+"""Schedule list/commit latency as the event store grows to a million events.
+
+Uses a throwaway database. Usage: python -m scripts.bench_schedule [total_events]
+"""
+import random, sys, tempfile, time
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+from services.common import storage
+from services.scheduler_agent import store
+
+TOTAL = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+USERS = 2_000
+CHECKPOINTS = sorted({c for c in (10_000, 100_000, 1_000_000, TOTAL) if c <= TOTAL})
+HEAVY = "heavy-user"  # gets 10% of all events, so per-user history grows too
+BASE = datetime(2024, 1, 1)
+rnd = random.Random(0)
+
+storage.configure(Path(tempfile.mkdtemp(prefix="bench-schedule-")) / "app.db")
+storage.init_db()
+
+def load(n):
+    rows = []
+    for _ in range(n):
+        user = HEAVY if rnd.random() < 0.1 else f"u{rnd.randrange(USERS)}"
+        at = BASE + timedelta(minutes=15 * rnd.randrange(4 * 24 * 730))
+        rows.append(store._row(user, {"type": "workout", "name": "w", "scheduled_at": at.isoformat(), "duration_min": 30}))
+    with storage.engine.begin() as conn:
+        conn.execute(store.INSERT, rows)
+
+def p50_ms(fn, reps=200):
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50)
+
+def list_week():
+    start = BASE + timedelta(days=rnd.randrange(700))
+    store.list_events(HEAVY, start=start.isoformat(), end=(start + timedelta(days=7)).isoformat(), limit=50)
+
+def commit_one():
+    at = BASE + timedelta(minutes=rnd.randrange(60 * 24 * 730))
+    store.commit_events(HEAVY, [{"type": "meal", "name": "m", "scheduled_at": at.isoformat(), "duration_min": 15}])
+
+loaded = 0
+print(f"{'events':>10} {'heavy user':>11} {'list p50 ms':>12} {'commit p50 ms':>14}")
+for target in CHECKPOINTS:
+    while loaded < target:
+        n = min(100_000, target - loaded)
+        load(n)
+        loaded += n
+    with storage.engine.connect() as conn:
+        heavy = conn.exec_driver_sql("SELECT COUNT(*) FROM schedule_event WHERE user_id=?", (HEAVY,)).scalar()
+    print(f"{loaded:>10} {heavy:>11} {p50_ms(list_week):>12.3f} {p50_ms(commit_one, 100):>14.3f}")
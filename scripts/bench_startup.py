@@ -0,0 +1,109 @@
+"""Cold-start time per service: import cost (python -X importtime, with the heaviest top-level
+packages) and time from process spawn to the first 200 from /health under waitress, against a
+throwaway database that is migrated beforehand.
+
+Usage: python -m scripts.bench_startup [--runs 3] [--only diet,gateway] [--out now.json] [--baseline before.json]
+
+With --baseline, each service's numbers are printed next to the saved ones and the exit status is
+1 if any service's time to /health regressed by more than --tolerance (default 25%).
+"""
+import argparse, json, os, socket, statistics, subprocess, sys, tempfile, time
+from collections import Counter
+from pathlib import Path
+import requests
+from services.run import ROOT, SERVICES
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def import_profile(module:str, env:dict) -> tuple[float, list[tuple[str, float]]]:
+    """(cumulative import ms, [(top-level package, self ms)] heaviest first) from -X importtime."""
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    total, by_package = 0.0, Counter()
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us) / 1000
+        if name.strip() == module:
+            total = int(cumulative_us) / 1000
+    return total, by_package.most_common(4)
+
+def import_wall(module:str, env:dict) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, env=env, check=True)
+    return (time.perf_counter() - t0) * 1000
+
+def first_health(target:str, env:dict, timeout_s:float=60.0) -> float:
+    """ms from spawning a waitress process serving `target` until /health answers 200."""
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "waitress", "--host=127.0.0.1", f"--port={port}", target],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout_s:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{target} exited with {proc.returncode} before answering /health")
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    return (time.perf_counter() - t0) * 1000
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError(f"{target}: no /health within {timeout_s:g}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--runs", type=int, default=3, help="medians over this many cold starts")
+    ap.add_argument("--only", help="comma-separated service names")
+    ap.add_argument("--out", help="save the results as JSON")
+    ap.add_argument("--baseline", help="JSON saved by an earlier --out to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    args = ap.parse_args(argv)
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench-startup-"))
+    env = {**os.environ, "HC_DB_PATH": str(tmp / "app.db"), "HC_AUTO_MIGRATE": "0",
+           "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))}
+    env.pop("OPENAI_API_KEY", None)   # a key would only add the client's construction, not network time
+    subprocess.run([sys.executable, "-c", "from services.common import storage; storage.migrate()"],
+                   cwd=ROOT, env=env, check=True)
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    for svc in SERVICES:
+        if only and svc.name not in only:
+            continue
+        module = svc.target.split(":")[0]
+        profiles = [import_profile(module, env) for _ in range(args.runs)]
+        results[svc.name] = {
+            "import_ms": statistics.median(p[0] for p in profiles),
+            "import_wall_ms": statistics.median(import_wall(module, env) for _ in range(args.runs)),
+            "first_health_ms": statistics.median(first_health(svc.target, env) for _ in range(args.runs)),
+            "top_packages": [[name, round(ms, 1)] for name, ms in profiles[-1][1]],
+        }
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    print(f"{'service':12}{'import ms':>11}{'wall ms':>10}{'/health ms':>12}   heaviest imports (self ms)")
+    regressed = []
+    for name, r in results.items():
+        top = ", ".join(f"{pkg} {ms:.0f}" for pkg, ms in r["top_packages"])
+        print(f"{name:12}{r['import_ms']:>11.0f}{r['import_wall_ms']:>10.0f}{r['first_health_ms']:>12.0f}   {top}")
+        if name in baseline:
+            b = baseline[name]
+            print(f"{'  before':12}{b['import_ms']:>11.0f}{b['import_wall_ms']:>10.0f}{b['first_health_ms']:>12.0f}")
+            if r["first_health_ms"] > b["first_health_ms"] * (1 + args.tolerance):
+                regressed.append(name)
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+    if regressed:
+        print(f"slower to /health than the baseline: {', '.join(regressed)}")
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Per-request cost of the telemetry middleware.
+
+1. Bare WSGI: a trivial WSGI app called directly, with and without TelemetryMiddleware.
+2. Flask: the exercise agent's /exercise/suggest called as a WSGI app, with and without
+   instrument() (the Flask number includes the after_request hook that labels the route).
+Usage: python -m scripts.bench_telemetry [n_requests]
+"""
+import io, json, sys, time
+from flask import Flask
+from werkzeug.test import EnvironBuilder
+from services.common import telemetry
+from services.exercise_agent.app import suggest
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+def bare(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+def start_response(status, headers, exc_info=None):
+    return None
+
+def per_call_us(app, n:int) -> float:
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/"}
+    best = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            app(dict(environ), start_response)
+        best = min(best, (time.perf_counter() - t0) / n * 1e6)
+    return best
+
+plain = per_call_us(bare, N)
+wrapped = per_call_us(telemetry.TelemetryMiddleware(bare, "bench", telemetry.Registry()), N)
+print(f"bare WSGI   plain {plain:7.2f} us  instrumented {wrapped:7.2f} us  overhead {wrapped - plain:6.2f} us/request")
+
+def flask_app(instrumented:bool):
+    app = Flask(f"bench_{instrumented}")
+    app.post("/exercise/suggest")(suggest)
+    if instrumented:
+        telemetry.instrument(app, "bench")
+    return app
+
+BODY = json.dumps({"user_id": "u1", "goal": {"type": "endurance"}}).encode()
+ENVIRON = EnvironBuilder(method="POST", path="/exercise/suggest", data=BODY, content_type="application/json").get_environ()
+
+def flask_us(apps:list, n:int, rounds:int=5) -> list[float]:
+    """Best-of-rounds us/request per app; apps alternate within each round so drift hits both."""
+    best = [float("inf")] * len(apps)
+    for _ in range(rounds):
+        for i, app in enumerate(apps):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                b"".join(app({**ENVIRON, "wsgi.input": io.BytesIO(BODY)}, start_response))
+            best[i] = min(best[i], (time.perf_counter() - t0) / n * 1e6)
+    return best
+
+plain, wrapped = flask_us([flask_app(False), flask_app(True)], max(N // 50, 1000))
+print(f"Flask       plain {plain:7.1f} us  instrumented {wrapped:7.1f} us  overhead {wrapped - plain:6.1f} us/request")
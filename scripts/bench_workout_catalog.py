@@ -0,0 +1,46 @@
+"""Workout-suggestion latency as the workout catalog grows, against a plain Python filter.
+
+Usage: python -m scripts.bench_workout_catalog
+"""
+import time
+import numpy as np
+from services.exercise_agent.catalog import (EQUIPMENT, GOALS, INJURIES, equipment_mask, forbid_mask, injury_mask,
+                                             intensity_mask, parse_windows, synthetic_catalog)
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+REPS = 500
+NAIVE_REPS = 5
+rng = np.random.default_rng(0)
+
+def _query():
+    equipment = [str(e) for e in rng.choice(EQUIPMENT, int(rng.integers(0, 4)), replace=False)]
+    injuries = [str(j) for j in rng.choice(INJURIES, int(rng.integers(0, 3)), replace=False)]
+    level = str(rng.choice(["sedentary", "light", "moderate", "active"]))
+    return str(rng.choice(GOALS)), equipment, injuries, level
+
+def _naive(records, goal, equipment, injuries, level):
+    # what a straightforward list comprehension over dicts does; no early exit
+    top = 1 if level in ("sedentary", "light") else 2
+    rank = {"low": 0, "medium": 1, "high": 2}
+    ok = [r for r in records if goal in r["goals"] and set(r["equipment"]) <= set(equipment)
+          and not set(r["contraindications"]) & set(injuries) and rank[r["intensity"]] <= top]
+    return sorted(ok, key=lambda r: -r["priority"])[:2]
+
+windows = parse_windows(["07:00-08:00", "18:00-19:30"])
+print(f"{'workouts':>9} {'build ms':>9} {'p50 us':>8} {'p99 us':>8} {'naive ms':>9}")
+for n in SIZES:
+    t0 = time.perf_counter()
+    catalog = synthetic_catalog(n)
+    build_ms = (time.perf_counter() - t0) * 1000
+    samples = []
+    for _ in range(REPS):
+        goal, equipment, injuries, level = _query()
+        t0 = time.perf_counter()
+        forbid = forbid_mask(equipment_mask(equipment), injury_mask(injuries), intensity_mask(level))
+        catalog.suggest(goal, forbid, windows)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    t0 = time.perf_counter()
+    for _ in range(NAIVE_REPS):
+        _naive(catalog.records, *_query())
+    naive_ms = (time.perf_counter() - t0) / NAIVE_REPS * 1000
+    print(f"{n:>9} {build_ms:>9.0f} {np.percentile(samples, 50):>8.1f} {np.percentile(samples, 99):>8.1f} {naive_ms:>9.1f}")
@@ -0,0 +1,15 @@
+"""Load-test and regression suite: record gateway traffic, replay it, compare against a baseline.
+
+    # record: run the gateway with TRAFFIC_RECORD=1 (storage/traffic.jsonl) while real clients use it,
+    # or generate a synthetic mix
+    python -m scripts.loadtest generate --n 3000 --rate 50
+    # replay against a freshly launched local stack (fake OpenAI server included), save results
+    python -m scripts.loadtest run --rate 100 --concurrency 32 --duration 60 --out storage/loadtest/base.json
+    # later: same replay, flag regressions against the saved baseline (exit code 1 if any)
+    python -m scripts.loadtest run --rate 100 --concurrency 32 --duration 60 --baseline storage/loadtest/base.json
+    python -m scripts.loadtest compare storage/loadtest/new.json storage/loadtest/base.json
+    # chat flood on top of cheap routes, with gateway admission control off and on
+    python -m scripts.loadtest spike
+
+Everything runs offline on one machine.
+"""
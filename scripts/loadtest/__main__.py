@@ -0,0 +1,139 @@
+import argparse, platform, subprocess, sys, time
+from contextlib import nullcontext
+from scripts.loadtest import __doc__ as DOC, replay, report, spike, traffic
+
+def _git_rev() -> str|None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def cmd_generate(args) -> int:
+    rows = traffic.generate(args.n, args.users, args.rate, args.seed)
+    traffic.save(rows, args.out)
+    print(f"wrote {len(rows)} requests ({rows[-1]['t']:.1f}s at ~{args.rate:g}/s) to {args.out}")
+    return 0
+
+def cmd_run(args) -> int:
+    rows = traffic.load(args.traffic)
+    if not rows:
+        print(f"no traffic in {args.traffic}")
+        return 2
+    offsets = replay.schedule(rows, args.rate, args.speed)
+    if args.duration:
+        rows, offsets = replay.repeat(rows, offsets, args.duration)
+    if args.target:
+        stack = nullcontext((args.target, None))
+    else:
+        from scripts.loadtest.stack import launched
+        stack = launched(args.port_offset, args.workers, args.threads, args.server, args.llm_latency_ms)
+    with stack as (url, _):
+        if args.warmup:
+            warm = rows[:args.warmup]
+            replay.run(url, warm, [0.0] * len(warm), args.concurrency, args.timeout)
+        print(f"replaying {len(rows)} requests over {offsets[-1]:.1f}s against {url} (concurrency {args.concurrency})")
+        results, wall = replay.run(url, rows, offsets, args.concurrency, args.timeout)
+    meta = {"traffic": str(args.traffic), "requests": len(rows), "rate": args.rate, "speed": args.speed,
+            "concurrency": args.concurrency, "target": args.target or "local", "workers": args.workers,
+            "threads": args.threads, "llm_latency_ms": args.llm_latency_ms, "git": _git_rev(),
+            "host": platform.node(), "python": platform.python_version(), "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    summary = report.summarize(results, wall, meta)
+    report.print_summary(summary)
+    if args.out:
+        report.save(summary, args.out)
+        print(f"results: {args.out}")
+    if args.baseline:
+        return _verdict(report.compare(summary, report.load(args.baseline), args.threshold), args.baseline)
+    return 0
+
+def cmd_spike(args) -> int:
+    from scripts.loadtest.stack import launched
+    rows, offsets = spike.generate(args.duration, args.chat_rate, args.cheap_rate, args.chat_users, args.seed)
+    cheap = [replay.endpoint(r) for r in ({"method": "GET", "path": "/health"}, {"path": "/nudge/send"})]
+    summaries = {}
+    for name, env in (("admission off", {"ADMISSION": "0"}), ("admission on", {})):
+        with launched(args.port_offset, args.workers, args.threads, args.server, args.llm_latency_ms, env=env) as (url, _):
+            print(f"[{name}] replaying {len(rows)} requests over {offsets[-1]:.1f}s against {url}")
+            results, wall = replay.run(url, rows, offsets, args.concurrency, args.timeout)
+        summaries[name] = summary = report.summarize(results, wall, {"scenario": "spike", "admission": name != "admission off"})
+        report.print_summary(summary)
+        for ep, s in summary["endpoints"].items():
+            print(f"  {ep:26} statuses {s['statuses']}")
+    print("cheap-route p99 (ms): " + "  ".join(
+        f"{ep} {summaries['admission off']['endpoints'][ep]['p99_ms']:.0f} -> {summaries['admission on']['endpoints'][ep]['p99_ms']:.0f}"
+        for ep in cheap if all(ep in s["endpoints"] for s in summaries.values())))
+    if args.out:
+        report.save(summaries, args.out)
+        print(f"results: {args.out}")
+    return 0
+
+def cmd_compare(args) -> int:
+    return _verdict(report.compare(report.load(args.current), report.load(args.baseline), args.threshold), args.baseline)
+
+def _verdict(regressions:list[str], baseline:str) -> int:
+    if not regressions:
+        print(f"no regressions against {baseline}")
+        return 0
+    print(f"{len(regressions)} regression(s) against {baseline}:")
+    for r in regressions:
+        print(f"  {r}")
+    return 1
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m scripts.loadtest", description=DOC.split("\n")[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    g = sub.add_parser("generate", help="write a synthetic traffic file")
+    g.add_argument("--out", default=str(traffic.DEFAULT_PATH))
+    g.add_argument("--n", type=int, default=3000)
+    g.add_argument("--users", type=int, default=200)
+    g.add_argument("--rate", type=float, default=50.0, help="mean arrivals per second (Poisson)")
+    g.add_argument("--seed", type=int, default=0)
+    g.set_defaults(fn=cmd_generate)
+
+    r = sub.add_parser("run", help="replay traffic and report per-endpoint throughput/latency")
+    r.add_argument("--traffic", default=str(traffic.DEFAULT_PATH), help="recorded or generated JSONL")
+    r.add_argument("--rate", type=float, help="send at this fixed rate (req/s) instead of the recorded timing")
+    r.add_argument("--speed", type=float, default=1.0, help="replay the recorded timing this many times faster")
+    r.add_argument("--duration", type=float, help="loop the traffic for this many seconds")
+    r.add_argument("--concurrency", type=int, default=32)
+    r.add_argument("--timeout", type=float, default=60.0)
+    r.add_argument("--warmup", type=int, default=50, help="requests sent (unmeasured) before the run")
+    r.add_argument("--target", help="replay against this running gateway instead of launching a local stack")
+    r.add_argument("--port-offset", type=int, default=10000, help="local stack ports = default ports + offset")
+    r.add_argument("--workers", type=int, help="processes per service in the local stack")
+    r.add_argument("--threads", type=int, help="threads per worker in the local stack")
+    r.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default="auto")
+    r.add_argument("--llm-latency-ms", type=float, default=300.0, help="fake OpenAI time to first token")
+    r.add_argument("--out", help="save results as JSON")
+    r.add_argument("--baseline", help="results JSON to check for regressions against")
+    r.add_argument("--threshold", type=float, default=0.10, help="relative p95/p99/throughput change that counts")
+    r.set_defaults(fn=cmd_run)
+
+    s = sub.add_parser("spike", help="chat flood + cheap traffic, replayed with admission control off and on")
+    s.add_argument("--duration", type=float, default=20.0)
+    s.add_argument("--chat-rate", type=float, default=40.0, help="chat requests per second")
+    s.add_argument("--cheap-rate", type=float, default=20.0, help="/health + /nudge/send requests per second")
+    s.add_argument("--chat-users", type=int, default=10)
+    s.add_argument("--seed", type=int, default=0)
+    s.add_argument("--concurrency", type=int, default=512, help="client threads; keep above the requests in flight")
+    s.add_argument("--timeout", type=float, default=60.0)
+    s.add_argument("--port-offset", type=int, default=10000)
+    s.add_argument("--workers", type=int)
+    s.add_argument("--threads", type=int)
+    s.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default="auto")
+    s.add_argument("--llm-latency-ms", type=float, default=3000.0, help="fake OpenAI time to first token")
+    s.add_argument("--out", help="save both summaries as JSON")
+    s.set_defaults(fn=cmd_spike)
+
+    c = sub.add_parser("compare", help="check a results file against a baseline")
+    c.add_argument("current")
+    c.add_argument("baseline")
+    c.add_argument("--threshold", type=float, default=0.10)
+    c.set_defaults(fn=cmd_compare)
+
+    args = ap.parse_args(argv)
+    return args.fn(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
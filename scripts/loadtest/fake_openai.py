@@ -0,0 +1,114 @@
+"""Offline stand-in for the OpenAI chat completions API (plain and streamed), with configurable latency.
+
+    python -m scripts.loadtest.fake_openai --port 18200 --latency-ms 300 --token-ms 2
+
+Point the diet agent at it with OPENAI_BASE_URL=http://127.0.0.1:18200/v1 and any OPENAI_API_KEY.
+Replies follow the JSON shape the diet agent asks for: chat prompts get {"assistant_reply",
+"updated_plan" (the input plan, unchanged)}; diet prompts get a fixed three-meal plan.
+`FakeClient` gives the same replies in-process, in place of an `openai.OpenAI` client.
+"""
+import argparse, itertools, json, logging, threading, time
+from types import SimpleNamespace
+from flask import Flask, Response, jsonify, request
+
+LATENCY_MS = 300.0   # time to first token
+TOKEN_MS = 2.0       # per streamed chunk
+CHUNK_CHARS = 16
+
+app = Flask(__name__)
+_ids = itertools.count(1)
+stats = {"requests": 0, "streamed": 0}
+
+DIET_PLAN = {
+    "daily_calories": 2200,
+    "macros": {"protein": 150, "carbs": 230, "fat": 70},
+    "meals": [
+        {"name": "Oats with berries", "calories": 550, "protein": 30, "carbs": 80, "fat": 12},
+        {"name": "Chicken rice bowl", "calories": 850, "protein": 60, "carbs": 90, "fat": 25},
+        {"name": "Salmon and greens", "calories": 800, "protein": 60, "carbs": 60, "fat": 33},
+    ],
+}
+
+def reply_for(messages:list) -> str:
+    prompt = messages[-1].get("content", "") if messages else ""
+    if "assistant_reply" in prompt:
+        _, _, tail = prompt.partition("Input JSON:")
+        try:
+            payload = json.loads(tail)
+        except ValueError:
+            payload = {}
+        return json.dumps({"assistant_reply": f"Done: {payload.get('message', 'updated')}. Swapped a snack for fruit.",
+                           "updated_plan": payload.get("current_plan", {})})
+    if "daily_calories" in prompt:
+        return json.dumps(DIET_PLAN)
+    return "Keep going!"
+
+class FakeClient:
+    """In-process stand-in for `openai.OpenAI` (non-streamed completions only): sleeps `latency_s`
+    per call, counts calls and how many run at once."""
+
+    def __init__(self, latency_s:float=LATENCY_MS / 1000):
+        self.latency_s = latency_s
+        self.calls = self.active = self.peak = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model:str="fake", messages:list=(), **request):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.latency_s)
+            content = reply_for(list(messages))
+        finally:
+            with self._lock:
+                self.active -= 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def _envelope(model:str, **fields) -> dict:
+    return {"id": f"chatcmpl-fake{next(_ids)}", "created": int(time.time()), "model": model, **fields}
+
+@app.post("/v1/chat/completions")
+def completions():
+    body = request.get_json(force=True)
+    model = body.get("model", "fake")
+    content = reply_for(body.get("messages", []))
+    stats["requests"] += 1
+    time.sleep(LATENCY_MS / 1000)
+    if not body.get("stream"):
+        return jsonify(_envelope(model, object="chat.completion", choices=[
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            usage={"prompt_tokens": 0, "completion_tokens": len(content) // 4, "total_tokens": len(content) // 4}))
+    stats["streamed"] += 1
+
+    def events():
+        for i in range(0, len(content), CHUNK_CHARS):
+            chunk = _envelope(model, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": {"content": content[i:i + CHUNK_CHARS]}, "finish_reason": None}])
+            yield f"data: {json.dumps(chunk)}\n\n"
+            time.sleep(TOKEN_MS / 1000)
+        done = _envelope(model, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+
+    return Response(events(), mimetype="text/event-stream")
+
+@app.get("/health")
+def health():
+    return jsonify({"ok": True, "service": "fake_openai", **stats})
+
+def main(argv=None):
+    global LATENCY_MS, TOKEN_MS
+    ap = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=18200)
+    ap.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    ap.add_argument("--token-ms", type=float, default=TOKEN_MS)
+    args = ap.parse_args(argv)
+    LATENCY_MS, TOKEN_MS = args.latency_ms, args.token_ms
+    # werkzeug's threaded server: one thread per completion, and streamed chunks are flushed as written
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
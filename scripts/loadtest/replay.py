@@ -0,0 +1,101 @@
+"""Open-loop replay of traffic rows against a gateway.
+
+Each row has a scheduled send time (its recorded offset / `speed`, or i / `rate`). `concurrency`
+worker threads take rows in order and send each one no earlier than its scheduled time. Latency is
+measured from the scheduled time, so when every worker is busy the queueing delay shows up in the
+percentiles instead of being hidden by a slower send rate (no coordinated omission). `service_ms`
+is the time from actually sending to the last byte.
+"""
+import itertools, threading, time
+import requests
+
+class Result:
+    __slots__ = ("endpoint", "status", "latency_ms", "service_ms", "ttfb_ms", "bytes", "error")
+
+    def __init__(self, endpoint, status, latency_ms, service_ms, ttfb_ms, nbytes, error=None):
+        self.endpoint = endpoint
+        self.status = status
+        self.latency_ms = latency_ms
+        self.service_ms = service_ms
+        self.ttfb_ms = ttfb_ms
+        self.bytes = nbytes
+        self.error = error
+
+def endpoint(row:dict) -> str:
+    return f"{row.get('method', 'POST')} {row['path']}"
+
+def schedule(rows:list[dict], rate:float|None=None, speed:float=1.0) -> list[float]:
+    """Send offsets (s): evenly spaced at `rate`/s, or the recorded offsets compressed by `speed`."""
+    if rate:
+        return [i / rate for i in range(len(rows))]
+    return [r.get("t", 0.0) / speed for r in rows]
+
+def repeat(rows:list[dict], offsets:list[float], duration_s:float) -> tuple[list[dict], list[float]]:
+    """Loop the traffic until `duration_s` seconds of schedule are covered."""
+    if not rows or duration_s <= 0:
+        return rows, offsets
+    span = (offsets[-1] + (offsets[-1] / max(len(offsets) - 1, 1))) or 1.0
+    out_rows, out_offsets = [], []
+    for lap in itertools.count():
+        for r, o in zip(rows, offsets):
+            t = lap * span + o
+            if t >= duration_s:
+                return out_rows, out_offsets
+            out_rows.append(r)
+            out_offsets.append(t)
+
+def send(session:requests.Session, base_url:str, row:dict, timeout:float):
+    url = f"{base_url}{row['path']}" + (f"?{row['query']}" if row.get("query") else "")
+    kwargs = {"timeout": timeout, "stream": True}
+    if "body" in row:
+        kwargs["json"] = row["body"]
+    elif "data" in row:
+        kwargs["data"] = row["data"].encode()
+        kwargs["headers"] = {"Content-Type": row.get("content_type") or "application/octet-stream"}
+    t0 = time.perf_counter()
+    with session.request(row.get("method", "POST"), url, **kwargs) as res:
+        ttfb, nbytes = None, 0
+        for chunk in res.iter_content(chunk_size=None):
+            if ttfb is None:
+                ttfb = time.perf_counter() - t0
+            nbytes += len(chunk)
+    return res.status_code, t0, ttfb, nbytes
+
+def run(base_url:str, rows:list[dict], offsets:list[float], concurrency:int=16, timeout:float=60.0,
+        progress=None) -> tuple[list[Result], float]:
+    """Replay `rows` at `offsets`; returns (results in completion order, wall seconds)."""
+    base_url = base_url.rstrip("/")
+    results: list[Result] = []
+    lock = threading.Lock()
+    next_row = itertools.count()
+    start = time.perf_counter() + 0.05
+
+    def worker():
+        session = requests.Session()
+        while True:
+            i = next(next_row)
+            if i >= len(rows):
+                return
+            row, due = rows[i], start + offsets[i]
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                status, sent, ttfb, nbytes = send(session, base_url, row, timeout)
+                end = time.perf_counter()
+                r = Result(endpoint(row), status, (end - due) * 1000, (end - sent) * 1000,
+                           (ttfb or end - sent) * 1000, nbytes)
+            except requests.RequestException as e:
+                end = time.perf_counter()
+                r = Result(endpoint(row), None, (end - due) * 1000, None, None, 0, type(e).__name__)
+            with lock:
+                results.append(r)
+                if progress:
+                    progress(len(results), len(rows))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
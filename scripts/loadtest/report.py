@@ -0,0 +1,69 @@
+"""Per-endpoint summaries of a replay, JSON result files and regression checks against a baseline."""
+import json
+from pathlib import Path
+import numpy as np
+
+PCTS = (50, 95, 99)
+
+def _stats(results:list, wall_s:float) -> dict:
+    lat = np.array([r.latency_ms for r in results])
+    ok = [r for r in results if r.status is not None and r.status < 500]
+    svc = np.array([r.service_ms for r in ok]) if ok else np.zeros(0)
+    errors = len(results) - len(ok)
+    out = {"count": len(results), "errors": errors, "error_rate": errors / len(results) if results else 0.0,
+           "rps": len(results) / wall_s if wall_s > 0 else 0.0,
+           "mean_ms": float(lat.mean()) if len(lat) else 0.0, "max_ms": float(lat.max()) if len(lat) else 0.0}
+    for p, v in zip(PCTS, np.percentile(lat, PCTS) if len(lat) else [0.0] * len(PCTS)):
+        out[f"p{p}_ms"] = float(v)
+    for p, v in zip(PCTS, np.percentile(svc, PCTS) if len(svc) else [0.0] * len(PCTS)):
+        out[f"service_p{p}_ms"] = float(v)
+    statuses: dict[str, int] = {}
+    for r in results:
+        key = str(r.status) if r.status is not None else r.error
+        statuses[key] = statuses.get(key, 0) + 1
+    out["statuses"] = statuses
+    return out
+
+def summarize(results:list, wall_s:float, meta:dict|None=None) -> dict:
+    by_endpoint: dict[str, list] = {}
+    for r in results:
+        by_endpoint.setdefault(r.endpoint, []).append(r)
+    return {"meta": {**(meta or {}), "wall_s": wall_s},
+            "overall": _stats(results, wall_s),
+            "endpoints": {ep: _stats(rs, wall_s) for ep, rs in sorted(by_endpoint.items())}}
+
+def print_summary(summary:dict, out=print):
+    out(f"{'endpoint':28}{'n':>7}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in [*summary["endpoints"].items(), ("TOTAL", summary["overall"])]:
+        out(f"{name:28}{s['count']:>7}{s['errors']:>6}{s['rps']:>9.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+            f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+
+def save(summary:dict, path:Path|str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+def load(path:Path|str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(current:dict, baseline:dict, threshold:float=0.10, min_count:int=20, min_delta_ms:float=1.0) -> list[str]:
+    """Regressions of `current` against `baseline`: p95/p99 up by more than `threshold` (and more
+    than `min_delta_ms`), throughput down by more than `threshold`, or error rate up by over one point.
+    Endpoints with fewer than `min_count` requests on either side are skipped as too noisy, and p99 is
+    only judged with at least 100 requests (below that it is essentially the maximum)."""
+    found = []
+    pairs = [("TOTAL", current["overall"], baseline["overall"])]
+    pairs += [(ep, s, baseline["endpoints"][ep]) for ep, s in current["endpoints"].items() if ep in baseline["endpoints"]]
+    for name, cur, base in pairs:
+        if cur["count"] < min_count or base["count"] < min_count:
+            continue
+        for key, need in (("p95_ms", min_count), ("p99_ms", max(min_count, 100))):
+            if min(cur["count"], base["count"]) >= need and cur[key] > base[key] * (1 + threshold) and cur[key] - base[key] > min_delta_ms:
+                found.append(f"{name}: {key} {base[key]:.1f} -> {cur[key]:.1f} (+{(cur[key] / base[key] - 1) * 100:.0f}%)"
+                             if base[key] else f"{name}: {key} 0 -> {cur[key]:.1f}")
+        if cur["rps"] < base["rps"] * (1 - threshold):
+            found.append(f"{name}: rps {base['rps']:.1f} -> {cur['rps']:.1f}")
+        if cur["error_rate"] > base["error_rate"] + 0.01:
+            found.append(f"{name}: error rate {base['error_rate']:.1%} -> {cur['error_rate']:.1%}")
+    return found
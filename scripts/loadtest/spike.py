@@ -0,0 +1,30 @@
+"""Spike scenario for admission control: a diet-chat flood from a few users against a slow model,
+on top of steady cheap traffic (/health, /nudge/send) from many users. Each run replays the same
+rows against a fresh local stack; comparing ADMISSION=0 with the default limits shows whether cheap
+routes keep their p99 while chat is saturated."""
+import random
+
+CHEAP = ["/health", "/nudge/send"]
+
+def generate(duration_s:float=20.0, chat_rate:float=40.0, cheap_rate:float=20.0, chat_users:int=10,
+             seed:int=0) -> tuple[list[dict], list[float]]:
+    """(rows, send offsets): Poisson chat arrivals at `chat_rate`/s from `chat_users` users, half
+    of them streamed, and cheap requests at `cheap_rate`/s, each from a different user."""
+    rng = random.Random(seed)
+    events = []
+    t, i = 0.0, 0
+    while (t := t + rng.expovariate(chat_rate)) < duration_s:
+        i += 1
+        plan = {"user_id": f"chat-{rng.randrange(chat_users)}", "meals": [{"name": "Oats", "calories": 400}], "workouts": []}
+        # a distinct message per request so the LLM cache never answers for the model
+        events.append((t, {"method": "POST", "path": rng.choice(["/diet/chat", "/diet/chat/stream"]),
+                           "body": {"message": f"swap breakfast, take {i}", "current_plan": plan}}))
+    t = 0.0
+    while (t := t + rng.expovariate(cheap_rate)) < duration_s:
+        i += 1
+        path = rng.choice(CHEAP)
+        row = {"method": "GET", "path": path} if path == "/health" else \
+              {"method": "POST", "path": path, "body": {"user_id": f"cheap-{i}", "tone": "coach", "goal": "stay_consistent"}}
+        events.append((t, row))
+    events.sort(key=lambda e: e[0])
+    return [row for _, row in events], [t for t, _ in events]
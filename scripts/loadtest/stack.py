@@ -0,0 +1,53 @@
+"""Launch the whole service stack locally for a load test: every service under services.run's
+Supervisor (gunicorn/waitress, real worker processes) plus the fake OpenAI server, on offset ports,
+with a throwaway database and LLM cache so the tracked storage/ files are never touched."""
+import os, subprocess, sys, tempfile, time
+from contextlib import contextmanager
+import requests
+from services.run import ROOT, Supervisor, configured
+
+@contextmanager
+def launched(port_offset:int=10000, workers:int|None=None, threads:int|None=None, server:str="auto",
+             llm_latency_ms:float=300.0, llm_token_ms:float=2.0, env:dict|None=None, log=print):
+    """Yield the gateway URL of a freshly started stack; stops everything on exit."""
+    tmp = tempfile.mkdtemp(prefix="hc-loadtest-")
+    services = configured(workers=workers, threads=threads)
+    for svc in services:
+        svc.port += port_offset
+    llm_port = 8200 + port_offset
+    saved = dict(os.environ)
+    os.environ.update({
+        "HC_DB_PATH": os.path.join(tmp, "app.db"),
+        "LLM_CACHE_PATH": os.path.join(tmp, "llm_cache.db"),
+        "OPENAI_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "CAMPAIGN_SINK": "memory",
+        "TRAFFIC_RECORD": "0",
+        **{f"{svc.name.upper()}_URL": svc.url("127.0.0.1") for svc in services},
+        **(env or {}),
+    })
+    llm = subprocess.Popen([sys.executable, "-m", "scripts.loadtest.fake_openai", "--port", str(llm_port),
+                            "--latency-ms", str(llm_latency_ms), "--token-ms", str(llm_token_ms)],
+                           cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sup = Supervisor(services, server=server, log=log)
+    try:
+        _wait(f"http://127.0.0.1:{llm_port}/health", llm)
+        if not sup.start():
+            raise RuntimeError("service stack did not start")
+        yield next(s for s in services if s.name == "gateway").url("127.0.0.1"), sup
+    finally:
+        sup.stop()
+        llm.terminate()
+        llm.wait()
+        os.environ.clear()
+        os.environ.update(saved)
+
+def _wait(url:str, proc:subprocess.Popen, timeout_s:float=15.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline and proc.poll() is None:
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
@@ -0,0 +1,75 @@
+"""Traffic files: rows recorded by the gateway (services/common/traffic.py), or a synthetic mix."""
+import json, random
+from pathlib import Path
+from services.common.traffic import DEFAULT_PATH
+
+GOALS = ["fat_loss", "muscle_gain", "endurance", "general_health"]
+LEVELS = ["sedentary", "light", "moderate", "active", "very_active"]
+EQUIPMENT = [[], ["dumbbells"], ["dumbbells", "pullup_bar"], ["bike"]]
+CHAT = ["swap lunch for something vegetarian", "less carbs at dinner please", "add a high-protein snack",
+        "I don't like salmon", "make breakfast quicker"]
+
+# (weight, path) of the synthetic mix: mostly plan reads, then feedback/scheduling writes
+MIX = [
+    (50, "/plan/today"), (15, "/feedback"), (8, "/chat"), (8, "/nudge/send"), (8, "/schedule/commit"),
+    (5, "/diet/chat"), (4, "/diet/chat/stream"), (2, "/plan/batch"),
+]
+
+def load(path:Path|str=DEFAULT_PATH) -> list[dict]:
+    """Recorded rows ordered by time, with `t` rebased to 0."""
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    rows.sort(key=lambda r: r.get("t", 0))
+    t0 = rows[0].get("t", 0) if rows else 0
+    for r in rows:
+        r["t"] = r.get("t", 0) - t0
+    return rows
+
+def save(rows:list[dict], path:Path|str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, separators=(",", ":")) + "\n")
+
+def _user(rng:random.Random, i:int) -> dict:
+    return {
+        "user_id": f"lt-{i}",
+        "profile": {"age": rng.randint(18, 70), "sex": rng.choice(["M", "F"]), "height_cm": round(rng.uniform(150, 200), 1),
+                    "weight_kg": round(rng.uniform(45, 130), 1), "activity_level": rng.choice(LEVELS)},
+        "goal": {"type": rng.choice(GOALS), "deficit_kcal": rng.choice([0, 250, 500])},
+    }
+
+def _body(path:str, rng:random.Random, users:list[dict], n:int) -> dict:
+    u = rng.choice(users)
+    if path == "/plan/today":
+        return {**u, "equipment": rng.choice(EQUIPMENT)}
+    if path == "/feedback":
+        return {"event_id": f"lt-ev-{n}", "user_id": u["user_id"], "rating": rng.randint(1, 5), "bandit_arm": rng.choice(["coach", "friendly"])}
+    if path == "/chat":
+        return {"user_id": u["user_id"], "text": rng.choice(["make me a plan", "motivate me", "hello"])}
+    if path == "/nudge/send":
+        return {"user_id": u["user_id"], "tone": rng.choice(["coach", "friendly"]), "goal": "stay_consistent"}
+    if path == "/schedule/commit":
+        day = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        return {"user_id": u["user_id"], "events": [
+            {"type": "meal", "name": "Breakfast", "scheduled_at": f"{day}T08:00:00", "duration_min": 15},
+            {"type": "workout", "name": "Run", "scheduled_at": f"{day}T18:{rng.randint(0, 59):02d}:00", "duration_min": 30}]}
+    if path in ("/diet/chat", "/diet/chat/stream"):
+        plan = {"user_id": u["user_id"], "meals": [{"name": "Oats", "calories": 400, "macros": {"protein": 20, "carbs": 60, "fat": 8}}], "workouts": []}
+        return {"message": rng.choice(CHAT), "current_plan": plan}
+    if path == "/plan/batch":
+        return {"items": [rng.choice(users) for _ in range(50)]}
+    raise ValueError(path)
+
+def generate(n:int=2000, users:int=200, rate:float=50.0, seed:int=0) -> list[dict]:
+    """`n` synthetic requests with Poisson arrivals at `rate`/s, in the recorder's row format."""
+    rng = random.Random(seed)
+    people = [_user(rng, i) for i in range(users)]
+    weights, paths = zip(*MIX)
+    rows, t = [], 0.0
+    for i in range(n):
+        path = rng.choices(paths, weights)[0]
+        rows.append({"t": round(t, 4), "method": "POST", "path": path, "content_type": "application/json",
+                     "body": _body(path, rng, people, i)})
+        t += rng.expovariate(rate)
+    return rows
@@ -0,0 +1,180 @@
+"""Shared HTTP client layer for calling agents.
+
+One pooled keep-alive `requests.Session` per agent base URL, bounded retries with
+jittered backoff, and a circuit breaker that fails fast while an agent is down.
+"""
+import os, random, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from services.common import inproc, telemetry
+
+POOL_MAXSIZE = int(os.environ.get("AGENT_POOL_MAXSIZE", "32"))
+BREAKER_FAILURES = int(os.environ.get("AGENT_BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.environ.get("AGENT_BREAKER_RESET_S", "10"))
+RETRY_BACKOFF_S = float(os.environ.get("AGENT_RETRY_BACKOFF_S", "0.05"))
+RETRY_STATUSES = {502, 503, 504}
+
+
+class CircuitOpen(requests.ConnectionError):
+    """Raised without touching the network while an agent's breaker is open."""
+
+
+def not_sent(e:requests.RequestException) -> bool:
+    """True if the connection was never established, so the agent cannot have seen the request.
+    A connection dropped after sending (RemoteDisconnected, reset) is also a ConnectionError but
+    may have been processed."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if isinstance(e, requests.ConnectionError) and e.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures; after `reset_timeout_s`
+    a single half-open probe is let through and its outcome closes or re-opens the breaker."""
+
+    def __init__(self, failure_threshold:int=BREAKER_FAILURES, reset_timeout_s:float=BREAKER_RESET_S, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout_s:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state, self.opened_at = "open", self.clock()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snap = {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+            if self.state == "open":
+                snap["retry_in_s"] = round(max(0.0, self.reset_timeout_s - (self.clock() - self.opened_at)), 2)
+            return snap
+
+
+class AgentClient:
+    def __init__(self, base_url:str, pool_maxsize:int=POOL_MAXSIZE, breaker:CircuitBreaker|None=None):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        # max_retries=0: retries are handled below so they can be jittered and breaker-aware
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"requests": 0, "errors": 0, "retries": 0, "short_circuited": 0, "in_flight": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key:str, n:int=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def request(self, method:str, path:str, timeout, retries:int=0, idempotent:bool=False, **kwargs) -> requests.Response:
+        """Send a request through the pool.
+
+        Failures to connect are retried up to `retries` times (the request never reached the
+        agent); other connection errors, timeouts and 502/503/504 responses only when `idempotent`.
+        Raises CircuitOpen while the breaker is open.
+        """
+        url = f"{self.base_url}{path}"
+        trace = telemetry.outgoing_headers()
+        if trace:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **trace}
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                raise CircuitOpen(f"circuit open for {self.base_url}")
+            self._count("requests")
+            self._count("in_flight")
+            t0 = time.perf_counter()
+            try:
+                res = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                telemetry.record_hop(path, time.perf_counter() - t0)
+                self._count("errors")
+                self.breaker.record_failure()
+                retryable = not_sent(e) or (idempotent and isinstance(e, (requests.ConnectionError, requests.Timeout)))
+                if attempt >= retries or not retryable:
+                    raise
+            else:
+                telemetry.record_hop(path, time.perf_counter() - t0, res.status_code, res.headers.get("Server-Timing"))
+                if res.status_code < 500:
+                    self.breaker.record_success()
+                    return res
+                self._count("errors")
+                self.breaker.record_failure()
+                if attempt >= retries or not (idempotent and res.status_code in RETRY_STATUSES):
+                    return res
+                res.close()
+            finally:
+                self._count("in_flight", -1)
+            attempt += 1
+            self._count("retries")
+            # full jitter: sleep U(0, backoff * 2^attempt)
+            time.sleep(random.uniform(0, RETRY_BACKOFF_S * (2 ** attempt)))
+
+    def post(self, path:str, json=None, **kwargs) -> requests.Response:
+        return self.request("POST", path, json=json, **kwargs)
+
+    def get(self, path:str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def snapshot(self) -> dict:
+        pools = []
+        for key in self.adapter.poolmanager.pools.keys():
+            pool = self.adapter.poolmanager.pools[key]
+            pools.append({"host": f"{pool.host}:{pool.port}", "maxsize": self.adapter._pool_maxsize,
+                          "idle": pool.pool.qsize() if pool.pool else 0,
+                          "connections_opened": pool.num_connections, "requests": pool.num_requests})
+        with self._lock:
+            stats = dict(self.stats)
+        return {"base_url": self.base_url, "breaker": self.breaker.snapshot(), "pools": pools, **stats}
+
+
+_CLIENTS: dict[str, AgentClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def get_client(base_url:str) -> AgentClient:
+    """Process-wide client for `base_url` (created on first use).
+    `inproc://<module>` URLs call that module's HANDLERS in this process (see services.common.inproc)."""
+    base_url = base_url.rstrip("/")
+    client = _CLIENTS.get(base_url)
+    if client is None:
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.get(base_url)
+            if client is None:
+                if base_url.startswith(inproc.SCHEME):
+                    client = inproc.InProcClient(base_url)
+                else:
+                    client = AgentClient(base_url)
+                _CLIENTS[base_url] = client
+    return client
+
+def snapshot_all() -> list[dict]:
+    return [c.snapshot() for c in list(_CLIENTS.values())]
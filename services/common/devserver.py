@@ -0,0 +1,9 @@
+import threading
+from werkzeug.serving import make_server
+
+def serve_in_thread(app, host:str="127.0.0.1", port:int=0):
+    """Run a WSGI app on a background thread (tests/benchmarks). Returns (server, base_url)."""
+    server = make_server(host, port, app, threaded=True)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return server, f"http://{host}:{server.server_port}"
@@ -0,0 +1,42 @@
+"""Incremental multi-day planning with a dependency-tracked per-day cache.
+
+A day's plan depends on that day's inputs and on the previous day's plan (variety rules look one
+day back). DayCache keys each day on (scope, the day's inputs, digest of the previous day's
+*result*), so editing day k leaves days before it as hits, recomputes day k, and recomputes day
+k+1 only if day k's plan actually changed; a chain stops at the first day whose result is unchanged.
+"""
+import hashlib, json
+from services.common.cache import LRUCache
+
+
+def digest(value) -> str:
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class DayCache(LRUCache):
+    """LRUCache of day key -> (result, result digest)."""
+
+    def __init__(self, max_entries:int=10_000, ttl_s:float|None=None):
+        super().__init__(max_entries, ttl_s)
+        self.computed = 0
+
+    def plan(self, scope:str, days:list, compute) -> tuple[list, int]:
+        """Results for each day's inputs in order; `compute(inputs, previous result or None)`
+        runs only for days whose key is not cached. Returns (results, days computed)."""
+        results, prev, prev_digest, computed = [], None, "", 0
+        for inputs in days:
+            key = digest([scope, inputs, prev_digest])
+            hit = self.get(key)
+            if hit is None:
+                value = compute(inputs, prev)
+                hit = (value, digest(value))
+                self.put(key, hit)
+                computed += 1
+            prev, prev_digest = hit
+            results.append(prev)
+        self.computed += computed
+        return results, computed
+
+    def stats(self) -> dict:
+        return {**super().stats(), "computed": self.computed}
@@ -0,0 +1,110 @@
+"""In-process agent calls: the same client interface as AgentClient, without HTTP.
+
+An agent module opts in by exposing `HANDLERS = {path: handler}`, where a handler takes the
+decoded JSON body and returns `(payload, status)`; payload is a dict/list, or an iterator of
+str/bytes chunks for streaming routes. Its Flask routes wrap the same handlers via `respond`,
+so remote (per-port) and in-process deployments run identical logic.
+
+Payloads are handed over without encoding or copying: callers must treat them as read-only.
+"""
+import importlib, json, threading, time
+import requests
+from flask import Response, jsonify, stream_with_context
+from services.common import telemetry
+
+SCHEME = "inproc://"
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def respond(result):
+    """Flask response for a handler's (payload, status)."""
+    payload, status = result
+    if isinstance(payload, (dict, list)):
+        return jsonify(payload), status
+    return Response(stream_with_context(payload), status=status, mimetype="application/x-ndjson", headers=STREAM_HEADERS)
+
+
+class LocalResponse:
+    """The parts of requests.Response the gateway uses."""
+
+    def __init__(self, payload, status_code:int=200):
+        self.status_code = status_code
+        self._payload = payload
+        self._streaming = not isinstance(payload, (dict, list))
+        self.headers = {"Content-Type": "application/x-ndjson" if self._streaming else "application/json"}
+        self._content = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self):
+        if self._streaming:
+            raise ValueError("streaming response")
+        return self._payload
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = b"".join(self.iter_content()) if self._streaming else json.dumps(self._payload).encode()
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode()
+
+    def iter_content(self, chunk_size=None):
+        if not self._streaming:
+            yield self.content
+            return
+        for chunk in self._payload:
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} from in-process agent", response=self)
+
+    def close(self):
+        close = getattr(self._payload, "close", None)
+        if self._streaming and close:
+            close()
+
+
+class InProcClient:
+    """AgentClient look-alike for `inproc://<module>` base URLs."""
+
+    def __init__(self, base_url:str):
+        self.base_url = base_url
+        module = importlib.import_module(base_url[len(SCHEME):])
+        self.handlers = module.HANDLERS
+        self.stats = {"requests": 0, "errors": 0}
+        self.total_s = 0.0
+        self._lock = threading.Lock()
+
+    def request(self, method:str, path:str, timeout=None, retries:int=0, idempotent:bool=False, json=None, **kwargs):
+        handler = self.handlers.get(path)
+        if handler is None:
+            raise requests.ConnectionError(f"{path} is not served in-process by {self.base_url}")
+        t0 = time.perf_counter()
+        try:
+            payload, status = handler(json if json is not None else {})
+        except Exception as e:  # same outcome a remote agent's 500 would give
+            payload, status = {"error": f"{type(e).__name__}: {e}"}, 500
+        elapsed = time.perf_counter() - t0
+        telemetry.record_hop(path, elapsed, status)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["errors"] += status >= 500
+            self.total_s += elapsed
+        return LocalResponse(payload, status)
+
+    def post(self, path:str, json=None, **kwargs) -> LocalResponse:
+        return self.request("POST", path, json=json, **kwargs)
+
+    def get(self, path:str, **kwargs) -> LocalResponse:
+        return self.request("GET", path, **kwargs)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats, total = dict(self.stats), self.total_s
+        return {"base_url": self.base_url, "mode": "inproc", "paths": sorted(self.handlers),
+                "avg_ms": round(1000 * total / stats["requests"], 3) if stats["requests"] else 0.0, **stats}
@@ -0,0 +1,78 @@
+"""Minimal JSON Patch (RFC 6902): `diff` emits add/remove/replace ops, `apply` applies them.
+
+Lists are compared position by position (changed items are diffed recursively, extra items are
+appended or removed from the end), which keeps patches small for the in-place edits plans get.
+"""
+import copy
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _escape(key) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+def _unescape(token:str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def diff(old, new, path:str="") -> list[dict]:
+    if type(old) is not type(new):
+        return [{"op": "replace", "path": path, "value": new}]
+    if isinstance(old, dict):
+        ops = [{"op": "remove", "path": f"{path}/{_escape(k)}"} for k in old if k not in new]
+        for k, v in new.items():
+            if k not in old:
+                ops.append({"op": "add", "path": f"{path}/{_escape(k)}", "value": v})
+            else:
+                ops += diff(old[k], v, f"{path}/{_escape(k)}")
+        return ops
+    if isinstance(old, list):
+        ops = []
+        for i in range(min(len(old), len(new))):
+            ops += diff(old[i], new[i], f"{path}/{i}")
+        ops += [{"op": "add", "path": f"{path}/-", "value": v} for v in new[len(old):]]
+        ops += [{"op": "remove", "path": f"{path}/{i}"} for i in range(len(old) - 1, len(new) - 1, -1)]
+        return ops
+    return [] if old == new else [{"op": "replace", "path": path, "value": new}]
+
+
+def apply(doc, ops:list[dict]):
+    """A patched copy of `doc`; raises PatchError on a bad path or op."""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        path = op.get("path", "")
+        if path == "":
+            if op.get("op") not in ("add", "replace"):
+                raise PatchError(f"cannot {op.get('op')} the document root")
+            doc = copy.deepcopy(op["value"])
+            continue
+        *parents, last = [_unescape(t) for t in path.split("/")[1:]]
+        target = doc
+        try:
+            for token in parents:
+                target = target[int(token)] if isinstance(target, list) else target[token]
+            if isinstance(target, list):
+                index = len(target) if last == "-" else int(last)
+                if op["op"] == "add":
+                    target.insert(index, copy.deepcopy(op["value"]))
+                elif op["op"] == "remove":
+                    del target[index]
+                elif op["op"] == "replace":
+                    target[index] = copy.deepcopy(op["value"])
+                else:
+                    raise PatchError(f"unsupported op {op['op']!r}")
+            elif op["op"] in ("add", "replace"):
+                if op["op"] == "replace" and last not in target:
+                    raise PatchError(f"no value at {path}")
+                target[last] = copy.deepcopy(op["value"])
+            elif op["op"] == "remove":
+                del target[last]
+            else:
+                raise PatchError(f"unsupported op {op['op']!r}")
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            if isinstance(e, PatchError):
+                raise
+            raise PatchError(f"cannot apply {op.get('op')} at {path}") from None
+    return doc
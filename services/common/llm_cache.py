@@ -0,0 +1,200 @@
+"""Content-addressed cache for LLM chat completions.
+
+Key = sha256 over the normalized request (model, temperature, messages with whitespace
+collapsed, response_format). An in-memory LRU tier sits over a SQLite tier in `storage/`;
+both honour the TTL, and the SQLite tier is trimmed to `max_rows` by least-recent access.
+Only replies that pass `reply_ok` (or the caller's own `accept`) are cached, so one malformed
+completion is retried on the next request instead of being served for the whole TTL.
+
+Every diet worker shares the SQLite file, so it is opened like the main database (WAL, busy
+timeout; see storage.make_engine), disk hits only rewrite `accessed_at` once per
+`touch_interval_s`, and a database error is a miss or a skipped store, never the caller's error.
+"""
+import hashlib, json, os, threading, time
+from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from services.common import storage
+from services.common.cache import LRUCache
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "storage" / "llm_cache.db"
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        value TEXT,
+        created_at REAL,
+        accessed_at REAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache(accessed_at)",
+]
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(model:str, messages:list, temperature:float|None=None, **extra) -> str:
+    blob = json.dumps({"model": model, "temperature": temperature, "messages": _normalize(messages), **_normalize(extra)},
+                      sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path:str|Path|None=None, max_memory:int=1024, max_rows:int=50_000,
+                 ttl_s:float=7 * 24 * 3600, clock=time.time, touch_interval_s:float=3600):
+        self.path = Path(path or os.environ.get("LLM_CACHE_PATH") or DEFAULT_PATH)
+        self.max_rows = max_rows
+        self.ttl_s = ttl_s
+        self.touch_interval_s = touch_interval_s   # accessed_at only needs to be good enough for trim()
+        self.clock = clock
+        self.memory = LRUCache(max_memory, ttl_s=ttl_s, clock=clock)
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "puts": 0, "disk_evictions": 0, "disk_errors": 0}
+        self._engine = None
+        self._lock = threading.Lock()
+        self._puts_since_trim = 0
+
+    @property
+    def engine(self):
+        # the SQLite file is only opened on first use
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    engine = storage.make_engine(self.path)
+                    with engine.begin() as conn:
+                        for stmt in SCHEMA:
+                            conn.execute(text(stmt))
+                    self._engine = engine
+        return self._engine
+
+    def _count(self, key:str, n:int=1):
+        with self._lock:
+            self.counters[key] += n
+
+    def get(self, key:str) -> str|None:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        now = self.clock()
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(text("SELECT value, created_at, accessed_at FROM llm_cache WHERE key=:k"), {"k": key}).first()
+            if row is not None and row.created_at + self.ttl_s > now and now - row.accessed_at >= self.touch_interval_s:
+                with self.engine.begin() as conn:
+                    conn.execute(text("UPDATE llm_cache SET accessed_at=:t WHERE key=:k"), {"t": now, "k": key})
+        except SQLAlchemyError:
+            self._count("disk_errors")
+            row = None
+        if row is None or row.created_at + self.ttl_s <= now:
+            self._count("misses")
+            return None
+        self._count("disk_hits")
+        self.memory.put(key, row.value, ttl_s=row.created_at + self.ttl_s - now)
+        return row.value
+
+    def put(self, key:str, value:str, model:str|None=None) -> bool:
+        """Cache `value`; False if only the memory tier took it (the disk write failed)."""
+        now = self.clock()
+        self.memory.put(key, value)
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text("""INSERT OR REPLACE INTO llm_cache(key, model, value, created_at, accessed_at)
+                                     VALUES (:k, :m, :v, :t, :t)"""), {"k": key, "m": model, "v": value, "t": now})
+        except SQLAlchemyError:
+            self._count("disk_errors")
+            return False
+        with self._lock:
+            self.counters["puts"] += 1
+            self._puts_since_trim += 1
+            due = self._puts_since_trim >= max(1, self.max_rows // 100)
+            if due:
+                self._puts_since_trim = 0
+        if due:
+            try:
+                self.trim()
+            except SQLAlchemyError:
+                self._count("disk_errors")
+        return True
+
+    def trim(self) -> int:
+        """Drop expired rows, then the least recently used rows beyond `max_rows`."""
+        with self.engine.begin() as conn:
+            n = conn.execute(text("DELETE FROM llm_cache WHERE created_at <= :t"), {"t": self.clock() - self.ttl_s}).rowcount
+            n += conn.execute(text("""DELETE FROM llm_cache WHERE key IN (
+                                        SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET :n)"""),
+                              {"n": self.max_rows}).rowcount
+        self._count("disk_evictions", n)
+        return n
+
+    def stats(self) -> dict:
+        with self.engine.begin() as conn:
+            rows = conn.execute(text("SELECT COUNT(*) FROM llm_cache")).scalar()
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hit_rate = (counters["memory_hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+        return {**counters, "hit_rate": round(hit_rate, 4), "disk_rows": rows, "max_rows": self.max_rows,
+                "ttl_s": self.ttl_s, "memory": self.memory.stats()}
+
+
+def request_key(request:dict) -> str:
+    extra = {k: v for k, v in request.items() if k not in ("model", "messages", "temperature", "stream")}
+    return cache_key(request["model"], request["messages"], request.get("temperature"), **extra)
+
+
+def reply_ok(request:dict, content:str|None) -> bool:
+    """Whether a reply may be cached: non-empty and, for JSON-mode requests, a JSON object."""
+    if not content:
+        return False
+    if (request.get("response_format") or {}).get("type") in ("json_object", "json_schema"):
+        try:
+            return isinstance(json.loads(content), dict)
+        except ValueError:
+            return False
+    return True
+
+
+def store_reply(cache:LLMCache, key:str, request:dict, content:str|None, accept=None):
+    """Cache `content` under `key` if `accept(content)` (default `reply_ok`) says it is usable."""
+    if (accept(content) if accept else reply_ok(request, content)):
+        cache.put(key, content, model=request["model"])
+
+
+def cached_completion(client, cache:LLMCache|None, accept=None, **request) -> str:
+    """`client.chat.completions.create(**request)` message content, served from `cache` when possible.
+    `accept(content) -> bool` overrides which replies may be cached (default `reply_ok`)."""
+    if cache is None:
+        return client.chat.completions.create(**request).choices[0].message.content
+    key = request_key(request)
+    content = cache.get(key)
+    if content is None:
+        content = client.chat.completions.create(**request).choices[0].message.content
+        store_reply(cache, key, request, content, accept)
+    return content
+
+
+def stream_completion(client, cache:LLMCache|None, accept=None, **request):
+    """Yield content deltas of a streamed completion; a cache hit is yielded as one delta.
+    The full content is cached once the stream completes (shares keys with `cached_completion`)."""
+    key = request_key(request) if cache is not None else None
+    content = cache.get(key) if key else None
+    if content is not None:
+        yield content
+        return
+    parts = []
+    for chunk in client.chat.completions.create(**request, stream=True):
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            yield delta
+    if key:
+        store_reply(cache, key, request, "".join(parts), accept)
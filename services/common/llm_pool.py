@@ -0,0 +1,185 @@
+"""Bounded worker pool for blocking LLM calls, with per-call deadlines and coalescing.
+
+Request threads never call the model themselves: `call` hands the work to one of `workers` threads
+and waits at most the caller's deadline. At most `workers + max_queue` distinct calls are queued or
+running; beyond that `call` fails fast with PoolSaturated. Callers asking for the same key while a
+call is in flight wait on that call instead of starting another. A call whose waiters all gave up
+keeps running if it already started (the completion still lands in the LLM cache), or is dropped
+if it had not. `submit` starts a call nobody shares (a stream) under the same capacity limit.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from services.common.llm_cache import LLMCache, request_key, store_reply
+
+
+class LLMUnavailable(Exception):
+    reason = "unavailable"
+
+class PoolSaturated(LLMUnavailable):
+    reason = "saturated"
+
+class DeadlineExceeded(LLMUnavailable):
+    reason = "deadline"
+
+
+class _Call:
+    __slots__ = ("future", "waiters")
+
+    def __init__(self):
+        self.future = None
+        self.waiters = 0
+
+
+class LLMPool:
+    def __init__(self, workers:int=4, max_queue:int=16):
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self._inflight: dict[object, _Call] = {}
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "coalesced": 0, "saturated": 0, "deadline": 0, "errors": 0, "dropped": 0,
+                         "store_errors": 0}
+
+    def call(self, key:str, fn, timeout_s:float):
+        """fn() on a pool worker, shared with concurrent callers of the same key; its result,
+        or PoolSaturated / DeadlineExceeded / whatever fn raised."""
+        with self._lock:
+            c = self._inflight.get(key)
+            if c is not None:
+                self.counters["coalesced"] += 1
+            elif len(self._inflight) >= self.capacity:
+                self.counters["saturated"] += 1
+                raise PoolSaturated(f"{len(self._inflight)} LLM calls queued or running")
+            else:
+                self.counters["calls"] += 1
+                c = self._inflight[key] = _Call()
+                c.future = self._executor.submit(self._run, key, c, fn)
+            c.waiters += 1
+        try:
+            return c.future.result(timeout=max(timeout_s, 0.0))
+        except (FutureTimeout, CancelledError):
+            with self._lock:
+                self.counters["deadline"] += 1
+            raise DeadlineExceeded(f"no LLM reply within {timeout_s:.1f}s") from None
+        finally:
+            with self._lock:
+                c.waiters -= 1
+                if not c.waiters and c.future.cancel():   # nobody waits and it never started
+                    self.counters["dropped"] += 1
+                    if self._inflight.get(key) is c:
+                        del self._inflight[key]
+
+    def submit(self, fn):
+        """Start fn() on a pool worker without waiting for it; PoolSaturated if the pool is full.
+        The call counts against capacity until fn returns."""
+        key = object()   # never coalesced
+        with self._lock:
+            if len(self._inflight) >= self.capacity:
+                self.counters["saturated"] += 1
+                raise PoolSaturated(f"{len(self._inflight)} LLM calls queued or running")
+            self.counters["calls"] += 1
+            c = self._inflight[key] = _Call()
+            c.future = self._executor.submit(self._run, key, c, fn)
+        return c.future
+
+    def _run(self, key, c:_Call, fn):
+        try:
+            return fn()
+        except Exception:
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is c:
+                    del self._inflight[key]
+
+    def count(self, key:str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "workers": self.workers, "capacity": self.capacity, "inflight": len(self._inflight)}
+
+
+def pooled_completion(pool:LLMPool, client, cache:LLMCache|None, timeout_s:float, accept=None, **request) -> str:
+    """Like `cached_completion`, but a cache miss goes through `pool` under a deadline; identical
+    in-flight requests (same cache key) share one model call."""
+    key = request_key(request)
+    content = cache.get(key) if cache is not None else None
+    if content is not None:
+        return content
+
+    def complete():
+        content = client.chat.completions.create(**request).choices[0].message.content
+        if cache is not None:
+            try:
+                store_reply(cache, key, request, content, accept)
+            except Exception:  # the reply is paid for and valid; a failed store must not cost it
+                pool.count("store_errors")
+        return content
+
+    return pool.call(key, complete, timeout_s)
+
+
+_END = object()
+
+def pooled_stream(pool:LLMPool, client, cache:LLMCache|None, timeout_s:float, accept=None, max_buffered:int=256,
+                  **request):
+    """Like `stream_completion`, but the model stream is read on a `pool` worker into a bounded
+    queue that this generator drains; PoolSaturated if the pool is full, DeadlineExceeded once
+    `timeout_s` has passed without the stream finishing. A worker whose reader gave up keeps
+    reading (without buffering) so the completion still lands in the cache."""
+    key = request_key(request)
+    content = cache.get(key) if cache is not None else None
+    if content is not None:
+        yield content
+        return
+
+    q = queue.Queue(maxsize=max_buffered)
+    abandoned = threading.Event()
+
+    def put(item):
+        while not abandoned.is_set():
+            try:
+                return q.put(item, timeout=0.1)
+            except queue.Full:
+                pass
+
+    def run():
+        parts = []
+        try:
+            for chunk in client.chat.completions.create(**request, stream=True):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    put(delta)
+        except Exception as e:
+            put(e)
+            raise
+        if cache is not None:
+            try:
+                store_reply(cache, key, request, "".join(parts), accept)
+            except Exception:  # as in pooled_completion
+                pool.count("store_errors")
+        put(_END)
+
+    pool.submit(run)
+    deadline = time.monotonic() + max(timeout_s, 0.0)
+    try:
+        while True:
+            try:
+                item = q.get(timeout=max(deadline - time.monotonic(), 0.0))
+            except queue.Empty:
+                pool.count("deadline")
+                raise DeadlineExceeded(f"LLM stream not finished within {timeout_s:.1f}s") from None
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        abandoned.set()
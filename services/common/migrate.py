@@ -0,0 +1,30 @@
+"""Apply pending schema migrations (storage.MIGRATIONS) to the shared SQLite database.
+
+    python -m services.common.migrate            # bring the schema up to date
+    python -m services.common.migrate --check    # exit 1 if migrations are pending
+
+Run it once per deploy before starting services; `services.run` does so itself. Services never
+migrate at import, and with HC_AUTO_MIGRATE=0 they refuse an old schema instead of migrating it.
+"""
+import argparse, sys
+from services.common import storage
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--db", help="database file (default: HC_DB_PATH / storage/app.db)")
+    ap.add_argument("--target", type=int, help="migrate up to this version (default: latest)")
+    ap.add_argument("--check", action="store_true", help="only report; exit 1 if migrations are pending")
+    args = ap.parse_args(argv)
+    if args.db:
+        storage.configure(args.db)
+    latest = len(storage.MIGRATIONS)
+    before = storage.schema_version()
+    if args.check:
+        print(f"{storage.engine.url.database}: schema version {before} of {latest}")
+        return 0 if before >= latest else 1
+    after = storage.migrate(args.target)
+    print(f"{storage.engine.url.database}: schema version {before} -> {after} of {latest}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
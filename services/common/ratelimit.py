@@ -0,0 +1,42 @@
+import threading, time
+
+class TokenBucket:
+    """Thread-safe token bucket: refills `rate` tokens per second up to `burst`.
+    A rate <= 0 means unlimited."""
+
+    def __init__(self, rate:float, burst:float|None=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, self.rate))
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n:float=1) -> float:
+        """Take `n` tokens if available; returns 0.0 on success, else the seconds to wait."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0.0
+            return (min(n, self.burst) - self.tokens) / self.rate
+
+    def acquire(self, n:float=1, timeout:float|None=None) -> bool:
+        """Block until `n` tokens are taken (requests above `burst` are capped at `burst`)."""
+        n = min(n, self.burst) if self.rate > 0 else n
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            wait = self.try_acquire(n)
+            if wait == 0.0:
+                return True
+            if deadline is not None and self.clock() + wait > deadline:
+                return False
+            self.sleep(wait)
@@ -1,57 +1,382 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from pathlib import Path
+import datetime, os, threading, time
+from services.common import telemetry
 
-DB_PATH = Path(__file__).resolve().parents[2] / "storage" / "app.db"
+DB_PATH = Path(os.environ.get("HC_DB_PATH") or Path(__file__).resolve().parents[2] / "storage" / "app.db")
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-engine = create_engine(f"sqlite:///{DB_PATH}", future=True, echo=False)
-
-SCHEMA = '''
-CREATE TABLE IF NOT EXISTS feedback (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    event_id TEXT,
-    user_id TEXT,
-    rating INTEGER,
-    reason TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS bandit_arm (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    agent TEXT,
-    arm TEXT,
-    pulls INTEGER DEFAULT 0,
-    reward_sum REAL DEFAULT 0.0
-);
-'''
+# "tuned": WAL + busy timeout + pooled connections (several services share this file);
+# "basic": SQLAlchemy defaults
+STORAGE_MODE = os.environ.get("STORAGE_MODE", "tuned")
+# Schema changes belong to the explicit migrate step (python -m services.common.migrate). Services only
+# check the schema version on first use; HC_AUTO_MIGRATE=0 makes an old schema an error instead of
+# migrating it there (services.run migrates before starting any worker and sets it).
+AUTO_MIGRATE = os.environ.get("HC_AUTO_MIGRATE", "1") == "1"
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+
+PRAGMAS = {
+    "journal_mode": "WAL",       # readers don't block the writer
+    "synchronous": "NORMAL",     # durable across app crashes in WAL mode, far fewer fsyncs
+    "busy_timeout": "5000",      # wait for a competing writer instead of failing with 'database is locked'
+    "temp_store": "MEMORY",
+    "cache_size": "-16000",      # ~16 MB page cache per connection
+    "foreign_keys": "ON",
+}
+
+def _timed(eng):
+    """Add statement time to the current request's `db` span (see services.common.telemetry)."""
+    @event.listens_for(eng, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["hc_t0"] = time.perf_counter()
+
+    @event.listens_for(eng, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        telemetry.add_time("db", time.perf_counter() - conn.info.pop("hc_t0", time.perf_counter()))
+
+    return eng
+
+def make_engine(path:Path|str=DB_PATH, mode:str=STORAGE_MODE):
+    url = f"sqlite:///{path}"
+    if mode != "tuned":
+        return _timed(create_engine(url, future=True, echo=False))
+    eng = _timed(create_engine(url, future=True, echo=False, pool_size=POOL_SIZE, max_overflow=POOL_SIZE,
+                               connect_args={"timeout": 30, "check_same_thread": False}))
+
+    @event.listens_for(eng, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for name, value in PRAGMAS.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
+
+    return eng
+
+engine = make_engine()
+
+def configure(path:Path|str=DB_PATH, mode:str=STORAGE_MODE):
+    """Point this module at another database file (tests, tools) and return the new engine."""
+    global engine
+    engine.dispose()
+    engine = make_engine(path, mode)
+    return engine
+
+# Feedback rollups: (scope, key) -> count, rating sum and a 1..5 rating histogram. Every feedback insert
+# folds its rows in within the same transaction; rebuild_rollups() recomputes them from the whole log.
+ROLLUP_TABLE = """CREATE TABLE IF NOT EXISTS {table} (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    n INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    r1 INTEGER NOT NULL DEFAULT 0,
+    r2 INTEGER NOT NULL DEFAULT 0,
+    r3 INTEGER NOT NULL DEFAULT 0,
+    r4 INTEGER NOT NULL DEFAULT 0,
+    r5 INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID"""
+# scope -> (key expression, row filter) over feedback
+ROLLUP_SCOPES = {
+    "all": ("'*'", "1"),
+    "user": ("COALESCE(user_id, 'anon')", "1"),
+    "day": ("date(created_at)", "1"),
+    "arm": ("bandit_arm", "bandit_arm IS NOT NULL"),
+    "arm_day": ("bandit_arm || '|' || date(created_at)", "bandit_arm IS NOT NULL"),
+}
+ROLLUP_COLUMNS = ["n", "rating_sum", "r1", "r2", "r3", "r4", "r5"]
+
+def rollup_sql(table:str="feedback_rollup", rows:str="id > :lo AND id <= :hi") -> list[str]:
+    """One upsert per scope adding the aggregates of the feedback rows matching `rows` into `table`."""
+    hist = ", ".join(f"COALESCE(SUM(rating = {r}), 0)" for r in range(1, 6))
+    add = ", ".join(f"{c} = {c} + excluded.{c}" for c in ROLLUP_COLUMNS)
+    return [f"""INSERT INTO {table}(scope, key, {", ".join(ROLLUP_COLUMNS)})
+                SELECT '{scope}', {key}, COUNT(*), COALESCE(SUM(rating), 0), {hist} FROM feedback
+                WHERE {rows} AND {where} GROUP BY 2
+                ON CONFLICT(scope, key) DO UPDATE SET {add}"""
+            for scope, (key, where) in ROLLUP_SCOPES.items()]
+
+# Versioned schema; PRAGMA user_version holds the last applied migration.
+MIGRATIONS = [
+    # 1: base tables
+    [
+        """CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id TEXT,
+            user_id TEXT,
+            rating INTEGER,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS bandit_arm (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent TEXT,
+            arm TEXT,
+            pulls INTEGER DEFAULT 0,
+            reward_sum REAL DEFAULT 0.0
+        )""",
+        """CREATE TABLE IF NOT EXISTS bandit_flush (
+            journal TEXT PRIMARY KEY,
+            last_seq INTEGER
+        )""",
+    ],
+    # 2: lookup indexes; merge duplicate arm rows so (agent, arm) can be unique
+    [
+        "CREATE INDEX IF NOT EXISTS ix_feedback_user_id ON feedback(user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_feedback_event_id ON feedback(event_id)",
+        """UPDATE bandit_arm SET
+            pulls = (SELECT SUM(b.pulls) FROM bandit_arm b WHERE b.agent IS bandit_arm.agent AND b.arm IS bandit_arm.arm),
+            reward_sum = (SELECT SUM(b.reward_sum) FROM bandit_arm b WHERE b.agent IS bandit_arm.agent AND b.arm IS bandit_arm.arm)
+           WHERE id IN (SELECT MIN(id) FROM bandit_arm GROUP BY agent, arm HAVING COUNT(*) > 1)""",
+        "DELETE FROM bandit_arm WHERE id NOT IN (SELECT MIN(id) FROM bandit_arm GROUP BY agent, arm)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_bandit_arm_agent_arm ON bandit_arm(agent, arm)",
+    ],
+    # 3: scheduler event store; times are normalized ISO strings so they sort chronologically
+    [
+        """CREATE TABLE IF NOT EXISTS schedule_event (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            type TEXT,
+            name TEXT,
+            scheduled_at TEXT NOT NULL,
+            end_at TEXT NOT NULL,
+            duration_min INTEGER,
+            payload TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_schedule_event_user_time ON schedule_event(user_id, scheduled_at, id)",
+    ],
+    # 4: reminder bookkeeping; the partial index covers only reminders still to fire
+    [
+        "ALTER TABLE schedule_event ADD COLUMN reminded_at TEXT",
+        "CREATE INDEX IF NOT EXISTS ix_schedule_event_pending ON schedule_event(scheduled_at) WHERE reminded_at IS NULL",
+    ],
+    # 5: contextual bandit sufficient statistics (sum x x^T and sum r x, flattened per arm); additive like bandit_arm
+    [
+        """CREATE TABLE IF NOT EXISTS bandit_linear (
+            agent TEXT NOT NULL,
+            arm TEXT NOT NULL,
+            cell INTEGER NOT NULL,
+            value REAL NOT NULL DEFAULT 0.0,
+            PRIMARY KEY (agent, arm, cell)
+        )""",
+    ],
+    # 6: log which arm a rated nudge used and the probability the policy chose it with (offline evaluation)
+    [
+        "ALTER TABLE feedback ADD COLUMN bandit_arm TEXT",
+        "ALTER TABLE feedback ADD COLUMN propensity REAL",
+    ],
+    # 7: server-side diet plans edited through /diet/chat; version is bumped on every change (optimistic concurrency)
+    [
+        """CREATE TABLE IF NOT EXISTS diet_plan (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            version INTEGER NOT NULL,
+            plan TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ],
+    # 8: feedback rollups per user / day / arm / arm and day, seeded from the existing log
+    [
+        ROLLUP_TABLE.format(table="feedback_rollup"),
+        *rollup_sql(rows="1"),
+    ],
+]
+
+def schema_version() -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("PRAGMA user_version")).scalar()
+
+def migrate(target:int|None=None) -> int:
+    """Apply pending migrations (each in its own transaction); returns the resulting version."""
+    target = len(MIGRATIONS) if target is None else target
+    version = schema_version()
+    for v in range(version + 1, target + 1):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")   # one migrator at a time; the others see the new version
+            if conn.execute(text("PRAGMA user_version")).scalar() >= v:
+                version = v
+                continue
+            for stmt in MIGRATIONS[v - 1]:
+                conn.execute(text(stmt))
+            conn.execute(text(f"PRAGMA user_version = {v}"))
+        version = v
+    return version
 
 def init_db():
-    with engine.begin() as conn:
-        for stmt in SCHEMA.strip().split(';'):
-            s = stmt.strip()
-            if s:
-                conn.execute(text(s))
-
-def record_feedback(event_id:str, user_id:str, rating:int, reason:str|None):
-    with engine.begin() as conn:
-        conn.execute(text("""INSERT INTO feedback(event_id,user_id,rating,reason)
-                             VALUES (:e,:u,:r,:re)"""),
-                     {"e":event_id,"u":user_id,"r":rating,"re":reason})
+    global _ready_engine
+    migrate()
+    _ready_engine = engine
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+_ready_engine = None
+_ready_lock = threading.Lock()
+
+def ready():
+    """Once per process (and engine): make sure the schema is current, migrating it if AUTO_MIGRATE is
+    on, else raising SchemaOutdated. Runs on first use instead of at import."""
+    global _ready_engine
+    if _ready_engine is engine:
+        return
+    with _ready_lock:
+        if _ready_engine is engine:
+            return
+        version = schema_version()
+        if version < len(MIGRATIONS):
+            if not AUTO_MIGRATE:
+                raise SchemaOutdated(f"database schema is at version {version} of {len(MIGRATIONS)}; "
+                                     "run python -m services.common.migrate")
+            migrate()
+        _ready_engine = engine
+
+def begin():
+    """engine.begin() on a ready schema."""
+    ready()
+    return engine.begin()
+
+def connect():
+    """engine.connect() on a ready schema."""
+    ready()
+    return engine.connect()
+
+# created_at is set here rather than by the column default so the rollup day is the row's day
+INSERT_FEEDBACK = text("""INSERT INTO feedback(event_id,user_id,rating,reason,bandit_arm,propensity,created_at)
+                          VALUES (:e,:u,:r,:re,:a,:p,:t)""")
+
+ROLLUP_UPSERTS = [text(stmt) for stmt in rollup_sql()]
+UPSERT_ROLLUP = text(f"""INSERT INTO feedback_rollup(scope, key, {", ".join(ROLLUP_COLUMNS)})
+                         VALUES (:scope, :key, {", ".join(":" + c for c in ROLLUP_COLUMNS)})
+                         ON CONFLICT(scope, key) DO UPDATE SET {", ".join(f"{c} = {c} + excluded.{c}" for c in ROLLUP_COLUMNS)}""")
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")  # CURRENT_TIMESTAMP's format
+
+def _roll_up(conn, params:list[dict]):
+    """Fold just-inserted feedback params into feedback_rollup (same keys as ROLLUP_SCOPES), one executemany."""
+    deltas: dict = {}
+    for p in params:
+        day, arm = p["t"][:10], p["a"]
+        keys = [("all", "*"), ("user", p["u"] if p["u"] is not None else "anon"), ("day", day)]
+        if arm is not None:
+            keys += [("arm", arm), ("arm_day", f"{arm}|{day}")]
+        for key in keys:
+            d = deltas.get(key)
+            if d is None:
+                d = deltas[key] = {"scope": key[0], "key": key[1], **dict.fromkeys(ROLLUP_COLUMNS, 0)}
+            d["n"] += 1
+            d["rating_sum"] += p["r"]
+            if 1 <= p["r"] <= 5:
+                d[f"r{p['r']}"] += 1
+    conn.execute(UPSERT_ROLLUP, list(deltas.values()))
+
+def record_feedback(event_id:str, user_id:str, rating:int, reason:str|None, bandit_arm:str|None=None, propensity:float|None=None):
+    params = {"e":event_id,"u":user_id,"r":rating,"re":reason,"a":bandit_arm,"p":propensity,"t":_now()}
+    with begin() as conn:
+        conn.execute(INSERT_FEEDBACK, params)
+        _roll_up(conn, [params])
+
+def record_feedback_many(rows:list[dict]) -> int:
+    """Insert many {event_id, user_id, rating, reason, bandit_arm?, propensity?} rows in one executemany transaction."""
+    if not rows:
+        return 0
+    now = _now()
+    params = [{"e":r.get("event_id",""), "u":r.get("user_id","anon"), "r":r["rating"], "re":r.get("reason"),
+               "a":r.get("bandit_arm"), "p":r.get("propensity"), "t":now} for r in rows]
+    with begin() as conn:
+        conn.execute(INSERT_FEEDBACK, params)
+        _roll_up(conn, params)
+    return len(params)
+
+def get_rollups(scope:str, keys:list[str]) -> dict:
+    """{key: {n, rating_sum, r1..r5}} for the given keys of `scope` that have any feedback."""
+    if not keys:
+        return {}
+    names = {f"k{i}": k for i, k in enumerate(keys)}
+    with begin() as conn:
+        rows = conn.execute(text(f"""SELECT key, {", ".join(ROLLUP_COLUMNS)} FROM feedback_rollup
+                                     WHERE scope=:scope AND key IN ({", ".join(":" + k for k in names)})"""),
+                            {"scope": scope, **names}).mappings().all()
+    return {r["key"]: {c: r[c] for c in ROLLUP_COLUMNS} for r in rows}
+
+def rebuild_rollups(chunk:int=500_000, progress=None) -> int:
+    """Recompute feedback_rollup from the whole feedback log, `chunk` ids per short transaction, into a
+    build table that is swapped in at the end; rows logged meanwhile are folded in at the swap.
+    `progress(done_id, last_id)` is called after each chunk. Returns the number of rows rolled up."""
+    with begin() as conn:
+        last = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM feedback")).scalar()
+        conn.execute(text("DROP TABLE IF EXISTS feedback_rollup_build"))
+        conn.execute(text(ROLLUP_TABLE.format(table="feedback_rollup_build")))
+    build = [text(stmt) for stmt in rollup_sql("feedback_rollup_build")]
+    for lo in range(0, last, chunk):
+        hi = min(lo + chunk, last)
+        with begin() as conn:
+            for stmt in build:
+                conn.execute(stmt, {"lo": lo, "hi": hi})
+        if progress:
+            progress(hi, last)
+    with begin() as conn:
+        conn.execute(text("DELETE FROM feedback_rollup"))   # takes the write lock before the final MAX(id)
+        now = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM feedback")).scalar()
+        conn.execute(text("INSERT INTO feedback_rollup SELECT * FROM feedback_rollup_build"))
+        for stmt in ROLLUP_UPSERTS:
+            conn.execute(stmt, {"lo": last, "hi": now})
+        conn.execute(text("DROP TABLE feedback_rollup_build"))
+        return conn.execute(text("SELECT COALESCE(SUM(n), 0) FROM feedback_rollup WHERE scope='all'")).scalar()
 
 def get_arms(agent:str):
-    with engine.begin() as conn:
+    with begin() as conn:
         rows = conn.execute(text("SELECT id, agent, arm, pulls, reward_sum FROM bandit_arm WHERE agent=:a"), {"a":agent}).mappings().all()
     return [dict(r) for r in rows]
 
+UPSERT_ARM = text("""INSERT INTO bandit_arm(agent, arm, pulls, reward_sum) VALUES (:agent, :arm, :p, :r)
+                     ON CONFLICT(agent, arm) DO UPDATE SET
+                        pulls = pulls + excluded.pulls,
+                        reward_sum = reward_sum + excluded.reward_sum""")
+
 def upsert_arm(agent:str, arm:str, reward:float|None=None, pulled:bool=False):
-    # Ensure row exists
-    with engine.begin() as conn:
-        conn.execute(text("""INSERT INTO bandit_arm(agent, arm, pulls, reward_sum)
-                           SELECT :agent, :arm, 0, 0.0
-                           WHERE NOT EXISTS (SELECT 1 FROM bandit_arm WHERE agent=:agent AND arm=:arm)"""),
-                     {"agent":agent,"arm":arm})
-        if pulled or reward is not None:
-            conn.execute(text("""UPDATE bandit_arm SET
-                                pulls = pulls + :p,
-                                reward_sum = reward_sum + :r
-                                WHERE agent=:agent AND arm=:arm"""),
-                         {"p":1 if pulled else 0, "r":(reward or 0.0), "agent":agent, "arm":arm})
+    # Creates the row if needed and applies the increments in one statement
+    with begin() as conn:
+        conn.execute(UPSERT_ARM, {"p":1 if pulled else 0, "r":(reward or 0.0), "agent":agent, "arm":arm})
+
+def get_flush_seq(journal:str) -> int:
+    with begin() as conn:
+        seq = conn.execute(text("SELECT last_seq FROM bandit_flush WHERE journal=:j"), {"j":journal}).scalar()
+    return seq or 0
+
+def apply_arm_deltas(agent:str, deltas:dict, journal:str, last_seq:int, expect_seq:int|None=None):
+    """Add {arm: (pulls, reward_sum)} deltas and record `last_seq` for `journal`, in one transaction.
+    Returns the resulting {arm: (pulls, reward_sum)} totals for `agent`.
+
+    With `expect_seq` (the journal's last_seq when the deltas were read) nothing is applied and None
+    is returned if another process has moved it meanwhile, so a journal is replayed at most once."""
+    rows = [{"agent":agent, "arm":arm, "p":p, "r":r} for arm, (p, r) in deltas.items()]
+    with begin() as conn:
+        # the flush row first: the write lock is taken before anything is read
+        if expect_seq is None:
+            conn.execute(text("""INSERT INTO bandit_flush(journal, last_seq) VALUES (:j, :s)
+                                 ON CONFLICT(journal) DO UPDATE SET last_seq=excluded.last_seq"""), {"j":journal, "s":last_seq})
+        elif not conn.execute(text("""INSERT INTO bandit_flush(journal, last_seq) VALUES (:j, :s)
+                                      ON CONFLICT(journal) DO UPDATE SET last_seq=excluded.last_seq
+                                      WHERE bandit_flush.last_seq = :e"""), {"j":journal, "s":last_seq, "e":expect_seq}).rowcount:
+            return None
+        if rows:
+            conn.execute(UPSERT_ARM, rows)
+        totals = conn.execute(text("SELECT arm, pulls, reward_sum FROM bandit_arm WHERE agent=:a"), {"a":agent}).all()
+    return {r.arm: (r.pulls or 0, r.reward_sum or 0.0) for r in totals}
+
+UPSERT_LINEAR = text("""INSERT INTO bandit_linear(agent, arm, cell, value) VALUES (:agent, :arm, :c, :v)
+                        ON CONFLICT(agent, arm, cell) DO UPDATE SET value = value + excluded.value""")
+
+def apply_linear_deltas(agent:str, deltas:dict) -> dict:
+    """Add {arm: {cell: delta}} to bandit_linear in one transaction; returns the resulting {arm: {cell: value}} for `agent`."""
+    rows = [{"agent":agent, "arm":arm, "c":c, "v":v} for arm, cells in deltas.items() for c, v in cells.items() if v]
+    with begin() as conn:
+        if rows:
+            conn.execute(UPSERT_LINEAR, rows)
+        totals = conn.execute(text("SELECT arm, cell, value FROM bandit_linear WHERE agent=:a"), {"a":agent}).all()
+    out: dict = {}
+    for r in totals:
+        out.setdefault(r.arm, {})[r.cell] = r.value
+    return out
@@ -0,0 +1,226 @@
+"""Request metrics and trace propagation shared by every service.
+
+`instrument(app, service)` wraps a Flask app's WSGI callable:
+  * Prometheus text on GET /metrics: request counts by route/method/status, a latency
+    histogram per route, in-flight requests, and per-hop agent call latency.
+  * A trace id per request, taken from the caller's X-Trace-Id or created; AgentClient forwards
+    it to downstream agents, so one id follows a request through every hop.
+  * A Server-Timing response header with the request's time breakdown: `total`, named spans
+    (`span("validate")`), agent hops (`diet`, plus `diet.app` = the agent's own total) and
+    SQLite time (`db`). With TRACE_LOG=1 the same breakdown is logged, one line per request.
+
+Metrics are per process (each gunicorn worker exposes its own /metrics).
+Streamed responses are timed until their headers are sent.
+"""
+import bisect, itertools, logging, os, threading, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TRACE_HEADER = "X-Trace-Id"
+TRACE_LOG = os.environ.get("TRACE_LOG") == "1"
+log = logging.getLogger("hc.trace")
+
+_current: ContextVar["Trace | None"] = ContextVar("hc_trace", default=None)
+
+
+class Trace:
+    __slots__ = ("id", "spans")
+
+    def __init__(self, trace_id:str):
+        self.id = trace_id
+        self.spans: dict[str, float] = {}  # name -> seconds (repeated spans add up)
+
+    def add(self, name:str, seconds:float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+def current() -> Trace | None:
+    return _current.get()
+
+def add_time(name:str, seconds:float):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+@contextmanager
+def span(name:str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - t0)
+
+def outgoing_headers() -> dict:
+    trace = _current.get()
+    return {TRACE_HEADER: trace.id} if trace is not None else {}
+
+def server_timing(total:float, spans:dict[str, float]) -> str:
+    head = "total;dur=%.2f" % (total * 1000)
+    if not spans:
+        return head
+    return ", ".join([head, *("%s;dur=%.2f" % (name, sec * 1000) for name, sec in spans.items())])
+
+# process prefix + counter: unique across workers, and cheaper than random bytes per request
+_TRACE_PREFIX = os.urandom(4).hex()
+_trace_seq = itertools.count(1)
+
+def new_trace_id() -> str:
+    return "%s%08x" % (_TRACE_PREFIX, next(_trace_seq) & 0xFFFFFFFF)
+
+def downstream_total(header:str|None) -> float|None:
+    """`total` (seconds) from a downstream Server-Timing header."""
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name == "total" and params.startswith("dur="):
+            try:
+                return float(params[4:]) / 1000
+            except ValueError:
+                return None
+    return None
+
+
+# ---- metrics registry ----
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value:float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    def __init__(self):
+        # (service, route, method, status) -> latency histogram; its count is the request counter
+        self.requests: dict[tuple, Histogram] = {}
+        self.in_flight: dict[str, int] = {}         # service -> n
+        self.hops: dict[tuple, Histogram] = {}      # (agent, path) -> histogram
+        self.hop_errors: dict[tuple, int] = {}
+        self.lock = threading.Lock()
+
+    def enter(self, service:str):
+        with self.lock:
+            self.in_flight[service] = self.in_flight.get(service, 0) + 1
+
+    def observe_request(self, service, route, method, status, seconds):
+        key = (service, route, method, status)
+        with self.lock:
+            self.in_flight[service] = self.in_flight.get(service, 1) - 1
+            h = self.requests.get(key)
+            if h is None:
+                h = self.requests[key] = Histogram()
+            h.observe(seconds)
+
+    def observe_hop(self, agent:str, path:str, seconds:float, error:bool=False):
+        key = (agent, path)
+        with self.lock:
+            h = self.hops.get(key)
+            if h is None:
+                h = self.hops[key] = Histogram()
+            h.observe(seconds)
+            if error:
+                self.hop_errors[key] = self.hop_errors.get(key, 0) + 1
+
+    def render(self) -> str:
+        out = []
+        with self.lock:
+            latency: dict[tuple, Histogram] = {}
+            out += ["# HELP http_requests_total Requests handled, by route, method and status.",
+                    "# TYPE http_requests_total counter"]
+            for (svc, route, method, status), h in sorted(self.requests.items()):
+                out.append(f'http_requests_total{{service="{svc}",route="{route}",method="{method}",status="{status}"}} {h.count}')
+                agg = latency.setdefault((svc, route), Histogram())
+                agg.counts = [x + y for x, y in zip(agg.counts, h.counts)]
+                agg.sum += h.sum
+                agg.count += h.count
+            out += ["# HELP http_requests_in_flight Requests currently being handled.",
+                    "# TYPE http_requests_in_flight gauge"]
+            for svc, n in sorted(self.in_flight.items()):
+                out.append(f'http_requests_in_flight{{service="{svc}"}} {n}')
+            out += _histogram_lines("http_request_duration_seconds", "Request latency.",
+                                    {f'service="{s}",route="{r}"': h for (s, r), h in sorted(latency.items())})
+            out += _histogram_lines("agent_call_duration_seconds", "Latency of calls to other agents, as seen by the caller.",
+                                    {f'agent="{a}",path="{p}"': h for (a, p), h in sorted(self.hops.items())})
+            out += ["# HELP agent_call_errors_total Agent calls that failed or returned 5xx.",
+                    "# TYPE agent_call_errors_total counter"]
+            for (a, p), n in sorted(self.hop_errors.items()):
+                out.append(f'agent_call_errors_total{{agent="{a}",path="{p}"}} {n}')
+        return "\n".join(out) + "\n"
+
+def _histogram_lines(name:str, help_:str, series:dict) -> list[str]:
+    out = [f"# HELP {name} {help_}", f"# TYPE {name} histogram"]
+    for labels, h in series.items():
+        cum = 0
+        for le, n in zip(BUCKETS, h.counts):
+            cum += n
+            out.append(f'{name}_bucket{{{labels},le="{le}"}} {cum}')
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+        out.append(f"{name}_sum{{{labels}}} {h.sum}")
+        out.append(f"{name}_count{{{labels}}} {h.count}")
+    return out
+
+REGISTRY = Registry()
+
+def record_hop(path:str, seconds:float, status:int|None=None, downstream:str|None=None):
+    """Called by agent clients after each call: metrics plus `<agent>` / `<agent>.app` spans."""
+    agent = path.strip("/").split("/", 1)[0] or "root"
+    REGISTRY.observe_hop(agent, path, seconds, error=status is None or status >= 500)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(agent, seconds)
+        inner = downstream_total(downstream)
+        if inner is not None:
+            trace.add(f"{agent}.app", inner)
+
+
+# ---- WSGI middleware ----
+class TelemetryMiddleware:
+    def __init__(self, wsgi_app, service:str, registry:Registry=REGISTRY):
+        self.wsgi_app = wsgi_app
+        self.service = service
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        t0 = time.perf_counter()
+        trace = Trace(environ.get("HTTP_X_TRACE_ID") or new_trace_id())
+        token = _current.set(trace)
+        self.registry.enter(self.service)
+        status = ["500"]
+
+        def _start_response(status_line, headers, exc_info=None):
+            status[0] = status_line[:3]
+            headers.append((TRACE_HEADER, trace.id))
+            headers.append(("Server-Timing", server_timing(time.perf_counter() - t0, trace.spans)))
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, _start_response)
+        finally:
+            elapsed = time.perf_counter() - t0
+            route = environ.get("hc.route", "unmatched")
+            self.registry.observe_request(self.service, route, environ.get("REQUEST_METHOD", ""), status[0], elapsed)
+            _current.reset(token)
+            if TRACE_LOG:
+                log.info("trace=%s service=%s route=%s status=%s %s", trace.id, self.service, route, status[0],
+                         " ".join(f"{k}={v * 1000:.2f}ms" for k, v in {"total": elapsed, **trace.spans}.items()))
+
+def instrument(app, service:str):
+    """Wrap a Flask app with TelemetryMiddleware and add GET /metrics."""
+    from flask import Response, request
+
+    @app.after_request
+    def _route_label(response):
+        rule = request.url_rule
+        request.environ["hc.route"] = rule.rule if rule is not None else "unmatched"
+        return response
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    app.wsgi_app = TelemetryMiddleware(app.wsgi_app, service)
+    return app
@@ -0,0 +1,71 @@
+"""Gateway traffic capture for load-test replay (see scripts/loadtest).
+
+With TRAFFIC_RECORD=<path> (or `1` for storage/traffic.jsonl) the gateway appends one JSON line
+per handled request:
+    {"t": unix time, "method", "path", "query", "content_type",
+     "body": decoded JSON | "data": raw text, "status", "ms"}
+GET /health, GET /metrics and other introspection routes are not recorded. Several gunicorn
+workers can append to the same file (one write per line, O_APPEND); replay orders rows by `t`.
+"""
+import json, os, threading, time
+from pathlib import Path
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "storage" / "traffic.jsonl"
+SKIP_PATHS = {"/health", "/metrics", "/", "/admin/agents"}
+
+
+class TrafficRecorder:
+    def __init__(self, path:Path|str=DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.f = open(self.path, "ab", buffering=0)  # unbuffered: each row is a single write
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, method:str, path:str, query:str, content_type:str, raw:bytes, status:int, ms:float):
+        row = {"t": round(time.time(), 4), "method": method, "path": path}
+        if query:
+            row["query"] = query
+        if raw:
+            row["content_type"] = content_type
+            text = raw.decode("utf-8", "replace")
+            try:
+                row["body"] = json.loads(text) if content_type.startswith("application/json") else None
+            except ValueError:
+                row["body"] = None
+            if row["body"] is None:
+                del row["body"]
+                row["data"] = text
+        row["status"], row["ms"] = status, round(ms, 2)
+        line = (json.dumps(row, separators=(",", ":")) + "\n").encode()
+        with self.lock:
+            self.f.write(line)
+            self.recorded += 1
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+def from_env() -> TrafficRecorder | None:
+    target = os.environ.get("TRAFFIC_RECORD")
+    if not target or target == "0":
+        return None
+    return TrafficRecorder(DEFAULT_PATH if target == "1" else target)
+
+def install(app, recorder:TrafficRecorder):
+    """Record every request `app` handles (after the response is built)."""
+    from flask import g, request
+
+    @app.before_request
+    def _traffic_start():
+        g.traffic_t0 = time.perf_counter()
+
+    @app.after_request
+    def _traffic_record(response):
+        if request.path not in SKIP_PATHS:
+            recorder.record(request.method, request.path, request.query_string.decode(), request.content_type or "",
+                            request.get_data(cache=True), response.status_code,
+                            (time.perf_counter() - g.get("traffic_t0", time.perf_counter())) * 1000)
+        return response
+
+    return recorder
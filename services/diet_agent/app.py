@@ -1,87 +1,228 @@
 import os
+import sys
 import json
-from dotenv import load_dotenv
-from typing import Dict, Any, Optional
+import math
+import re
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
 from flask import Flask, request, jsonify
-from openai import OpenAI
+from services.common.horizon import DayCache
+from services.common import jsonpatch
+from services.common.inproc import respond
+from services.common.llm_cache import LLMCache
+from services.common.llm_pool import LLMPool, LLMUnavailable, pooled_completion, pooled_stream
+from services.common.telemetry import instrument
+from services.diet_agent import plan_store
+from services.diet_agent.streaming import ReplyExtractor
+from services.diet_agent.catalog import (UnknownDietType, allergen_mask, check_diet, load_default, macro_targets,
+                                         select_meals, servable_slots)
 
 # -------------------- SETUP --------------------
 BASE_DIR = os.path.dirname(__file__)
-load_dotenv(os.path.join(BASE_DIR, "diet.env"))
-load_dotenv()
+# python-dotenv is only imported when there is a file for it to load (diet.env, or a .env that
+# load_dotenv() would find walking up from here)
+if any(p.is_file() for p in [Path(BASE_DIR, "diet.env"), *(d / ".env" for d in [Path(BASE_DIR), *Path(BASE_DIR).parents])]):
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BASE_DIR, "diet.env"))
+    load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client: Optional[OpenAI] = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+# The OpenAI SDK is heavy to import, so the client is built on first use (llm_client()), never when
+# AI is off. Tests and tools may assign `client` directly (None turns AI off).
+_UNSET = object()
+client: Any = _UNSET
+_client_lock = threading.Lock()
+
+def llm_client():
+    global client
+    if client is _UNSET:
+        with _client_lock:
+            if client is _UNSET:
+                if OPENAI_API_KEY:
+                    from openai import OpenAI
+                    # the client-side timeout bounds how long a worker can be held by one call
+                    client = OpenAI(api_key=OPENAI_API_KEY, timeout=float(os.getenv("LLM_TIMEOUT_S", "60")))
+                else:
+                    client = None
+    return client
+
+def _openai_errors() -> tuple:
+    # openai is only loaded once a real client exists; before that there is nothing of its to catch
+    mod = sys.modules.get("openai")
+    return (mod.OpenAIError,) if mod is not None else ()
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+# Identical normalized prompts are answered from cache (memory LRU over storage/llm_cache.db)
+LLM_CACHE: Optional[LLMCache] = None if os.getenv("LLM_CACHE_DISABLED") == "1" else LLMCache(
+    max_memory=int(os.getenv("LLM_CACHE_MEMORY", "1024")),
+    max_rows=int(os.getenv("LLM_CACHE_MAX_ROWS", "50000")),
+    ttl_s=float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600))),
+)
+# Blocking completions run on LLM_WORKERS threads with at most LLM_QUEUE more waiting; a request
+# waits LLM_DEADLINE_S (or its own smaller "deadline_ms") before falling back to rule-based output
+LLM_POOL = LLMPool(workers=int(os.getenv("LLM_WORKERS", "4")), max_queue=int(os.getenv("LLM_QUEUE", "16")))
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "20"))
+MIN_DEADLINE_S = 0.05
 
 app = Flask(__name__)
+instrument(app, "diet_agent")
 
 # -------------------- TDEE --------------------
+ACTIVITY_MULT = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9
+}
+
 def tdee(profile: Dict[str, Any]) -> int:
-    # Mifflin-St Jeor
-    w = profile.get("weight_kg", 70)
-    h = profile.get("height_cm", 170)
-    a = profile.get("age", 30)
-    sex = profile.get("sex", "M")
+    # Mifflin-St Jeor (missing or null fields fall back to defaults)
+    w = profile.get("weight_kg") or 70
+    h = profile.get("height_cm") or 170
+    a = profile.get("age") or 30
+    sex = profile.get("sex") or "M"
 
     s = 5 if sex == "M" else -161
     bmr = 10 * w + 6.25 * h - 5 * a + s
 
-    mult = {
-        "sedentary": 1.2,
-        "light": 1.375,
-        "moderate": 1.55,
-        "active": 1.725,
-        "very_active": 1.9
-    }.get(profile.get("activity_level", "light"), 1.375)
+    mult = ACTIVITY_MULT.get(profile.get("activity_level") or "light", 1.375)
 
     return int(bmr * mult)
 
+
+def tdee_batch(profiles: List[Dict[str, Any]]) -> np.ndarray:
+    """Vectorized `tdee` over many profiles; same defaults, returns an int64 array."""
+    n = len(profiles)
+    w = np.fromiter((p.get("weight_kg") or 70 for p in profiles), dtype=np.float64, count=n)
+    h = np.fromiter((p.get("height_cm") or 170 for p in profiles), dtype=np.float64, count=n)
+    a = np.fromiter((p.get("age") or 30 for p in profiles), dtype=np.float64, count=n)
+    s = np.fromiter((5 if (p.get("sex") or "M") == "M" else -161 for p in profiles), dtype=np.float64, count=n)
+    mult = np.fromiter((ACTIVITY_MULT.get(p.get("activity_level") or "light", 1.375) for p in profiles), dtype=np.float64, count=n)
+    bmr = 10 * w + 6.25 * h - 5 * a + s
+    return (bmr * mult).astype(np.int64)  # truncation matches int()
+
 # -------------------- STATIC RECIPES --------------------
+# Built-in catalog; set RECIPE_CATALOG_PATH to a JSON/JSONL file to load a larger one
 RECIPES = [
-    {"name": "Greek Yogurt + Berries + Oats", "macros": {"protein": 35, "carbs": 50, "fat": 8}},
-    {"name": "Chicken Quinoa Bowl", "macros": {"protein": 45, "carbs": 55, "fat": 12}},
-    {"name": "Tuna Salad Wrap", "macros": {"protein": 30, "carbs": 35, "fat": 10}},
-    {"name": "Lentil Veggie Stew", "macros": {"protein": 24, "carbs": 40, "fat": 7}},
-    {"name": "Salmon + Rice + Greens", "macros": {"protein": 42, "carbs": 60, "fat": 14}},
+    {"name": "Greek Yogurt + Berries + Oats", "macros": {"protein": 35, "carbs": 50, "fat": 8},
+     "diets": ["balanced", "high_protein", "vegetarian", "pescatarian"], "allergens": ["dairy", "gluten"], "slots": ["breakfast"]},
+    {"name": "Chicken Quinoa Bowl", "macros": {"protein": 45, "carbs": 55, "fat": 12},
+     "diets": ["balanced", "high_protein"], "allergens": [], "slots": ["lunch", "dinner"]},
+    {"name": "Tuna Salad Wrap", "macros": {"protein": 30, "carbs": 35, "fat": 10},
+     "diets": ["balanced", "high_protein", "pescatarian"], "allergens": ["fish", "gluten"], "slots": ["lunch", "dinner"]},
+    {"name": "Lentil Veggie Stew", "macros": {"protein": 24, "carbs": 40, "fat": 7},
+     "diets": ["balanced", "vegetarian", "vegan", "pescatarian"], "allergens": [], "slots": ["lunch", "dinner"]},
+    {"name": "Salmon + Rice + Greens", "macros": {"protein": 42, "carbs": 60, "fat": 14},
+     "diets": ["balanced", "high_protein", "pescatarian"], "allergens": ["fish"], "slots": ["lunch", "dinner"]},
+    {"name": "Veggie Omelette + Toast", "macros": {"protein": 28, "carbs": 30, "fat": 18},
+     "diets": ["balanced", "vegetarian", "pescatarian"], "allergens": ["egg", "gluten"], "slots": ["breakfast"]},
+    {"name": "Tofu Scramble + Avocado", "macros": {"protein": 26, "carbs": 14, "fat": 24},
+     "diets": ["balanced", "vegetarian", "vegan", "pescatarian", "keto"], "allergens": ["soy"], "slots": ["breakfast"]},
+    {"name": "Peanut Butter Overnight Oats", "macros": {"protein": 22, "carbs": 58, "fat": 16},
+     "diets": ["balanced", "vegetarian", "vegan", "pescatarian"], "allergens": ["peanuts", "gluten"], "slots": ["breakfast"]},
+    {"name": "Chickpea Spinach Curry + Rice", "macros": {"protein": 20, "carbs": 70, "fat": 12},
+     "diets": ["balanced", "vegetarian", "vegan", "pescatarian"], "allergens": [], "slots": ["lunch", "dinner"]},
+    {"name": "Steak + Roasted Veg", "macros": {"protein": 48, "carbs": 12, "fat": 28},
+     "diets": ["balanced", "high_protein", "keto"], "allergens": [], "slots": ["lunch", "dinner"]},
+    {"name": "Tempeh Stir-Fry + Noodles", "macros": {"protein": 32, "carbs": 62, "fat": 15},
+     "diets": ["balanced", "vegetarian", "vegan", "pescatarian", "high_protein"], "allergens": ["soy", "gluten"], "slots": ["lunch", "dinner"]},
 ]
 
-MEAL_TIMES = ["08:00", "13:00", "19:00"]
+CATALOG = load_default(RECIPES)
+# /diet/week: per-day results keyed on the day's inputs + the previous day's recipes (see horizon.py)
+DAY_CACHE = DayCache(int(os.getenv("DAY_CACHE_MAX", "10000")))
 
+MEAL_SLOTS = ["breakfast", "lunch", "dinner"]
+MEAL_TIMES = {"breakfast": "08:00", "lunch": "13:00", "dinner": "19:00"}
 
-def build_rule_based_diet(profile: Dict[str, Any], goal: Dict[str, Any]) -> Dict[str, Any]:
-    base = tdee(profile)
+
+def _daily_target(profile: Dict[str, Any], goal: Dict[str, Any], base: int) -> int:
+    diet = profile.get("diet") or {}
+    if diet.get("calorie_target"):
+        return int(diet["calorie_target"])
     deficit = int(goal.get("deficit_kcal", 0) or 0)
-    target = max(base - deficit, 1400)
-    per = target // 3
-    meals = []
+    return max(base - deficit, 1400)
+
 
-    total_p = total_c = total_f = 0
+def _diet_filters(profile: Dict[str, Any]):
+    diet = profile.get("diet") or {}
+    return check_diet(diet.get("type") or "balanced"), allergen_mask(diet.get("allergies") or diet.get("exclude"))
 
-    for idx, r in enumerate(RECIPES[:3]):
-        p = float(r["macros"]["protein"])
-        c = float(r["macros"]["carbs"])
-        f = float(r["macros"]["fat"])
 
-        total_p += p
-        total_c += c
-        total_f += f
+def _bad_diet(*profiles: Dict[str, Any]):
+    """The 400 for a profile whose diet type the catalog doesn't know, else None."""
+    try:
+        for profile in profiles:
+            _diet_filters(profile or {})
+    except UnknownDietType as e:
+        return {"error": str(e)}, 400
+    return None
 
+
+def _meals_for(targets: tuple, diet_type: str, exclude: int) -> List[Dict[str, Any]]:
+    # a slot with no compliant recipe is left out rather than filled with one that isn't
+    slots = servable_slots(CATALOG, MEAL_SLOTS, diet_type, exclude)
+    return _shape_meals(select_meals(CATALOG, np.array(targets, dtype=np.float64), slots, diet_type, exclude), slots)
+
+
+def _shape_meals(picks, slots: List[str]) -> List[Dict[str, Any]]:
+    meals = []
+    for slot, (ri, portion) in zip(slots, picks):
+        kcal, p, c, f = (float(x) for x in CATALOG.nutrients[ri] * portion)
+        p, c, f = round(p, 1), round(c, 1), round(f, 1)
         meals.append(
             {
-                "name": r["name"],
-                "calories": int(per),
+                "name": CATALOG.names[ri],
+                "calories": int(round(kcal)),
                 "macros": {"protein": p, "carbs": c, "fat": f},
-                "when": MEAL_TIMES[idx] if idx < len(MEAL_TIMES) else None,
+                "when": MEAL_TIMES.get(slot),
                 "protein": p,
                 "carbs": c,
                 "fat": f,
             }
         )
+    return meals
 
-    return {
+
+def _plan_from_meals(target: int, meals: List[Dict[str, Any]]) -> Dict[str, Any]:
+    plan = {
         "daily_calories": int(target),
-        "macros": {"protein": total_p, "carbs": total_c, "fat": total_f},
+        "macros": {k: round(sum(m["macros"][k] for m in meals), 1) for k in ("protein", "carbs", "fat")},
         "meals": meals,
     }
+    served = {m["when"] for m in meals}
+    unfilled = [slot for slot in MEAL_SLOTS if MEAL_TIMES[slot] not in served]
+    if unfilled:
+        plan["unfilled_slots"] = unfilled  # no recipe fits the diet and allergies for these
+    return plan
+
+
+def build_rule_based_diet(profile: Dict[str, Any], goal: Dict[str, Any]) -> Dict[str, Any]:
+    target = _daily_target(profile, goal, tdee(profile))
+    targets = tuple(macro_targets(profile, goal, target).tolist())
+    return _plan_from_meals(target, _meals_for(targets, *_diet_filters(profile)))
+
+
+def build_rule_based_diet_batch(profiles: List[Dict[str, Any]], goals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """`build_rule_based_diet` for many users at once: TDEE and targets are computed as arrays,
+    and users sharing the same targets and filters share one meal selection."""
+    base = tdee_batch(profiles)
+    deficit = np.fromiter((int(g.get("deficit_kcal", 0) or 0) for g in goals), dtype=np.int64, count=len(goals))
+    target = np.maximum(base - deficit, 1400)
+
+    memo: Dict[tuple, List[Dict[str, Any]]] = {}
+    plans = []
+    for profile, goal, t in zip(profiles, goals, target.tolist()):
+        if (profile.get("diet") or {}).get("calorie_target"):
+            t = _daily_target(profile, goal, t)
+        key = (tuple(macro_targets(profile, goal, t).tolist()), *_diet_filters(profile))
+        meals = memo.get(key)
+        if meals is None:
+            meals = memo[key] = _meals_for(*key)
+        plans.append(_plan_from_meals(t, [dict(m, macros=dict(m["macros"])) for m in meals]))
+    return plans
 
 # -------------------- RULE-BASED DIET --------------------
 @app.post("/generate_diet")
@@ -90,42 +231,98 @@ def generate_diet():
 
     profile = body.get("profile", {})
     goal = body.get("goal", {})
+    if error := _bad_diet(profile):
+        return respond(error)
     plan = build_rule_based_diet(profile, goal)
     return jsonify({"diet_plan": plan})
 
 
-@app.post("/diet/suggest")
-def diet_suggest():
-    body = request.get_json(force=True)
+def _suggest_shape(plan: Dict[str, Any]) -> Dict[str, Any]:
+    shaped = {
+        "meals": [
+            {
+                "name": m["name"],
+                "calories": int(m["calories"]),
+                "macros": m["macros"],
+                "when": m.get("when"),
+            }
+            for m in plan["meals"]
+        ],
+        "daily_calories": plan["daily_calories"],
+        "macros": plan["macros"],
+    }
+    if plan.get("unfilled_slots"):
+        shaped["unfilled_slots"] = plan["unfilled_slots"]
+    return shaped
+
+
+# Route handlers take the JSON body and return (payload, status); the gateway can call them
+# in-process through HANDLERS (DIET_MODE=inproc) instead of over HTTP.
+def handle_suggest(body: Dict[str, Any]):
     profile = body.get("profile", {})
     goal = body.get("goal", {})
+    if error := _bad_diet(profile):
+        return error
 
     plan = build_rule_based_diet(profile, goal)
-    return jsonify(
-        {
-            "meals": [
-                {
-                    "name": m["name"],
-                    "calories": int(m["calories"]),
-                    "macros": m["macros"],
-                    "when": m.get("when"),
-                }
-                for m in plan["meals"]
-            ],
-            "daily_calories": plan["daily_calories"],
-            "macros": plan["macros"],
-        }
-    )
+    return _suggest_shape(plan), 200
+
+def handle_batch(body: Dict[str, Any]):
+    # Expect: { profiles: [...], goals: [...] } (same length); returns /diet/suggest shapes in order
+    profiles = body.get("profiles") or []
+    goals = body.get("goals") or [{}] * len(profiles)
+    if len(goals) != len(profiles):
+        return {"error": "profiles and goals must have the same length"}, 400
+    if error := _bad_diet(*profiles):
+        return error
+    return {"plans": build_rule_based_diet_batch(profiles, goals)}, 200
+
+def _day_diet(day: Dict[str, Any], prev: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    profile, goal = day.get("profile") or {}, day.get("goal") or {}
+    target = _daily_target(profile, goal, tdee(profile))
+    # variety: no recipe from the previous day unless a slot has nothing else
+    diet_type, exclude = _diet_filters(profile)
+    slots = servable_slots(CATALOG, MEAL_SLOTS, diet_type, exclude)
+    picks = select_meals(CATALOG, macro_targets(profile, goal, target), slots, diet_type, exclude,
+                         avoid=(prev or {}).get("recipes", ()))
+    return {"plan": _suggest_shape(_plan_from_meals(target, _shape_meals(picks, slots))), "recipes": [ri for ri, _ in picks]}
+
+# What a day's diet depends on; other profile fields (time windows, injuries, ...) don't invalidate it
+DAY_PROFILE_FIELDS = ("age", "sex", "height_cm", "weight_kg", "activity_level", "diet")
+DAY_GOAL_FIELDS = ("type", "deficit_kcal")
+
+def handle_week(body: Dict[str, Any]):
+    # Expect: { days: [{profile, goal}, ...] }; returns one /diet/suggest shape per day, in order
+    days = [{"profile": {k: (d.get("profile") or {}).get(k) for k in DAY_PROFILE_FIELDS},
+             "goal": {k: (d.get("goal") or {}).get(k) for k in DAY_GOAL_FIELDS}} for d in body.get("days") or []]
+    if error := _bad_diet(*(d["profile"] for d in days)):
+        return error
+    results, computed = DAY_CACHE.plan(CATALOG.version, days, _day_diet)
+    return {"plans": [r["plan"] for r in results], "computed": computed}, 200
+
+@app.post("/diet/suggest")
+def diet_suggest():
+    return respond(handle_suggest(request.get_json(force=True)))
+
+
+@app.post("/diet/batch")
+def diet_batch():
+    return respond(handle_batch(request.get_json(force=True)))
+
+
+@app.post("/diet/week")
+def diet_week():
+    return respond(handle_week(request.get_json(force=True)))
 
 # -------------------- AI DIET --------------------
-def ai_diet(user_data: dict):
+def ai_diet(user_data: dict, deadline_s: float = LLM_DEADLINE_S):
     prompt = f"""
 You are a sports nutritionist.
 
 Create a personalized daily diet plan.
 
 User:
-{user_data}
+{json.dumps({k: v for k, v in user_data.items() if k != "deadline_ms"}, sort_keys=True)}
 
 Return ONLY valid JSON in this format:
 
@@ -148,19 +345,50 @@ Return ONLY valid JSON in this format:
 }}
 """
 
-    if client is None:
-        profile = user_data.get("profile", {})
-        goal = user_data.get("goal", {})
+    profile = user_data.get("profile", {})
+    goal = user_data.get("goal", {})
+    llm = llm_client()
+    if llm is None:
         return build_rule_based_diet(profile, goal)
 
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-        response_format={"type": "json_object"},
-    )
-
-    return json.loads(resp.choices[0].message.content)
+    try:
+        content = pooled_completion(
+            LLM_POOL,
+            llm,
+            LLM_CACHE,
+            deadline_s,
+            model=LLM_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            response_format={"type": "json_object"},
+        )
+        return json.loads(content)
+    except (LLMUnavailable, ValueError, *_openai_errors()) as e:
+        return {**build_rule_based_diet(profile, goal), **_degraded(e)}
+
+
+def _deadline(body: Dict[str, Any]):
+    """(seconds to wait for the model, None), or (None, 400 response) if "deadline_ms" isn't a number.
+    The deadline is clamped to [MIN_DEADLINE_S, LLM_DEADLINE_S]."""
+    ms = body.get("deadline_ms")
+    if ms is None:
+        return LLM_DEADLINE_S, None
+    try:
+        seconds = float(ms) / 1000
+    except (TypeError, ValueError):
+        seconds = math.nan
+    if isinstance(ms, bool) or math.isnan(seconds):
+        return None, ({"error": "deadline_ms must be a number of milliseconds"}, 400)
+    return min(max(seconds, MIN_DEADLINE_S), LLM_DEADLINE_S), None
+
+
+def _degraded(e: Exception) -> Dict[str, Any]:
+    # responses built without the model say so, and why
+    if isinstance(e, LLMUnavailable):
+        reason = e.reason
+    else:
+        reason = "error" if isinstance(e, _openai_errors()) else "invalid_reply"
+    return {"degraded": True, "degraded_reason": reason}
 
 
 def _normalize_plan_shape(plan: Dict[str, Any]) -> Dict[str, Any]:
@@ -186,14 +414,11 @@ def _normalize_plan_shape(plan: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _ai_chat_update_plan(message: str, current_plan: Dict[str, Any]) -> Dict[str, Any]:
-    if client is None:
-        return {
-            "assistant_reply": "I updated nothing yet because AI is not configured. Add OPENAI_API_KEY to diet.env.",
-            "updated_plan": current_plan,
-        }
+NO_AI_REPLY = "I updated nothing yet because AI is not configured. Add OPENAI_API_KEY to diet.env."
+BUSY_REPLY = "I couldn't get to that just now, so your plan is unchanged. Please try again in a moment."
 
-    schema_hint = """
+# assistant_reply comes first so it can be streamed before the plan is complete
+CHAT_SCHEMA_HINT = """
 Return ONLY JSON:
 {
   "assistant_reply": "string",
@@ -211,9 +436,12 @@ Return ONLY JSON:
   }
 }
 """
+
+
+def _chat_request(message: str, current_plan: Dict[str, Any]) -> Dict[str, Any]:
     payload = {"message": message, "current_plan": current_plan}
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
+    return dict(
+        model=LLM_MODEL,
         temperature=0.2,
         response_format={"type": "json_object"},
         messages=[
@@ -223,35 +451,239 @@ Return ONLY JSON:
             },
             {
                 "role": "user",
-                "content": f"{schema_hint}\n\nInput JSON:\n{json.dumps(payload)}",
+                "content": f"{CHAT_SCHEMA_HINT}\n\nInput JSON:\n{json.dumps(payload, sort_keys=True)}",
             },
         ],
     )
-    data = json.loads(resp.choices[0].message.content)
+
+
+def _finish_chat(data: Dict[str, Any], current_plan: Dict[str, Any]) -> Dict[str, Any]:
     updated = data.get("updated_plan", current_plan)
     data["updated_plan"] = _normalize_plan_shape(updated)
     if "assistant_reply" not in data:
         data["assistant_reply"] = "Updated your diet plan."
     return data
 
+
+def _ai_chat_update_plan(message: str, current_plan: Dict[str, Any], deadline_s: float = LLM_DEADLINE_S) -> Dict[str, Any]:
+    llm = llm_client()
+    if llm is None:
+        return {
+            "assistant_reply": NO_AI_REPLY,
+            "updated_plan": current_plan,
+        }
+
+    try:
+        content = pooled_completion(LLM_POOL, llm, LLM_CACHE, deadline_s, **_chat_request(message, current_plan))
+        return _finish_chat(json.loads(content), current_plan)
+    except (LLMUnavailable, ValueError, *_openai_errors()) as e:
+        return {"assistant_reply": BUSY_REPLY, "updated_plan": current_plan, **_degraded(e)}
+
+
+def _ai_chat_stream(message: str, current_plan: Dict[str, Any], deadline_s: float = LLM_DEADLINE_S) -> Iterator[Dict[str, Any]]:
+    """Chat events: {"type": "token", "text"} per assistant_reply fragment, then one
+    {"type": "final", "assistant_reply", "updated_plan"}; degraded, with the plan unchanged, when
+    the model is busy, late or fails (as `_ai_chat_update_plan`)."""
+    llm = llm_client()
+    if llm is None:
+        yield {"type": "token", "text": NO_AI_REPLY}
+        yield {"type": "final", "assistant_reply": NO_AI_REPLY, "updated_plan": current_plan}
+        return
+
+    extractor = ReplyExtractor()
+    parts = []
+    try:
+        for delta in pooled_stream(LLM_POOL, llm, LLM_CACHE, deadline_s, **_chat_request(message, current_plan)):
+            parts.append(delta)
+            text = extractor.feed(delta)
+            if text:
+                yield {"type": "token", "text": text}
+        data = _finish_chat(json.loads("".join(parts)), current_plan)
+    except (LLMUnavailable, ValueError, *_openai_errors()) as e:
+        data = {"assistant_reply": BUSY_REPLY, "updated_plan": current_plan, **_degraded(e)}
+    except Exception as e:  # the HTTP status is already sent; report in-band
+        yield {"type": "error", "error": f"{type(e).__name__}: {e}"}
+        return
+    if not extractor.started:
+        yield {"type": "token", "text": data["assistant_reply"]}
+    yield {"type": "final", **data}
+
 # -------------------- AI API ROUTE --------------------
 @app.post("/ai_diet")
 def ai_diet_route():
     body = request.get_json(force=True)
-    result = ai_diet(body)
+    deadline_s, error = _deadline(body)
+    if error or (error := _bad_diet(body.get("profile", {}))):
+        return respond(error)
+    result = ai_diet(body, deadline_s)
     return jsonify(result)
 
 
-@app.post("/diet/chat")
-def diet_chat():
-    body = request.get_json(force=True)
+# -------------------- STORED PLANS --------------------
+# /diet/chat against a stored plan: the client sends {plan_id, base_version, message}, the model only
+# sees the meals the message is about, and the reply carries a JSON Patch from base_version to version.
+SLOT_WORDS = {"breakfast": ("breakfast", "morning"), "lunch": ("lunch", "midday", "noon"),
+              "dinner": ("dinner", "supper", "evening"), "snack": ("snack", "snacks")}
+SLOT_PATTERNS = {slot: re.compile(r"\b(?:%s)\b" % "|".join(keys)) for slot, keys in SLOT_WORDS.items()}
+
+
+def _meal_slot(meal: Dict[str, Any]) -> Optional[str]:
+    # a meal named as a snack is one; otherwise by time: between the main meals or late at night
+    if re.search(r"\bsnack", (meal.get("name") or "").lower()):
+        return "snack"
+    when = meal.get("when") or ""
+    if len(when) < 2 or not when[:2].isdigit():
+        return None
+    hour = int(when[:2])
+    if hour < 5 or hour >= 22 or 15 <= hour < 17:
+        return "snack"
+    return "breakfast" if hour < 11 else "lunch" if hour < 15 else "dinner"
+
+
+def relevant_meals(message: str, meals: List[Dict[str, Any]]) -> List[int]:
+    """Indexes of the meals a chat message is about: meals it names (any word of 4+ letters) or
+    whose time falls in a slot it mentions; all meals if it points at none."""
+    text = message.lower()
+    words = set(text.replace(",", " ").replace(".", " ").split())
+    slots = {slot for slot, pattern in SLOT_PATTERNS.items() if pattern.search(text)}
+    idx = [i for i, m in enumerate(meals)
+           if _meal_slot(m) in slots or any(len(w) > 3 and w in words for w in (m.get("name") or "").lower().split())]
+    return idx or list(range(len(meals)))
+
+
+def _merge_meals(meals: List[Dict[str, Any]], idx: List[int], updated: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # the model returned its version of meals[idx]; same count: in place, otherwise at the first one's position
+    if len(updated) == len(idx):
+        out = list(meals)
+        for i, m in zip(idx, updated):
+            out[i] = m
+        return out
+    rest = [m for i, m in enumerate(meals) if i not in set(idx)]
+    return rest[:idx[0]] + updated + rest[idx[0]:] if idx else rest + updated
+
+
+def _stored_plan(body: Dict[str, Any]):
+    """(stored plan, None) if body's plan_id exists at base_version, else (None, error response)."""
+    stored = plan_store.get(str(body["plan_id"]))
+    if stored is None:
+        return None, ({"error": "unknown plan_id"}, 404)
+    if str(body.get("base_version")) != str(stored["version"]):
+        return None, ({"error": "base_version is not the current version", **stored}, 409)
+    return stored, None
+
+
+def _commit_chat(stored: Dict[str, Any], idx: List[int], data: Dict[str, Any]):
+    plan = stored["plan"]
+    new = {**plan, "meals": _merge_meals(plan["meals"], idx, data["updated_plan"]["meals"])}
+    patch = jsonpatch.diff(plan, new)
+    version = stored["version"]
+    if patch:
+        try:
+            version = plan_store.update(stored["plan_id"], version, new)
+        except plan_store.StaleVersion as e:  # another edit landed while the model was thinking
+            return {"error": "plan changed during the chat", **e.current}, 409
+    out = {"assistant_reply": data["assistant_reply"], "plan_id": stored["plan_id"],
+           "base_version": stored["version"], "version": version, "patch": patch}
+    if data.get("degraded"):
+        out.update(degraded=True, degraded_reason=data.get("degraded_reason"))
+    return out, 200
+
+
+def _stored_chat_events(stored: Dict[str, Any], idx: List[int], events: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for e in events:
+        if e["type"] == "final":
+            payload, status = _commit_chat(stored, idx, e)
+            e = {"type": "final", **payload} if status == 200 else {"type": "error", "status": status, **payload}
+        yield e
+
+
+def handle_create_plan(body: Dict[str, Any]):
+    # Expect: { user_id, plan: {meals, workouts} }; returns { plan_id, version: 1, plan }
+    plan = _normalize_plan_shape({**(body.get("plan") or {}), "user_id": body.get("user_id", "anon")})
+    return plan_store.create(plan["user_id"], plan), 201
+
+
+def handle_chat(body: Dict[str, Any]):
     message = (body.get("message") or "").strip()
     if not message:
-        return jsonify({"error": "message is required"}), 400
+        return {"error": "message is required"}, 400
+    deadline_s, error = _deadline(body)
+    if error:
+        return error
+
+    if body.get("plan_id"):
+        stored, error = _stored_plan(body)
+        if error:
+            return error
+        idx = relevant_meals(message, stored["plan"]["meals"])
+        data = _ai_chat_update_plan(message, {"meals": [stored["plan"]["meals"][i] for i in idx]}, deadline_s)
+        return _commit_chat(stored, idx, data)
 
     current_plan = _normalize_plan_shape(body.get("current_plan", {}))
-    data = _ai_chat_update_plan(message=message, current_plan=current_plan)
-    return jsonify(data)
+    return _ai_chat_update_plan(message=message, current_plan=current_plan, deadline_s=deadline_s), 200
+
+def handle_chat_stream(body: Dict[str, Any]):
+    message = (body.get("message") or "").strip()
+    if not message:
+        return {"error": "message is required"}, 400
+    deadline_s, error = _deadline(body)
+    if error:
+        return error
+
+    if body.get("plan_id"):
+        stored, error = _stored_plan(body)
+        if error:
+            return error
+        idx = relevant_meals(message, stored["plan"]["meals"])
+        events = _ai_chat_stream(message, {"meals": [stored["plan"]["meals"][i] for i in idx]}, deadline_s)
+        return (json.dumps(e) + "\n" for e in _stored_chat_events(stored, idx, events)), 200
+
+    current_plan = _normalize_plan_shape(body.get("current_plan", {}))
+    return (json.dumps(e) + "\n" for e in _ai_chat_stream(message, current_plan, deadline_s)), 200
+
+def handle_catalog(body: Dict[str, Any]):
+    # the gateway keys its plan cache on this version
+    return {"version": CATALOG.version, "recipes": len(CATALOG)}, 200
+
+HANDLERS = {
+    "/diet/catalog": handle_catalog,
+    "/diet/suggest": handle_suggest,
+    "/diet/batch": handle_batch,
+    "/diet/week": handle_week,
+    "/diet/plans": handle_create_plan,
+    "/diet/chat": handle_chat,
+    "/diet/chat/stream": handle_chat_stream,
+}
+
+@app.get("/diet/catalog")
+def diet_catalog():
+    return respond(handle_catalog({}))
+
+@app.post("/diet/plans")
+def diet_create_plan():
+    return respond(handle_create_plan(request.get_json(force=True)))
+
+@app.post("/diet/chat")
+def diet_chat():
+    return respond(handle_chat(request.get_json(force=True)))
+
+@app.post("/diet/chat/stream")
+def diet_chat_stream():
+    return respond(handle_chat_stream(request.get_json(force=True)))
+
+@app.get("/diet/llm-cache/stats")
+def llm_cache_stats():
+    if LLM_CACHE is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **LLM_CACHE.stats()})
+
+@app.get("/diet/llm-pool/stats")
+def llm_pool_stats():
+    return jsonify(LLM_POOL.stats())
+
+@app.get("/health")
+def health():
+    return jsonify({"ok": True, "service": "diet_agent"})
 
 # -------------------- RUN --------------------
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+"""Recipe catalog with precomputed indexes and a vectorized macro-fitting meal selector.
+
+Recipes are stored column-wise (NumPy arrays) so candidate filtering is a couple of
+index lookups plus one bitmask test, and meal selection scores whole candidate sets at once.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DIET_TYPES = ["balanced", "high_protein", "vegetarian", "vegan", "pescatarian", "keto"]
+ALLERGENS = ["dairy", "gluten", "nuts", "peanuts", "fish", "shellfish", "egg", "soy"]
+SLOTS = ["breakfast", "lunch", "dinner", "snack"]
+
+# Share of the day's calories per slot when planning three meals
+SLOT_SHARE = {"breakfast": 0.3, "lunch": 0.35, "dinner": 0.35, "snack": 0.1}
+
+DIET_BIT = {d: 1 << i for i, d in enumerate(DIET_TYPES)}
+ALLERGEN_BIT = {a: 1 << i for i, a in enumerate(ALLERGENS)}
+SLOT_ID = {s: i for i, s in enumerate(SLOTS)}
+
+
+class UnknownDietType(ValueError):
+    pass
+
+
+def check_diet(diet: str) -> str:
+    if diet not in DIET_BIT:
+        raise UnknownDietType(f"unknown diet type {diet!r}; expected one of {', '.join(DIET_TYPES)}")
+    return diet
+
+
+def allergen_mask(allergens: Optional[Iterable[str]]) -> int:
+    m = 0
+    for a in allergens or []:
+        m |= ALLERGEN_BIT.get(str(a).lower(), 0)
+    return m
+
+
+class RecipeCatalog:
+    def __init__(self, records: Sequence[Dict[str, Any]]):
+        n = len(records)
+        self.records = list(records)
+        self.names = [r["name"] for r in records]
+        m = np.array([[r["macros"]["protein"], r["macros"]["carbs"], r["macros"]["fat"]] for r in records], dtype=np.float64).reshape(n, 3)
+        kcal = np.array([r.get("calories") or 0 for r in records], dtype=np.float64)
+        kcal = np.where(kcal > 0, kcal, m @ np.array([4.0, 4.0, 9.0]))
+        # columns: kcal, protein, carbs, fat (per serving)
+        self.nutrients = np.column_stack([kcal, m])
+        self.diet_mask = np.array([sum(DIET_BIT.get(d, 0) for d in r.get("diets", ["balanced"])) for r in records], dtype=np.int64)
+        self.allergen_mask = np.array([allergen_mask(r.get("allergens")) for r in records], dtype=np.int64)
+        self.slot_mask = np.array([sum(1 << SLOT_ID[s] for s in r.get("slots", ["lunch", "dinner"]) if s in SLOT_ID) for r in records], dtype=np.int64)
+
+        # (slot, diet) -> recipe indexes; allergens are filtered on top of these with one AND
+        self.index: Dict[Tuple[str, str], np.ndarray] = {}
+        for slot in SLOTS:
+            in_slot = (self.slot_mask & (1 << SLOT_ID[slot])) != 0
+            for diet in DIET_TYPES:
+                self.index[(slot, diet)] = np.flatnonzero(in_slot & ((self.diet_mask & DIET_BIT[diet]) != 0))
+
+        digest = hashlib.sha1(json.dumps([self.names, self.nutrients.round(2).tolist()]).encode()).hexdigest()
+        self.version = f"{n}-{digest[:12]}"
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls, path: str) -> "RecipeCatalog":
+        """Load a JSON list or JSON-lines file of recipe records."""
+        with open(path, encoding="utf-8") as f:
+            if path.endswith((".jsonl", ".ndjson")):
+                return cls([json.loads(line) for line in f if line.strip()])
+            return cls(json.load(f))
+
+    def candidates(self, slot: str, diet: str = "balanced", exclude_allergens: int = 0) -> np.ndarray:
+        """Recipes for `slot` that are tagged `diet` and contain none of `exclude_allergens`;
+        the diet is never relaxed, so this may be empty."""
+        idx = self.index.get((slot, check_diet(diet)))
+        if idx is None or not len(idx):
+            return np.empty(0, dtype=np.int64)
+        if exclude_allergens:
+            idx = idx[(self.allergen_mask[idx] & exclude_allergens) == 0]
+        return idx
+
+
+def macro_targets(profile: Dict[str, Any], goal: Dict[str, Any], kcal: float) -> np.ndarray:
+    """Daily [kcal, protein g, carbs g, fat g] targets for a calorie budget."""
+    diet = profile.get("diet") or {}
+    if isinstance(diet.get("macros"), dict):
+        m = diet["macros"]
+        return np.array([kcal, m.get("protein", 0), m.get("carbs", 0), m.get("fat", 0)], dtype=np.float64)
+    weight = profile.get("weight_kg") or 70
+    g_per_kg = {"fat_loss": 2.0, "muscle_gain": 1.8, "endurance": 1.4}.get((goal or {}).get("type"), 1.2)
+    protein = round(weight * g_per_kg / 5) * 5
+    fat_share = 0.7 if diet.get("type") == "keto" else 0.28
+    fat = round(kcal * fat_share / 9)
+    carbs = max(0, round((kcal - protein * 4 - fat * 9) / 4))
+    return np.array([kcal, protein, carbs, fat], dtype=np.float64)
+
+
+# portions are scaled to a slot's calorie share, within these bounds
+MIN_PORTION, MAX_PORTION = 0.5, 2.0
+TOP_K = 24
+BEAM = 512
+
+
+def _error(totals: np.ndarray, target: np.ndarray) -> np.ndarray:
+    # relative error per nutrient; calories weighted double
+    rel = np.abs(totals - target) / np.maximum(target, 1.0)
+    return rel @ np.array([2.0, 1.0, 1.0, 1.0])
+
+
+def select_meals(catalog: RecipeCatalog, target: np.ndarray, slots: Sequence[str] = ("breakfast", "lunch", "dinner"),
+                 diet: str = "balanced", exclude_allergens: int = 0, avoid: Iterable[int] = ()) -> List[Tuple[int, float]]:
+    """Pick one recipe (and portion) per slot so the day's totals fit `target`.
+
+    Each slot keeps its TOP_K best candidates for its calorie share, then slots are combined
+    with a beam search over the vectorized totals (exhaustive for <= 3 slots at the defaults).
+    `avoid` holds recipe indexes to skip. Returns [(recipe index, portion)] in slot order, or []
+    if some slot has no compliant recipe (see `servable_slots`).
+    """
+    shares = np.array([SLOT_SHARE.get(s, 1.0 / len(slots)) for s in slots])
+    shares = shares / shares.sum()
+    avoid = np.fromiter(avoid, dtype=np.int64)
+    per_slot = []
+    for slot, share in zip(slots, shares):
+        idx = catalog.candidates(slot, diet, exclude_allergens)
+        if len(avoid) and len(idx) > 1:
+            keep = idx[~np.isin(idx, avoid)]
+            idx = keep if len(keep) else idx
+        if not len(idx):
+            return []
+        slot_target = target * share
+        nut = catalog.nutrients[idx]
+        portion = np.clip(slot_target[0] / np.maximum(nut[:, 0], 1.0), MIN_PORTION, MAX_PORTION)
+        scaled = nut * portion[:, None]
+        err = _error(scaled, slot_target)
+        if len(idx) > TOP_K:
+            top = np.argpartition(err, TOP_K)[:TOP_K]
+            idx, portion, scaled = idx[top], portion[top], scaled[top]
+        per_slot.append((idx, portion, scaled))
+
+    # beam over slots: rows are partial combinations
+    choice = np.zeros((1, 0), dtype=np.int64)
+    totals = np.zeros((1, 4))
+    done = 0.0
+    for s, (idx, _, scaled) in enumerate(per_slot):
+        done += shares[s]
+        k = len(idx)
+        totals = (totals[:, None, :] + scaled[None, :, :]).reshape(-1, 4)
+        choice = np.concatenate([np.repeat(choice, k, axis=0), np.tile(np.arange(k), len(choice))[:, None]], axis=1)
+        if s:
+            # distinct recipes within a day
+            last = per_slot[s][0][choice[:, s]]
+            ok = np.ones(len(choice), dtype=bool)
+            for j in range(s):
+                ok &= per_slot[j][0][choice[:, j]] != last
+            if ok.any():
+                totals, choice = totals[ok], choice[ok]
+        if s < len(per_slot) - 1 and len(choice) > BEAM:
+            keep = np.argpartition(_error(totals, target * done), BEAM)[:BEAM]
+            totals, choice = totals[keep], choice[keep]
+    best = int(np.argmin(_error(totals, target)))
+    # final uniform rescale so the day lands on the calorie target
+    fix = float(np.clip(target[0] / max(totals[best, 0], 1.0), MIN_PORTION, MAX_PORTION))
+    return [(int(per_slot[s][0][c]), float(per_slot[s][1][c]) * fix) for s, c in enumerate(choice[best])]
+
+
+def servable_slots(catalog: RecipeCatalog, slots: Sequence[str], diet: str = "balanced",
+                   exclude_allergens: int = 0) -> List[str]:
+    """The slots that have at least one recipe compliant with the diet and allergen filters."""
+    return [s for s in slots if len(catalog.candidates(s, diet, exclude_allergens))]
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> RecipeCatalog:
+    """Random but plausible recipes, for benchmarks and tests."""
+    rng = np.random.default_rng(seed)
+    protein = rng.uniform(5, 60, n)
+    carbs = rng.uniform(5, 90, n)
+    fat = rng.uniform(2, 35, n)
+    diet_bits = rng.integers(1, 1 << len(DIET_TYPES), n) | DIET_BIT["balanced"]
+    allergen_bits = rng.integers(0, 1 << len(ALLERGENS), n) & rng.integers(0, 1 << len(ALLERGENS), n)
+    slot_bits = rng.integers(1, 1 << 3, n)
+    records = []
+    for i in range(n):
+        records.append({
+            "name": f"Recipe {i}",
+            "macros": {"protein": round(float(protein[i]), 1), "carbs": round(float(carbs[i]), 1), "fat": round(float(fat[i]), 1)},
+            "diets": [d for d, b in DIET_BIT.items() if diet_bits[i] & b],
+            "allergens": [a for a, b in ALLERGEN_BIT.items() if allergen_bits[i] & b],
+            "slots": [s for s in SLOTS[:3] if slot_bits[i] & (1 << SLOT_ID[s])],
+        })
+    return RecipeCatalog(records)
+
+
+def load_default(builtin: Sequence[Dict[str, Any]]) -> RecipeCatalog:
+    path = os.environ.get("RECIPE_CATALOG_PATH")
+    return RecipeCatalog.load(path) if path else RecipeCatalog(builtin)
@@ -0,0 +1,42 @@
+"""Server-side diet plans with a version per plan.
+
+Clients chat against a stored plan by id and the version they last saw; a change is saved only
+if that version is still current (UPDATE ... WHERE version = base), so concurrent edits from two
+tabs or devices can't silently overwrite each other.
+"""
+import json, uuid
+from sqlalchemy import text
+from services.common import storage
+
+
+class StaleVersion(Exception):
+    def __init__(self, current:dict):
+        super().__init__(f"plan {current['plan_id']} is at version {current['version']}")
+        self.current = current
+
+
+def create(user_id:str, plan:dict) -> dict:
+    pid = str(uuid.uuid4())
+    with storage.begin() as conn:
+        conn.execute(text("INSERT INTO diet_plan(id, user_id, version, plan) VALUES (:id, :u, 1, :p)"),
+                     {"id": pid, "u": user_id, "p": json.dumps(plan)})
+    return {"plan_id": pid, "version": 1, "plan": plan}
+
+
+def get(plan_id:str) -> dict|None:
+    with storage.connect() as conn:
+        row = conn.execute(text("SELECT version, plan FROM diet_plan WHERE id=:id"), {"id": plan_id}).first()
+    return None if row is None else {"plan_id": plan_id, "version": row.version, "plan": json.loads(row.plan)}
+
+
+def update(plan_id:str, base_version:int, plan:dict) -> int:
+    """Save `plan` as version base_version + 1; raises StaleVersion if base_version is not current."""
+    with storage.begin() as conn:
+        n = conn.execute(text("""UPDATE diet_plan SET plan=:p, version=version + 1, updated_at=CURRENT_TIMESTAMP
+                                 WHERE id=:id AND version=:v"""), {"p": json.dumps(plan), "id": plan_id, "v": base_version}).rowcount
+    if not n:
+        current = get(plan_id)
+        if current is None:
+            raise KeyError(plan_id)
+        raise StaleVersion(current)
+    return base_version + 1
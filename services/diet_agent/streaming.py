@@ -0,0 +1,62 @@
+"""Incremental extraction of a JSON string field from a streamed model response."""
+import re
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ReplyExtractor:
+    """Feed raw JSON text chunks; get back newly decoded characters of `field`'s string value.
+
+    Works on partial input: escapes split across chunks are held back until complete.
+    """
+
+    def __init__(self, field: str = "assistant_reply"):
+        self._start = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buf = ""
+        self._pos = 0
+        self.started = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        self._buf += chunk
+        if not self.started:
+            m = self._start.search(self._buf)
+            if m is None:
+                return ""
+            self.started, self._pos = True, m.end()
+        out = []
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc == "u":
+                if i + 6 > len(buf):
+                    break
+                code = int(buf[i + 2:i + 6], 16)
+                # surrogate pair: wait for the low half
+                if 0xD800 <= code < 0xDC00:
+                    if i + 12 > len(buf):
+                        break
+                    low = int(buf[i + 8:i + 12], 16)
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+                out.append(chr(code))
+                i += 6
+                continue
+            out.append(_ESCAPES.get(esc, esc))
+            i += 2
+        self._pos = i
+        return "".join(out)
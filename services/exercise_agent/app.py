@@ -1,32 +1,142 @@
+import os
 from flask import Flask, request, jsonify
+from services.common.horizon import DayCache
+from services.common.inproc import respond
+from services.common.telemetry import instrument
+from services.exercise_agent.catalog import UnknownName, load_default, suggest_for, user_query
 
 app = Flask(__name__)
+instrument(app, "exercise_agent")
 
-WORKOUTS = {
-    "fat_loss": [
-        {"name":"Full-Body Circuit (No Machines)", "duration_min":30, "intensity":"high", "when":"18:00"},
-        {"name":"Incline Walk + Core", "duration_min":25, "intensity":"medium", "when":"07:00"}
-    ],
-    "muscle_gain": [
-        {"name":"Upper Push (DB/Bench)", "duration_min":45, "intensity":"medium", "when":"18:00"},
-        {"name":"Lower Body (DB/Bodyweight)", "duration_min":40, "intensity":"medium", "when":"08:00"}
-    ],
-    "endurance": [
-        {"name":"Tempo Run", "duration_min":35, "intensity":"medium", "when":"18:30"},
-        {"name":"Zone 2 Ride", "duration_min":50, "intensity":"low", "when":"07:30"}
-    ],
-    "general_health": [
-        {"name":"Brisk Walk + Mobility", "duration_min":30, "intensity":"low", "when":"19:00"}
-    ]
-}
+# -------------------- WORKOUT CATALOG --------------------
+# Built-in catalog; set WORKOUT_CATALOG_PATH to a JSON/JSONL file to load a larger one.
+# equipment: all required; contraindications: injuries that rule the workout out; priority: higher first
+WORKOUTS = [
+    {"name": "Full-Body Circuit (No Machines)", "duration_min": 30, "intensity": "high", "goals": ["fat_loss"],
+     "equipment": [], "contraindications": ["knee", "ankle"], "muscles": ["legs", "chest", "core", "cardio"], "priority": 1.0},
+    {"name": "Incline Walk + Core", "duration_min": 25, "intensity": "medium", "goals": ["fat_loss", "general_health"],
+     "equipment": ["treadmill"], "contraindications": [], "muscles": ["glutes", "core"], "priority": 0.9},
+    {"name": "Kettlebell Swings + Carries", "duration_min": 25, "intensity": "high", "goals": ["fat_loss", "muscle_gain"],
+     "equipment": ["kettlebell"], "contraindications": ["lower_back", "shoulder"], "muscles": ["glutes", "back", "core"], "priority": 0.8},
+    {"name": "Rower Intervals", "duration_min": 20, "intensity": "high", "goals": ["fat_loss", "endurance"],
+     "equipment": ["rower"], "contraindications": ["lower_back"], "muscles": ["back", "legs", "cardio"], "priority": 0.75},
+    {"name": "Jump Rope Finisher", "duration_min": 15, "intensity": "high", "goals": ["fat_loss"],
+     "equipment": ["jump_rope"], "contraindications": ["knee", "ankle"], "muscles": ["cardio"], "priority": 0.6},
+    {"name": "Low-Impact Cardio Circuit", "duration_min": 30, "intensity": "medium", "goals": ["fat_loss", "general_health"],
+     "equipment": [], "contraindications": [], "muscles": ["cardio", "core"], "priority": 0.5},
+    {"name": "Brisk Walk Intervals", "duration_min": 40, "intensity": "low", "goals": ["fat_loss", "general_health", "endurance"],
+     "equipment": [], "contraindications": [], "muscles": ["legs", "cardio"], "priority": 0.4},
+    {"name": "Upper Push (DB/Bench)", "duration_min": 45, "intensity": "medium", "goals": ["muscle_gain"],
+     "equipment": ["dumbbells", "bench"], "contraindications": ["shoulder", "elbow"], "muscles": ["chest", "shoulders", "arms"], "priority": 1.0},
+    {"name": "Lower Body (DB/Bodyweight)", "duration_min": 40, "intensity": "medium", "goals": ["muscle_gain"],
+     "equipment": ["dumbbells"], "contraindications": ["knee"], "muscles": ["legs", "glutes"], "priority": 0.95},
+    {"name": "Barbell Squat + Deadlift", "duration_min": 60, "intensity": "high", "goals": ["muscle_gain"],
+     "equipment": ["barbell"], "contraindications": ["knee", "lower_back"], "muscles": ["legs", "glutes", "back"], "priority": 0.9},
+    {"name": "Pull-Up + Row Session", "duration_min": 40, "intensity": "medium", "goals": ["muscle_gain"],
+     "equipment": ["pullup_bar", "dumbbells"], "contraindications": ["shoulder", "elbow"], "muscles": ["back", "arms"], "priority": 0.85},
+    {"name": "Machine Full Body", "duration_min": 50, "intensity": "medium", "goals": ["muscle_gain", "general_health"],
+     "equipment": ["machines"], "contraindications": [], "muscles": ["legs", "chest", "back"], "priority": 0.7},
+    {"name": "Band Upper Body", "duration_min": 30, "intensity": "low", "goals": ["muscle_gain", "general_health"],
+     "equipment": ["bands"], "contraindications": [], "muscles": ["shoulders", "back", "arms"], "priority": 0.6},
+    {"name": "Push-Up + Plank Ladder", "duration_min": 25, "intensity": "medium", "goals": ["muscle_gain", "fat_loss"],
+     "equipment": [], "contraindications": ["wrist", "shoulder"], "muscles": ["chest", "arms", "core"], "priority": 0.55},
+    {"name": "Bodyweight Legs + Glutes", "duration_min": 30, "intensity": "medium", "goals": ["muscle_gain"],
+     "equipment": [], "contraindications": ["knee"], "muscles": ["legs", "glutes"], "priority": 0.5},
+    {"name": "Glute Bridge + Core Circuit", "duration_min": 25, "intensity": "low", "goals": ["muscle_gain", "general_health"],
+     "equipment": [], "contraindications": [], "muscles": ["glutes", "core"], "priority": 0.4},
+    {"name": "Tempo Run", "duration_min": 35, "intensity": "medium", "goals": ["endurance"],
+     "equipment": [], "contraindications": ["knee", "ankle", "hip"], "muscles": ["legs", "cardio"], "priority": 1.0},
+    {"name": "Zone 2 Ride", "duration_min": 50, "intensity": "low", "goals": ["endurance", "general_health"],
+     "equipment": ["bike"], "contraindications": [], "muscles": ["legs", "cardio"], "priority": 0.95},
+    {"name": "Treadmill Intervals", "duration_min": 30, "intensity": "high", "goals": ["endurance", "fat_loss"],
+     "equipment": ["treadmill"], "contraindications": ["knee", "ankle"], "muscles": ["legs", "cardio"], "priority": 0.8},
+    {"name": "Steady Swim", "duration_min": 45, "intensity": "medium", "goals": ["endurance", "general_health"],
+     "equipment": ["pool"], "contraindications": ["shoulder"], "muscles": ["back", "shoulders", "cardio"], "priority": 0.75},
+    {"name": "Core + Hip Stability", "duration_min": 20, "intensity": "low", "goals": ["endurance", "general_health"],
+     "equipment": [], "contraindications": [], "muscles": ["core", "glutes"], "priority": 0.6},
+    {"name": "Easy Long Walk", "duration_min": 60, "intensity": "low", "goals": ["endurance", "general_health"],
+     "equipment": [], "contraindications": [], "muscles": ["legs", "cardio"], "priority": 0.5},
+    {"name": "Brisk Walk + Mobility", "duration_min": 30, "intensity": "low", "goals": ["general_health"],
+     "equipment": [], "contraindications": [], "muscles": ["legs", "cardio"], "priority": 1.0},
+    {"name": "Gentle Yoga Flow", "duration_min": 30, "intensity": "low", "goals": ["general_health"],
+     "equipment": [], "contraindications": ["wrist"], "muscles": ["core", "back"], "priority": 0.8},
+    {"name": "Chair Mobility + Stretch", "duration_min": 15, "intensity": "low", "goals": ["general_health"],
+     "equipment": [], "contraindications": [], "muscles": ["back", "shoulders"], "priority": 0.3},
+]
+
+CATALOG = load_default(WORKOUTS)
+# /exercise/week: per-day results keyed on the day's inputs + the previous day's picks (see horizon.py)
+DAY_CACHE = DayCache(int(os.getenv("DAY_CACHE_MAX", "10000")))
+
+def _unknown_names(e: UnknownName):
+    # no plan rather than one that ignores an injury or equipment; the client can show which names to fix
+    return {"error": str(e), e.field: e.names}, 400
+
+# Handlers return (payload, status); HTTP routes and in-process callers (EXERCISE_MODE=inproc) share them
+def handle_suggest(body):
+    # equipment: request list plus profile.equipment (none = bodyweight only); injuries and
+    # time_windows come from the profile
+    try:
+        return {"workouts": suggest_for(CATALOG, body.get("profile"), body.get("goal"), body.get("equipment"))}, 200
+    except UnknownName as e:
+        return _unknown_names(e)
+
+def handle_batch(body):
+    # Expect: { goals: [...], profiles?: [...], equipment?: [[...], ...] }; one workout list per goal, in order
+    goals = body.get("goals") or []
+    profiles = body.get("profiles") or [None] * len(goals)
+    equipment = body.get("equipment") or [None] * len(goals)
+    try:
+        return {"workouts": [suggest_for(CATALOG, p, g, e) for g, p, e in zip(goals, profiles, equipment)]}, 200
+    except UnknownName as e:
+        return _unknown_names(e)
+
+def _day_workouts(day, prev):
+    # variety: yesterday's workouts only if nothing else fits
+    picks = CATALOG.pick(*user_query(day.get("profile"), day.get("goal"), day.get("equipment")),
+                         avoid=(prev or {}).get("ids", ()))
+    return {"workouts": CATALOG.shape(picks), "ids": [i for i, _ in picks]}
+
+# What a day's workouts depend on; other profile fields (weight, diet, ...) don't invalidate it
+DAY_PROFILE_FIELDS = ("activity_level", "injuries", "equipment", "time_windows")
+
+def handle_week(body):
+    # Expect: { days: [{profile, goal, equipment?}, ...] }; one workout list per day, in order
+    days = [{"profile": {k: (d.get("profile") or {}).get(k) for k in DAY_PROFILE_FIELDS},
+             "goal": {"type": (d.get("goal") or {}).get("type")}, "equipment": d.get("equipment")}
+            for d in body.get("days") or []]
+    try:
+        results, computed = DAY_CACHE.plan(CATALOG.version, days, _day_workouts)
+    except UnknownName as e:
+        return _unknown_names(e)
+    return {"workouts": [r["workouts"] for r in results], "computed": computed}, 200
+
+def handle_catalog(body):
+    # the gateway keys its plan cache on this version
+    return {"version": CATALOG.version, "workouts": len(CATALOG)}, 200
+
+HANDLERS = {"/exercise/suggest": handle_suggest, "/exercise/batch": handle_batch, "/exercise/week": handle_week,
+            "/exercise/catalog": handle_catalog}
 
 @app.post("/exercise/suggest")
 def suggest():
-    body = request.get_json(force=True)
-    goal = (body.get("goal") or {}).get("type","general_health")
-    workouts = WORKOUTS.get(goal, WORKOUTS["general_health"])
-    # Filter by equipment (MVP: just pass-through)
-    return jsonify({"workouts": workouts})
+    return respond(handle_suggest(request.get_json(force=True)))
+
+@app.post("/exercise/batch")
+def batch():
+    return respond(handle_batch(request.get_json(force=True)))
+
+@app.post("/exercise/week")
+def week():
+    return respond(handle_week(request.get_json(force=True)))
+
+@app.get("/exercise/catalog")
+def catalog():
+    return respond(handle_catalog({}))
+
+@app.get("/health")
+def health():
+    return jsonify({"ok": True, "service": "exercise_agent"})
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8102, debug=True)
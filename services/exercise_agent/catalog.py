@@ -0,0 +1,296 @@
+"""Workout catalog with bitmask filters and a priority-ordered goal index.
+
+Each workout's hard constraints are packed into one int64 `need` word: required equipment,
+contraindicated injuries and its intensity bit. A user's query packs what rules a workout out
+(equipment they lack, their injuries, intensities they should not do) into one `forbid` word, so
+"is this workout allowed" is `need & forbid == 0` over a compact array. Workouts are pre-sorted by
+priority per goal (and per goal x intensity); a suggestion scans that order in small chunks and
+stops as soon as the day's sessions are filled, so query cost does not grow with catalog size.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+GOALS = ["fat_loss", "muscle_gain", "endurance", "general_health"]
+INTENSITIES = ["low", "medium", "high"]
+EQUIPMENT = ["dumbbells", "barbell", "bench", "pullup_bar", "kettlebell", "bands", "bike", "treadmill",
+             "rower", "pool", "machines", "jump_rope"]
+INJURIES = ["knee", "lower_back", "shoulder", "wrist", "ankle", "hip", "neck", "elbow"]
+MUSCLES = ["legs", "glutes", "chest", "back", "shoulders", "arms", "core", "cardio"]
+
+EQUIPMENT_BIT = {e: 1 << i for i, e in enumerate(EQUIPMENT)}
+INJURY_BIT = {j: 1 << i for i, j in enumerate(INJURIES)}
+MUSCLE_BIT = {m: 1 << i for i, m in enumerate(MUSCLES)}
+GOAL_BIT = {g: 1 << i for i, g in enumerate(GOALS)}
+INTENSITY_ID = {s: i for i, s in enumerate(INTENSITIES)}
+
+# `need` word layout: [equipment | injuries | intensity]
+INJURY_SHIFT = len(EQUIPMENT)
+INTENSITY_SHIFT = INJURY_SHIFT + len(INJURIES)
+ALL_EQUIPMENT = (1 << len(EQUIPMENT)) - 1
+ALL_INTENSITIES = (1 << len(INTENSITIES)) - 1
+
+# Other names users send for an injury (after lower-casing and joining words with "_"; plurals are handled)
+INJURY_ALIASES = {"back": "lower_back", "low_back": "lower_back", "lumbar": "lower_back", "knee_pain": "knee",
+                  "back_pain": "lower_back", "lower_back_pain": "lower_back"}
+# Equipment names users send that mean "everything in a gym", or nothing at all
+GYM = {"gym", "full_gym", "all"}
+NO_EQUIPMENT = {"none", "bodyweight", "no_equipment"}
+# Other names users send for equipment (normalised like injuries; singular and plural both match)
+EQUIPMENT_ALIASES = {"pull_up_bar": "pullup_bar", "chin_up_bar": "pullup_bar", "resistance_band": "bands",
+                     "bicycle": "bike", "stationary_bike": "bike", "exercise_bike": "bike", "rowing_machine": "rower",
+                     "skipping_rope": "jump_rope", "jumprope": "jump_rope"}
+# Highest intensity by activity level; unknown levels allow everything
+MAX_INTENSITY = {"sedentary": "medium", "light": "medium"}
+SESSIONS = {"fat_loss": 2, "muscle_gain": 2, "endurance": 2, "general_health": 1}
+DEFAULT_WINDOWS = ["07:00-08:00", "18:00-19:30"]
+SCAN_CHUNK = 256
+
+
+def _bits(names: Optional[Iterable[str]], table: Dict[str, int]) -> int:
+    m = 0
+    for n in names or []:
+        m |= table.get(str(n).lower(), 0)
+    return m
+
+def _key(name: str) -> str:
+    return re.sub(r"[\s\-]+", "_", str(name).strip().lower())
+
+class UnknownName(ValueError):
+    """Names outside the catalog's vocabulary; `field` is where the API reports them."""
+    kind, field, vocabulary = "names", "unknown_names", ()
+
+    def __init__(self, names: List[str]):
+        super().__init__(f"unknown {self.kind}: {', '.join(names)}; expected one of {', '.join(self.vocabulary)}")
+        self.names = names
+
+class UnknownInjury(UnknownName):
+    """Injury names the catalog cannot map; planning around them fails closed."""
+    kind, field, vocabulary = "injuries", "unknown_injuries", INJURIES
+
+class UnknownEquipment(UnknownName):
+    """Equipment names the catalog cannot map; rejected rather than planned as if absent."""
+    kind, field, vocabulary = "equipment", "unknown_equipment", [*EQUIPMENT, *sorted(GYM | NO_EQUIPMENT)]
+
+
+def normalize_equipment(name: str) -> Optional[str]:
+    """"Dumbbell", "Pull-up bar", "kettlebells" -> the EQUIPMENT name, "gym"/"none" as given, or None."""
+    key = _key(name)
+    for k in (key, key[:-1] if key.endswith("s") else key + "s"):
+        k = EQUIPMENT_ALIASES.get(k, k)
+        if k in EQUIPMENT_BIT or k in GYM or k in NO_EQUIPMENT:
+            return k
+    return None
+
+def equipment_mask(equipment: Optional[Iterable[str]]) -> int:
+    """Bits for `equipment` (everything for a gym name); raises UnknownEquipment for names it can't map."""
+    if isinstance(equipment, str):
+        equipment = [equipment]
+    m, unknown = 0, []
+    for name in equipment or []:
+        key = normalize_equipment(name)
+        if key is None:
+            unknown.append(str(name))
+        elif key in GYM:
+            m = ALL_EQUIPMENT
+        elif key in EQUIPMENT_BIT:
+            m |= EQUIPMENT_BIT[key]
+    if unknown:
+        raise UnknownEquipment(unknown)
+    return m
+
+def normalize_injury(name: str) -> Optional[str]:
+    """"Knees", "lower back", "Lower-Back" -> the INJURIES name, or None if unrecognised."""
+    key = _key(name)
+    key = INJURY_ALIASES.get(key, key)
+    if key not in INJURY_BIT and key.endswith("s"):
+        key = INJURY_ALIASES.get(key[:-1], key[:-1])
+    return key if key in INJURY_BIT else None
+
+def injury_mask(injuries: Optional[Iterable[str]]) -> int:
+    """Bits for `injuries`; raises UnknownInjury rather than ignoring a name it can't map."""
+    if isinstance(injuries, str):
+        injuries = [injuries]
+    m, unknown = 0, []
+    for name in injuries or []:
+        key = normalize_injury(name)
+        if key is None:
+            unknown.append(str(name))
+        else:
+            m |= INJURY_BIT[key]
+    if unknown:
+        raise UnknownInjury(unknown)
+    return m
+
+def intensity_mask(activity_level: Optional[str]) -> int:
+    top = INTENSITY_ID[MAX_INTENSITY.get(activity_level or "", "high")]
+    return (1 << (top + 1)) - 1
+
+def forbid_mask(equipment: int, injuries: int, intensities: int = ALL_INTENSITIES) -> int:
+    """Bits that rule a workout out: equipment the user lacks, their injuries, disallowed intensities."""
+    return ((ALL_EQUIPMENT & ~equipment) | (injuries << INJURY_SHIFT)
+            | ((ALL_INTENSITIES & ~intensities) << INTENSITY_SHIFT))
+
+def parse_windows(windows: Optional[Iterable[str]]) -> List[Tuple[int, int]]:
+    """["06:00-07:00", ...] -> sorted [(start_min, end_min)]; malformed entries are skipped."""
+    out = []
+    for w in windows or []:
+        try:
+            a, b = str(w).split("-")
+            start = int(a[:2]) * 60 + int(a[3:5])
+            end = int(b[:2]) * 60 + int(b[3:5])
+        except ValueError:
+            continue
+        if end > start:
+            out.append((start, end))
+    return sorted(out)
+
+
+class WorkoutCatalog:
+    def __init__(self, records: Sequence[Dict[str, Any]]):
+        n = len(records)
+        self.records = list(records)
+        self.names = [r["name"] for r in records]
+        self.duration = np.array([int(r["duration_min"]) for r in records], dtype=np.int32)
+        self.intensity = np.array([INTENSITY_ID.get(r.get("intensity", "medium"), 1) for r in records], dtype=np.int8)
+        self.goal_mask = np.array([_bits(r.get("goals") or GOALS, GOAL_BIT) for r in records], dtype=np.int64)
+        self.muscle_mask = np.array([_bits(r.get("muscles"), MUSCLE_BIT) for r in records], dtype=np.int64)
+        equip = np.array([_bits(r.get("equipment"), EQUIPMENT_BIT) for r in records], dtype=np.int64)
+        contra = np.array([injury_mask(r.get("contraindications")) for r in records], dtype=np.int64)
+        self.need = equip | (contra << INJURY_SHIFT) | (np.left_shift(1, self.intensity.astype(np.int64)) << INTENSITY_SHIFT)
+        priority = np.array([float(r.get("priority", 1.0)) for r in records], dtype=np.float64).reshape(n)
+
+        # goal (x intensity) -> workout indexes, highest priority first (stable: catalog order breaks ties)
+        order = np.argsort(-priority, kind="stable")
+        self.index: Dict[Tuple[str, str], np.ndarray] = {}
+        for goal in GOALS:
+            in_goal = order[(self.goal_mask[order] & GOAL_BIT[goal]) != 0]
+            self.index[(goal, "*")] = in_goal
+            for level, i in INTENSITY_ID.items():
+                self.index[(goal, level)] = in_goal[self.intensity[in_goal] == i]
+
+        digest = hashlib.sha1(json.dumps(self.records, sort_keys=True).encode()).hexdigest()
+        self.version = f"{n}-{digest[:12]}"
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls, path: str) -> "WorkoutCatalog":
+        """Load a JSON list or JSON-lines file of workout records."""
+        with open(path, encoding="utf-8") as f:
+            if path.endswith((".jsonl", ".ndjson")):
+                return cls([json.loads(line) for line in f if line.strip()])
+            return cls(json.load(f))
+
+    def candidates(self, goal: str, forbid: int = 0, intensity: str = "*") -> np.ndarray:
+        """All allowed workouts for a goal, best first (full filter; `suggest` scans lazily instead)."""
+        idx = self.index.get((goal if goal in GOAL_BIT else "general_health", intensity))
+        if idx is None:
+            return np.empty(0, dtype=np.int64)
+        return idx[(self.need[idx] & forbid) == 0] if forbid else idx
+
+    def pick(self, goal: str, forbid: int = 0, windows: Optional[List[Tuple[int, int]]] = None,
+             sessions: Optional[int] = None, intensity: str = "*", avoid: Iterable[int] = ()) -> List[Tuple[int, int]]:
+        """Up to `sessions` allowed workouts, each placed in its own time window it fits into,
+        preferring sessions that work different muscle groups. Workouts in `avoid` (e.g. yesterday's)
+        are used only if nothing else fits. Returns [(workout index, window start minute)]."""
+        goal = goal if goal in GOAL_BIT else "general_health"
+        order = self.index.get((goal, intensity))
+        if order is None:
+            return []
+        windows = windows or parse_windows(DEFAULT_WINDOWS)
+        want = min(sessions or SESSIONS[goal], len(windows))
+        avoid = set(avoid)
+        free = list(windows)
+        chosen: List[Tuple[int, int]] = []
+        used_muscles = 0
+        skipped: List[int] = []               # allowed but overlapping muscles; second choice
+        avoided: List[int] = []               # allowed but in `avoid`; last resort
+        for start in range(0, len(order), SCAN_CHUNK):
+            chunk = order[start:start + SCAN_CHUNK]
+            for i in chunk[(self.need[chunk] & forbid) == 0].tolist():
+                if i in avoid:
+                    avoided.append(i)
+                    continue
+                if self.muscle_mask[i] & used_muscles:
+                    skipped.append(i)
+                    continue
+                w = self._fit(free, int(self.duration[i]))
+                if w is not None:
+                    chosen.append((i, free.pop(w)[0]))
+                    used_muscles |= int(self.muscle_mask[i])
+                    if len(chosen) == want:
+                        return chosen
+        for i in skipped + avoided:
+            w = self._fit(free, int(self.duration[i]))
+            if w is not None:
+                chosen.append((i, free.pop(w)[0]))
+                if len(chosen) == want:
+                    break
+        return chosen
+
+    def suggest(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """`pick`, as plan-shaped workout dicts ordered by time."""
+        return self.shape(self.pick(*args, **kwargs))
+
+    @staticmethod
+    def _fit(free: List[Tuple[int, int]], minutes: int) -> Optional[int]:
+        for k, (a, b) in enumerate(free):
+            if b - a >= minutes:
+                return k
+        return None
+
+    def shape(self, chosen: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        return [{"name": self.names[i], "duration_min": int(self.duration[i]),
+                 "intensity": INTENSITIES[self.intensity[i]], "when": f"{at // 60:02d}:{at % 60:02d}"}
+                for i, at in sorted(chosen, key=lambda c: c[1])]
+
+
+def user_query(profile: Optional[Dict[str, Any]], goal: Optional[Dict[str, Any]],
+               equipment: Optional[Iterable[str]] = None) -> Tuple[str, int, List[Tuple[int, int]]]:
+    """(goal, forbid mask, windows) for one user: equipment from the request and/or the profile,
+    injuries and time windows from the profile, intensity capped by activity level."""
+    profile = profile or {}
+    have = equipment_mask([*(equipment or []), *(profile.get("equipment") or [])])
+    forbid = forbid_mask(have, injury_mask(profile.get("injuries")), intensity_mask(profile.get("activity_level")))
+    return (goal or {}).get("type") or "general_health", forbid, parse_windows(profile.get("time_windows"))
+
+def suggest_for(catalog: WorkoutCatalog, profile: Optional[Dict[str, Any]], goal: Optional[Dict[str, Any]],
+                equipment: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    return catalog.suggest(*user_query(profile, goal, equipment))
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> WorkoutCatalog:
+    """Random but plausible workouts, for benchmarks and tests."""
+    rng = np.random.default_rng(seed)
+    goal_bits = rng.integers(1, 1 << len(GOALS), n)
+    # most workouts need little or no equipment; a few need several items
+    equip_bits = rng.integers(0, 1 << len(EQUIPMENT), n) & rng.integers(0, 1 << len(EQUIPMENT), n) & rng.integers(0, 1 << len(EQUIPMENT), n)
+    contra_bits = rng.integers(0, 1 << len(INJURIES), n) & rng.integers(0, 1 << len(INJURIES), n)
+    muscle_bits = rng.integers(1, 1 << len(MUSCLES), n) & rng.integers(1, 1 << len(MUSCLES), n)
+    duration = rng.choice([15, 20, 25, 30, 40, 45, 60, 75, 90], n)
+    intensity = rng.integers(0, len(INTENSITIES), n)
+    priority = rng.random(n)
+    records = []
+    for i in range(n):
+        records.append({
+            "name": f"Workout {i}",
+            "goals": [g for g, b in GOAL_BIT.items() if goal_bits[i] & b],
+            "duration_min": int(duration[i]),
+            "intensity": INTENSITIES[intensity[i]],
+            "equipment": [e for e, b in EQUIPMENT_BIT.items() if equip_bits[i] & b],
+            "contraindications": [j for j, b in INJURY_BIT.items() if contra_bits[i] & b],
+            "muscles": [m for m, b in MUSCLE_BIT.items() if muscle_bits[i] & b],
+            "priority": round(float(priority[i]), 4),
+        })
+    return WorkoutCatalog(records)
+
+
+def load_default(builtin: Sequence[Dict[str, Any]]) -> WorkoutCatalog:
+    path = os.environ.get("WORKOUT_CATALOG_PATH")
+    return WorkoutCatalog.load(path) if path else WorkoutCatalog(builtin)
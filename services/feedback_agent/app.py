@@ -1,50 +1,178 @@
 from flask import Flask, request, jsonify
-import random
-from services.common.storage import init_db, get_arms, upsert_arm, record_feedback
+import atexit, datetime, os, threading
+import numpy as np
+from pydantic import ValidationError
+from services.common.cache import LRUCache
+from services.common.models import Feedback
+from services.common.storage import get_rollups, record_feedback, record_feedback_many
+from services.common.telemetry import instrument
+from services.feedback_agent.contextual import LinUCB, featurize, featurize_batch
+from services.feedback_agent.engine import BanditEngine
 
 app = Flask(__name__)
-init_db()
+instrument(app, "feedback_agent")
 
 AGENT_NAME = "motivation_tone"
 ARMS = ["coach","friendly"]
-EPSILON = 0.2
+EPSILON = float(os.environ.get("BANDIT_EPSILON", "0.2"))
 
-# Ensure arms exist
-for arm in ARMS:
-    upsert_arm(AGENT_NAME, arm)
+# Arm stats live in memory; updates are journaled and flushed to bandit_arm in batches
+ENGINE = BanditEngine(
+    AGENT_NAME, ARMS, EPSILON,
+    flush_interval_s=float(os.environ.get("BANDIT_FLUSH_INTERVAL_S", "1.0")),
+    flush_max_pending=int(os.environ.get("BANDIT_FLUSH_MAX_PENDING", "1000")),
+)
+
+# Per-user policy over UserProfile/Goal features (POST /bandit/choose, /bandit/choose_batch)
+CONTEXTUAL = LinUCB(AGENT_NAME, ARMS, alpha=float(os.environ.get("LINUCB_ALPHA", "0.5")))
+
+# Both policies load their state (and replay journals of crashed workers) on the first request that
+# needs them rather than at import, so spawning a worker does no database work
+_started = False
+_start_lock = threading.Lock()
+
+@app.before_request
+def start_policies():
+    global _started
+    if _started or request.path == "/health":
+        return
+    with _start_lock:
+        if not _started:
+            ENGINE.start()
+            atexit.register(ENGINE.close)
+            CONTEXTUAL.start()
+            atexit.register(CONTEXTUAL.close)
+            _started = True
+# user_id -> features at decision time, so a later rating can update the arm that was shown
+CONTEXTS = LRUCache(max_entries=int(os.environ.get("BANDIT_CONTEXT_CACHE", "100000")), ttl_s=7 * 24 * 3600)
 
 @app.get("/bandit/choose")
 def choose():
-    # epsilon-greedy on average reward
-    arms = get_arms(AGENT_NAME)
-    if random.random() < EPSILON:
-        choice = random.choice(ARMS)
-    else:
-        # pick arm with best mean reward (default 0)
-        best, best_mu = ARMS[0], -1e9
-        for a in arms:
-            pulls = a["pulls"] or 0
-            mu = (a["reward_sum"] / pulls) if pulls > 0 else 0.0
-            if mu > best_mu:
-                best, best_mu = a["arm"], mu
-        choice = best
-    upsert_arm(AGENT_NAME, choice, pulled=True)
-    return jsonify({"arm": choice, "epsilon": EPSILON})
+    # epsilon-greedy on average reward, served from memory; send propensity back with the rating
+    arm, propensity = ENGINE.choose_with_propensity()
+    return jsonify({"arm": arm, "epsilon": EPSILON, "propensity": propensity})
+
+@app.post("/bandit/choose")
+def choose_contextual():
+    # Expect: {user_id, profile?, goal?}
+    body = request.get_json(force=True) or {}
+    x = featurize(body.get("profile"), body.get("goal"))
+    arm = CONTEXTUAL.choose(x)
+    CONTEXTS.put(body.get("user_id") or "anon", x)
+    ENGINE.record_pulls({arm: 1})
+    return jsonify({"arm": arm, "epsilon": EPSILON, "policy": "linucb"})
+
+@app.post("/bandit/choose_batch")
+def choose_batch():
+    # Expect: {users: [{user_id, profile?, goal?}, ...]}; one vectorized scoring call for the whole batch
+    users = (request.get_json(force=True) or {}).get("users") or []
+    X = featurize_batch([u.get("profile") for u in users], [u.get("goal") for u in users])
+    arms = CONTEXTUAL.choose_batch(X) if users else []
+    counts: dict[str, int] = {}
+    for u, x, arm in zip(users, X, arms):
+        CONTEXTS.put(u.get("user_id") or "anon", x)
+        counts[arm] = counts.get(arm, 0) + 1
+    ENGINE.record_pulls(counts)
+    return jsonify({"arms": [{"user_id": u.get("user_id"), "arm": a} for u, a in zip(users, arms)], "policy": "linucb"})
+
+@app.get("/bandit/stats")
+def bandit_stats():
+    return jsonify({**ENGINE.snapshot(), "contextual": CONTEXTUAL.snapshot()})
+
+@app.post("/bandit/pulls")
+def bandit_pulls():
+    # Expect: {counts: {arm: n}} for arms chosen in bulk outside /bandit/choose (motivation campaigns)
+    counts = (request.get_json(force=True) or {}).get("counts", {})
+    ENGINE.record_pulls({arm: int(n) for arm, n in counts.items() if arm in ARMS})
+    return jsonify({"ok": True})
 
 @app.post("/feedback")
 def feedback():
     body = request.get_json(force=True)
-    # Expect: {event_id, user_id, rating, reason, bandit_arm?}
+    # Expect: {event_id, user_id, rating, reason, bandit_arm?, propensity?}
     event_id = body.get("event_id","")
     user_id = body.get("user_id","anon")
     rating = int(body.get("rating",3))
     reason = body.get("reason")
     arm = body.get("bandit_arm")
-    record_feedback(event_id, user_id, rating, reason)
+    propensity = body.get("propensity")
+    record_feedback(event_id, user_id, rating, reason, arm, float(propensity) if propensity is not None else None)
     if arm in ARMS:
-        reward = max(0.0, (rating - 3) / 2.0)  # map 1..5 -> -1..+1 -> clamp to 0..1
-        upsert_arm(AGENT_NAME, arm, reward=reward)
+        ENGINE.reward(arm, rating_reward(rating))
+        reward_contextual([{"user_id": user_id, "bandit_arm": arm, "rating": rating}])
     return jsonify({"ok": True, "logged": {"event_id":event_id, "rating":rating, "reason":reason, "arm":arm}})
 
+def rating_reward(rating:int) -> float:
+    return max(0.0, (rating - 3) / 2.0)  # map 1..5 -> -1..+1 -> clamp to 0..1
+
+def reward_contextual(rows:list[dict]):
+    # only ratings whose decision context is still cached can update the per-user policy
+    hits = [(r["bandit_arm"], x, rating_reward(r["rating"])) for r in rows
+            if (x := CONTEXTS.get(r.get("user_id") or "anon")) is not None]
+    if hits:
+        arms, xs, rewards = zip(*hits)
+        CONTEXTUAL.reward_batch(list(arms), np.stack(xs), rewards)
+
+@app.post("/feedback/bulk")
+def feedback_bulk():
+    # Expect: {items: [{event_id, user_id, rating, reason, bandit_arm?, propensity?}, ...]} or a bare list;
+    # for clients that buffered ratings offline. Valid rows are inserted in one transaction.
+    body = request.get_json(force=True)
+    items = body.get("items", []) if isinstance(body, dict) else body
+    rows, errors = [], []
+    for i, item in enumerate(items or []):
+        try:
+            fb = Feedback(**{"event_id": "", "user_id": "anon", **item})
+        except (ValidationError, TypeError) as e:
+            errors.append({"index": i, "error": str(e)})
+            continue
+        p = item.get("propensity")
+        rows.append({**fb.model_dump(), "bandit_arm": item.get("bandit_arm"), "propensity": float(p) if p is not None else None})
+    logged = record_feedback_many(rows)
+    rated = [r for r in rows if r["bandit_arm"] in ARMS]
+    for r in rated:
+        ENGINE.reward(r["bandit_arm"], rating_reward(r["rating"]))
+    reward_contextual(rated)
+    return jsonify({"ok": not errors, "logged": logged, "errors": errors}), (200 if logged or not errors else 400)
+
+# Longest per-arm trend /feedback/stats returns (days)
+STATS_MAX_DAYS = int(os.environ.get("FEEDBACK_STATS_MAX_DAYS", "366"))
+
+def summarize(row:dict|None) -> dict:
+    """Rating summary of one rollup row (see storage.ROLLUP_SCOPES); reward as in rating_reward."""
+    if not row or not row["n"]:
+        return {"n": 0}
+    n = row["n"]
+    hist = [row[f"r{r}"] for r in range(1, 6)]
+    return {"n": n, "mean_rating": round(row["rating_sum"] / n, 4), "ratings": dict(zip("12345", hist)),
+            "positive_rate": round((hist[3] + hist[4]) / n, 4), "mean_reward": round((0.5 * hist[3] + hist[4]) / n, 4)}
+
+@app.get("/feedback/stats")
+def feedback_stats():
+    # ?user_id=&day=YYYY-MM-DD&arm=&days=N&end=YYYY-MM-DD; answered from feedback_rollup by primary key,
+    # never by scanning feedback. The arm trend covers `days` days up to `end` (default today, UTC).
+    args = request.args
+    out = {"all": summarize(get_rollups("all", ["*"]).get("*")),
+           "arms": {arm: summarize(row) for arm, row in get_rollups("arm", ARMS).items()}}
+    if args.get("user_id"):
+        out["user"] = {"user_id": args["user_id"], **summarize(get_rollups("user", [args["user_id"]]).get(args["user_id"]))}
+    try:
+        if args.get("day"):
+            day = datetime.date.fromisoformat(args["day"]).isoformat()
+            out["day"] = {"day": day, **summarize(get_rollups("day", [day]).get(day))}
+        if args.get("arm"):
+            end = datetime.date.fromisoformat(args["end"]) if args.get("end") else datetime.datetime.now(datetime.timezone.utc).date()
+            n = min(max(int(args.get("days", 14)), 1), STATS_MAX_DAYS)
+            days = [(end - datetime.timedelta(days=d)).isoformat() for d in range(n - 1, -1, -1)]
+            rows = get_rollups("arm_day", [f"{args['arm']}|{d}" for d in days])
+            out["trend"] = {"arm": args["arm"], "days": [{"day": d, **summarize(rows.get(f"{args['arm']}|{d}"))} for d in days]}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(out)
+
+@app.get("/health")
+def health():
+    return jsonify({"ok": True, "service": "feedback_agent"})
+
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8105, debug=True)
@@ -0,0 +1,33 @@
+"""Rebuild the feedback rollups (per user / day / arm / arm and day) from the whole feedback log.
+
+    python -m services.feedback_agent.backfill --chunk 500000
+
+Normally unnecessary: migration 8 seeds the rollups and every insert keeps them current. Use it after
+editing or restoring `feedback` outside the app. The log is read in id-range chunks, one short
+transaction each, so the feedback agent can keep writing while it runs.
+"""
+import argparse, sys, time
+from services.common import storage
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--db", help="database file (default: HC_DB_PATH / storage/app.db)")
+    ap.add_argument("--chunk", type=int, default=500_000, help="feedback ids per transaction")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args(argv)
+    if args.db:
+        storage.configure(args.db)
+    storage.init_db()
+    t0 = time.perf_counter()
+
+    def progress(done:int, last:int):
+        if not args.quiet:
+            rate = done / max(time.perf_counter() - t0, 1e-9)
+            print(f"  {done}/{last} ids ({rate:,.0f}/s)", flush=True)
+
+    rows = storage.rebuild_rollups(args.chunk, progress)
+    print(f"rolled up {rows} feedback rows in {time.perf_counter() - t0:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
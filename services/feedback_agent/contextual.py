@@ -0,0 +1,185 @@
+"""Contextual (per-user) tone policy: LinUCB over UserProfile/Goal features.
+
+Per-arm parameters are two arrays, A = ridge*I + sum x x^T (k, d, d) and b = sum r x (k, d);
+scoring a batch is a couple of matrix products, so bulk jobs can score 100k users at once.
+Both statistics are sums, so updates are flushed to `bandit_linear` as additive deltas
+(several worker processes can share the table, as with `bandit_arm`). Updates not yet
+flushed are lost on a crash; the global BanditEngine remains the journaled source of truth.
+"""
+import random, threading
+import numpy as np
+from services.common import storage
+
+ACTIVITY_LEVELS = ["sedentary", "light", "moderate", "active", "very_active"]
+GOAL_TYPES = ["fat_loss", "muscle_gain", "endurance", "general_health"]
+FEATURES = (["bias", "age", "sex_m", "sex_f", "bmi", "activity"]
+            + [f"goal_{g}" for g in GOAL_TYPES] + ["deficit"])
+DIM = len(FEATURES)
+_ACTIVITY = {a: i / (len(ACTIVITY_LEVELS) - 1) for i, a in enumerate(ACTIVITY_LEVELS)}
+
+
+def featurize_batch(profiles:list[dict|None], goals:list[dict|None]|None=None) -> np.ndarray:
+    """(n, DIM) feature matrix; missing fields map to neutral values (0 after centring)."""
+    n = len(profiles)
+    profiles = [p or {} for p in profiles]
+    goals = [g or {} for g in (goals or [None] * n)]
+    X = np.zeros((n, DIM))
+    X[:, 0] = 1.0
+    X[:, 1] = (np.fromiter((p.get("age") or 40 for p in profiles), np.float64, n) - 40) / 20
+    sex = [p.get("sex") for p in profiles]
+    X[:, 2] = [s == "M" for s in sex]
+    X[:, 3] = [s == "F" for s in sex]
+    w = np.fromiter((p.get("weight_kg") or 0 for p in profiles), np.float64, n)
+    h = np.fromiter((p.get("height_cm") or 0 for p in profiles), np.float64, n) / 100
+    bmi = np.divide(w, h * h, out=np.full(n, 25.0), where=(w > 0) & (h > 0))
+    X[:, 4] = np.clip((bmi - 25) / 5, -3, 3)
+    X[:, 5] = np.fromiter((_ACTIVITY.get(p.get("activity_level") or "light", 0.25) for p in profiles), np.float64, n)
+    goal_idx = np.fromiter((GOAL_TYPES.index(g.get("type")) if g.get("type") in GOAL_TYPES else 3 for g in goals), np.int64, n)
+    X[np.arange(n), 6 + goal_idx] = 1.0
+    X[:, 10] = np.fromiter((g.get("deficit_kcal") or 0 for g in goals), np.float64, n) / 500
+    return X
+
+def featurize(profile:dict|None=None, goal:dict|None=None) -> np.ndarray:
+    return featurize_batch([profile], [goal])[0]
+
+
+class LinUCB:
+    def __init__(self, agent:str, arms:list[str], alpha:float=0.5, ridge:float=1.0, flush_interval_s:float=5.0,
+                 flush_max_pending:int=500, rng:random.Random|None=None):
+        self.agent = agent
+        self.arms = list(arms)
+        self.alpha = alpha
+        self.ridge = ridge
+        self.flush_interval_s = flush_interval_s
+        self.flush_max_pending = flush_max_pending
+        k = len(self.arms)
+        self.A = np.tile(np.eye(DIM) * ridge, (k, 1, 1))
+        self.b = np.zeros((k, DIM))
+        self.pending_A = np.zeros((k, DIM, DIM))
+        self.pending_b = np.zeros((k, DIM))
+        self.pending_ops = 0
+        self.updates = 0
+        self.rng = np.random.default_rng((rng or random.Random()).getrandbits(32))
+        self._A_inv = self._theta = None  # recomputed lazily after updates
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- lifecycle ----
+    def start(self):
+        self.load()
+        self._thread = threading.Thread(target=self._run, name=f"linucb-flush-{self.agent}", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # kept pending; retried next round
+
+    # ---- scoring ----
+    def _params(self):
+        # caller holds self._lock
+        if self._A_inv is None:
+            self._A_inv = np.linalg.inv(self.A)
+            self._theta = np.einsum("kij,kj->ki", self._A_inv, self.b)
+        return self._A_inv, self._theta
+
+    def scores(self, X:np.ndarray) -> np.ndarray:
+        """(n, k) upper confidence bounds: x.theta_a + alpha * sqrt(x' A_a^-1 x)."""
+        with self._lock:
+            A_inv, theta = self._params()
+        mean = X @ theta.T
+        width = np.stack([np.einsum("ij,ij->i", X @ A_inv[a], X) for a in range(len(self.arms))], axis=1)
+        return mean + self.alpha * np.sqrt(np.maximum(width, 0.0))
+
+    def choose_batch(self, X:np.ndarray) -> list[str]:
+        s = self.scores(X)
+        s += self.rng.random(s.shape) * 1e-9  # break exact ties (e.g. no data yet) at random
+        return [self.arms[i] for i in s.argmax(axis=1)]
+
+    def choose(self, x:np.ndarray) -> str:
+        return self.choose_batch(x[None, :])[0]
+
+    # ---- updates ----
+    def reward(self, arm:str, x:np.ndarray, reward:float):
+        self.reward_batch([arm], x[None, :], [reward])
+
+    def reward_batch(self, arms:list[str], X:np.ndarray, rewards) -> None:
+        idx = np.array([self.arms.index(a) for a in arms], dtype=np.int64)
+        r = np.asarray(rewards, dtype=np.float64)
+        dA = np.zeros_like(self.A)
+        db = np.zeros_like(self.b)
+        np.add.at(dA, idx, np.einsum("ni,nj->nij", X, X))
+        np.add.at(db, idx, X * r[:, None])
+        with self._lock:
+            self.A += dA
+            self.b += db
+            self.pending_A += dA
+            self.pending_b += db
+            self.pending_ops += len(idx)
+            self.updates += len(idx)
+            self._A_inv = None
+            if self.pending_ops >= self.flush_max_pending:
+                self._wake.set()
+
+    # ---- persistence ----
+    def _cells(self, A_sum:np.ndarray, b:np.ndarray) -> dict:
+        return {int(c): float(v) for c, v in enumerate(np.concatenate([A_sum.ravel(), b]))}
+
+    def flush(self) -> int:
+        """Add pending statistics to bandit_linear and reload the shared totals; returns updates flushed."""
+        with self._lock:
+            if not self.pending_ops:
+                return 0
+            dA, db, n = self.pending_A, self.pending_b, self.pending_ops
+            self.pending_A, self.pending_b, self.pending_ops = np.zeros_like(dA), np.zeros_like(db), 0
+        try:
+            totals = storage.apply_linear_deltas(self.agent, {arm: self._cells(dA[i], db[i]) for i, arm in enumerate(self.arms)})
+        except Exception:
+            with self._lock:
+                self.pending_A += dA
+                self.pending_b += db
+                self.pending_ops += n
+            raise
+        self._load(totals)
+        return n
+
+    def load(self):
+        self._load(storage.apply_linear_deltas(self.agent, {}))
+        return self
+
+    def _load(self, totals:dict):
+        with self._lock:
+            for i, arm in enumerate(self.arms):
+                cells = totals.get(arm, {})
+                flat = np.array([cells.get(c, 0.0) for c in range(DIM * DIM + DIM)])
+                # DB totals (including other workers' flushes) plus what arrived since
+                self.A[i] = np.eye(DIM) * self.ridge + flat[:DIM * DIM].reshape(DIM, DIM) + self.pending_A[i]
+                self.b[i] = flat[DIM * DIM:] + self.pending_b[i]
+            self._A_inv = None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            _, theta = self._params()
+            return {
+                "agent": self.agent,
+                "policy": "linucb",
+                "alpha": self.alpha,
+                "features": FEATURES,
+                "theta": {arm: [round(float(v), 4) for v in theta[i]] for i, arm in enumerate(self.arms)},
+                "updates": self.updates,
+                "pending_updates": self.pending_ops,
+            }
@@ -0,0 +1,221 @@
+"""In-memory epsilon-greedy bandit with write-behind persistence.
+
+Decisions and reward updates only touch process memory. Every update is appended to a
+per-process journal file before it is applied, and pending deltas are flushed to
+`bandit_arm` in one transaction on a timer or once `flush_max_pending` updates queue up.
+Each flush records the last journal sequence it covered (`bandit_flush`), so on restart
+any journal left behind by a crashed process is replayed exactly once, even when several
+workers recover at the same time.
+"""
+import os, random, threading
+from pathlib import Path
+from services.common import storage
+
+DEFAULT_JOURNAL_DIR = storage.DB_PATH.parent
+
+
+def _pid_alive(pid:int) -> bool:
+    if pid == os.getpid():
+        return False  # a journal with our own pid is left over from an earlier process
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class BanditEngine:
+    def __init__(self, agent:str, arms:list[str], epsilon:float=0.2, journal_dir:str|Path|None=None,
+                 flush_interval_s:float=1.0, flush_max_pending:int=1000, rng:random.Random|None=None):
+        self.agent = agent
+        self.arms = list(arms)
+        self.epsilon = epsilon
+        self.flush_interval_s = flush_interval_s
+        self.flush_max_pending = flush_max_pending
+        self.rng = rng or random.Random()
+        self.journal_dir = Path(journal_dir or DEFAULT_JOURNAL_DIR)
+        self.journal_id = f"{agent}-{os.getpid()}"
+        self.journal_path = self.journal_dir / f"bandit-{self.journal_id}.journal"
+        self.stats = {arm: [0, 0.0] for arm in self.arms}    # arm -> [pulls, reward_sum]
+        self.pending: dict[str, list] = {}                    # not yet in bandit_arm
+        self.pending_ops = 0
+        self.seq = 0
+        self.flushes = 0
+        self._journal = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- lifecycle ----
+    def start(self):
+        self.recover()
+        self._thread = threading.Thread(target=self._run, name=f"bandit-flush-{self.agent}", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    def recover(self):
+        """Replay journals of dead processes into the DB, then load arm totals."""
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        prefix = f"bandit-{self.agent}-"
+        journals: dict[str, list[Path]] = {}
+        for path in self.journal_dir.glob(f"{prefix}*.journal*"):
+            journals.setdefault(path.name[len("bandit-"):].split(".journal")[0], []).append(path)
+        for journal_id, paths in sorted(journals.items()):
+            pid = journal_id[len(self.agent) + 1:]
+            if not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            last = storage.get_flush_seq(journal_id)
+            deltas, max_seq = {}, last
+            try:
+                for path in paths:  # the live journal and a .flushing file interrupted mid-flush
+                    for seq, arm, dp, dr in self._read_journal(path):
+                        if seq > last:
+                            d = deltas.setdefault(arm, [0, 0.0])
+                            d[0] += dp
+                            d[1] += dr
+                            max_seq = max(max_seq, seq)
+            except FileNotFoundError:
+                continue  # another worker replayed and removed it
+            if max_seq > last:
+                # applied only if last_seq is still `last`: a worker recovering alongside us skips it
+                storage.apply_arm_deltas(self.agent, deltas, journal_id, max_seq, expect_seq=last)
+            for path in paths:
+                path.unlink(missing_ok=True)
+        totals = storage.apply_arm_deltas(self.agent, {arm: (0, 0.0) for arm in self.arms}, self.journal_id, 0)
+        with self._lock:
+            self.stats = {arm: list(totals.get(arm, (0, 0.0))) for arm in set(self.arms) | set(totals)}
+
+    @staticmethod
+    def _read_journal(path:Path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 4:
+                    continue  # torn last line from a crash mid-write
+                yield int(parts[0]), parts[1], int(parts[2]), float(parts[3])
+
+    # ---- decisions / updates ----
+    def choose(self) -> str:
+        return self.choose_with_propensity()[0]
+
+    def choose_with_propensity(self) -> tuple[str, float]:
+        """The chosen arm and the probability the policy gave it (logged for offline evaluation)."""
+        with self._lock:
+            # pick arm with best mean reward (default 0)
+            best, best_mu = self.arms[0], -1e9
+            for arm in self.arms:
+                pulls, reward_sum = self.stats.get(arm, (0, 0.0))
+                mu = (reward_sum / pulls) if pulls > 0 else 0.0
+                if mu > best_mu:
+                    best, best_mu = arm, mu
+            if self.rng.random() < self.epsilon:
+                choice = self.rng.choice(self.arms)
+            else:
+                choice = best
+            p = self.epsilon / len(self.arms) + (1 - self.epsilon) * (choice == best)
+            self._record(choice, 1, 0.0)
+        return choice, p
+
+    def record_pulls(self, counts:dict[str, int]):
+        """Count pulls decided elsewhere (e.g. bulk campaigns choosing from snapshot())."""
+        with self._lock:
+            for arm, n in counts.items():
+                if n:
+                    self._record(arm, int(n), 0.0)
+
+    def reward(self, arm:str, reward:float):
+        with self._lock:
+            self._record(arm, 0, float(reward))
+
+    def _record(self, arm:str, pulls:int, reward:float):
+        # caller holds self._lock
+        if self._journal is None:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self.seq += 1
+        self._journal.write(f"{self.seq} {arm} {pulls} {reward!r}\n")
+        self._journal.flush()  # survives a process crash once it reaches the OS
+        s = self.stats.setdefault(arm, [0, 0.0])
+        s[0] += pulls
+        s[1] += reward
+        p = self.pending.setdefault(arm, [0, 0.0])
+        p[0] += pulls
+        p[1] += reward
+        self.pending_ops += 1
+        if self.pending_ops >= self.flush_max_pending:
+            self._wake.set()
+
+    # ---- write-behind ----
+    def flush(self) -> int:
+        """Write pending deltas to bandit_arm in one transaction; returns the number of updates flushed."""
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending_ops:
+                    return 0
+                deltas, n, seq = self.pending, self.pending_ops, self.seq
+                self.pending, self.pending_ops = {}, 0
+                # rotate the journal: entries <= seq now live in the .flushing file
+                flushing = self.journal_path.with_suffix(".journal.flushing")
+                if self._journal:
+                    self._journal.close()
+                    self._journal = None
+                if self.journal_path.exists():
+                    os.replace(self.journal_path, flushing)
+            try:
+                totals = storage.apply_arm_deltas(self.agent, {a: tuple(d) for a, d in deltas.items()}, self.journal_id, seq)
+            except Exception:
+                with self._lock:
+                    for arm, (dp, dr) in deltas.items():
+                        p = self.pending.setdefault(arm, [0, 0.0])
+                        p[0] += dp
+                        p[1] += dr
+                    self.pending_ops += n
+                    # keep the un-flushed entries in the live journal
+                    if flushing.exists():
+                        with open(flushing, encoding="utf-8") as src, open(self.journal_path, "a", encoding="utf-8") as dst:
+                            dst.write(src.read())
+                        flushing.unlink()
+                raise
+            flushing.unlink(missing_ok=True)
+            with self._lock:
+                # DB totals (including other workers' flushes) plus what arrived during the flush
+                self.stats = {arm: list(v) for arm, v in totals.items()}
+                for arm, (dp, dr) in self.pending.items():
+                    s = self.stats.setdefault(arm, [0, 0.0])
+                    s[0] += dp
+                    s[1] += dr
+                self.flushes += 1
+            return n
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # retried on the next tick; updates stay journaled
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "agent": self.agent,
+                "arms": {arm: {"pulls": p, "reward_sum": r, "mean": (r / p) if p else 0.0} for arm, (p, r) in self.stats.items()},
+                "pending_updates": self.pending_ops,
+                "flushes": self.flushes,
+                "seq": self.seq,
+            }
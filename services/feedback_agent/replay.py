@@ -0,0 +1,206 @@
+"""Offline evaluation of tone policies against the feedback log, before shipping an epsilon/policy change.
+
+    python -m services.feedback_agent.replay --epsilons 0,0.05,0.1,0.2,0.5,1 --out report.json
+
+* Off-policy estimates on the logged data (streamed from `feedback` in keyset chunks, never row by row):
+  IPS and self-normalized IPS using the logged propensities, plus the replay method
+  (keep the rows where the candidate's sampled arm matches the logged arm) over many seeds at once.
+* An online simulation of each candidate over many simulated users and seeds, vectorized over
+  (policy, seed); per-user arm means are drawn around the logged means. Reports regret/reward curves.
+"""
+import argparse, json, sys, time
+import numpy as np
+from services.common import storage
+
+AGENT = "motivation_tone"
+ARMS = ["coach", "friendly"]
+
+# ---- log access ----
+def iter_log(arms:list[str]=ARMS, chunk:int=200_000):
+    """Yield (arm_idx, reward, propensity) arrays per chunk of rated feedback rows that name a known arm.
+    Propensity is NaN where the client did not send it back."""
+    # map arms and rewards in SQL so each chunk converts to one float array without per-row Python work
+    arm_case = " ".join(f"WHEN ? THEN {i}" for i in range(len(arms)))
+    sql = f"""SELECT id, CASE bandit_arm {arm_case} END AS a, rating, COALESCE(propensity, -1.0)
+              FROM feedback WHERE id > ? AND bandit_arm IN ({",".join("?" * len(arms))}) ORDER BY id LIMIT ?"""
+    raw = storage.engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        last = 0
+        while True:
+            cur.execute(sql, (*arms, last, *arms, chunk))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            a = np.array(rows, dtype=np.float64)
+            last = int(a[-1, 0])
+            prop = a[:, 3]
+            prop[prop < 0] = np.nan
+            yield a[:, 1].astype(np.int64), np.clip((a[:, 2] - 3) / 2.0, 0.0, 1.0), prop  # rating_reward, vectorized
+        cur.close()
+    finally:
+        raw.close()
+
+def arm_means(agent:str=AGENT, arms:list[str]=ARMS) -> np.ndarray:
+    """Arm means the live bandit currently acts on (bandit_arm totals)."""
+    stats = {a["arm"]: a for a in storage.get_arms(agent)}
+    return np.array([(stats[a]["reward_sum"] / stats[a]["pulls"]) if stats.get(a, {}).get("pulls") else 0.0 for a in arms])
+
+def epsilon_greedy(means:np.ndarray, eps:float) -> np.ndarray:
+    """Arm probabilities of epsilon-greedy given arm means (ties go to the first arm, like BanditEngine)."""
+    pi = np.full(len(means), eps / len(means))
+    pi[int(np.argmax(means))] += 1 - eps
+    return pi
+
+# ---- off-policy estimates ----
+def scan_log(chunks, k:int=len(ARMS), default_propensity:float|None=None) -> dict:
+    """One pass over the log chunks, keeping per-arm sums only. Every estimate below is linear in the
+    candidate's arm probabilities, so any number of policies can be evaluated from these afterwards."""
+    stats = {"rows": 0, "rows_with_propensity": 0, "n": np.zeros(k), "reward": np.zeros(k),
+             "w": np.zeros(k), "wr": np.zeros(k), "wr2": np.zeros(k), "groups": {}}
+    for arm, reward, prop in chunks:
+        stats["rows"] += len(arm)
+        stats["n"] += np.bincount(arm, minlength=k)
+        stats["reward"] += np.bincount(arm, reward, minlength=k)
+        if default_propensity is not None:
+            prop = np.where(np.isnan(prop), default_propensity, prop)
+        has = ~np.isnan(prop)
+        a, r, w = arm[has], reward[has], 1.0 / prop[has]
+        stats["rows_with_propensity"] += len(a)
+        stats["w"] += np.bincount(a, w, minlength=k)
+        stats["wr"] += np.bincount(a, w * r, minlength=k)
+        stats["wr2"] += np.bincount(a, (w * r) ** 2, minlength=k)
+        values, inv = np.unique(reward, return_inverse=True)  # (arm, reward) group sizes for replay
+        counts = np.bincount(inv * k + arm, minlength=len(values) * k).reshape(len(values), k)
+        groups = stats["groups"]
+        for v, j in zip(*np.nonzero(counts)):
+            key = (int(j), float(values[v]))
+            groups[key] = groups.get(key, 0) + int(counts[v, j])
+    return stats
+
+def logged_means(stats:dict) -> np.ndarray:
+    return np.divide(stats["reward"], stats["n"], out=np.zeros_like(stats["reward"]), where=stats["n"] > 0)
+
+def evaluate(policies:dict[str, np.ndarray], stats:dict, seeds:int=32, rng=None) -> dict:
+    """Per-policy IPS (with standard error), self-normalized IPS and replay estimates."""
+    rng = rng or np.random.default_rng(0)
+    names = list(policies)
+    PI = np.stack([policies[n] for n in names])          # (P, k)
+    m = stats["rows_with_propensity"]
+    ips = PI @ stats["wr"] / m if m else np.full(len(names), np.nan)
+    second = (PI ** 2) @ stats["wr2"] / m if m else np.full(len(names), np.nan)
+    snips = np.divide(PI @ stats["wr"], PI @ stats["w"], out=np.full(len(names), np.nan), where=(PI @ stats["w"]) > 0)
+    # replay: a row survives when the candidate's sampled arm equals the logged one, which for a
+    # context-free policy happens with probability pi[arm] independently per row, so each seed's
+    # survivors per (arm, reward) group are Binomial(count, pi[arm]); all seeds are drawn at once
+    rep_sum = np.zeros((len(names), seeds))
+    rep_n = np.zeros((len(names), seeds))
+    for (j, r), c in sorted(stats["groups"].items()):
+        matched = rng.binomial(c, PI[:, j][:, None], size=(len(names), seeds))
+        rep_n += matched
+        rep_sum += matched * r
+    rep = np.divide(rep_sum, rep_n, out=np.full_like(rep_sum, np.nan), where=rep_n > 0)
+    out = {}
+    for p, name in enumerate(names):
+        seen = rep_n[p] > 0
+        out[name] = {
+            "ips": float(ips[p]),
+            "ips_stderr": float(np.sqrt(max(second[p] - ips[p] ** 2, 0.0) / m)) if m else float("nan"),
+            "snips": float(snips[p]),
+            "replay": float(rep[p][seen].mean()) if seen.any() else float("nan"),
+            "replay_std": float(rep[p][seen].std()) if seen.any() else float("nan"),
+            "replay_matched": float(rep_n[p].mean()),
+        }
+    return out
+
+# ---- online simulation ----
+def simulate(epsilons:list[float], means:np.ndarray, users:int=2000, horizon:int=5000, seeds:int=64,
+             concentration:float=8.0, checkpoints:int=50, rng=None) -> dict:
+    """Run every epsilon-greedy candidate on `seeds` independent copies of a population of `users`
+    simulated users (Bernoulli rewards; each user's arm means ~ Beta around `means`), one user per step.
+    Returns mean cumulative regret and average reward at `checkpoints` steps, per candidate."""
+    rng = rng or np.random.default_rng(0)
+    k = len(means)
+    m = np.clip(means, 0.02, 0.98)
+    user_means = rng.beta(m * concentration, (1 - m) * concentration, size=(seeds, users, k))  # (S, U, k)
+    best = user_means.max(axis=2)
+    eps = np.asarray(epsilons, dtype=np.float64)[:, None]          # (P, 1)
+    P = len(epsilons)
+    pulls = np.zeros((P, seeds, k))
+    sums = np.zeros((P, seeds, k))
+    regret = np.zeros((P, seeds))
+    total = np.zeros((P, seeds))
+    seed_idx = np.arange(seeds)
+    marks = set(np.linspace(1, horizon, checkpoints, dtype=int).tolist())
+    curve_t, curve_regret, curve_reward = [], [], []
+    for t in range(1, horizon + 1):
+        u = rng.integers(0, users, size=seeds)                     # same user stream for every candidate
+        mu = user_means[seed_idx, u]                               # (S, k)
+        est = np.divide(sums, pulls, out=np.zeros_like(sums), where=pulls > 0)
+        greedy = est.argmax(axis=2)                                # (P, S)
+        explore = rng.random((P, seeds)) < eps
+        action = np.where(explore, rng.integers(0, k, size=(P, seeds)), greedy)
+        p_reward = mu[seed_idx, action]                            # (P, S)
+        reward = (rng.random((P, seeds)) < p_reward).astype(np.float64)
+        onehot = np.eye(k)[action]                                 # (P, S, k)
+        pulls += onehot
+        sums += onehot * reward[..., None]
+        regret += best[seed_idx, u] - p_reward
+        total += reward
+        if t in marks:
+            curve_t.append(t)
+            curve_regret.append(regret.mean(axis=1))
+            curve_reward.append(total.mean(axis=1) / t)
+    R, W = np.array(curve_regret), np.array(curve_reward)
+    return {
+        "users": users, "horizon": horizon, "seeds": seeds, "t": curve_t,
+        "policies": {f"eps={e:g}": {"regret": R[:, i].round(3).tolist(), "reward": W[:, i].round(4).tolist(),
+                                    "final_regret": float(R[-1, i]), "final_reward": float(W[-1, i])}
+                     for i, e in enumerate(epsilons)},
+    }
+
+# ---- CLI ----
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--db", help="database file (default: HC_DB_PATH / storage/app.db)")
+    ap.add_argument("--agent", default=AGENT)
+    ap.add_argument("--epsilons", default="0,0.05,0.1,0.2,0.3,0.5,1", help="candidate epsilon-greedy policies")
+    ap.add_argument("--seeds", type=int, default=32)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--horizon", type=int, default=5000)
+    ap.add_argument("--chunk", type=int, default=200_000)
+    ap.add_argument("--default-propensity", type=float, help="propensity for rows logged without one (skipped by IPS otherwise)")
+    ap.add_argument("--out", help="write the full report (curves included) as JSON")
+    args = ap.parse_args(argv)
+    if args.db:
+        storage.configure(args.db)
+    epsilons = [float(e) for e in args.epsilons.split(",") if e.strip()]
+    t0 = time.perf_counter()
+    stats = scan_log(iter_log(ARMS, args.chunk), len(ARMS), args.default_propensity)
+    # candidates act greedily on the live bandit's means; with no live stats, on the log's per-arm means
+    means = arm_means(args.agent)
+    if not means.any():
+        means = logged_means(stats)
+    offline = {"rows": stats["rows"], "rows_with_propensity": stats["rows_with_propensity"],
+               "logged_means": logged_means(stats).tolist(),
+               "policies": evaluate({f"eps={e:g}": epsilon_greedy(means, e) for e in epsilons}, stats, args.seeds)}
+    t_log = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    sim = simulate(epsilons, means if means.any() else np.full(len(ARMS), 0.5), users=args.users,
+                   horizon=args.horizon, seeds=args.seeds)
+    t_sim = time.perf_counter() - t0
+
+    print(f"log: {offline['rows']} rows ({offline['rows_with_propensity']} with propensity) in {t_log:.2f}s; "
+          f"simulation: {args.seeds} seeds x {args.users} users x {args.horizon} steps in {t_sim:.2f}s")
+    print(f"arm means ({', '.join(ARMS)}): {np.round(means, 3).tolist()}")
+    print(f"{'policy':10}{'ips':>9}{'snips':>9}{'replay':>9}{'sim reward':>12}{'sim regret':>12}")
+    for name, est in offline["policies"].items():
+        s = sim["policies"][name]
+        print(f"{name:10}{est['ips']:>9.3f}{est['snips']:>9.3f}{est['replay']:>9.3f}{s['final_reward']:>12.3f}{s['final_regret']:>12.1f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"arms": ARMS, "arm_means": means.tolist(), "offline": offline, "simulation": sim}, f)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
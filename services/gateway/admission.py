@@ -0,0 +1,228 @@
+"""Gateway admission control: per-user token buckets per route class, and per-agent concurrency
+lanes that shed load instead of letting it queue.
+
+Each POST is put in a route class (ROUTE_CLASSES, else "default") and takes one token from the
+bucket for (class, client address) and one from the bucket for (class, address, claimed user). If
+either is empty, the request gets a 429 whose Retry-After says when the next token arrives. The user
+id is whatever the client sends, so it only splits an address's budget: rotating ids cannot get
+past the address bucket, and nobody can spend another address's budget by claiming its users. Each agent call then takes a slot in that agent's lane for its class. At
+most `max_inflight` calls run at once and at most `max_queue` more wait up to `queue_timeout_s`.
+Anything beyond that is refused immediately with Overloaded (503 + Retry-After). A saturated
+agent therefore costs a caller milliseconds instead of a gateway worker held for the whole LLM
+call, and cheap routes keep their workers. Limits apply per gateway process.
+"""
+import math, os, threading, time
+from flask import jsonify, request
+from services.common.cache import LRUCache
+from services.common.ratelimit import TokenBucket
+
+# gateway routes and the agent paths they call -> class; rates and lanes are configured per class
+ROUTE_CLASSES = {
+    "/diet/chat": "chat",
+    "/diet/chat/stream": "chat",
+    "/plan/today": "plan",
+    "/plan/week": "plan",
+    "/plan/batch": "plan",
+    "/diet/suggest": "plan",
+    "/exercise/suggest": "plan",
+    "/diet/batch": "plan",
+    "/exercise/batch": "plan",
+    "/diet/week": "plan",
+    "/exercise/week": "plan",
+}
+# class -> (tokens per second, burst) for each user; a rate of 0 disables that bucket
+DEFAULT_RATES = {"chat": (0.5, 5), "plan": (5, 30), "default": (20, 60)}
+# class -> (tokens per second, burst) for each client address, shared by all users behind it
+DEFAULT_ADDRESS_RATES = {"chat": (5, 20), "plan": (50, 150), "default": (200, 300)}
+# class -> (max in flight, max queued) per downstream agent; 0 in flight means unlimited
+DEFAULT_LANES = {"chat": (8, 4), "plan": (32, 32), "default": (32, 64)}
+# bodies larger than this are not parsed just to find the user (batch uploads)
+USER_BODY_MAX = 64 * 1024
+
+
+class Overloaded(Exception):
+    def __init__(self, message:str, retry_after_s:float):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+def parse_limits(spec:str|None, defaults:dict) -> dict:
+    """"chat=1/5,plan=5/20" -> {"chat": (1.0, 5.0), "plan": (5.0, 20.0), ...} on top of `defaults`."""
+    limits = dict(defaults)
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        first, _, second = value.partition("/")
+        limits[name.strip()] = (float(first), float(second) if second else float(first))
+    return limits
+
+def classify(path:str) -> str:
+    return ROUTE_CLASSES.get(path, "default")
+
+def retry_after(seconds:float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def noop():
+    pass
+
+class Lane:
+    """Concurrency limiter: `max_inflight` holders, `max_queue` more waiting, then refusal."""
+
+    def __init__(self, max_inflight:int, max_queue:int, queue_timeout_s:float=2.0):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.inflight = self.queued = 0
+        self.counters = {"admitted": 0, "waited": 0, "shed": 0, "timeouts": 0}
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot; returns its release() (safe to call twice), or raises Overloaded."""
+        if self.max_inflight <= 0:
+            return noop
+        with self._cond:
+            if self.inflight >= self.max_inflight:
+                if self.queued >= self.max_queue:
+                    self.counters["shed"] += 1
+                    raise Overloaded(f"{self.inflight} calls in flight and {self.queued} queued", self.queue_timeout_s)
+                self.queued += 1
+                self.counters["waited"] += 1
+                try:
+                    free = self._cond.wait_for(lambda: self.inflight < self.max_inflight, self.queue_timeout_s)
+                finally:
+                    self.queued -= 1
+                if not free:
+                    self.counters["timeouts"] += 1
+                    raise Overloaded(f"no free slot within {self.queue_timeout_s:g}s", self.queue_timeout_s)
+            self.inflight += 1
+            self.counters["admitted"] += 1
+        released = threading.Event()
+
+        def release():
+            if released.is_set():
+                return
+            with self._cond:
+                if not released.is_set():
+                    released.set()
+                    self.inflight -= 1
+                    self._cond.notify()
+        return release
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self.counters, "inflight": self.inflight, "queued": self.queued,
+                    "max_inflight": self.max_inflight, "max_queue": self.max_queue}
+
+
+class Admission:
+    def __init__(self, rates:dict|None=None, lanes:dict|None=None, queue_timeout_s:float=2.0,
+                 max_users:int=100_000, clock=time.monotonic, address_rates:dict|None=None):
+        self.rates = {**DEFAULT_RATES, **(rates or {})}
+        self.address_rates = {**DEFAULT_ADDRESS_RATES, **(address_rates or {})}
+        self.lane_limits = {**DEFAULT_LANES, **(lanes or {})}
+        self.queue_timeout_s = queue_timeout_s
+        self.clock = clock
+        # (class, address[, user]) -> TokenBucket; evicting an idle one just hands back a full bucket later.
+        # A user bucket is only created once its address bucket admitted the request, so one address
+        # cannot flush other users' buckets faster than its own rate.
+        self.buckets = LRUCache(max_users)
+        self.lanes: dict[tuple, Lane] = {}
+        self.counters: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, cls:str, outcome:str):
+        with self._lock:
+            by_class = self.counters.setdefault(cls, {"admitted": 0, "limited": 0})
+            by_class[outcome] += 1
+
+    def _take(self, rates:dict, key:tuple) -> float:
+        rate, burst = rates.get(key[0], rates["default"])
+        if rate <= 0:
+            return 0.0
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(rate, burst, clock=self.clock)
+                    self.buckets.put(key, bucket)
+        return bucket.try_acquire()
+
+    def check(self, cls:str, user:str, address:str="") -> float:
+        """Charge one token to (cls, address) and to (cls, address, user): 0.0 if admitted, else the
+        seconds until both have one."""
+        wait = self._take(self.address_rates, (cls, address))
+        if not wait:
+            wait = self._take(self.rates, (cls, address, user))
+        self._count(cls, "limited" if wait else "admitted")
+        return wait
+
+    def lane(self, agent:str, cls:str) -> Lane:
+        lane = self.lanes.get((agent, cls))
+        if lane is None:
+            with self._lock:
+                lane = self.lanes.get((agent, cls))
+                if lane is None:
+                    max_inflight, max_queue = self.lane_limits.get(cls, self.lane_limits["default"])
+                    lane = self.lanes[(agent, cls)] = Lane(int(max_inflight), int(max_queue), self.queue_timeout_s)
+        return lane
+
+    def slot(self, agent:str, path:str):
+        """release() of a slot in the lane `path` uses on `agent`, or Overloaded."""
+        return self.lane(agent, classify(path)).acquire()
+
+    def admit(self):
+        """Flask before_request hook: None to proceed, or the 429 response."""
+        if request.method != "POST":
+            return None
+        cls = classify(request.path)
+        wait = self.check(cls, user_key(), request.remote_addr or "")
+        if not wait:
+            return None
+        res = jsonify({"error": "rate limited", "class": cls, "retry_after_s": round(wait, 3)})
+        res.status_code = 429
+        res.headers["Retry-After"] = retry_after(wait)
+        return res
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {cls: dict(c) for cls, c in self.counters.items()}
+            lanes = list(self.lanes.items())
+        return {"rates": {cls: {"rate": r, "burst": b} for cls, (r, b) in self.rates.items()},
+                "address_rates": {cls: {"rate": r, "burst": b} for cls, (r, b) in self.address_rates.items()},
+                "classes": counters, "buckets": len(self.buckets),
+                "lanes": {f"{agent} {cls}": lane.stats() for (agent, cls), lane in lanes}}
+
+
+def user_key() -> str:
+    """The user a request claims to be: X-User-Id, else the JSON body's user_id (or its current
+    plan's), else "anon". Unauthenticated, so it is only ever used together with the address."""
+    user = request.headers.get("X-User-Id")
+    if not user and request.is_json and (request.content_length or 0) <= USER_BODY_MAX:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            plan = body.get("current_plan")
+            user = body.get("user_id") or (plan.get("user_id") if isinstance(plan, dict) else None)
+    return str(user) if user else "anon"
+
+def shed_response(e:Overloaded):
+    res = jsonify({"error": "overloaded", "detail": str(e), "retry_after_s": e.retry_after_s})
+    res.status_code = 503
+    res.headers["Retry-After"] = retry_after(e.retry_after_s)
+    return res
+
+
+def from_env() -> Admission | None:
+    """ADMISSION=0 turns admission control off. RATE_LIMITS="chat=0.5/5,plan=5/30" (per user:
+    tokens/s / burst), ADDRESS_RATE_LIMITS (the same, per client address) and
+    AGENT_CONCURRENCY="chat=8/4" (per agent: in flight / queued) override DEFAULT_RATES /
+    DEFAULT_ADDRESS_RATES / DEFAULT_LANES per class; AGENT_QUEUE_TIMEOUT_S bounds a queued call's wait."""
+    if os.environ.get("ADMISSION", "1") == "0":
+        return None
+    return Admission(parse_limits(os.environ.get("RATE_LIMITS"), DEFAULT_RATES),
+                     parse_limits(os.environ.get("AGENT_CONCURRENCY"), DEFAULT_LANES),
+                     queue_timeout_s=float(os.environ.get("AGENT_QUEUE_TIMEOUT_S", "2")),
+                     max_users=int(os.environ.get("ADMISSION_MAX_USERS", "100000")),
+                     address_rates=parse_limits(os.environ.get("ADDRESS_RATE_LIMITS"), DEFAULT_ADDRESS_RATES))
@@ -1,19 +1,78 @@
-from flask import Flask, request, jsonify
-import requests, os
+from flask import Flask, Response, request, jsonify, stream_with_context
+import requests, os, time, json, contextvars, datetime
+from concurrent.futures import ThreadPoolExecutor, wait
 from pydantic import ValidationError
 from services.common.models import UserProfile, Goal, DayPlan, PlanMeal, PlanWorkout
-from services.common.storage import init_db
+from services.common.agent_client import get_client, snapshot_all
+from services.common.telemetry import instrument, span
+from services.common import traffic
+from services.gateway import admission
+from services.gateway.admission import Overloaded
+from services.gateway.plan_cache import CatalogVersions, PlanCache, etag, matches, plan_key
 from flask_cors import CORS
 
-DIET_URL = os.environ.get("DIET_URL", "http://127.0.0.1:8101")
-EXERCISE_URL = os.environ.get("EXERCISE_URL", "http://127.0.0.1:8102")
-MOTIVATION_URL = os.environ.get("MOTIVATION_URL", "http://127.0.0.1:8103")
+def agent_url(name:str, default:str, module:str) -> str:
+    """{NAME}_MODE=inproc runs that agent's handlers inside the gateway process (no HTTP hop);
+    the default, http, calls the agent service at {NAME}_URL."""
+    if os.environ.get(f"{name}_MODE", "http") == "inproc":
+        return f"inproc://{module}"
+    return os.environ.get(f"{name}_URL", default)
+
+DIET_URL = agent_url("DIET", "http://127.0.0.1:8101", "services.diet_agent.app")
+EXERCISE_URL = agent_url("EXERCISE", "http://127.0.0.1:8102", "services.exercise_agent.app")
+MOTIVATION_URL = agent_url("MOTIVATION", "http://127.0.0.1:8103", "services.motivation_agent.app")
 SCHEDULER_URL = os.environ.get("SCHEDULER_URL", "http://127.0.0.1:8104")
 FEEDBACK_URL = os.environ.get("FEEDBACK_URL", "http://127.0.0.1:8105")
 
+# One deadline for the whole diet/exercise fan-out in /plan/today (seconds)
+PLAN_DEADLINE_S = float(os.environ.get("PLAN_DEADLINE_S", "20"))
+# Per-route agent call policy: ((connect, read) timeout in s, retries, idempotent)
+AGENT_ROUTES = {
+    "/diet/suggest": ((2, 20), 1, True),
+    "/exercise/suggest": ((2, 20), 1, True),
+    "/diet/batch": ((2, 60), 1, True),
+    "/exercise/batch": ((2, 60), 1, True),
+    "/diet/week": ((2, 60), 1, True),
+    "/exercise/week": ((2, 60), 1, True),
+    "/diet/plans": ((2, 10), 0, False),
+    "/diet/chat": ((2, 30), 0, False),
+    "/diet/chat/stream": ((2, 30), 0, False),
+    "/schedule/commit": ((2, 10), 1, False),
+    "/schedule/cancel": ((2, 10), 1, True),
+    "/nudge/send": ((2, 5), 2, True),
+    "/feedback": ((2, 5), 1, False),
+    "/feedback/bulk": ((2, 30), 1, False),
+}
+# Longest horizon /plan/week accepts (days)
+WEEK_MAX_DAYS = int(os.environ.get("PLAN_WEEK_MAX_DAYS", "28"))
+# Users per agent round trip in /plan/batch
+BATCH_CHUNK = int(os.environ.get("PLAN_BATCH_CHUNK", "1000"))
+FANOUT = ThreadPoolExecutor(max_workers=int(os.environ.get("GATEWAY_FANOUT_WORKERS", "16")), thread_name_prefix="fanout")
+# /plan/today memoization keyed on inputs + catalog versions (see plan_cache.py); PLAN_CACHE_MAX=0 disables it
+PLAN_CACHE_MAX = int(os.environ.get("PLAN_CACHE_MAX", "10000"))
+PLAN_CACHE = PlanCache(PLAN_CACHE_MAX, float(os.environ.get("PLAN_CACHE_TTL_S", "3600"))) if PLAN_CACHE_MAX > 0 else None
+CATALOGS = CatalogVersions(lambda: {"diet": (DIET_URL, "/diet/catalog"), "exercise": (EXERCISE_URL, "/exercise/catalog")},
+                           check_s=float(os.environ.get("CATALOG_CHECK_S", "5")),
+                           on_change=lambda: PLAN_CACHE is not None and PLAN_CACHE.clear())
+PLAN_CACHE_CONTROL = "private, no-cache"  # clients may keep the plan but must revalidate (If-None-Match)
+
 app = Flask(__name__)
 CORS(app)
-init_db()
+instrument(app, "gateway")
+# TRAFFIC_RECORD=<path>|1: capture requests for scripts/loadtest replay
+TRAFFIC = traffic.from_env()
+if TRAFFIC is not None:
+    traffic.install(app, TRAFFIC)
+# per-user rate limits and per-agent concurrency lanes (see admission.py); ADMISSION=0 disables
+ADMISSION = admission.from_env()
+
+@app.before_request
+def admit():
+    return ADMISSION.admit() if ADMISSION is not None else None
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    return admission.shed_response(e)
 
 # ✅ ADD THESE HERE (BEFORE app.run)
 @app.get("/health")
@@ -24,6 +83,42 @@ def health():
 def home():
     return jsonify({"ok": True, "service": "gateway"})
 
+@app.get("/admin/agents")
+def admin_agents():
+    return jsonify({"agents": snapshot_all()})
+
+@app.get("/admin/plan-cache")
+def admin_plan_cache():
+    return jsonify({"cache": PLAN_CACHE.stats() if PLAN_CACHE is not None else None, "catalogs": CATALOGS.snapshot()})
+
+@app.get("/admin/admission")
+def admin_admission():
+    return jsonify(ADMISSION.stats() if ADMISSION is not None else {"enabled": False})
+
+
+def agent_slot(base_url:str, path:str):
+    """release() of a slot in the agent's admission lane for `path`; raises Overloaded when full."""
+    return ADMISSION.slot(base_url, path) if ADMISSION is not None else admission.noop
+
+def call_agent(base_url:str, path:str, body:dict, read_timeout:float|None=None, stream:bool=False):
+    """POST under the route's policy. Buffered calls hold an agent slot for their duration;
+    streaming callers take and release their own (the body outlives this call)."""
+    (connect_s, read_s), retries, idempotent = AGENT_ROUTES[path]
+    timeout = (connect_s, read_s if read_timeout is None else min(read_s, read_timeout))
+    release = admission.noop if stream else agent_slot(base_url, path)
+    try:
+        return get_client(base_url).post(path, json=body, timeout=timeout, retries=retries, idempotent=idempotent, stream=stream)
+    finally:
+        release()
+
+def proxy(base_url:str, path:str):
+    body = request.get_json(force=True)
+    try:
+        res = call_agent(base_url, path, body)
+    except requests.RequestException as e:
+        return jsonify({"error": "agent unavailable", "agent": base_url, "detail": type(e).__name__}), 503
+    return res.content, res.status_code, {"Content-Type": res.headers.get("Content-Type", "application/json")}
+
 @app.post("/chat")
 def chat():
     data = request.get_json(force=True)
@@ -31,7 +126,10 @@ def chat():
     if "plan" in text:
         return jsonify({"reply": "Sure, let's make today's plan. Call /plan/today with your profile & goal."})
     elif "nudge" in text or "motivate" in text:
-        res = requests.post(f"{MOTIVATION_URL}/nudge/send", json={"user_id": data.get("user_id","anon"), "tone": "coach", "goal":"stay_consistent"}).json()
+        try:
+            res = call_agent(MOTIVATION_URL, "/nudge/send", {"user_id": data.get("user_id","anon"), "tone": "coach", "goal":"stay_consistent"}).json()
+        except (requests.RequestException, Overloaded):
+            return jsonify({"reply": "Keep going — every small step counts!"})
         return jsonify({"reply": res["message"]})
     return jsonify({"reply": "Hi! I can plan meals/workouts, schedule, and log feedback. Try /plan/today."})
 
@@ -39,61 +137,258 @@ def chat():
 def plan_today():
     payload = request.get_json(force=True)
     try:
-        user_id = payload.get("user_id","anon")
-        profile = UserProfile(**payload.get("profile",{}))
-        goal = Goal(**payload.get("goal",{}))
+        with span("validate"):
+            user_id = payload.get("user_id","anon")
+            profile = UserProfile(**payload.get("profile",{}))
+            goal = Goal(**payload.get("goal",{}))
     except ValidationError as e:
         return jsonify({"error": str(e)}), 400
 
-    diet_res = requests.post(
-        f"{DIET_URL}/diet/suggest",
-        json={"user_id": user_id, "profile": profile.model_dump(), "goal": goal.model_dump()},
-        timeout=20,
-    )
-    if diet_res.status_code != 200:
-        return jsonify({"error": "diet agent failed", "detail": diet_res.text}), 502
-    diet = diet_res.json()
-
-    work_res = requests.post(
-        f"{EXERCISE_URL}/exercise/suggest",
-        json={"user_id": user_id, "profile": profile.model_dump(), "goal": goal.model_dump(), "equipment": payload.get("equipment", [])},
-        timeout=20,
-    )
-    if work_res.status_code != 200:
-        return jsonify({"error": "exercise agent failed", "detail": work_res.text}), 502
-    work = work_res.json()
-
-    plan = DayPlan(
-        user_id=user_id,
-        meals=[PlanMeal(**m) for m in diet["meals"]],
-        workouts=[PlanWorkout(**w) for w in work["workouts"]],
-    )
-    return jsonify(plan.model_dump())
+    body = {"user_id": user_id, "profile": profile.model_dump(), "goal": goal.model_dump()}
+    equipment = payload.get("equipment", [])
+    key = tag = None
+    versions = CATALOGS.current() if PLAN_CACHE is not None else None
+    if versions is not None:
+        key = plan_key(body["profile"], body["goal"], equipment, versions)
+        tag = etag(key, user_id)
+        if matches(request.headers.get("If-None-Match"), tag):
+            PLAN_CACHE.not_modified += 1
+            return "", 304, {"ETag": tag, "Cache-Control": PLAN_CACHE_CONTROL}
+        cached = PLAN_CACHE.get(key)
+        if cached is not None:
+            hit = {"ok": True, "cached": True}
+            return _plan_response({"user_id": user_id, **cached, "agents": {"diet": hit, "exercise": hit}}, tag, "hit")
+
+    calls = {
+        "diet": (DIET_URL, "/diet/suggest", body),
+        "exercise": (EXERCISE_URL, "/exercise/suggest", {**body, "equipment": equipment}),
+    }
+    results = fan_out(calls, PLAN_DEADLINE_S)
+    diet, work = results["diet"].pop("data", None), results["exercise"].pop("data", None)
+    if diet is None and work is None:
+        return _agents_failed(results)
+
+    with span("assemble"):
+        plan = DayPlan(
+            user_id=user_id,
+            meals=[PlanMeal(**m) for m in (diet or {}).get("meals", [])],
+            workouts=[PlanWorkout(**w) for w in (work or {}).get("workouts", [])],
+        ).model_dump()
+    if key is None or diet is None or work is None:  # degraded plans are neither cached nor tagged
+        return _plan_response({**plan, "agents": results}, None, "off" if key is None else "partial")
+    PLAN_CACHE.put(key, {"meals": plan["meals"], "workouts": plan["workouts"]})
+    return _plan_response({**plan, "agents": results}, tag, "miss")
+
+def _agents_failed(results:dict):
+    # both agents shed the call: tell the client when to retry instead of reporting a failure
+    waits = [r["retry_after_s"] for r in results.values() if "retry_after_s" in r]
+    if len(waits) == len(results):
+        return admission.shed_response(Overloaded("diet and exercise agents are at capacity", max(waits)))
+    return jsonify({"error": "diet and exercise agents failed", "agents": results}), 502
+
+def _plan_response(data:dict, tag:str|None, cache_status:str):
+    res = jsonify(data)
+    res.headers["X-Plan-Cache"] = cache_status
+    if tag:
+        res.headers["ETag"] = tag
+        res.headers["Cache-Control"] = PLAN_CACHE_CONTROL
+    return res
+
+
+def _post_agent(base_url:str, path:str, body:dict, deadline:float):
+    t0 = time.perf_counter()
+    try:
+        res = call_agent(base_url, path, body, read_timeout=max(deadline - time.monotonic(), 0.001))
+    except requests.RequestException as e:
+        return {"ok": False, "error": type(e).__name__, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    except Overloaded as e:
+        return {"ok": False, "error": "overloaded", "retry_after_s": e.retry_after_s, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    status = {"ok": res.status_code == 200, "status": res.status_code, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    if res.status_code != 200:
+        status["detail"] = res.text[:500]
+        return status
+    try:
+        return {**status, "data": res.json()}
+    except ValueError:
+        return {**status, "ok": False, "error": "invalid JSON from agent"}
+
+
+def fan_out(calls:dict, timeout_s:float) -> dict:
+    """POST to several agents concurrently under one deadline.
+
+    `calls` maps agent name -> (base url, path, json body). Returns agent name -> status block;
+    successful calls carry the decoded response under "data".
+    """
+    deadline = time.monotonic() + timeout_s
+    # each call runs in a copy of this request's context so it carries the trace id and spans
+    futures = {name: FANOUT.submit(contextvars.copy_context().run, _post_agent, *call, deadline) for name, call in calls.items()}
+    wait(futures.values(), timeout=timeout_s)
+    results = {}
+    for name, fut in futures.items():
+        if fut.done():
+            results[name] = fut.result()
+        else:
+            fut.cancel()
+            results[name] = {"ok": False, "error": "deadline exceeded", "ms": round(timeout_s * 1000, 1)}
+    return results
+
+
+def _batch_items():
+    # NDJSON (one {"user_id", "profile", "goal"} per line) or JSON {"items": [...]} / [...]
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        return [json.loads(line) for line in request.get_data().splitlines() if line.strip()]
+    body = request.get_json(force=True)
+    return body.get("items", []) if isinstance(body, dict) else body
+
+def _plan_chunk(offset:int, items:list):
+    lines, valid = [], []
+    for i, item in enumerate(items, start=offset):
+        try:
+            profile = UserProfile(**item.get("profile",{}))
+            goal = Goal(**item.get("goal",{}))
+        except (ValidationError, AttributeError, TypeError) as e:
+            lines.append({"index": i, "user_id": (item or {}).get("user_id") if isinstance(item, dict) else None, "error": str(e)})
+            continue
+        valid.append((i, item.get("user_id","anon"), profile.model_dump(), goal.model_dump(), item.get("equipment") or []))
+    if valid:
+        results = fan_out({
+            "diet": (DIET_URL, "/diet/batch", {"profiles": [v[2] for v in valid], "goals": [v[3] for v in valid]}),
+            "exercise": (EXERCISE_URL, "/exercise/batch", {"profiles": [v[2] for v in valid], "goals": [v[3] for v in valid],
+                                                            "equipment": [v[4] for v in valid]}),
+        }, PLAN_DEADLINE_S)
+        diets = (results["diet"].pop("data", None) or {}).get("plans") or [None] * len(valid)
+        works = (results["exercise"].pop("data", None) or {}).get("workouts") or [None] * len(valid)
+        for (i, user_id, *_), diet, work in zip(valid, diets, works):
+            if diet is None and work is None:
+                lines.append({"index": i, "user_id": user_id, "error": "diet and exercise agents failed", "agents": results})
+                continue
+            # agent output is already plan-shaped; skip re-validating it per user
+            line = {"index": i, "user_id": user_id, "meals": (diet or {}).get("meals", []), "workouts": work or []}
+            if diet is None or work is None:
+                line["agents"] = results
+            lines.append(line)
+    lines.sort(key=lambda l: l["index"])
+    return lines
+
+@app.post("/plan/batch")
+def plan_batch():
+    """Plans for many users; streams one NDJSON line per input item, in input order."""
+    try:
+        items = _batch_items()
+    except ValueError as e:
+        return jsonify({"error": f"invalid batch body: {e}"}), 400
+
+    def generate():
+        for offset in range(0, len(items), BATCH_CHUNK):
+            chunk = _plan_chunk(offset, items[offset:offset + BATCH_CHUNK])
+            yield "".join(json.dumps(line) + "\n" for line in chunk)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def _week_days(payload:dict) -> tuple[datetime.date, list, list]:
+    """Per-day {"profile", "goal", "equipment"} inputs: the base inputs with that day's override
+    (keyed by ISO date or day index) merged on top, each validated like /plan/today."""
+    start = datetime.date.fromisoformat(payload["start"]) if payload.get("start") else datetime.date.today()
+    n = int(payload.get("days", 7))
+    if not 1 <= n <= WEEK_MAX_DAYS:
+        raise ValueError(f"days must be between 1 and {WEEK_MAX_DAYS}")
+    dates = [(start + datetime.timedelta(days=d)).isoformat() for d in range(n)]
+    overrides = {}
+    for k, v in (payload.get("overrides") or {}).items():
+        d = int(k) if str(k).isdigit() else (datetime.date.fromisoformat(k) - start).days
+        if not 0 <= d < n:
+            raise ValueError(f"override {k!r} is outside the {n}-day horizon")
+        overrides[d] = v or {}
+    days = []
+    for d in range(n):
+        o = overrides.get(d, {})
+        profile = UserProfile(**{**payload.get("profile", {}), **(o.get("profile") or {})})
+        goal = Goal(**{**payload.get("goal", {}), **(o.get("goal") or {})})
+        days.append({"profile": profile.model_dump(), "goal": goal.model_dump(),
+                     "equipment": o.get("equipment", payload.get("equipment")) or []})
+    return start, dates, days
+
+@app.post("/plan/week")
+def plan_week():
+    """Plans for a horizon of days; the agents only recompute days whose inputs (or whose previous
+    day's plan, for variety) changed since they last saw them."""
+    payload = request.get_json(force=True)
+    try:
+        with span("validate"):
+            start, dates, days = _week_days(payload)
+    except (ValidationError, ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = fan_out({
+        "diet": (DIET_URL, "/diet/week", {"days": [{"profile": d["profile"], "goal": d["goal"]} for d in days]}),
+        "exercise": (EXERCISE_URL, "/exercise/week", {"days": days}),
+    }, PLAN_DEADLINE_S)
+    diet, work = results["diet"].pop("data", None), results["exercise"].pop("data", None)
+    if diet is None and work is None:
+        return _agents_failed(results)
+    for name, data in (("diet", diet), ("exercise", work)):
+        if data is not None:
+            results[name]["computed"] = data.get("computed")
+    plans = (diet or {}).get("plans") or [None] * len(days)
+    works = (work or {}).get("workouts") or [None] * len(days)
+    # agent output is already plan-shaped; skip re-validating it per day
+    return jsonify({"user_id": payload.get("user_id", "anon"), "start": start.isoformat(),
+                    "days": [{"date": date, "meals": (p or {}).get("meals", []), "workouts": w or []}
+                             for date, p, w in zip(dates, plans, works)],
+                    "agents": results})
+
 
+@app.post("/diet/plans")
+def diet_plans():
+    return proxy(DIET_URL, "/diet/plans")
 
 @app.post("/diet/chat")
 def diet_chat():
+    return proxy(DIET_URL, "/diet/chat")
+
+@app.post("/diet/chat/stream")
+def diet_chat_stream():
+    """NDJSON chat events from the diet agent, relayed chunk by chunk without buffering."""
     body = request.get_json(force=True)
-    res = requests.post(f"{DIET_URL}/diet/chat", json=body, timeout=30)
-    return jsonify(res.json()), res.status_code
+    release = agent_slot(DIET_URL, "/diet/chat/stream")   # held until the relayed stream is closed
+    try:
+        res = call_agent(DIET_URL, "/diet/chat/stream", body, stream=True)
+    except requests.RequestException as e:
+        release()
+        return jsonify({"error": "agent unavailable", "agent": DIET_URL, "detail": type(e).__name__}), 503
+
+    def relay():
+        try:
+            yield from res.iter_content(chunk_size=None)
+        finally:
+            res.close()
+
+    out = Response(stream_with_context(relay()), status=res.status_code,
+                   content_type=res.headers.get("Content-Type", "application/x-ndjson"),
+                   headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    out.call_on_close(release)
+    return out
 
 @app.post("/schedule/commit")
 def schedule_commit():
-    body = request.get_json(force=True)
-    res = requests.post(f"{SCHEDULER_URL}/schedule/commit", json=body)
-    return jsonify(res.json()), res.status_code
+    return proxy(SCHEDULER_URL, "/schedule/commit")
+
+@app.post("/schedule/cancel")
+def schedule_cancel():
+    return proxy(SCHEDULER_URL, "/schedule/cancel")
 
 @app.post("/nudge/send")
 def nudge_send():
-    body = request.get_json(force=True)
-    res = requests.post(f"{MOTIVATION_URL}/nudge/send", json=body)
-    return jsonify(res.json()), res.status_code
+    return proxy(MOTIVATION_URL, "/nudge/send")
 
 @app.post("/feedback")
 def feedback():
-    body = request.get_json(force=True)
-    res = requests.post(f"{FEEDBACK_URL}/feedback", json=body)
-    return jsonify(res.json()), res.status_code
+    return proxy(FEEDBACK_URL, "/feedback")
+
+@app.post("/feedback/bulk")
+def feedback_bulk():
+    return proxy(FEEDBACK_URL, "/feedback/bulk")
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8000, debug=True)
@@ -0,0 +1,94 @@
+"""Memoized /plan/today results and their ETags.
+
+The diet and exercise suggestions are a pure function of the validated profile, goal and equipment
+and of the agents' catalogs, so the plan cache is keyed on a canonical hash of exactly those (the
+user id is not an input to either agent and is added back per response). Catalog versions are read
+from GET /diet/catalog and /exercise/catalog at most every CATALOG_CHECK_S seconds; a changed
+version clears the cache. While a version cannot be read, plans are neither cached nor tagged.
+"""
+import hashlib, json, threading, time
+import requests
+from services.common.agent_client import get_client
+from services.common.cache import LRUCache
+
+CATALOG_TIMEOUT = (1, 2)
+
+
+class CatalogVersions:
+    """Current catalog version per agent, refreshed lazily (one request thread refreshes; others
+    keep using the last known versions meanwhile)."""
+
+    def __init__(self, agents, check_s:float=5.0, on_change=None, clock=time.monotonic):
+        self.agents = agents          # () -> {name: (base url, catalog path)}; read per check so URL changes apply
+        self.seen_agents = None
+        self.check_s = check_s
+        self.on_change = on_change
+        self.clock = clock
+        self.versions: tuple | None = None
+        self.checked_at = float("-inf")
+        self.changes = 0
+        self._refreshing = threading.Lock()
+
+    def current(self) -> tuple | None:
+        agents = self.agents()
+        if agents != self.seen_agents:   # other agent instances: their catalogs may differ, check now
+            with self._refreshing:
+                self.refresh(agents)
+        elif self.clock() - self.checked_at >= self.check_s and self._refreshing.acquire(blocking=False):
+            try:
+                self.refresh(agents)
+            finally:
+                self._refreshing.release()
+        return self.versions
+
+    def refresh(self, agents:dict):
+        self.seen_agents = agents
+        versions = []
+        try:
+            for name, (base_url, path) in agents.items():
+                res = get_client(base_url).get(path, timeout=CATALOG_TIMEOUT)
+                res.raise_for_status()
+                versions.append((name, str(res.json()["version"])))
+        except (requests.RequestException, ValueError, KeyError):
+            self.versions = None   # unknown: don't serve or store cached plans
+        else:
+            new = tuple(versions)
+            if self.versions is not None and new != self.versions:
+                self.changes += 1
+                if self.on_change:
+                    self.on_change()
+            self.versions = new
+        self.checked_at = self.clock()
+
+    def snapshot(self) -> dict:
+        return {"versions": dict(self.versions) if self.versions else None, "changes": self.changes}
+
+
+def plan_key(profile:dict, goal:dict, equipment, versions:tuple) -> str:
+    """Canonical hash of the plan inputs (validated model dumps) and catalog versions."""
+    equipment = sorted({str(e) for e in equipment}) if isinstance(equipment, list) else []
+    canonical = json.dumps([profile, goal, equipment, versions], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def etag(key:str, user_id:str) -> str:
+    # weak: the plan is the same, the per-response "agents" block is not
+    return 'W/"%s"' % hashlib.sha256(f"{key}:{user_id}".encode()).hexdigest()[:32]
+
+def matches(if_none_match:str|None, tag:str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = tag[2:]
+    return any(t.strip().removeprefix("W/") == bare for t in if_none_match.split(","))
+
+
+class PlanCache(LRUCache):
+    """LRUCache of plan key -> {"meals", "workouts"} (already validated dumps)."""
+
+    def __init__(self, max_entries:int=10_000, ttl_s:float|None=3600.0):
+        super().__init__(max_entries, ttl_s)
+        self.not_modified = 0
+
+    def stats(self) -> dict:
+        return {**super().stats(), "ttl_s": self.ttl_s, "not_modified": self.not_modified}
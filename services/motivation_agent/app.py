@@ -1,6 +1,23 @@
 from flask import Flask, request, jsonify
+import math, os
+from pathlib import Path
+import requests
+from services.common.agent_client import get_client
+from services.common.inproc import respond
+from services.common.telemetry import instrument
+from services.motivation_agent.campaign import Campaign, make_sink
+
+FEEDBACK_URL = os.environ.get("FEEDBACK_URL", "http://127.0.0.1:8105")
+# "file:<path>" (JSON lines, stand-in for a push provider) or "memory"
+CAMPAIGN_SINK = os.environ.get("CAMPAIGN_SINK") or f"file:{Path(__file__).resolve().parents[2] / 'storage' / 'campaign_outbox.jsonl'}"
+CAMPAIGN_RATE_PER_S = float(os.environ.get("CAMPAIGN_RATE_PER_S", "200"))
+CAMPAIGN_WORKERS = int(os.environ.get("CAMPAIGN_WORKERS", "4"))
+CAMPAIGN_BATCH = int(os.environ.get("CAMPAIGN_BATCH", "100"))
+CAMPAIGN_QUEUE_MAX = int(os.environ.get("CAMPAIGN_QUEUE_MAX", "16"))
+CAMPAIGN_EPSILON = 0.2
 
 app = Flask(__name__)
+instrument(app, "motivation_agent")
 
 TONES = {
     "coach": [
@@ -15,12 +32,120 @@ TONES = {
     ]
 }
 
+# Handlers return (payload, status); HTTP routes and in-process callers (MOTIVATION_MODE=inproc) share them
+def handle_send(body):
+    tone = body.get("tone","coach")
+    msg = TONES.get(tone, TONES["coach"])[0]
+    return {"message": msg, "tone": tone}, 200
+
+def handle_batch(body):
+    # Expect: { nudges: [ {user_id, tone?, event_id?, name?, type?, scheduled_at?} ] } (e.g. scheduler reminders)
+    out = []
+    for n in body.get("nudges", []):
+        tone = n.get("tone") or "coach"
+        msg = TONES.get(tone, TONES["coach"])[0]
+        if n.get("name"):
+            msg = f"Coming up: {n['name']}. {msg}"
+        out.append({"user_id": n.get("user_id", "anon"), "event_id": n.get("event_id"), "message": msg, "tone": tone})
+    return {"messages": out, "count": len(out)}, 200
+
+HANDLERS = {"/nudge/send": handle_send, "/nudge/batch": handle_batch}
+
 @app.post("/nudge/send")
 def nudge():
+    return respond(handle_send(request.get_json(force=True)))
+
+@app.post("/nudge/batch")
+def nudge_batch():
+    return respond(handle_batch(request.get_json(force=True)))
+
+# ---- campaigns ----
+CAMPAIGNS: dict[str, Campaign] = {}
+_sink = None
+
+def campaign_sink():
+    global _sink
+    if _sink is None:
+        _sink = make_sink(CAMPAIGN_SINK)
+    return _sink
+
+def arm_stats() -> dict|None:
+    # one read of the tone bandit per campaign; tones fall back to the first arm if it is down
+    try:
+        res = get_client(FEEDBACK_URL).get("/bandit/stats", timeout=(1, 3))
+        res.raise_for_status()
+        return res.json().get("arms")
+    except (requests.RequestException, ValueError):
+        return None
+
+def report_pulls(campaign:Campaign):
+    if campaign.sent_by_tone:
+        try:
+            get_client(FEEDBACK_URL).post("/bandit/pulls", json={"counts": campaign.sent_by_tone}, timeout=(1, 5), retries=1)
+        except requests.RequestException:
+            pass
+
+def _cohort(body:dict) -> list[dict]:
+    users = body.get("users") or [{"user_id": u} for u in body.get("user_ids", [])]
+    return [u if isinstance(u, dict) else {"user_id": str(u)} for u in users if u]
+
+def _rate(body:dict) -> float|None:
+    # None unless a positive number of sends per second (a rate <= 0 would mean unlimited)
+    value = body.get("rate_per_s")
+    if value is None:
+        return CAMPAIGN_RATE_PER_S
+    try:
+        rate = float(value) if not isinstance(value, bool) else math.nan
+    except (TypeError, ValueError):
+        return None
+    return rate if math.isfinite(rate) and rate > 0 else None
+
+@app.post("/campaigns")
+def start_campaign():
+    # Expect: { name?, user_ids: [...] } or { users: [{user_id, name?, tone?}] }, rate_per_s?
     body = request.get_json(force=True)
-    tone = body.get("tone","coach")
-    msg = TONES.get(tone, TONES["coach"])[0]
-    return jsonify({"message": msg, "tone": tone})
+    users = _cohort(body)
+    if not users or any(not u.get("user_id") for u in users):
+        return jsonify({"ok": False, "error": "users/user_ids must be a non-empty list of user ids"}), 400
+    rate = _rate(body)
+    if rate is None:
+        return jsonify({"ok": False, "error": "rate_per_s must be a positive number"}), 400
+    campaign = Campaign(
+        users, TONES, campaign_sink(),
+        name=body.get("name", ""),
+        arm_stats=arm_stats(),
+        epsilon=CAMPAIGN_EPSILON,
+        rate_per_s=rate,
+        workers=CAMPAIGN_WORKERS,
+        batch_size=CAMPAIGN_BATCH,
+        queue_max=CAMPAIGN_QUEUE_MAX,
+        on_done=report_pulls,
+    )
+    CAMPAIGNS[campaign.id] = campaign.start()
+    return jsonify({"ok": True, **campaign.progress()}), 202
+
+@app.get("/campaigns")
+def list_campaigns():
+    return jsonify({"campaigns": [c.progress() for c in CAMPAIGNS.values()]})
+
+@app.get("/campaigns/<cid>")
+def campaign_progress(cid):
+    campaign = CAMPAIGNS.get(cid)
+    if campaign is None:
+        return jsonify({"error": "unknown campaign"}), 404
+    return jsonify(campaign.progress())
+
+@app.post("/campaigns/<cid>/cancel")
+def cancel_campaign(cid):
+    campaign = CAMPAIGNS.get(cid)
+    if campaign is None:
+        return jsonify({"error": "unknown campaign"}), 404
+    campaign.cancel()
+    return jsonify({"ok": True, **campaign.progress()})
+
+@app.get("/health")
+def health():
+    return jsonify({"ok": True, "service": "motivation_agent"})
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8103, debug=True)
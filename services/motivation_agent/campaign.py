@@ -0,0 +1,197 @@
+"""Bulk nudge campaigns: build one message per user of a cohort and deliver them to a sink.
+
+A producer builds messages in batches into a bounded queue (it blocks when the queue is full,
+so memory stays flat however large the cohort); a small worker pool drains the queue through
+a shared token bucket into the sink.
+"""
+import itertools, json, queue, threading, time, uuid, zlib
+from pathlib import Path
+from services.common.ratelimit import TokenBucket
+
+_DONE = object()
+
+# ---- sinks: send(messages) delivers a batch or raises ----
+class MemorySink:
+    def __init__(self):
+        self.messages: list[dict] = []
+        self._lock = threading.Lock()
+
+    def send(self, messages:list[dict]):
+        with self._lock:
+            self.messages.extend(messages)
+
+class FileSink:
+    """Appends one JSON line per message (a local stand-in for a push provider)."""
+
+    def __init__(self, path:Path|str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def send(self, messages:list[dict]):
+        lines = "".join(json.dumps(m, ensure_ascii=False) + "\n" for m in messages)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+def make_sink(spec:str):
+    """'memory' or 'file:<path>'."""
+    kind, _, arg = spec.partition(":")
+    if kind == "memory":
+        return MemorySink()
+    if kind == "file" and arg:
+        return FileSink(arg)
+    raise ValueError(f"unknown sink {spec!r}")
+
+# ---- tone choice ----
+def _unit(*parts) -> float:
+    return zlib.crc32(":".join(map(str, parts)).encode()) / 2**32
+
+def choose_tones(user_ids:list[str], arms:list[str], arm_stats:dict|None, epsilon:float, seed:str="") -> list[str]:
+    """Epsilon-greedy over the bandit's arm means, one decision per user.
+    Decisions hash (seed, user_id), so re-running a campaign gives each user the same tone."""
+    stats = arm_stats or {}
+    means = {a: (stats[a]["reward_sum"] / stats[a]["pulls"]) if stats.get(a, {}).get("pulls") else 0.0 for a in arms}
+    best = max(arms, key=lambda a: means[a])  # first arm wins ties, like BanditEngine.choose
+    out = []
+    for uid in user_ids:
+        if _unit(seed, uid) < epsilon:
+            out.append(arms[int(_unit(seed, uid, "arm") * len(arms))])
+        else:
+            out.append(best)
+    return out
+
+
+class Campaign:
+    def __init__(self, users:list[dict], tones:dict[str, list[str]], sink, *, name:str="", arm_stats:dict|None=None,
+                 epsilon:float=0.2, rate_per_s:float=200.0, workers:int=4, batch_size:int=100, queue_max:int=16,
+                 on_done=None, clock=time.monotonic):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name or self.id
+        self.users = users
+        self.tones = tones
+        self.sink = sink
+        self.arm_stats = arm_stats
+        self.epsilon = epsilon
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.bucket = TokenBucket(rate_per_s, burst=self.batch_size, clock=clock)  # one batch at a time, no bursts
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, queue_max))
+        self.on_done = on_done
+        self.clock = clock
+        self.status = "queued"
+        self.built = self.sent = self.failed = 0
+        self.backpressure_waits = 0
+        self.sent_by_tone: dict[str, int] = {}
+        self.last_error: str | None = None
+        self.started_at = self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # ---- lifecycle ----
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"campaign-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout:float|None=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run(self):
+        self.status, self.started_at = "running", self.clock()
+        workers = [threading.Thread(target=self._deliver, daemon=True) for _ in range(self.workers)]
+        for w in workers:
+            w.start()
+        try:
+            self._produce()
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            for _ in workers:
+                self.queue.put(_DONE)
+            for w in workers:
+                w.join()
+        self.finished_at = self.clock()
+        self.status = "cancelled" if self._cancel.is_set() else ("failed" if self.last_error and not self.sent else "done")
+        if self.on_done:
+            self.on_done(self)
+
+    def _produce(self):
+        it = iter(self.users)
+        while not self._cancel.is_set():
+            chunk = list(itertools.islice(it, self.batch_size))
+            if not chunk:
+                return
+            batch = self._build(chunk)
+            self.built += len(batch)
+            try:
+                self.queue.put_nowait(batch)
+            except queue.Full:
+                self.backpressure_waits += 1  # workers are behind; wait instead of buffering more
+                while not self._cancel.is_set():
+                    try:
+                        self.queue.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+
+    def _build(self, users:list[dict]) -> list[dict]:
+        ids = [u["user_id"] for u in users]
+        arms = list(self.tones)
+        chosen = choose_tones(ids, arms, self.arm_stats, self.epsilon, seed=self.id)
+        out = []
+        for u, tone in zip(users, chosen):
+            tone = u.get("tone") if u.get("tone") in self.tones else tone
+            options = self.tones[tone]
+            msg = options[int(_unit(self.id, u["user_id"], "msg") * len(options))]
+            if u.get("name"):
+                msg = f"{u['name']}, {msg[0].lower()}{msg[1:]}"
+            out.append({"campaign_id": self.id, "user_id": u["user_id"], "tone": tone, "bandit_arm": tone, "message": msg})
+        return out
+
+    def _deliver(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _DONE:
+                return
+            if self._cancel.is_set():
+                continue  # drain without sending
+            self.bucket.acquire(len(batch))
+            try:
+                self.sink.send(batch)
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(batch)
+                    self.last_error = str(e)
+                continue
+            with self._lock:
+                self.sent += len(batch)
+                for m in batch:
+                    self.sent_by_tone[m["tone"]] = self.sent_by_tone.get(m["tone"], 0) + 1
+
+    # ---- progress ----
+    def progress(self) -> dict:
+        end = self.finished_at if self.finished_at is not None else self.clock()
+        elapsed = (end - self.started_at) if self.started_at is not None else 0.0
+        with self._lock:
+            sent, failed, by_tone = self.sent, self.failed, dict(self.sent_by_tone)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "total": len(self.users),
+            "built": self.built,
+            "sent": sent,
+            "failed": failed,
+            "queued_batches": self.queue.qsize(),
+            "backpressure_waits": self.backpressure_waits,
+            "sent_by_tone": by_tone,
+            "rate_per_s": self.bucket.rate,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(sent / elapsed, 1) if elapsed > 0 else 0.0,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,297 @@
+"""Production launcher: runs every service under a multi-worker WSGI server and supervises it.
+
+    python -m services.run                       # all services, default workers/threads
+    python -m services.run --only diet,gateway --workers 4 --threads 8
+    DIET_WORKERS=6 GATEWAY_THREADS=16 python -m services.run
+
+Servers: gunicorn (POSIX; `workers` processes x `threads` threads, crashed workers are replaced
+by its master) or waitress (any OS, including Windows; one process with `threads` threads).
+The supervisor applies schema migrations first (services.common.migrate), waits for each service's
+/health, restarts services whose process exits, prints a per-service resource summary, and on
+Ctrl+C / SIGTERM stops everything gracefully.
+"""
+import argparse, os, signal, subprocess, sys, time
+from pathlib import Path
+import requests
+
+try:
+    import psutil
+except ImportError:  # optional; /proc is used on Linux without it
+    psutil = None
+
+ROOT = Path(__file__).resolve().parents[1]
+CPUS = os.cpu_count() or 2
+
+class Service:
+    def __init__(self, name:str, target:str, port:int, workers:int=1, threads:int=4):
+        self.name = name
+        self.target = target          # "module:app"
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.proc: subprocess.Popen | None = None
+        self.server = None
+        self.status = "stopped"
+        self.restarts = 0
+        self.recent_exits: list[float] = []
+        self.next_start = 0.0
+
+    def url(self, host:str) -> str:
+        return f"http://{host}:{self.port}"
+
+# Start order: agents, then the gateway. The scheduler (reminder engine) and motivation agent
+# (campaign progress) keep per-process state, so they default to one worker.
+SERVICES = [
+    Service("diet", "services.diet_agent.app:app", 8101, workers=min(CPUS, 4), threads=8),
+    Service("exercise", "services.exercise_agent.app:app", 8102, workers=2, threads=8),
+    Service("motivation", "services.motivation_agent.app:app", 8103, workers=1, threads=8),
+    Service("scheduler", "services.scheduler_agent.app:app", 8104, workers=1, threads=8),
+    Service("feedback", "services.feedback_agent.app:app", 8105, workers=2, threads=8),
+    Service("gateway", "services.gateway.app:app", 8000, workers=min(CPUS, 4), threads=16),
+]
+
+def have_gunicorn() -> bool:
+    if os.name != "posix":
+        return False
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def command(svc:Service, server:str, host:str, graceful_s:float) -> list[str]:
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "--workers", str(svc.workers), "--threads", str(svc.threads),
+                "--bind", f"{host}:{svc.port}", "--graceful-timeout", str(int(graceful_s)), "--timeout", "60",
+                "--log-level", "warning", svc.target]
+    return [sys.executable, "-m", "waitress", f"--host={host}", f"--port={svc.port}", f"--threads={svc.threads}", svc.target]
+
+# ---- resource usage ----
+def _proc_tree_linux(pid:int) -> list[int]:
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree
+
+def resources(pid:int) -> dict | None:
+    """RSS (MB), CPU seconds and process count for `pid` and its descendants (gunicorn workers)."""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root, *root.children(recursive=True)]
+            rss = sum(p.memory_info().rss for p in procs)
+            cpu = sum(sum(p.cpu_times()[:2]) for p in procs)
+            return {"rss_mb": rss / 2**20, "cpu_s": cpu, "procs": len(procs)}
+        except psutil.Error:
+            return None
+    if not os.path.isdir("/proc"):
+        return None
+    rss = cpu = 0.0
+    tick = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    tree = _proc_tree_linux(pid)
+    for p in tree:
+        try:
+            with open(f"/proc/{p}/stat", encoding="utf-8") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / tick
+            rss += int(fields[21]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+    return {"rss_mb": rss / 2**20, "cpu_s": cpu, "procs": len(tree)}
+
+
+class Supervisor:
+    def __init__(self, services:list[Service], host:str="127.0.0.1", server:str="auto", ready_timeout_s:float=30.0,
+                 graceful_s:float=20.0, max_restarts:int=5, restart_window_s:float=60.0, log=print):
+        self.services = services
+        self.host = host
+        self.server = ("gunicorn" if have_gunicorn() else "waitress") if server == "auto" else server
+        self.ready_timeout_s = ready_timeout_s
+        self.graceful_s = graceful_s
+        self.max_restarts = max_restarts
+        self.restart_window_s = restart_window_s
+        self.log = log
+        self.stopping = False
+
+    def env(self) -> dict:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+        for svc in self.services:  # let the gateway and agents find each other on the chosen ports/host
+            env.setdefault(f"{svc.name.upper()}_URL", svc.url(self.host))
+        env.setdefault("HC_AUTO_MIGRATE", "0")  # migrate() below owns the schema; workers only check it
+        return env
+
+    def migrate(self) -> bool:
+        """Apply schema migrations once, before any worker starts."""
+        res = subprocess.run([sys.executable, "-m", "services.common.migrate"], cwd=ROOT, env=self.env(),
+                             capture_output=True, text=True)
+        self.log(f"[run] migrate: {(res.stdout if res.returncode == 0 else res.stderr).strip()}")
+        return res.returncode == 0
+
+    def spawn(self, svc:Service):
+        svc.server = self.server
+        if self.server == "waitress" and svc.workers > 1:
+            self.log(f"[run] {svc.name}: waitress runs one process; workers={svc.workers} ignored (threads={svc.threads})")
+            svc.workers = 1
+        svc.proc = subprocess.Popen(command(svc, self.server, self.host, self.graceful_s), cwd=ROOT, env=self.env(),
+                                    start_new_session=(os.name == "posix"))
+        svc.status = "starting"
+
+    def wait_ready(self, svc:Service) -> bool:
+        deadline = time.monotonic() + self.ready_timeout_s
+        while time.monotonic() < deadline:
+            if svc.proc.poll() is not None:
+                return False
+            try:
+                if requests.get(f"{svc.url(self.host)}/health", timeout=1).status_code == 200:
+                    svc.status = "ready"
+                    return True
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        return False
+
+    def start(self) -> bool:
+        if not self.migrate():
+            return False
+        for svc in self.services:
+            self.spawn(svc)
+            if not self.wait_ready(svc):
+                self.log(f"[run] {svc.name} did not become ready on {svc.url(self.host)}/health")
+                return False
+            self.log(f"[run] {svc.name:10} ready  {svc.url(self.host)}  ({self.server}, {svc.workers}w x {svc.threads}t)")
+        return True
+
+    def check(self):
+        """Restart services whose process exited (with backoff; gives up after max_restarts per window)."""
+        now = time.monotonic()
+        for svc in self.services:
+            if self.stopping or svc.proc is None or svc.status == "failed":
+                continue
+            if svc.status == "restarting":
+                if now >= svc.next_start:
+                    self.spawn(svc)
+                    svc.restarts += 1
+                    ok = self.wait_ready(svc)
+                    svc.status = "ready" if ok else "restarting"
+                    self.log(f"[run] {svc.name} restarted ({'ready' if ok else 'not ready'})")
+                continue
+            code = svc.proc.poll()
+            if code is None:
+                continue
+            if os.name == "posix":  # reap workers orphaned by a crashed gunicorn master before rebinding the port
+                try:
+                    os.killpg(svc.proc.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+            svc.recent_exits = [t for t in svc.recent_exits if now - t < self.restart_window_s] + [now]
+            if len(svc.recent_exits) > self.max_restarts:
+                svc.status = "failed"
+                self.log(f"[run] {svc.name} exited (code {code}) {len(svc.recent_exits)} times in "
+                         f"{self.restart_window_s:.0f}s; not restarting")
+                continue
+            svc.status = "restarting"
+            svc.next_start = now + min(2 ** (len(svc.recent_exits) - 1) * 0.5, 30)
+            self.log(f"[run] {svc.name} exited (code {code}); restarting")
+
+    def stop(self):
+        """SIGTERM everything (gunicorn drains in-flight requests), then kill what is left after graceful_s."""
+        self.stopping = True
+        running = [s for s in reversed(self.services) if s.proc and s.proc.poll() is None]
+        for svc in running:
+            svc.proc.terminate()
+        deadline = time.monotonic() + self.graceful_s
+        for svc in running:
+            try:
+                svc.proc.wait(max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                svc.proc.kill()
+                svc.proc.wait()
+            svc.status = "stopped"
+
+    def summary(self) -> list[dict]:
+        rows = []
+        for svc in self.services:
+            alive = svc.proc is not None and svc.proc.poll() is None
+            res = resources(svc.proc.pid) if alive else None
+            rows.append({"service": svc.name, "status": svc.status, "pid": svc.proc.pid if svc.proc else None,
+                         "url": svc.url(self.host), "workers": svc.workers, "threads": svc.threads,
+                         "restarts": svc.restarts, **(res or {})})
+        return rows
+
+    def print_summary(self):
+        self.log(f"{'service':11}{'status':11}{'pid':>8}{'procs':>6}{'w x t':>8}{'rss MB':>9}{'cpu s':>8}{'restarts':>9}")
+        for r in self.summary():
+            rss = f"{r['rss_mb']:.0f}" if "rss_mb" in r else "n/a"
+            cpu = f"{r['cpu_s']:.1f}" if "cpu_s" in r else "n/a"
+            self.log(f"{r['service']:11}{r['status']:11}{r['pid'] or '-':>8}{r.get('procs', '-'):>6}"
+                     f"{str(r['workers']) + 'x' + str(r['threads']):>8}{rss:>9}{cpu:>8}{r['restarts']:>9}")
+
+    def run(self, summary_every_s:float=60.0) -> int:
+        def on_signal(signum, frame):
+            raise KeyboardInterrupt
+        signal.signal(signal.SIGTERM, on_signal)
+        try:
+            if not self.start():
+                return 1
+            self.print_summary()
+            last = time.monotonic()
+            while True:
+                time.sleep(0.5)
+                self.check()
+                if summary_every_s and time.monotonic() - last >= summary_every_s:
+                    self.print_summary()
+                    last = time.monotonic()
+        except KeyboardInterrupt:
+            self.log("[run] shutting down")
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):  # a second Ctrl+C must not cut the graceful stop short
+                signal.signal(sig, signal.SIG_IGN)
+            self.stop()
+            self.print_summary()
+        return 0
+
+
+def configured(only:str|None=None, workers:int|None=None, threads:int|None=None) -> list[Service]:
+    """SERVICES filtered by `only`, with --workers/--threads and <NAME>_WORKERS / <NAME>_THREADS applied."""
+    names = {n.strip() for n in only.split(",")} if only else None
+    out = []
+    for base in SERVICES:
+        if names and base.name not in names:
+            continue
+        svc = Service(base.name, base.target, base.port, base.workers, base.threads)
+        svc.workers = int(os.environ.get(f"{svc.name.upper()}_WORKERS") or workers or svc.workers)
+        svc.threads = int(os.environ.get(f"{svc.name.upper()}_THREADS") or threads or svc.threads)
+        svc.port = int(os.environ.get(f"{svc.name.upper()}_PORT") or svc.port)
+        out.append(svc)
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Run all health-coach services under a WSGI server.")
+    ap.add_argument("--only", help="comma-separated subset, e.g. diet,exercise,gateway")
+    ap.add_argument("--workers", type=int, help="processes per service (gunicorn); default per service")
+    ap.add_argument("--threads", type=int, help="threads per worker; default per service")
+    ap.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default="auto")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--ready-timeout", type=float, default=30.0)
+    ap.add_argument("--graceful-timeout", type=float, default=20.0)
+    ap.add_argument("--summary-every", type=float, default=60.0, help="seconds between resource summaries (0: off)")
+    args = ap.parse_args(argv)
+    sup = Supervisor(configured(args.only, args.workers, args.threads), host=args.host, server=args.server,
+                     ready_timeout_s=args.ready_timeout, graceful_s=args.graceful_timeout)
+    return sup.run(args.summary_every)
+
+if __name__ == "__main__":
+    sys.exit(main())
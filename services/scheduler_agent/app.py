@@ -1,30 +1,84 @@
 from flask import Flask, request, jsonify
-from datetime import datetime, timedelta
-import uuid
+import atexit, os
+from services.common.agent_client import get_client
+from services.common.telemetry import instrument
+from services.scheduler_agent.reminders import ReminderEngine
+from services.scheduler_agent.store import InvalidEvent, commit_events, delete_event, event_time, list_events, DEFAULT_LIMIT
+
+MOTIVATION_URL = os.environ.get("MOTIVATION_URL", "http://127.0.0.1:8103")
 
 app = Flask(__name__)
+instrument(app, "scheduler_agent")
+
+# Events persist in the shared SQLite store (replace with Google Calendar later)
 
-# In-memory schedule (replace with Google Calendar later)
-SCHEDULE = {}
+def send_reminders(reminders:list[dict]):
+    res = get_client(MOTIVATION_URL).post("/nudge/batch", json={"nudges": reminders}, timeout=(2, 10), retries=1)
+    res.raise_for_status()
+
+# Fires a nudge per event at scheduled_at - REMINDER_LEAD_MIN
+REMINDERS = ReminderEngine(
+    send_reminders,
+    tick_s=float(os.environ.get("REMINDER_TICK_S", "1.0")),
+    lead_s=60 * float(os.environ.get("REMINDER_LEAD_MIN", "0")),
+    batch_size=int(os.environ.get("REMINDER_BATCH_SIZE", "500")),
+)
+if os.environ.get("REMINDERS_ENABLED", "1") == "1":
+    REMINDERS.start()
+    atexit.register(REMINDERS.stop)
 
 @app.post("/schedule/commit")
 def commit():
     body = request.get_json(force=True)
-    # Expect: { user_id, events: [ {type, name, scheduled_at, duration_min} ] }
+    # Expect: { user_id, events: [ {type, name, scheduled_at, duration_min} ], on_conflict?: allow|reject|skip }
     user_id = body.get("user_id","anon")
     events = body.get("events", [])
-    saved = []
-    for e in events:
-        eid = str(uuid.uuid4())
-        item = {"id": eid, **e}
-        SCHEDULE.setdefault(user_id, []).append(item)
-        saved.append(item)
-    return jsonify({"ok": True, "events": saved})
+    on_conflict = body.get("on_conflict", "allow")
+    if on_conflict not in ("allow", "reject", "skip"):
+        return jsonify({"ok": False, "error": "on_conflict must be allow, reject or skip"}), 400
+    try:
+        saved, conflicts = commit_events(user_id, events, on_conflict=on_conflict)
+    except InvalidEvent as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if conflicts and on_conflict == "reject":
+        return jsonify({"ok": False, "events": [], "conflicts": conflicts}), 409
+    for e in saved:
+        REMINDERS.schedule(e["id"], user_id, event_time(e), name=e.get("name") or e.get("title"), type=e.get("type"))
+    return jsonify({"ok": True, "events": saved, "conflicts": conflicts})
+
+@app.post("/schedule/cancel")
+def cancel():
+    body = request.get_json(force=True)
+    # Expect: { user_id, event_id }
+    user_id, event_id = body.get("user_id","anon"), body.get("event_id","")
+    removed = delete_event(user_id, event_id)
+    if removed:
+        REMINDERS.cancel(event_id)
+    return jsonify({"ok": removed}), (200 if removed else 404)
 
 @app.get("/schedule/list")
-def list_events():
+def list_route():
+    # Optional: from / to (ISO, [from, to)), limit, cursor (from a previous page's next_cursor)
     user_id = (request.args.get("user_id") or "anon")
-    return jsonify({"events": SCHEDULE.get(user_id,[])})
+    try:
+        events, next_cursor = list_events(
+            user_id,
+            start=request.args.get("from"),
+            end=request.args.get("to"),
+            limit=int(request.args.get("limit", DEFAULT_LIMIT)),
+            cursor=request.args.get("cursor"),
+        )
+    except (InvalidEvent, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"events": events, "next_cursor": next_cursor})
+
+@app.get("/reminders/stats")
+def reminder_stats():
+    return jsonify(REMINDERS.snapshot())
+
+@app.get("/health")
+def health():
+    return jsonify({"ok": True, "service": "scheduler_agent"})
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8104, debug=True)
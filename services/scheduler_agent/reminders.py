@@ -0,0 +1,208 @@
+"""Reminder engine: fires nudges to the motivation agent when events reach `scheduled_at`.
+
+Pending reminders sit in a hierarchical timing wheel: O(1) insert and cancel, and each
+tick only touches the bucket that is due (plus an occasional cascade from a coarser level).
+Fired reminders are marked in the event store, so a restart rebuilds only what is pending.
+"""
+import calendar, math, threading, time
+from datetime import datetime, timezone
+from services.scheduler_agent import store
+
+
+class TimingWheel:
+    """`levels` wheels of 2**`bits` slots; level i buckets span tick_s * 2**(bits*i) seconds.
+    With the defaults (1 s ticks, 8 bits, 4 levels) due times up to ~136 years ahead fit."""
+
+    def __init__(self, tick_s:float=1.0, bits:int=8, levels:int=4, now:float=0.0):
+        self.tick_s = tick_s
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.levels = levels
+        self.wheels = [[{} for _ in range(1 << bits)] for _ in range(levels)]
+        self.where: dict = {}     # key -> bucket dict holding it
+        self.overdue: dict = {}   # already due when added; fired on the next advance
+        self.current = int(now // tick_s)
+
+    def __len__(self):
+        return len(self.where)
+
+    def add(self, key, due:float, payload=None):
+        self.cancel(key)
+        tick = math.ceil(due / self.tick_s)  # never fire early
+        delta = tick - self.current
+        if delta <= 0:
+            bucket = self.overdue
+        else:
+            level = 0
+            while level < self.levels - 1 and delta >> (self.bits * (level + 1)):
+                level += 1
+            bucket = self.wheels[level][(tick >> (self.bits * level)) & self.mask]
+        bucket[key] = (due, payload)
+        self.where[key] = bucket
+
+    def cancel(self, key) -> bool:
+        bucket = self.where.pop(key, None)
+        if bucket is None:
+            return False
+        del bucket[key]
+        return True
+
+    def advance(self, now:float) -> list:
+        """Move time forward to `now`; returns [(key, due, payload)] that became due, in tick order."""
+        fired = self._drain(self.overdue)
+        target = int(now // self.tick_s)
+        while self.current < target:
+            if not self.where:
+                self.current = target  # nothing pending: skip empty ticks
+                break
+            self.current += 1
+            # cascade: entering a new span of level L re-files that span's bucket into lower levels
+            # (highest level first, so entries can fall through several levels in one tick)
+            top = 0
+            while top + 1 < self.levels and not self.current & ((1 << (self.bits * (top + 1))) - 1):
+                top += 1
+            for level in range(top, 0, -1):
+                bucket = self.wheels[level][(self.current >> (self.bits * level)) & self.mask]
+                for key, (due, payload) in list(bucket.items()):
+                    self.add(key, due, payload)
+            fired.extend(self._drain(self.wheels[0][self.current & self.mask]))
+            fired.extend(self._drain(self.overdue))
+        return fired
+
+    def _drain(self, bucket:dict) -> list:
+        if not bucket:
+            return []
+        out = [(key, due, payload) for key, (due, payload) in bucket.items()]
+        for key in bucket:
+            del self.where[key]
+        bucket.clear()
+        return out
+
+
+def to_iso(ts:float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime(store.ISO)
+
+def to_epoch(iso:str) -> float:
+    # stored times are naive UTC
+    return float(calendar.timegm(datetime.strptime(iso, store.ISO).timetuple()))
+
+
+class ReminderEngine:
+    def __init__(self, dispatch, clock=time.time, tick_s:float=1.0, lead_s:float=0.0,
+                 batch_size:int=500, retry_s:float=30.0, grace_s:float=3600.0):
+        """`dispatch(reminders: list[dict])` delivers one batch (raise to have it retried after `retry_s`).
+        Reminders fire `lead_s` before `scheduled_at`; on rebuild, ones missed by less than `grace_s` still fire."""
+        self.dispatch = dispatch
+        self.clock = clock
+        self.lead_s = lead_s
+        self.batch_size = batch_size
+        self.retry_s = retry_s
+        self.grace_s = grace_s
+        self.wheel = TimingWheel(tick_s, now=clock())
+        self.stats = {"scheduled": 0, "cancelled": 0, "fired": 0, "batches": 0, "dispatch_errors": 0,
+                      "mark_errors": 0, "max_lag_s": 0.0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cancelled_while_loading: set|None = None
+        self._unmarked: list[tuple[list[str], str]] = []   # dispatched, but marking them failed
+
+    def schedule(self, event_id:str, user_id:str, scheduled_at:str, name:str|None=None, type:str|None=None):
+        due = to_epoch(scheduled_at) - self.lead_s
+        with self._lock:
+            self.wheel.add(event_id, due, (user_id, type, name, scheduled_at))
+            self.stats["scheduled"] += 1
+
+    def cancel(self, event_id:str) -> bool:
+        with self._lock:
+            ok = self.wheel.cancel(event_id)
+            self.stats["cancelled"] += ok
+            if self._cancelled_while_loading is not None:
+                self._cancelled_while_loading.add(event_id)
+        return ok
+
+    def rebuild(self, chunk:int=10_000) -> int:
+        """Load not-yet-reminded events from the store (streamed in chunks). Events cancelled while
+        it runs are not loaded back."""
+        since = to_iso(self.clock() + self.lead_s - self.grace_s)
+        n = 0
+        with self._lock:
+            self._cancelled_while_loading = set()
+        try:
+            for rows in store.iter_pending_reminders(since, chunk):
+                with self._lock:
+                    for r in rows:
+                        if r.id not in self._cancelled_while_loading:
+                            self.wheel.add(r.id, to_epoch(r.scheduled_at) - self.lead_s, (r.user_id, r.type, r.name, r.scheduled_at))
+                n += len(rows)
+        finally:
+            with self._lock:
+                self._cancelled_while_loading = None
+        return n
+
+    def tick(self) -> int:
+        """Fire everything due by now, in batches; returns the number of reminders dispatched."""
+        now = self.clock()
+        with self._lock:
+            due = self.wheel.advance(now)
+            unmarked, self._unmarked = self._unmarked, []
+        for ids, at in unmarked:
+            self._mark(ids, at)
+        sent = 0
+        for i in range(0, len(due), self.batch_size):
+            batch = due[i:i + self.batch_size]
+            reminders = [{"event_id": key, "user_id": p[0], "type": p[1], "name": p[2], "scheduled_at": p[3]}
+                         for key, _, p in batch]
+            try:
+                self.dispatch(reminders)
+            except Exception:
+                with self._lock:
+                    self.stats["dispatch_errors"] += 1
+                    for key, _, payload in batch:
+                        self.wheel.add(key, now + self.retry_s, payload)
+                continue
+            self._mark([r["event_id"] for r in reminders], to_iso(now))
+            sent += len(batch)
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["fired"] += len(batch)
+                self.stats["max_lag_s"] = max(self.stats["max_lag_s"], now - min(d for _, d, _ in batch))
+        return sent
+
+    def _mark(self, ids:list[str], at:str):
+        # a failed mark is retried on the next tick by itself: the batch was delivered, don't nudge twice
+        try:
+            store.mark_reminded(ids, at)
+        except Exception:
+            with self._lock:
+                self.stats["mark_errors"] += 1
+                self._unmarked.append((ids, at))
+
+    def start(self):
+        """Start ticking; pending reminders are loaded on the background thread, not the caller's."""
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        loaded = False
+        while not loaded and not self._stop.is_set():
+            try:
+                self.rebuild()
+                loaded = True
+            except Exception:
+                self._stop.wait(self.wheel.tick_s)  # store not reachable yet; try again next tick
+        while not self._stop.wait(self.wheel.tick_s):
+            try:
+                self.tick()
+            except Exception:
+                pass  # keep ticking; failed batches are re-queued by tick()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"pending": len(self.wheel), **self.stats}
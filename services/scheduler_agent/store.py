@@ -0,0 +1,160 @@
+"""Persistent per-user event store for the scheduler agent.
+
+Events live in `schedule_event`, indexed on (user_id, scheduled_at, id), so range
+queries, keyset pagination and overlap checks are index seeks whose cost depends on the
+size of the answer, not on the user's history.
+"""
+import base64, json, uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from services.common import storage
+
+ISO = "%Y-%m-%dT%H:%M:%S"
+# Overlap checks only look back this far, which keeps them an index range scan
+MAX_DURATION_MIN = 24 * 60
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def normalize_time(value) -> str:
+    """ISO datetime -> 'YYYY-MM-DDTHH:MM:SS' (aware values converted to naive UTC)."""
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise InvalidEvent(f"invalid datetime: {value!r}")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime(ISO)
+
+
+def _row(user_id:str, event:dict, eid:str|None=None) -> dict:
+    # accepts both {name, scheduled_at} and the React client's {title, when}
+    when = event.get("scheduled_at") or event.get("when")
+    if not when:
+        raise InvalidEvent("scheduled_at is required")
+    start = normalize_time(when)
+    try:
+        duration = min(max(int(event.get("duration_min") or 0), 0), MAX_DURATION_MIN)
+    except (TypeError, ValueError):
+        raise InvalidEvent("duration_min must be an integer")
+    end = (datetime.strptime(start, ISO) + timedelta(minutes=duration)).strftime(ISO)
+    eid = eid or str(uuid.uuid4())
+    return {"id": eid, "user_id": user_id, "type": event.get("type"), "name": event.get("name") or event.get("title"),
+            "scheduled_at": start, "end_at": end, "duration_min": duration or None,
+            "payload": json.dumps({"id": eid, **event})}
+
+
+def encode_cursor(scheduled_at:str, eid:str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([scheduled_at, eid]).encode()).decode()
+
+
+def decode_cursor(cursor:str) -> tuple[str, str]:
+    try:
+        scheduled_at, eid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise InvalidEvent("invalid cursor")
+    return scheduled_at, eid
+
+
+OVERLAPS = text("""SELECT id, name, scheduled_at, end_at FROM schedule_event
+                   WHERE user_id = :u AND scheduled_at >= :lookback AND scheduled_at < :end AND end_at > :start""")
+
+
+def find_conflicts(conn, rows:list[dict]) -> list[dict]:
+    """Overlaps of `rows` with stored events and with each other (zero-length events never overlap)."""
+    conflicts = []
+    for i, r in enumerate(rows):
+        if r["end_at"] == r["scheduled_at"]:
+            continue
+        lookback = (datetime.strptime(r["scheduled_at"], ISO) - timedelta(minutes=MAX_DURATION_MIN)).strftime(ISO)
+        for other in conn.execute(OVERLAPS, {"u": r["user_id"], "lookback": lookback, "start": r["scheduled_at"], "end": r["end_at"]}):
+            conflicts.append({"event": r["id"], "conflicts_with": other.id, "name": other.name, "scheduled_at": other.scheduled_at})
+        for o in rows[:i]:
+            if o["scheduled_at"] < r["end_at"] and o["end_at"] > r["scheduled_at"]:
+                conflicts.append({"event": r["id"], "conflicts_with": o["id"], "name": o["name"], "scheduled_at": o["scheduled_at"]})
+    return conflicts
+
+
+INSERT = text("""INSERT INTO schedule_event(id, user_id, type, name, scheduled_at, end_at, duration_min, payload)
+                 VALUES (:id, :user_id, :type, :name, :scheduled_at, :end_at, :duration_min, :payload)""")
+
+
+def commit_events(user_id:str, events:list[dict], on_conflict:str="allow") -> tuple[list[dict], list[dict]]:
+    """Store `events` for `user_id` in one transaction. Returns (saved events, conflicts).
+
+    on_conflict: "allow" saves and reports overlaps, "reject" saves nothing if any overlap,
+    "skip" saves only the events without overlaps, "ignore" skips the check (bulk loads).
+    Raises InvalidEvent on bad input.
+    """
+    rows = [_row(user_id, e) for e in events]
+    with storage.begin() as conn:
+        if on_conflict != "ignore":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")   # no other commit lands between the check and the insert
+        conflicts = find_conflicts(conn, rows) if on_conflict != "ignore" else []
+        if conflicts and on_conflict == "reject":
+            return [], conflicts
+        if on_conflict == "skip":
+            clashing = {c["event"] for c in conflicts}
+            rows = [r for r in rows if r["id"] not in clashing]
+        if rows:
+            conn.execute(INSERT, rows)
+    return [json.loads(r["payload"]) for r in rows], conflicts
+
+
+def list_events(user_id:str, start:str|None=None, end:str|None=None, limit:int=DEFAULT_LIMIT,
+                cursor:str|None=None) -> tuple[list[dict], str|None]:
+    """Events of `user_id` with start <= scheduled_at < end, in time order, one page at a time.
+    Returns (events, next_cursor); next_cursor is None on the last page."""
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    clauses, params = ["user_id = :u"], {"u": user_id, "n": limit + 1}
+    if start:
+        clauses.append("scheduled_at >= :start")
+        params["start"] = normalize_time(start)
+    if end:
+        clauses.append("scheduled_at < :end")
+        params["end"] = normalize_time(end)
+    if cursor:
+        params["c_at"], params["c_id"] = decode_cursor(cursor)
+        # the plain >= bound keeps this an index range scan
+        clauses.append("scheduled_at >= :c_at AND (scheduled_at > :c_at OR id > :c_id)")
+    sql = text(f"SELECT id, scheduled_at, payload FROM schedule_event WHERE {' AND '.join(clauses)} "
+               "ORDER BY scheduled_at, id LIMIT :n")
+    with storage.connect() as conn:
+        rows = conn.execute(sql, params).all()
+    next_cursor = encode_cursor(rows[limit - 1].scheduled_at, rows[limit - 1].id) if len(rows) > limit else None
+    return [json.loads(r.payload) for r in rows[:limit]], next_cursor
+
+
+def event_time(event:dict) -> str:
+    return normalize_time(event.get("scheduled_at") or event.get("when"))
+
+
+def delete_event(user_id:str, eid:str) -> bool:
+    with storage.begin() as conn:
+        return conn.execute(text("DELETE FROM schedule_event WHERE id=:id AND user_id=:u"), {"id": eid, "u": user_id}).rowcount > 0
+
+
+def iter_pending_reminders(since:str, chunk:int=10_000):
+    """Yield lists of not-yet-reminded events with scheduled_at >= since, in time order."""
+    sql = text("""SELECT id, user_id, type, name, scheduled_at FROM schedule_event
+                  WHERE reminded_at IS NULL AND scheduled_at >= :since
+                    AND (scheduled_at > :at OR id > :id)
+                  ORDER BY scheduled_at, id LIMIT :n""")
+    at, eid = since, ""
+    while True:
+        with storage.connect() as conn:
+            rows = conn.execute(sql, {"since": at, "at": at, "id": eid, "n": chunk}).all()
+        if not rows:
+            return
+        yield rows
+        at, eid = rows[-1].scheduled_at, rows[-1].id
+
+
+def mark_reminded(ids:list[str], at:str):
+    if ids:
+        with storage.begin() as conn:
+            conn.execute(text("UPDATE schedule_event SET reminded_at=:at WHERE id=:id"), [{"at": at, "id": i} for i in ids])
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Keep test runs off the tracked storage/app.db and the on-disk LLM cache
+_TMP = tempfile.mkdtemp(prefix="hc-tests-")
+os.environ.setdefault("HC_DB_PATH", os.path.join(_TMP, "app.db"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_TMP, "llm_cache.db"))
+os.environ.setdefault("REMINDERS_ENABLED", "0")
@@ -0,0 +1,93 @@
+import threading, time
+import pytest
+import services.diet_agent.app as diet
+import services.gateway.app as gw
+from services.gateway.admission import Admission, Lane, Overloaded, parse_limits
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+def test_parse_limits():
+    limits = parse_limits("chat=1/5, plan=0.5 ,", {"chat": (2, 2), "default": (20, 60)})
+    assert limits == {"chat": (1.0, 5.0), "plan": (0.5, 0.5), "default": (20, 60)}
+
+def test_rate_limit_per_user_and_class(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(gw, "ADMISSION", Admission(rates={"default": (0.5, 2)}, clock=clock))
+    client = gw.app.test_client()
+    hello = {"user_id": "u1", "text": "hello"}
+    assert [client.post("/chat", json=hello).status_code for _ in range(2)] == [200, 200]
+    res = client.post("/chat", json=hello)
+    assert res.status_code == 429 and res.headers["Retry-After"] == "2"
+    assert res.get_json()["class"] == "default"
+    # other users, other classes' buckets and GETs are unaffected
+    assert client.post("/chat", json={**hello, "user_id": "u2"}).status_code == 200
+    assert client.post("/chat", json=hello, headers={"X-User-Id": "u3"}).status_code == 200
+    assert client.get("/health").status_code == 200
+    clock.t += 2
+    assert client.post("/chat", json=hello).status_code == 200
+    assert gw.ADMISSION.stats()["classes"]["default"] == {"admitted": 5, "limited": 1}
+
+def test_claimed_user_ids_cannot_escape_or_spend_anothers_budget(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(gw, "ADMISSION", Admission(rates={"default": (0.5, 2)}, address_rates={"default": (1, 3)},
+                                                   clock=clock))
+    client = gw.app.test_client()
+    # one address rotating ids runs into its address bucket
+    codes = [client.post("/chat", json={"user_id": f"u{i}", "text": "hi"}, environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code
+             for i in range(4)]
+    assert codes == [200, 200, 200, 429]
+    # u0's bucket at 10.0.0.1 is not the one another address gets by claiming u0
+    other = {"REMOTE_ADDR": "10.0.0.2"}
+    assert [client.post("/chat", json={"user_id": "u0", "text": "hi"}, environ_base=other).status_code
+            for _ in range(3)] == [200, 200, 429]
+
+
+def test_lane_queues_then_sheds():
+    lane = Lane(max_inflight=1, max_queue=1, queue_timeout_s=5)
+    release = lane.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(lane.acquire()))
+    waiter.start()
+    while lane.stats()["queued"] < 1:
+        time.sleep(0.001)
+    with pytest.raises(Overloaded) as e:
+        lane.acquire()   # one running, one queued: refused without waiting
+    assert e.value.retry_after_s == 5
+    release()
+    release()   # releasing twice frees one slot only
+    waiter.join(timeout=5)
+    assert len(got) == 1 and lane.stats()["inflight"] == 1
+    got[0]()
+    assert lane.stats() == {"admitted": 2, "waited": 1, "shed": 1, "timeouts": 0, "inflight": 0, "queued": 0,
+                            "max_inflight": 1, "max_queue": 1}
+
+def test_lane_queue_timeout():
+    lane = Lane(max_inflight=1, max_queue=4, queue_timeout_s=0.05)
+    lane.acquire()
+    t0 = time.perf_counter()
+    with pytest.raises(Overloaded):
+        lane.acquire()
+    assert time.perf_counter() - t0 >= 0.04 and lane.stats()["timeouts"] == 1
+
+def test_saturated_chat_lane_sheds_only_chat(monkeypatch):
+    monkeypatch.setattr(gw, "ADMISSION", Admission(lanes={"chat": (1, 0)}))
+    monkeypatch.setattr(gw, "DIET_URL", "inproc://services.diet_agent.app")
+    monkeypatch.setattr(diet, "client", None)
+    client = gw.app.test_client()
+    body = {"message": "less carbs", "current_plan": {"user_id": "u1", "meals": []}}
+    release = gw.ADMISSION.slot(gw.DIET_URL, "/diet/chat")
+    for path in ("/diet/chat", "/diet/chat/stream"):
+        res = client.post(path, json=body)
+        assert res.status_code == 503 and res.headers["Retry-After"] == "2"
+    assert client.post("/chat", json={"user_id": "u1", "text": "hello"}).status_code == 200
+    release()
+    assert client.post("/diet/chat", json=body).status_code != 503
+    res = client.post("/diet/chat/stream", json=body)
+    res.get_data()
+    res.close()
+    assert gw.ADMISSION.lane(gw.DIET_URL, "chat").stats()["inflight"] == 0
@@ -0,0 +1,94 @@
+import socket, threading
+import pytest
+import requests
+from flask import Flask, jsonify
+from services.common.agent_client import AgentClient, CircuitBreaker, CircuitOpen
+from services.common.devserver import serve_in_thread
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+    def __call__(self):
+        return self.t
+
+def _dead_url():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return f"http://127.0.0.1:{port}"
+
+def test_breaker_opens_fails_fast_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=5, clock=clock)
+    client = AgentClient(_dead_url(), breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.post("/x", json={}, timeout=0.5)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        client.post("/x", json={}, timeout=0.5)
+    assert client.stats["short_circuited"] == 1
+
+    clock.t = 6  # reset timeout elapsed: one half-open probe is let through
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.snapshot()["state"] == "closed"
+
+def test_retries_connection_errors_with_bounded_attempts():
+    client = AgentClient(_dead_url(), breaker=CircuitBreaker(failure_threshold=100))
+    with pytest.raises(requests.ConnectionError):
+        client.post("/x", json={}, timeout=0.5, retries=2)
+    assert client.stats["requests"] == 3 and client.stats["retries"] == 2
+
+def test_keep_alive_pool_reuses_connections():
+    app = Flask("stub")
+    calls = {"n": 0}
+
+    @app.post("/echo")
+    def echo():
+        calls["n"] += 1
+        return jsonify({"n": calls["n"]}), (503 if calls["n"] == 1 else 200)
+
+    server, url = serve_in_thread(app)
+    # werkzeug's dev server speaks HTTP/1.1 keep-alive only with this flag
+    server.RequestHandlerClass.protocol_version = "HTTP/1.1"
+    try:
+        client = AgentClient(url)
+        res = client.post("/echo", json={}, timeout=2, retries=1, idempotent=True)
+        assert res.status_code == 200 and res.json()["n"] == 2
+        for _ in range(5):
+            client.post("/echo", json={}, timeout=2)
+        pool = client.snapshot()["pools"][0]
+        assert pool["connections_opened"] == 1 and pool["requests"] == 7
+    finally:
+        server.shutdown()
+
+def test_dropped_connection_retried_only_when_idempotent():
+    # accepts, reads the request, closes without answering: the agent may have acted on it
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(8)
+    seen = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            seen.append(conn.recv(65536))
+            conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    url = f"http://127.0.0.1:{listener.getsockname()[1]}"
+    try:
+        client = AgentClient(url, breaker=CircuitBreaker(failure_threshold=100))
+        with pytest.raises(requests.ConnectionError):
+            client.post("/schedule/commit", json={}, timeout=2, retries=2)
+        assert client.stats["retries"] == 0 and len(seen) == 1
+        with pytest.raises(requests.ConnectionError):
+            client.post("/schedule/cancel", json={}, timeout=2, retries=2, idempotent=True)
+        assert client.stats["retries"] == 2 and len(seen) == 4
+    finally:
+        listener.close()
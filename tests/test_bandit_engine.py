@@ -0,0 +1,76 @@
+import random
+import pytest
+from services.common import storage
+from services.feedback_agent import engine as engine_mod
+from services.feedback_agent.engine import BanditEngine
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "engine", storage.make_engine(tmp_path / "app.db"))
+    storage.init_db()
+    return tmp_path
+
+def _db_arms():
+    return {a["arm"]: (a["pulls"], a["reward_sum"]) for a in storage.get_arms("tone")}
+
+def _engine(db, **kw):
+    return BanditEngine("tone", ["coach", "friendly"], epsilon=0.1, journal_dir=db, flush_interval_s=3600,
+                        rng=random.Random(0), **kw)
+
+def test_updates_are_batched_into_one_flush(db):
+    eng = _engine(db)
+    eng.recover()
+    for _ in range(50):
+        eng.reward(eng.choose(), 1.0)
+    assert sum(p for p, _ in _db_arms().values()) == 0  # nothing written yet
+    assert eng.flush() == 100
+    pulls = sum(p for p, _ in _db_arms().values())
+    assert pulls == 50 and eng.snapshot()["pending_updates"] == 0
+    assert not (db / f"bandit-{eng.journal_id}.journal.flushing").exists()
+
+def test_size_threshold_wakes_flusher(db):
+    eng = _engine(db, flush_max_pending=10).start()
+    try:
+        for _ in range(10):
+            eng.choose()
+        eng._thread.join(0.5)
+        assert sum(p for p, _ in _db_arms().values()) == 10
+    finally:
+        eng.close()
+
+def test_recovers_unflushed_updates_after_crash(db):
+    eng = _engine(db)
+    eng.recover()
+    for _ in range(5):
+        eng.choose()
+    eng.flush()
+    eng.reward("coach", 1.0)
+    eng.reward("friendly", 0.5)
+    eng.choose()
+    # crash: process dies without flushing; only the journal survives
+    eng._journal.close()
+
+    restarted = _engine(db)
+    restarted.recover()
+    assert sum(p for p, _ in _db_arms().values()) == 6
+    assert sum(r for _, r in _db_arms().values()) == 1.5
+    assert restarted.snapshot()["arms"]["coach"]["reward_sum"] == 1.0
+    # replaying again must not double count
+    again = _engine(db)
+    again.recover()
+    assert sum(p for p, _ in _db_arms().values()) == 6
+
+def test_concurrent_recovery_replays_a_journal_once(db, monkeypatch):
+    monkeypatch.setattr(engine_mod, "_pid_alive", lambda pid: False)
+    dead = db / "bandit-tone-4242.journal"   # a crashed worker's journal, never flushed
+    dead.write_text("1 coach 1 0.0\n2 coach 0 1.0\n3 friendly 1 0.0\n4 friendly 1 0.0\n")
+    journal = dead.read_text()
+
+    _engine(db).recover()
+    assert _db_arms() == {"coach": (1, 1.0), "friendly": (2, 0.0)}
+    # a second worker that read last_seq and the journal before the first one committed and unlinked it
+    dead.write_text(journal)
+    monkeypatch.setattr(storage, "get_flush_seq", lambda journal_id: 0)
+    _engine(db).recover()
+    assert _db_arms() == {"coach": (1, 1.0), "friendly": (2, 0.0)}
+    assert not dead.exists()
@@ -0,0 +1,82 @@
+import time
+import pytest
+from services.common.ratelimit import TokenBucket
+from services.motivation_agent import app as motivation
+from services.motivation_agent.campaign import Campaign, MemorySink, choose_tones
+
+TONES = {"coach": ["Go."], "friendly": ["You got this!"]}
+STATS = {"coach": {"pulls": 10, "reward_sum": 2.0}, "friendly": {"pulls": 10, "reward_sum": 7.0}}
+
+def test_token_bucket_refills_at_rate():
+    now = [0.0]
+    bucket = TokenBucket(10, burst=5, clock=lambda: now[0], sleep=lambda s: now.__setitem__(0, now[0] + s))
+    assert all(bucket.try_acquire() == 0.0 for _ in range(5))
+    assert bucket.try_acquire() == pytest.approx(0.1)
+    assert bucket.acquire(5)
+    assert now[0] == pytest.approx(0.5)
+
+def test_tones_follow_best_arm_and_are_stable():
+    users = [f"u{i}" for i in range(2000)]
+    tones = choose_tones(users, list(TONES), STATS, epsilon=0.2, seed="c1")
+    share = tones.count("friendly") / len(tones)
+    assert 0.85 < share < 0.95  # 1 - eps/2
+    assert tones == choose_tones(users, list(TONES), STATS, epsilon=0.2, seed="c1")
+    assert set(choose_tones(users, list(TONES), None, epsilon=0.0)) == {"coach"}
+
+def test_campaign_delivers_everyone_at_the_rate_limit():
+    sink = MemorySink()
+    users = [{"user_id": f"u{i}"} for i in range(300)] + [{"user_id": "ann", "name": "Ann", "tone": "coach"}]
+    c = Campaign(users, TONES, sink, arm_stats=STATS, rate_per_s=1000, batch_size=50, workers=3)
+    t0 = time.perf_counter()
+    c.run()
+    assert time.perf_counter() - t0 >= 0.2  # 301 messages, 50 burst, 1000/s
+    p = c.progress()
+    assert p["status"] == "done" and p["sent"] == 301 and p["failed"] == 0
+    assert sum(p["sent_by_tone"].values()) == 301
+    assert sorted(m["user_id"] for m in sink.messages) == sorted(u["user_id"] for u in users)
+    ann = next(m for m in sink.messages if m["user_id"] == "ann")
+    assert ann["tone"] == "coach" and ann["message"] == "Ann, go."
+
+def test_slow_sink_applies_backpressure():
+    class SlowSink(MemorySink):
+        def send(self, messages):
+            time.sleep(0.01)
+            super().send(messages)
+    c = Campaign([{"user_id": f"u{i}"} for i in range(200)], TONES, SlowSink(), rate_per_s=0,
+                 batch_size=10, workers=1, queue_max=1)
+    c.run()
+    assert c.progress()["sent"] == 200 and c.backpressure_waits > 0
+
+def test_sink_errors_are_counted():
+    class FlakySink(MemorySink):
+        calls = 0
+        def send(self, messages):
+            self.calls += 1
+            if self.calls == 2:
+                raise IOError("provider down")
+            super().send(messages)
+    c = Campaign([{"user_id": f"u{i}"} for i in range(30)], TONES, FlakySink(), rate_per_s=0, batch_size=10, workers=1)
+    c.run()
+    p = c.progress()
+    assert (p["sent"], p["failed"], p["last_error"]) == (20, 10, "provider down")
+
+def test_campaign_api(monkeypatch):
+    sink = MemorySink()
+    pulls = []
+    monkeypatch.setattr(motivation, "_sink", sink)
+    monkeypatch.setattr(motivation, "arm_stats", lambda: STATS)
+    monkeypatch.setattr(motivation, "report_pulls", lambda c: pulls.append(dict(c.sent_by_tone)))
+    client = motivation.app.test_client()
+    assert client.post("/campaigns", json={"user_ids": []}).status_code == 400
+    for bad in ("fast", -5, 0, True, [], "inf"):
+        res = client.post("/campaigns", json={"user_ids": ["u1"], "rate_per_s": bad})
+        assert res.status_code == 400 and "rate_per_s" in res.get_json()["error"]
+    assert not motivation.CAMPAIGNS
+    res = client.post("/campaigns", json={"name": "monday", "user_ids": [f"u{i}" for i in range(50)]})
+    assert res.status_code == 202
+    cid = res.get_json()["id"]
+    motivation.CAMPAIGNS[cid].join(5)
+    p = client.get(f"/campaigns/{cid}").get_json()
+    assert p["status"] == "done" and p["sent"] == 50 and p["name"] == "monday"
+    assert pulls == [p["sent_by_tone"]]
+    assert client.get("/campaigns/nope").status_code == 404
@@ -0,0 +1,73 @@
+import random, time
+import numpy as np
+import pytest
+from services.common import storage
+from services.feedback_agent.contextual import DIM, LinUCB, featurize, featurize_batch
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "engine", storage.make_engine(tmp_path / "app.db"))
+    storage.init_db()
+    return tmp_path
+
+def _users(n, seed=0):
+    rng = random.Random(seed)
+    goals = ["fat_loss", "muscle_gain", "endurance", "general_health"]
+    profiles = [{"age": rng.randint(18, 70), "sex": rng.choice(["M", "F"]), "height_cm": 170, "weight_kg": rng.randint(50, 110),
+                 "activity_level": rng.choice(["sedentary", "light", "moderate", "active"])} for _ in range(n)]
+    return profiles, [{"type": rng.choice(goals)} for _ in range(n)]
+
+def test_featurize_handles_missing_fields():
+    X = featurize_batch([None, {"age": 60, "sex": "F", "height_cm": 160, "weight_kg": 80}], [None, {"type": "fat_loss"}])
+    assert X.shape == (2, DIM) and np.isfinite(X).all()
+    assert X[0, 0] == 1.0 and X[0, 9] == 1.0  # bias, default general_health goal
+    assert np.array_equal(featurize({"age": 60}), featurize_batch([{"age": 60}])[0])
+
+def test_learns_per_segment_preferences(db):
+    # fat_loss users respond to "coach", everyone else to "friendly"
+    bandit = LinUCB("t", ["coach", "friendly"], alpha=0.3, rng=random.Random(1))
+    rng = random.Random(2)
+    for round_ in range(20):
+        profiles, goals = _users(200, seed=round_)
+        X = featurize_batch(profiles, goals)
+        arms = bandit.choose_batch(X)
+        best = ["coach" if g["type"] == "fat_loss" else "friendly" for g in goals]
+        rewards = [float(rng.random() < (0.8 if a == b else 0.2)) for a, b in zip(arms, best)]
+        bandit.reward_batch(arms, X, rewards)
+    profiles, goals = _users(1000, seed=99)
+    arms = bandit.choose_batch(featurize_batch(profiles, goals))
+    best = ["coach" if g["type"] == "fat_loss" else "friendly" for g in goals]
+    assert sum(a == b for a, b in zip(arms, best)) / len(best) > 0.9
+
+def test_scores_100k_users_in_well_under_a_second(db):
+    bandit = LinUCB("t", ["coach", "friendly"])
+    profiles, goals = _users(100_000)
+    t0 = time.perf_counter()
+    arms = bandit.choose_batch(featurize_batch(profiles, goals))
+    assert len(arms) == 100_000 and time.perf_counter() - t0 < 1.0
+
+def test_flushes_are_additive_across_workers(db):
+    a, b = LinUCB("t", ["coach", "friendly"]).load(), LinUCB("t", ["coach", "friendly"]).load()
+    x = featurize({"age": 30}, {"type": "endurance"})
+    a.reward("coach", x, 1.0)
+    b.reward("coach", x, 0.0)
+    b.reward("friendly", x, 1.0)
+    assert a.flush() == 1 and b.flush() == 2
+    fresh = LinUCB("t", ["coach", "friendly"]).load()
+    assert np.allclose(fresh.A, b.A) and np.allclose(fresh.b, b.b)
+    assert np.allclose(fresh.A[0], np.eye(DIM) + 2 * np.outer(x, x))
+
+def test_api_keeps_global_choose_and_adds_batch():
+    from services.feedback_agent import app as feedback
+    client = feedback.app.test_client()
+    res = client.get("/bandit/choose").get_json()
+    assert res["arm"] in feedback.ARMS and res["epsilon"] == feedback.EPSILON
+    users = [{"user_id": f"u{i}", "profile": {"age": 20 + i}, "goal": {"type": "fat_loss"}} for i in range(5)]
+    res = client.post("/bandit/choose_batch", json={"users": users}).get_json()
+    assert [r["user_id"] for r in res["arms"]] == [u["user_id"] for u in users]
+    before = feedback.CONTEXTUAL.updates
+    arm = res["arms"][0]["arm"]
+    client.post("/feedback", json={"event_id": "e1", "user_id": "u0", "rating": 5, "bandit_arm": arm})
+    assert feedback.CONTEXTUAL.updates == before + 1
+    single = client.post("/bandit/choose", json={"user_id": "u9", "profile": {"age": 40}}).get_json()
+    assert single["policy"] == "linucb" and single["arm"] in feedback.ARMS
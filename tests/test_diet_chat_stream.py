@@ -0,0 +1,91 @@
+import json
+import time
+from types import SimpleNamespace
+import requests
+import services.diet_agent.app as diet
+import services.gateway.app as gw
+from services.common.devserver import serve_in_thread
+from services.common.llm_cache import LLMCache
+from services.common.llm_pool import LLMPool
+from services.diet_agent.streaming import ReplyExtractor
+
+REPLY = 'Swapped dinner for a "lighter" option.\nEnjoy!'
+CONTENT = json.dumps({"assistant_reply": REPLY, "updated_plan": {"meals": [{"name": "Tofu Bowl", "calories": 550}]}})
+CHUNK_DELAY_S = 0.02
+
+class FakeStreamingOpenAI:
+    """Yields the completion in 4-character chunks with a delay between them."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream=False, **request):
+        assert stream
+        self.calls += 1
+        for i in range(0, len(CONTENT), 4):
+            time.sleep(CHUNK_DELAY_S)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=CONTENT[i:i + 4]))])
+
+def test_reply_extractor_handles_split_escapes():
+    raw = json.dumps({"assistant_reply": 'a\\"bé\n', "x": 1})
+    for size in (1, 2, 3, 7):
+        ex = ReplyExtractor()
+        assert "".join(ex.feed(raw[i:i + size]) for i in range(0, len(raw), size)) == 'a\\"bé\n'
+        assert ex.done
+
+def test_stream_through_gateway_first_token_before_completion(tmp_path, monkeypatch):
+    fake = FakeStreamingOpenAI()
+    monkeypatch.setattr(diet, "client", fake)
+    monkeypatch.setattr(diet, "LLM_CACHE", LLMCache(tmp_path / "c.db"))
+    diet_server, diet_url = serve_in_thread(diet.app)
+    gw_server, gw_url = serve_in_thread(gw.app)
+    monkeypatch.setattr(gw, "DIET_URL", diet_url)
+    body = {"message": "lighter dinner", "current_plan": {"meals": [{"name": "Steak", "calories": 800}]}}
+    try:
+        t0 = time.perf_counter()
+        res = requests.post(f"{gw_url}/diet/chat/stream", json=body, stream=True, timeout=10)
+        events, first_token_s = [], None
+        for line in res.iter_lines():
+            events.append(json.loads(line))
+            if first_token_s is None and events[-1]["type"] == "token":
+                first_token_s = time.perf_counter() - t0
+        total_s = time.perf_counter() - t0
+        # second identical request is answered from the cache
+        cached = [json.loads(l) for l in requests.post(f"{gw_url}/diet/chat/stream", json=body, timeout=10).text.splitlines()]
+    finally:
+        diet_server.shutdown()
+        gw_server.shutdown()
+
+    assert res.headers["Content-Type"].startswith("application/x-ndjson")
+    tokens = [e["text"] for e in events if e["type"] == "token"]
+    assert len(tokens) > 3 and "".join(tokens) == REPLY
+    assert first_token_s < total_s / 2
+    final = events[-1]
+    assert final["type"] == "final" and final["assistant_reply"] == REPLY
+    assert final["updated_plan"]["meals"][0]["name"] == "Tofu Bowl"
+    assert fake.calls == 1 and cached[-1] == final
+
+def test_stream_degrades_when_pool_is_saturated_or_late(tmp_path, monkeypatch):
+    fake = FakeStreamingOpenAI()
+    pool = LLMPool(workers=1, max_queue=0)
+    monkeypatch.setattr(diet, "client", fake)
+    monkeypatch.setattr(diet, "LLM_CACHE", LLMCache(tmp_path / "c.db"))
+    monkeypatch.setattr(diet, "LLM_POOL", pool)
+    plan = {"meals": [{"name": "Steak", "calories": 800}]}
+    def chat(**extra):
+        lines, _ = diet.handle_chat_stream({"message": "lighter dinner", "current_plan": plan, **extra})
+        return [json.loads(l) for l in lines]
+
+    busy = pool.submit(lambda: time.sleep(0.2))
+    events = chat()
+    assert events[-1]["degraded_reason"] == "saturated" and events[-1]["updated_plan"]["meals"][0]["name"] == "Steak"
+    assert [e["text"] for e in events if e["type"] == "token"] == [diet.BUSY_REPLY] and fake.calls == 0
+    busy.result()
+
+    t0 = time.perf_counter()
+    events = chat(deadline_ms=50)
+    assert time.perf_counter() - t0 < 0.3
+    assert events[-1]["type"] == "final" and events[-1]["degraded_reason"] == "deadline"
+    assert events[-1]["updated_plan"]["meals"][0]["name"] == "Steak"
+    assert diet.handle_chat_stream({"message": "hi", "deadline_ms": "soon"})[1] == 400
@@ -0,0 +1,74 @@
+import time
+from flask import Flask, jsonify
+from services.common.devserver import serve_in_thread
+import services.gateway.app as gw
+
+AGENT_DELAY_S = 0.4
+PROFILE = {"age":24,"sex":"M","height_cm":178,"weight_kg":78,"activity_level":"moderate"}
+
+def _stub_agent(delay:float, fail:bool=False):
+    app = Flask("stub")
+
+    @app.post("/diet/suggest")
+    def diet():
+        time.sleep(delay)
+        if fail:
+            return jsonify({"error": "boom"}), 500
+        return jsonify({"meals": [{"name":"Stub Meal","calories":600,"macros":{"protein":40,"carbs":50,"fat":10},"when":"08:00"}]})
+
+    @app.post("/exercise/suggest")
+    def exercise():
+        time.sleep(delay)
+        if fail:
+            return jsonify({"error": "boom"}), 500
+        return jsonify({"workouts": [{"name":"Stub Run","duration_min":30,"intensity":"medium","when":"18:00"}]})
+
+    return serve_in_thread(app)
+
+def _plan(monkeypatch, diet_url, exercise_url):
+    monkeypatch.setattr(gw, "DIET_URL", diet_url)
+    monkeypatch.setattr(gw, "EXERCISE_URL", exercise_url)
+    client = gw.app.test_client()
+    t0 = time.perf_counter()
+    res = client.post("/plan/today", json={"user_id":"u1","profile":PROFILE,"goal":{"type":"fat_loss"}})
+    return res, time.perf_counter() - t0
+
+def test_plan_latency_is_slowest_agent_not_sum(monkeypatch):
+    server, url = _stub_agent(AGENT_DELAY_S)
+    try:
+        res, elapsed = _plan(monkeypatch, url, url)
+    finally:
+        server.shutdown()
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["meals"] and body["workouts"]
+    assert body["agents"]["diet"]["ok"] and body["agents"]["exercise"]["ok"]
+    assert AGENT_DELAY_S <= elapsed < 2 * AGENT_DELAY_S * 0.8
+
+def test_partial_failure_returns_what_came_back(monkeypatch):
+    ok_server, ok_url = _stub_agent(0.0)
+    bad_server, bad_url = _stub_agent(0.0, fail=True)
+    try:
+        res, _ = _plan(monkeypatch, bad_url, ok_url)
+    finally:
+        ok_server.shutdown()
+        bad_server.shutdown()
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["meals"] == [] and len(body["workouts"]) == 1
+    assert body["agents"]["diet"]["ok"] is False and body["agents"]["diet"]["status"] == 500
+    assert body["agents"]["exercise"]["ok"] is True
+
+def test_deadline_bounds_slow_agent(monkeypatch):
+    slow_server, slow_url = _stub_agent(1.0)
+    ok_server, ok_url = _stub_agent(0.0)
+    monkeypatch.setattr(gw, "PLAN_DEADLINE_S", 0.3)
+    try:
+        res, elapsed = _plan(monkeypatch, ok_url, slow_url)
+    finally:
+        slow_server.shutdown()
+        ok_server.shutdown()
+    assert elapsed < 0.9
+    body = res.get_json()
+    assert body["meals"] and body["workouts"] == []
+    assert body["agents"]["exercise"]["ok"] is False
@@ -0,0 +1,55 @@
+import json
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.common.agent_client import get_client
+from services.common.devserver import serve_in_thread
+
+DIET_INPROC = "inproc://services.diet_agent.app"
+EXERCISE_INPROC = "inproc://services.exercise_agent.app"
+BODY = {"user_id": "u1", "profile": {"age": 30, "sex": "F", "height_cm": 165, "weight_kg": 60, "activity_level": "light"},
+        "goal": {"type": "muscle_gain"}}
+
+def _plan(monkeypatch, diet_url, exercise_url, path="/plan/today", **kw):
+    monkeypatch.setattr(gw, "DIET_URL", diet_url)
+    monkeypatch.setattr(gw, "EXERCISE_URL", exercise_url)
+    return gw.app.test_client().post(path, **kw)
+
+def test_inproc_plan_matches_http(monkeypatch):
+    servers = [serve_in_thread(diet.app), serve_in_thread(exercise.app)]
+    try:
+        remote = _plan(monkeypatch, servers[0][1], servers[1][1], json=BODY).get_json()
+    finally:
+        for server, _ in servers:
+            server.shutdown()
+    local = _plan(monkeypatch, DIET_INPROC, EXERCISE_INPROC, json=BODY).get_json()
+    for res in (remote, local):
+        for status in res.pop("agents").values():
+            assert status["ok"]
+    assert local == remote and local["meals"] and local["workouts"]
+    assert get_client(DIET_INPROC).snapshot()["mode"] == "inproc"
+
+def test_inproc_batch_and_errors(monkeypatch):
+    items = [BODY, {**BODY, "user_id": "u2", "goal": {"type": "endurance"}}]
+    res = _plan(monkeypatch, DIET_INPROC, EXERCISE_INPROC, "/plan/batch", json={"items": items})
+    lines = [json.loads(l) for l in res.get_data(as_text=True).splitlines()]
+    assert [l["user_id"] for l in lines] == ["u1", "u2"] and all(l["meals"] and l["workouts"] for l in lines)
+
+    client = gw.app.test_client()
+    monkeypatch.setattr(gw, "DIET_URL", DIET_INPROC)
+    assert client.post("/diet/chat", json={"message": ""}).status_code == 400  # the handler's own 400
+
+    def boom(body):
+        raise RuntimeError("bad")
+    monkeypatch.setitem(diet.HANDLERS, "/diet/suggest", boom)
+    monkeypatch.setattr(gw, "PLAN_CACHE", None)  # same inputs and catalogs would be a cache hit
+    res = _plan(monkeypatch, DIET_INPROC, EXERCISE_INPROC, json=BODY).get_json()
+    assert res["agents"]["diet"]["status"] == 500 and res["workouts"]  # degrades like a remote 500
+
+def test_inproc_stream(monkeypatch):
+    monkeypatch.setattr(diet, "client", None)
+    monkeypatch.setattr(gw, "DIET_URL", DIET_INPROC)
+    res = gw.app.test_client().post("/diet/chat/stream", json={"message": "less carbs", "current_plan": {}})
+    events = [json.loads(l) for l in res.get_data(as_text=True).splitlines()]
+    assert res.mimetype == "application/x-ndjson"
+    assert [e["type"] for e in events] == ["token", "final"]
@@ -0,0 +1,109 @@
+import json
+from types import SimpleNamespace
+import services.diet_agent.app as diet
+from sqlalchemy import create_engine, text
+from services.common.llm_cache import LLMCache, cache_key, cached_completion
+
+class FakeOpenAI:
+    """Stands in for `openai.OpenAI`: counts calls and returns a canned JSON body (a str is sent as is)."""
+
+    def __init__(self, content:dict|str):
+        self.calls = 0
+        self.content = content
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **request):
+        self.calls += 1
+        content = self.content if isinstance(self.content, str) else json.dumps(self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+    def __call__(self):
+        return self.t
+
+REQ = {"model": "m", "temperature": 0.2, "messages": [{"role": "user", "content": "plan  my\n day"}]}
+
+def test_key_normalizes_whitespace_but_not_model_or_temperature():
+    assert cache_key("m", [{"role": "user", "content": "plan my day"}], 0.2) == cache_key(**REQ)
+    assert cache_key("m", REQ["messages"], 0.3) != cache_key(**REQ)
+    assert cache_key("other", REQ["messages"], 0.2) != cache_key(**REQ)
+
+def test_memory_then_disk_tier_and_ttl(tmp_path):
+    clock = Clock()
+    fake = FakeOpenAI({"ok": 1})
+    cache = LLMCache(tmp_path / "c.db", max_memory=8, ttl_s=60, clock=clock)
+    for _ in range(3):
+        cached_completion(fake, cache, **REQ)
+    assert fake.calls == 1 and cache.counters["memory_hits"] == 2
+
+    # fresh process: memory tier empty, SQLite tier still answers
+    cache2 = LLMCache(tmp_path / "c.db", max_memory=8, ttl_s=60, clock=clock)
+    cached_completion(fake, cache2, **REQ)
+    assert fake.calls == 1 and cache2.counters["disk_hits"] == 1
+
+    clock.t += 61
+    cached_completion(fake, cache2, **REQ)
+    assert fake.calls == 2 and cache2.counters["misses"] == 1
+
+def test_size_bounded_eviction(tmp_path):
+    clock = Clock()
+    cache = LLMCache(tmp_path / "c.db", max_memory=2, max_rows=5, clock=clock)
+    for i in range(12):
+        clock.t += 1
+        cache.put(f"k{i}", str(i))
+    cache.trim()
+    stats = cache.stats()
+    assert stats["disk_rows"] == 5 and stats["memory"]["entries"] == 2
+    assert cache.get("k11") == "11" and cache.get("k0") is None
+
+def test_disk_hits_touch_sparingly_and_disk_errors_are_misses(tmp_path, monkeypatch):
+    clock = Clock()
+    cache = LLMCache(tmp_path / "c.db", max_memory=1, clock=clock, touch_interval_s=60)
+    cache.put("k", "v")
+    cache.put("other", "x")   # pushes "k" out of the memory tier
+
+    def accessed():
+        with cache.engine.connect() as conn:
+            return conn.execute(text("SELECT accessed_at FROM llm_cache WHERE key='k'")).scalar()
+
+    clock.t += 10
+    assert cache.get("k") == "v" and accessed() == 1000.0   # read only, no write lock
+    cache.memory.clear()
+    clock.t += 60
+    assert cache.get("k") == "v" and accessed() == 1070.0
+
+    broken = LLMCache(tmp_path / "missing" / "dir" / "c.db")
+    monkeypatch.setattr(broken, "_engine", create_engine(f"sqlite:///{tmp_path}/missing/dir/c.db"))
+    assert broken.get("k") is None and broken.put("k", "v") is False
+    assert broken.get("k") == "v"   # still served from memory
+    assert broken.counters["disk_errors"] == 2 and broken.counters["misses"] == 1
+
+def test_diet_chat_served_from_cache(tmp_path, monkeypatch):
+    fake = FakeOpenAI({"assistant_reply": "Swapped lunch.", "updated_plan": {"meals": [{"name": "Tofu Bowl", "calories": 600}]}})
+    monkeypatch.setattr(diet, "client", fake)
+    monkeypatch.setattr(diet, "LLM_CACHE", LLMCache(tmp_path / "c.db"))
+    client = diet.app.test_client()
+    body = {"message": "swap lunch for tofu", "current_plan": {"meals": [{"name": "Chicken", "calories": 600}]}}
+    first = client.post("/diet/chat", json=body).get_json()
+    second = client.post("/diet/chat", json={**body, "message": "swap lunch  for tofu "}).get_json()
+    assert first == second and first["updated_plan"]["meals"][0]["name"] == "Tofu Bowl"
+    assert fake.calls == 1
+    assert client.get("/diet/llm-cache/stats").get_json()["memory_hits"] == 1
+
+def test_malformed_reply_is_not_cached(tmp_path, monkeypatch):
+    fake = FakeOpenAI('{"assistant_reply": "Swapped')   # truncated
+    monkeypatch.setattr(diet, "client", fake)
+    monkeypatch.setattr(diet, "LLM_CACHE", LLMCache(tmp_path / "c.db"))
+    client = diet.app.test_client()
+    body = {"message": "swap lunch for tofu", "current_plan": {"meals": [{"name": "Chicken", "calories": 600}]}}
+    assert client.post("/diet/chat", json=body).get_json()["degraded_reason"] == "invalid_reply"
+    fake.content = {"assistant_reply": "Swapped lunch.", "updated_plan": {"meals": [{"name": "Tofu Bowl"}]}}
+    assert client.post("/diet/chat", json=body).get_json()["updated_plan"]["meals"][0]["name"] == "Tofu Bowl"
+    assert client.post("/diet/chat", json=body).get_json()["assistant_reply"] == "Swapped lunch."
+    assert fake.calls == 2 and diet.LLM_CACHE.counters["puts"] == 1
+    # callers can narrow what is cacheable further
+    cache = LLMCache(tmp_path / "d.db")
+    cached_completion(fake, cache, accept=lambda content: "Tofu" not in content, **REQ)
+    assert cache.counters["puts"] == 0
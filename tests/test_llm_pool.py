@@ -0,0 +1,89 @@
+import threading, time
+import pytest
+import services.diet_agent.app as diet
+from services.common.llm_cache import LLMCache
+from services.common.llm_pool import DeadlineExceeded, LLMPool, PoolSaturated, pooled_completion
+from scripts.loadtest.fake_openai import FakeClient
+
+PLAN = {"user_id": "u1", "meals": [{"name": "Tofu Bowl", "calories": 550, "macros": {"protein": 30, "carbs": 60, "fat": 15}, "when": "13:00"}],
+        "workouts": []}
+
+def _req(text:str) -> dict:
+    return {"model": "m", "temperature": 0.2, "messages": [{"role": "user", "content": text}]}
+
+def _parallel(n:int, fn):
+    out, threads = [None] * n, []
+    def run(i):
+        try:
+            out[i] = fn(i)
+        except Exception as e:
+            out[i] = e
+    for i in range(n):
+        threads.append(threading.Thread(target=run, args=(i,)))
+        threads[-1].start()
+    for t in threads:
+        t.join()
+    return out
+
+def test_identical_inflight_prompts_share_one_call(tmp_path):
+    fake, pool, cache = FakeClient(0.2), LLMPool(workers=2, max_queue=0), LLMCache(tmp_path / "c.db")
+    out = _parallel(8, lambda i: pooled_completion(pool, fake, cache, 5, **_req("plan my day")))
+    assert fake.calls == 1 and len(set(out)) == 1 and pool.stats()["coalesced"] == 7
+    assert pooled_completion(pool, fake, cache, 5, **_req("plan  my day")) == out[0] and fake.calls == 1  # cache hit
+
+def test_saturation_and_queued_calls_past_deadline(tmp_path):
+    fake, pool = FakeClient(0.3), LLMPool(workers=1, max_queue=1)
+    out = _parallel(3, lambda i: (time.sleep(0.02 * i), pooled_completion(pool, fake, None, 5, **_req(f"q{i}")))[1])
+    assert isinstance(out[2], PoolSaturated) and isinstance(out[0], str) and isinstance(out[1], str)
+    assert fake.peak == 1
+
+    # a queued call whose only waiter gives up never reaches the model
+    t = threading.Thread(target=pooled_completion, args=(pool, fake, None, 5), kwargs=_req("slow"))
+    t.start()
+    time.sleep(0.02)
+    with pytest.raises(DeadlineExceeded):
+        pooled_completion(pool, fake, None, 0.05, **_req("late"))
+    t.join()
+    assert fake.calls == 3 and pool.stats()["dropped"] == 1 and pool.stats()["inflight"] == 0
+
+def test_reply_survives_a_failed_cache_store(tmp_path, monkeypatch):
+    pool, cache = LLMPool(workers=1), LLMCache(tmp_path / "c.db")
+    def broken_put(*args, **kwargs):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(cache, "put", broken_put)
+    assert pooled_completion(pool, FakeClient(0.0), cache, 1.0, **_req("hi"))
+    assert pool.stats()["store_errors"] == 1 and pool.stats()["errors"] == 0
+
+def test_chat_falls_back_to_unchanged_plan(tmp_path, monkeypatch):
+    fake = FakeClient(0.4)
+    monkeypatch.setattr(diet, "client", fake)
+    monkeypatch.setattr(diet, "LLM_CACHE", LLMCache(tmp_path / "c.db"))
+    monkeypatch.setattr(diet, "LLM_POOL", LLMPool(workers=1, max_queue=0))
+    t0 = time.perf_counter()
+    res, status = diet.handle_chat({"message": "less carbs", "current_plan": PLAN, "deadline_ms": 50})
+    assert status == 200 and time.perf_counter() - t0 < 0.3
+    assert res["degraded"] and res["degraded_reason"] == "deadline" and res["updated_plan"]["meals"] == PLAN["meals"]
+    time.sleep(0.5)  # the call kept running and its reply was cached
+    res, _ = diet.handle_chat({"message": "less carbs", "current_plan": PLAN, "deadline_ms": 50})
+    assert "degraded" not in res and res["assistant_reply"].startswith("Done") and fake.calls == 1
+
+def test_ai_diet_falls_back_to_rule_based_when_saturated(tmp_path, monkeypatch):
+    monkeypatch.setattr(diet, "client", FakeClient(0.3))
+    monkeypatch.setattr(diet, "LLM_CACHE", LLMCache(tmp_path / "c.db"))
+    monkeypatch.setattr(diet, "LLM_POOL", LLMPool(workers=1, max_queue=0))
+    users = [{"profile": {"weight_kg": 60 + i}, "goal": {"type": "fat_loss"}} for i in range(2)]
+    out = _parallel(2, lambda i: (time.sleep(0.05 * i), diet.ai_diet(users[i]))[1])
+    assert "degraded" not in out[0] and out[0]["daily_calories"] == 2200
+    assert out[1]["degraded_reason"] == "saturated" and out[1]["meals"] == diet.build_rule_based_diet(**users[1])["meals"]
+
+def test_bad_deadline_is_a_400_before_any_llm_work(monkeypatch):
+    fake = FakeClient(0.0)
+    monkeypatch.setattr(diet, "client", fake)
+    client = diet.app.test_client()
+    for bad in ("soon", [], True, "nan"):
+        for path, body in (("/diet/chat", {"message": "hi", "current_plan": PLAN}), ("/ai_diet", {"profile": {}})):
+            res = client.post(path, json={**body, "deadline_ms": bad})
+            assert res.status_code == 400 and "deadline_ms" in res.get_json()["error"]
+    assert fake.calls == 0
+    assert diet._deadline({"deadline_ms": -5}) == (diet.MIN_DEADLINE_S, None)
+    assert diet._deadline({"deadline_ms": "1e9"}) == (diet.LLM_DEADLINE_S, None)
@@ -0,0 +1,100 @@
+import json, time
+from flask import Flask, jsonify, request
+from openai import OpenAI
+from services.common.devserver import serve_in_thread
+from services.common.traffic import TrafficRecorder, install
+from scripts.loadtest import fake_openai, replay, report, traffic
+
+def _echo_app(delay_s=0.0):
+    app = Flask("echo")
+
+    @app.post("/slow")
+    def slow():
+        time.sleep(delay_s)
+        return jsonify(request.get_json(force=True))
+
+    @app.post("/echo")
+    def echo():
+        return request.get_data(), 200, {"Content-Type": request.content_type}
+
+    @app.get("/health")
+    def health():
+        return jsonify({"ok": True})
+
+    return app
+
+def test_recorded_traffic_replays(tmp_path):
+    app = _echo_app()
+    recorder = install(app, TrafficRecorder(tmp_path / "traffic.jsonl"))
+    client = app.test_client()
+    client.post("/slow", json={"a": 1})
+    client.post("/echo", data=b'{"x":1}\n{"x":2}\n', content_type="application/x-ndjson")
+    client.get("/health")
+    recorder.close()
+    rows = traffic.load(tmp_path / "traffic.jsonl")
+    assert [r["path"] for r in rows] == ["/slow", "/echo"]  # /health is not recorded
+    assert rows[0]["t"] == 0 and rows[0]["body"] == {"a": 1} and rows[0]["status"] == 200
+    assert rows[1]["data"] == '{"x":1}\n{"x":2}\n' and rows[1]["content_type"] == "application/x-ndjson"
+
+    server, url = serve_in_thread(_echo_app())
+    try:
+        results, _ = replay.run(url, rows, [0.0, 0.0], concurrency=2)
+    finally:
+        server.shutdown()
+    assert sorted((r.endpoint, r.status) for r in results) == [("POST /echo", 200), ("POST /slow", 200)]
+    assert {r.bytes for r in results if r.endpoint == "POST /echo"} == {16}
+
+def test_latency_counts_queueing_behind_busy_workers():
+    server, url = serve_in_thread(_echo_app(delay_s=0.05))
+    rows = [{"method": "POST", "path": "/slow", "body": {}}] * 6
+    try:
+        # 100/s offered to one worker that serves 20/s: later requests wait for the worker
+        results, _ = replay.run(url, rows, replay.schedule(rows, rate=100), concurrency=1)
+    finally:
+        server.shutdown()
+    last = results[-1]
+    assert last.service_ms < 100 and last.latency_ms > 150
+
+def test_generated_mix_and_schedule():
+    rows = traffic.generate(n=500, rate=50, seed=1)
+    assert {r["path"] for r in rows} == {p for _, p in traffic.MIX}
+    assert rows == traffic.generate(n=500, rate=50, seed=1)
+    assert 5 < rows[-1]["t"] < 15
+    offsets = replay.schedule(rows[:3], rate=10)
+    assert offsets == [0.0, 0.1, 0.2]
+    looped, looped_offsets = replay.repeat(rows[:3], offsets, duration_s=1.0)
+    assert len(looped) == 10 and abs(looped_offsets[3] - 0.3) < 1e-9
+
+def test_compare_flags_regressions():
+    def fake(ms, n=200, status=200):
+        return [replay.Result("POST /plan/today", status, ms, ms, ms, 10) for _ in range(n)]
+    base = report.summarize(fake(10.0), wall_s=10)
+    assert report.compare(report.summarize(fake(10.5), wall_s=10), base) == []
+    slower = report.compare(report.summarize(fake(20.0), wall_s=10), base)
+    assert any("p95_ms" in r for r in slower) and any("p99_ms" in r for r in slower)
+    failing = report.compare(report.summarize(fake(10.0, status=503), wall_s=10), base)
+    assert any("error rate" in r for r in failing)
+    assert any("rps" in r for r in report.compare(report.summarize(fake(10.0), wall_s=20), base))
+
+def test_fake_openai_speaks_the_sdk_protocol(monkeypatch):
+    monkeypatch.setattr(fake_openai, "LATENCY_MS", 0.0)
+    monkeypatch.setattr(fake_openai, "TOKEN_MS", 0.0)
+    server, url = serve_in_thread(fake_openai.app)
+    try:
+        client = OpenAI(api_key="x", base_url=f"{url}/v1")
+        prompt = 'Return ONLY JSON: {"assistant_reply": ...}\n\nInput JSON:\n' + json.dumps({"message": "less carbs", "current_plan": {"meals": []}})
+        res = client.chat.completions.create(model="m", messages=[{"role": "user", "content": prompt}])
+        data = json.loads(res.choices[0].message.content)
+        assert data["updated_plan"] == {"meals": []} and "less carbs" in data["assistant_reply"]
+        chunks = client.chat.completions.create(model="m", messages=[{"role": "user", "content": prompt}], stream=True)
+        assert "".join(c.choices[0].delta.content or "" for c in chunks) == res.choices[0].message.content
+    finally:
+        server.shutdown()
+
+def test_spike_mix_is_ordered_and_uncacheable():
+    from scripts.loadtest import spike
+    rows, offsets = spike.generate(duration_s=5, chat_rate=20, cheap_rate=10)
+    assert offsets == sorted(offsets) and offsets[-1] < 5
+    chats = [r["body"]["message"] for r in rows if r["path"].startswith("/diet/chat")]
+    assert len(chats) > 50 and len(set(chats)) == len(chats)
+    assert {r["path"] for r in rows} == {"/diet/chat", "/diet/chat/stream", "/health", "/nudge/send"}
@@ -0,0 +1,45 @@
+import time
+import numpy as np
+import pytest
+import services.diet_agent.app as diet
+from services.diet_agent.catalog import (ALLERGEN_BIT, DIET_BIT, UnknownDietType, allergen_mask, macro_targets, select_meals,
+                                         synthetic_catalog)
+
+CATALOG = synthetic_catalog(20_000, seed=1)
+
+def test_selection_fits_targets_and_filters():
+    target = macro_targets({"weight_kg": 80}, {"type": "muscle_gain"}, 2600)
+    exclude = allergen_mask(["nuts", "dairy"])
+    picks = select_meals(CATALOG, target, diet="vegan", exclude_allergens=exclude)
+    assert len(picks) == 3 and len({i for i, _ in picks}) == 3
+    for i, _ in picks:
+        assert CATALOG.diet_mask[i] & DIET_BIT["vegan"]
+        assert not CATALOG.allergen_mask[i] & (ALLERGEN_BIT["nuts"] | ALLERGEN_BIT["dairy"])
+    totals = sum(CATALOG.nutrients[i] * portion for i, portion in picks)
+    assert abs(totals[0] - 2600) / 2600 < 0.02
+    assert np.all(np.abs(totals[1:] - target[1:]) / target[1:] < 0.15)
+
+def test_selection_latency_milliseconds():
+    target = macro_targets({"weight_kg": 70}, {"type": "fat_loss"}, 1900)
+    select_meals(CATALOG, target)
+    t0 = time.perf_counter()
+    for _ in range(20):
+        select_meals(CATALOG, target)
+    assert (time.perf_counter() - t0) / 20 < 0.05
+
+def test_candidate_index_respects_slot():
+    idx = CATALOG.candidates("breakfast", "keto", allergen_mask(["egg"]))
+    assert len(idx) and np.all(CATALOG.slot_mask[idx] & 1)
+    assert not np.any(CATALOG.allergen_mask[idx] & ALLERGEN_BIT["egg"])
+
+def test_diet_is_never_relaxed():
+    # the built-in catalog has no vegan breakfast without soy or peanuts: skip the slot, don't serve eggs
+    plan = diet.build_rule_based_diet({"weight_kg": 70, "diet": {"type": "vegan", "allergies": ["soy", "peanuts"]}}, {})
+    vegan = {r["name"] for r in diet.RECIPES if "vegan" in r["diets"]}
+    assert plan["unfilled_slots"] == ["breakfast"] and [m["when"] for m in plan["meals"]] == ["13:00", "19:00"]
+    assert {m["name"] for m in plan["meals"]} <= vegan
+    assert abs(sum(m["calories"] for m in plan["meals"]) - plan["daily_calories"]) < 5
+    with pytest.raises(UnknownDietType):
+        CATALOG.candidates("lunch", "paleo")
+    body, status = diet.handle_suggest({"profile": {"diet": {"type": "paleo"}}})
+    assert status == 400 and "paleo" in body["error"]
@@ -0,0 +1,43 @@
+import json
+import random
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.common.devserver import serve_in_thread
+
+def _random_items(n, seed=0):
+    rnd = random.Random(seed)
+    return [{
+        "user_id": f"u{i}",
+        "profile": {"age": rnd.randint(18, 70), "sex": rnd.choice(["M", "F"]), "height_cm": rnd.uniform(150, 200),
+                    "weight_kg": rnd.uniform(45, 130), "activity_level": rnd.choice(list(diet.ACTIVITY_MULT))},
+        "goal": {"type": rnd.choice(["fat_loss", "muscle_gain", "endurance", "general_health"]), "deficit_kcal": rnd.choice([0, 300, 500])},
+    } for i in range(n)]
+
+def test_batch_matches_per_user_rule_based_diet():
+    items = _random_items(200) + [{"profile": {"age": None}, "goal": {}}]
+    plans = diet.build_rule_based_diet_batch([i["profile"] for i in items], [i["goal"] for i in items])
+    for item, plan in zip(items, plans):
+        expected = diet.build_rule_based_diet(item["profile"], item["goal"])
+        assert plan["daily_calories"] == expected["daily_calories"]
+        assert [m["calories"] for m in plan["meals"]] == [m["calories"] for m in expected["meals"]]
+
+def test_plan_batch_streams_ndjson_in_order(monkeypatch):
+    diet_server, diet_url = serve_in_thread(diet.app)
+    ex_server, ex_url = serve_in_thread(exercise.app)
+    monkeypatch.setattr(gw, "DIET_URL", diet_url)
+    monkeypatch.setattr(gw, "EXERCISE_URL", ex_url)
+    monkeypatch.setattr(gw, "BATCH_CHUNK", 40)
+    items = _random_items(100)
+    items[7] = {"user_id": "bad", "profile": {"sex": "X"}, "goal": {}}
+    body = "\n".join(json.dumps(i) for i in items)
+    try:
+        res = gw.app.test_client().post("/plan/batch", data=body, content_type="application/x-ndjson")
+        lines = [json.loads(l) for l in res.get_data(as_text=True).splitlines()]
+    finally:
+        diet_server.shutdown()
+        ex_server.shutdown()
+    assert res.status_code == 200 and res.mimetype == "application/x-ndjson"
+    assert [l["index"] for l in lines] == list(range(100))
+    assert "error" in lines[7]
+    assert all(l["meals"] and l["workouts"] for i, l in enumerate(lines) if i != 7)
@@ -0,0 +1,68 @@
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.gateway.plan_cache import CatalogVersions, PlanCache, plan_key
+
+BODY = {"user_id": "u1", "profile": {"age": 41, "sex": "M", "height_cm": 180, "weight_kg": 90, "activity_level": "active"},
+        "goal": {"type": "fat_loss", "deficit_kcal": 300}, "equipment": ["dumbbells", "bike"]}
+
+def _setup(monkeypatch):
+    monkeypatch.setattr(gw, "DIET_URL", "inproc://services.diet_agent.app")
+    monkeypatch.setattr(gw, "EXERCISE_URL", "inproc://services.exercise_agent.app")
+    monkeypatch.setattr(gw, "PLAN_CACHE", PlanCache(100))
+    monkeypatch.setattr(gw, "CATALOGS", CatalogVersions(
+        lambda: {"diet": (gw.DIET_URL, "/diet/catalog"), "exercise": (gw.EXERCISE_URL, "/exercise/catalog")},
+        check_s=0, on_change=gw.PLAN_CACHE.clear))
+    calls = []
+    for module, path in ((diet, "/diet/suggest"), (exercise, "/exercise/suggest")):
+        handler = module.HANDLERS[path]
+        monkeypatch.setitem(module.HANDLERS, path, lambda body, h=handler, p=path: calls.append(p) or h(body))
+    return gw.app.test_client(), calls
+
+def test_repeat_plan_is_served_from_cache(monkeypatch):
+    client, calls = _setup(monkeypatch)
+    first = client.post("/plan/today", json=BODY)
+    second = client.post("/plan/today", json=BODY)
+    assert first.headers["X-Plan-Cache"] == "miss" and second.headers["X-Plan-Cache"] == "hit"
+    assert len(calls) == 2  # one diet + one exercise call, for the first request only
+    assert first.headers["ETag"] == second.headers["ETag"] and first.headers["ETag"].startswith('W/"')
+    a, b = first.get_json(), second.get_json()
+    assert b["agents"]["diet"] == {"ok": True, "cached": True}
+    a.pop("agents"), b.pop("agents")
+    assert a == b and a["meals"] and a["workouts"]
+
+    # another user with the same inputs shares the plan but not the ETag
+    other = client.post("/plan/today", json={**BODY, "user_id": "u2"})
+    assert other.headers["X-Plan-Cache"] == "hit" and other.get_json()["user_id"] == "u2"
+    assert other.headers["ETag"] != first.headers["ETag"]
+
+def test_if_none_match_skips_agents(monkeypatch):
+    client, calls = _setup(monkeypatch)
+    tag = client.post("/plan/today", json=BODY).headers["ETag"]
+    gw.PLAN_CACHE.clear()
+    res = client.post("/plan/today", json=BODY, headers={"If-None-Match": f'"other", {tag}'})
+    assert res.status_code == 304 and res.get_data() == b"" and res.headers["ETag"] == tag
+    assert len(calls) == 2 and gw.PLAN_CACHE.stats()["not_modified"] == 1
+    changed = {**BODY, "goal": {"type": "endurance"}}
+    assert client.post("/plan/today", json=changed, headers={"If-None-Match": tag}).status_code == 200
+
+def test_catalog_change_invalidates(monkeypatch):
+    client, calls = _setup(monkeypatch)
+    tag = client.post("/plan/today", json=BODY).headers["ETag"]
+    monkeypatch.setattr(exercise.CATALOG, "version", "new-catalog")
+    res = client.post("/plan/today", json=BODY, headers={"If-None-Match": tag})
+    assert res.status_code == 200 and res.headers["X-Plan-Cache"] == "miss" and res.headers["ETag"] != tag
+    assert gw.CATALOGS.changes == 1 and len(calls) == 4
+
+def test_degraded_plans_are_not_cached(monkeypatch):
+    client, calls = _setup(monkeypatch)
+    monkeypatch.setitem(diet.HANDLERS, "/diet/suggest", lambda body: ({"error": "down"}, 500))
+    res = client.post("/plan/today", json=BODY)
+    assert res.headers["X-Plan-Cache"] == "partial" and "ETag" not in res.headers and len(gw.PLAN_CACHE) == 0
+
+def test_key_is_canonical():
+    versions = (("diet", "a"), ("exercise", "b"))
+    k = plan_key({"age": 30, "sex": "F"}, {"type": "endurance"}, ["bike", "dumbbells"], versions)
+    assert k == plan_key({"sex": "F", "age": 30}, {"type": "endurance"}, ["dumbbells", "bike", "bike"], versions)
+    assert k != plan_key({"age": 30, "sex": "F"}, {"type": "endurance"}, ["bike"], versions)
+    assert k != plan_key({"age": 30, "sex": "F"}, {"type": "endurance"}, ["bike", "dumbbells"], (("diet", "c"), ("exercise", "b")))
@@ -0,0 +1,82 @@
+import copy, json
+from types import SimpleNamespace
+import pytest
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+from services.common import jsonpatch
+from services.common.llm_cache import LLMCache
+
+PLAN = {"meals": [
+    {"name": "Veggie Omelette + Toast", "calories": 500, "macros": {"protein": 28, "carbs": 30, "fat": 18}, "when": "08:00"},
+    {"name": "Chicken Quinoa Bowl", "calories": 650, "macros": {"protein": 45, "carbs": 55, "fat": 12}, "when": "13:00"},
+    {"name": "Salmon + Rice + Greens", "calories": 700, "macros": {"protein": 42, "carbs": 60, "fat": 14}, "when": "19:00"},
+], "workouts": [{"name": "Tempo Run", "duration_min": 35, "intensity": "medium", "when": "18:30"}]}
+
+class LighterDinner:
+    """Fake model: halves the calories of every meal it is shown and records what it saw."""
+
+    def __init__(self):
+        self.seen = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream=False, **request):
+        payload = json.loads(request["messages"][-1]["content"].partition("Input JSON:")[2])
+        self.seen.append(payload["current_plan"])
+        meals = [{**m, "calories": m["calories"] // 2} for m in payload["current_plan"]["meals"]]
+        content = json.dumps({"assistant_reply": "Lighter now.", "updated_plan": {"meals": meals}})
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(gw, "DIET_URL", "inproc://services.diet_agent.app")
+    monkeypatch.setattr(diet, "client", LighterDinner())
+    monkeypatch.setattr(diet, "LLM_CACHE", LLMCache(tmp_path / "c.db"))
+    return gw.app.test_client()
+
+def test_patch_roundtrip():
+    old = {"a": [1, 2, 3], "b": {"x/y": 1, "gone": 2}, "c": "s"}
+    for new in ({"a": [1, 5], "b": {"x/y": 2}, "c": "s", "d": None}, {"a": [1, 2, 3, 4, {"k": 1}], "b": {}, "c": 3}, old):
+        ops = jsonpatch.diff(old, new)
+        assert jsonpatch.apply(old, ops) == new
+    assert jsonpatch.diff(old, copy.deepcopy(old)) == []
+    with pytest.raises(jsonpatch.PatchError):
+        jsonpatch.apply(old, [{"op": "replace", "path": "/nope/0", "value": 1}])
+
+def test_relevant_meals():
+    meals = PLAN["meals"]
+    assert diet.relevant_meals("Swap my dinner for something lighter", meals) == [2]
+    assert diet.relevant_meals("no more salmon please", meals) == [2]
+    assert diet.relevant_meals("breakfast and lunch need more protein", meals) == [0, 1]
+    assert diet.relevant_meals("more protein overall", meals) == [0, 1, 2]
+    # "afternoon" is not "noon"; snacks have a slot of their own
+    with_snacks = meals + [{"name": "Greek Yogurt", "when": "16:00"}, {"name": "Snack: Almonds", "when": "10:30"}]
+    assert diet.relevant_meals("a lighter afternoon snack", with_snacks) == [3, 4]
+    assert diet.relevant_meals("no snacks after noon", with_snacks) == [1, 3, 4]
+
+def test_chat_returns_patch_and_bumps_version(client):
+    created = client.post("/diet/plans", json={"user_id": "u1", "plan": PLAN})
+    assert created.status_code == 201
+    pid, plan = created.get_json()["plan_id"], created.get_json()["plan"]
+
+    res = client.post("/diet/chat", json={"plan_id": pid, "base_version": 1, "message": "lighter dinner please"})
+    body = res.get_json()
+    assert res.status_code == 200 and body["version"] == 2 and body["base_version"] == 1
+    assert body["patch"] == [{"op": "replace", "path": "/meals/2/calories", "value": 350}]
+    assert diet.client.seen == [{"meals": [plan["meals"][2]]}]   # only the dinner went to the model
+    stored = diet.plan_store.get(pid)
+    assert stored["plan"] == jsonpatch.apply(plan, body["patch"]) and stored["plan"]["workouts"] == plan["workouts"]
+
+    stale = client.post("/diet/chat", json={"plan_id": pid, "base_version": 1, "message": "and lunch"})
+    assert stale.status_code == 409 and stale.get_json()["version"] == 2 and stale.get_json()["plan"] == stored["plan"]
+    assert client.post("/diet/chat", json={"plan_id": "nope", "base_version": 1, "message": "x"}).status_code == 404
+
+def test_stream_final_event_carries_patch(client):
+    pid = client.post("/diet/plans", json={"user_id": "u1", "plan": PLAN}).get_json()["plan_id"]
+    res = client.post("/diet/chat/stream", json={"plan_id": pid, "base_version": 1, "message": "lighter lunch"})
+    events = [json.loads(l) for l in res.get_data(as_text=True).splitlines()]
+    final = events[-1]
+    assert final["type"] == "final" and final["version"] == 2
+    assert final["patch"] == [{"op": "replace", "path": "/meals/1/calories", "value": 325}]
+    assert "updated_plan" not in final
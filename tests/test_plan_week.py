@@ -0,0 +1,61 @@
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.common.horizon import DayCache
+
+BODY = {"user_id": "u1", "profile": {"age": 35, "sex": "F", "height_cm": 168, "weight_kg": 70, "activity_level": "moderate"},
+        "goal": {"type": "fat_loss", "deficit_kcal": 300}, "equipment": ["kettlebell", "rower"], "start": "2026-10-19"}
+
+def _client(monkeypatch):
+    monkeypatch.setattr(gw, "DIET_URL", "inproc://services.diet_agent.app")
+    monkeypatch.setattr(gw, "EXERCISE_URL", "inproc://services.exercise_agent.app")
+    monkeypatch.setattr(diet, "DAY_CACHE", DayCache())
+    monkeypatch.setattr(exercise, "DAY_CACHE", DayCache())
+    return gw.app.test_client()
+
+def _computed(res):
+    agents = res.get_json()["agents"]
+    return agents["diet"]["computed"], agents["exercise"]["computed"]
+
+def test_week_has_variety_and_is_cached(monkeypatch):
+    client = _client(monkeypatch)
+    res = client.post("/plan/week", json=BODY)
+    days = res.get_json()["days"]
+    assert [d["date"] for d in days] == ["2026-10-%d" % d for d in range(19, 26)]
+    for a, b in zip(days, days[1:]):
+        assert not {m["name"] for m in a["meals"]} & {m["name"] for m in b["meals"]}
+        assert not {w["name"] for w in a["workouts"]} & {w["name"] for w in b["workouts"]}
+    assert all(len(d["meals"]) == 3 and d["workouts"] for d in days)
+    again = client.post("/plan/week", json=BODY)
+    assert _computed(again) == (0, 0) and again.get_json()["days"] == days
+
+def test_edit_recomputes_only_affected_days(monkeypatch):
+    client = _client(monkeypatch)
+    before = client.post("/plan/week", json=BODY).get_json()["days"]
+    edited = {**BODY, "overrides": {"2026-10-22": {"profile": {"time_windows": ["06:00-06:30"]}}}}
+    res = client.post("/plan/week", json=edited)
+    after = res.get_json()["days"]
+    diet_n, exercise_n = _computed(res)
+    assert diet_n == 0 and 1 <= exercise_n <= 3   # time windows don't feed the diet
+    assert after[:3] == before[:3] and after[3] != before[3]
+    assert [w["when"] for w in after[3]["workouts"]] == ["06:00"]
+
+    # a new weight on day 5: earlier days are untouched and the workouts aren't recomputed
+    res = client.post("/plan/week", json={**edited, "overrides": {**edited["overrides"], "5": {"profile": {"weight_kg": 66}}}})
+    assert 1 <= _computed(res)[0] <= 2 and _computed(res)[1] == 0 and res.get_json()["days"][:5] == after[:5]
+
+def test_bad_horizon(monkeypatch):
+    client = _client(monkeypatch)
+    assert client.post("/plan/week", json={**BODY, "days": 0}).status_code == 400
+    assert client.post("/plan/week", json={**BODY, "overrides": {"2026-11-30": {}}}).status_code == 400
+    assert client.post("/plan/week", json={**BODY, "overrides": {"1": {"goal": {"type": "nope"}}}}).status_code == 400
+
+def test_day_cache_stops_at_unchanged_result():
+    cache, calls = DayCache(), []
+    def compute(inputs, prev):
+        calls.append(inputs)
+        return {"parity": inputs % 2, "after": prev}
+    cache.plan("s", [1, 2, 3, 4], compute)
+    calls.clear()
+    results, computed = cache.plan("s", [1, 4, 3, 4], compute)   # 2 -> 4: same result, day 3 onwards are hits
+    assert calls == [4] and computed == 1 and results[1]["parity"] == 0
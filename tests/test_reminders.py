@@ -0,0 +1,112 @@
+import random
+import time
+from datetime import datetime, timedelta
+import pytest
+from services.common import storage
+from services.scheduler_agent import store
+from services.scheduler_agent.reminders import ReminderEngine, TimingWheel, to_epoch
+
+T0 = to_epoch("2025-10-16T00:00:00")
+
+class Clock:
+    def __init__(self, t=T0):
+        self.t = t
+    def __call__(self):
+        return self.t
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "engine", storage.make_engine(tmp_path / "app.db"))
+    storage.init_db()
+
+def test_wheel_fires_within_one_tick_across_levels():
+    wheel = TimingWheel(tick_s=1.0, bits=4, levels=4, now=0)  # small wheels to force cascades
+    rnd = random.Random(1)
+    due = {f"k{i}": rnd.uniform(0, 30_000) for i in range(2_000)}
+    for k, d in due.items():
+        wheel.add(k, d)
+    for k in list(due)[:500]:
+        assert wheel.cancel(k)
+        del due[k]
+    fired = {}
+    for now in range(0, 30_001, 7):
+        for key, d, _ in wheel.advance(now):
+            fired[key] = now
+    assert set(fired) == set(due) and len(wheel) == 0
+    assert all(0 <= fired[k] - due[k] < 1 + 7 for k in due)  # tick + advance step
+
+def test_engine_batches_dispatch_and_marks_fired(db):
+    clock = Clock()
+    batches = []
+    eng = ReminderEngine(batches.append, clock=clock, batch_size=3)
+    ids = []
+    for i in range(7):
+        at = (datetime(2025, 10, 16, 9) + timedelta(minutes=i)).strftime(store.ISO)
+        saved, _ = store.commit_events("u1", [{"type": "workout", "name": f"w{i}", "scheduled_at": at}])
+        eng.schedule(saved[0]["id"], "u1", at, name=f"w{i}")
+        ids.append(saved[0]["id"])
+    assert eng.cancel(ids[6])  # cancelled in memory only; the event stays in the store
+
+    clock.t = to_epoch("2025-10-16T09:02:30")
+    assert eng.tick() == 3 and [r["name"] for r in batches[0]] == ["w0", "w1", "w2"]
+    clock.t = to_epoch("2025-10-16T10:00:00")
+    assert eng.tick() == 3 and [len(b) for b in batches] == [3, 3]
+    assert eng.snapshot()["pending"] == 0
+
+    # restart: fired reminders are not rebuilt, pending ones are
+    store.commit_events("u1", [{"type": "meal", "name": "late", "scheduled_at": "2025-10-16T12:00:00"}])
+    restarted = ReminderEngine(batches.append, clock=clock)
+    assert restarted.rebuild() == 2  # "late" plus w6, which was never fired
+    clock.t = to_epoch("2025-10-16T12:00:01")
+    restarted.tick()
+    assert sorted(r["name"] for r in batches[-1]) == ["late", "w6"]
+
+def test_failed_dispatch_is_retried(db):
+    clock = Clock()
+    calls = []
+    def flaky(reminders):
+        calls.append(len(reminders))
+        if len(calls) == 1:
+            raise ConnectionError("motivation agent down")
+    eng = ReminderEngine(flaky, clock=clock, retry_s=30)
+    eng.schedule("e1", "u1", "2025-10-16T00:00:10")
+    clock.t = T0 + 11
+    assert eng.tick() == 0 and eng.snapshot()["dispatch_errors"] == 1
+    clock.t = T0 + 45
+    assert eng.tick() == 1 and calls == [1, 1]
+
+def test_failed_mark_is_retried_without_dispatching_again(db, monkeypatch):
+    clock = Clock()
+    batches, marks = [], []
+    def flaky_mark(ids, at):
+        marks.append((ids, at))
+        if len(marks) == 1:
+            raise ConnectionError("database locked")
+    monkeypatch.setattr(store, "mark_reminded", flaky_mark)
+    eng = ReminderEngine(batches.append, clock=clock, retry_s=30)
+    eng.schedule("e1", "u1", "2025-10-16T00:00:10")
+    clock.t = T0 + 11
+    assert eng.tick() == 1 and eng.snapshot()["mark_errors"] == 1
+    clock.t = T0 + 45
+    assert eng.tick() == 0 and len(batches) == 1
+    assert marks == [(["e1"], "2025-10-16T00:00:11")] * 2
+
+def test_throughput_insert_cancel_fire(monkeypatch):
+    clock = Clock()
+    fired = []
+    eng = ReminderEngine(lambda batch: fired.append(len(batch)), clock=clock, batch_size=10_000)
+    n = 200_000
+    t0 = time.perf_counter()
+    wheel = eng.wheel
+    for i in range(n):  # due times spread over a day
+        wheel.add(i, T0 + 1 + (i % 86_400), ("u", "workout", "w", ""))
+    for i in range(0, n, 2):
+        wheel.cancel(i)
+    insert_cancel_s = time.perf_counter() - t0
+    clock.t = T0 + 86_401
+    monkeypatch.setattr(store, "mark_reminded", lambda ids, at: None)
+    t0 = time.perf_counter()
+    assert eng.tick() == n // 2
+    fire_s = time.perf_counter() - t0
+    assert sum(fired) == n // 2
+    assert insert_cancel_s < 3 and fire_s < 3
@@ -0,0 +1,37 @@
+import socket, time
+import pytest
+import requests
+from services import run
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.mark.parametrize("server", ["waitress", "gunicorn"])
+def test_supervisor_starts_restarts_and_stops(server, monkeypatch):
+    if server == "gunicorn" and not run.have_gunicorn():
+        pytest.skip("gunicorn needs a POSIX host with gunicorn installed")
+    monkeypatch.setenv("EXERCISE_PORT", str(_free_port()))
+    services = run.configured("exercise", workers=2, threads=2)
+    logs = []
+    sup = run.Supervisor(services, server=server, ready_timeout_s=20, graceful_s=5, log=logs.append)
+    try:
+        assert sup.start()
+        svc = services[0]
+        url = svc.url(sup.host)
+        assert requests.post(f"{url}/exercise/suggest", json={"goal": {"type": "endurance"}}, timeout=5).json()["workouts"]
+        row = sup.summary()[0]
+        assert row["status"] == "ready" and row["procs"] >= (3 if server == "gunicorn" else 1)  # master + 2 workers
+
+        svc.proc.kill()
+        svc.proc.wait()
+        deadline = time.monotonic() + 20
+        while svc.restarts == 0 and time.monotonic() < deadline:
+            sup.check()
+            time.sleep(0.1)
+        assert svc.status == "ready" and svc.restarts == 1
+        assert requests.get(f"{url}/health", timeout=5).json()["ok"]
+    finally:
+        sup.stop()
+    assert svc.proc.poll() is not None and svc.status == "stopped"
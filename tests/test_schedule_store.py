@@ -0,0 +1,68 @@
+import threading, time
+import pytest
+import services.scheduler_agent.app as scheduler
+from services.common import storage
+from services.scheduler_agent import store
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "engine", storage.make_engine(tmp_path / "app.db"))
+    storage.init_db()
+
+def _ev(name, at, minutes=30):
+    return {"type": "workout", "name": name, "scheduled_at": at, "duration_min": minutes}
+
+def test_range_query_and_cursor_pagination(db):
+    store.commit_events("u1", [_ev(f"e{d:02d}", f"2025-10-{d:02d}T18:00:00") for d in range(1, 31)])
+    store.commit_events("u2", [_ev("other", "2025-10-10T18:00:00")])
+
+    events, cursor = store.list_events("u1", start="2025-10-05", end="2025-10-25", limit=8)
+    seen = [e["name"] for e in events]
+    while cursor:
+        events, cursor = store.list_events("u1", start="2025-10-05", end="2025-10-25", limit=8, cursor=cursor)
+        seen += [e["name"] for e in events]
+    assert seen == [f"e{d:02d}" for d in range(5, 25)]
+
+def test_conflicts_detected_on_commit(db):
+    saved, conflicts = store.commit_events("u1", [_ev("run", "2025-10-16T18:00:00", 45)])
+    assert saved and not conflicts
+
+    _, conflicts = store.commit_events("u1", [_ev("lift", "2025-10-16T18:30:00")], on_conflict="reject")
+    assert [c["name"] for c in conflicts] == ["run"]
+    assert len(store.list_events("u1")[0]) == 1  # rejected commit stored nothing
+
+    saved, conflicts = store.commit_events("u1", [_ev("stretch", "2025-10-16T18:45:00"), _ev("yoga", "2025-10-16T18:50:00")], on_conflict="skip")
+    assert [e["name"] for e in saved] == ["stretch"] and conflicts[0]["name"] == "stretch"
+
+def test_concurrent_overlapping_commits_cannot_both_land(db, monkeypatch):
+    find_conflicts = store.find_conflicts
+    def slow_find_conflicts(conn, rows):
+        found = find_conflicts(conn, rows)
+        time.sleep(0.1)   # widen the window between the check and the insert
+        return found
+    monkeypatch.setattr(store, "find_conflicts", slow_find_conflicts)
+    out = {}
+    def post(name, at):
+        out[name] = store.commit_events("u1", [_ev(name, at, 60)], on_conflict="reject")
+    threads = [threading.Thread(target=post, args=a) for a in (("run", "2025-10-16T18:00:00"), ("lift", "2025-10-16T18:30:00"))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(len(saved) for saved, _ in out.values()) == [0, 1]
+    assert len(store.list_events("u1")[0]) == 1
+
+def test_accepts_react_client_shape_and_timezones(db):
+    saved, _ = store.commit_events("u1", [{"type": "meal", "when": "2025-10-16T08:00:00Z", "title": "Oats"}])
+    assert saved[0]["title"] == "Oats" and "id" in saved[0]
+    events, _ = store.list_events("u1", start="2025-10-16T07:59:00", end="2025-10-16T08:01:00")
+    assert events == saved
+    with pytest.raises(store.InvalidEvent):
+        store.commit_events("u1", [{"name": "no time"}])
+
+def test_bad_duration_is_a_400(db):
+    res = scheduler.app.test_client().post("/schedule/commit", json={"user_id": "u1", "events": [
+        _ev("run", "2025-10-16T18:00:00", "abc")]})
+    assert res.status_code == 400 and res.get_json()["error"] == "duration_min must be an integer"
+    saved, _ = store.commit_events("u1", [_ev("run", "2025-10-16T18:00:00", "45")])
+    assert saved[0]["duration_min"] == "45" and store.list_events("u1")[0][0]["name"] == "run"
@@ -0,0 +1,116 @@
+import sqlite3
+import pytest
+from services.common import storage
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / "app.db"
+    monkeypatch.setattr(storage, "engine", storage.make_engine(path))
+    return path
+
+def test_migrates_legacy_db_and_merges_duplicate_arms(db):
+    # a pre-migration database: tables only, duplicate arm rows, user_version 0
+    con = sqlite3.connect(db)
+    con.executescript("""
+        CREATE TABLE bandit_arm (id INTEGER PRIMARY KEY AUTOINCREMENT, agent TEXT, arm TEXT, pulls INTEGER DEFAULT 0, reward_sum REAL DEFAULT 0.0);
+        CREATE TABLE feedback (id INTEGER PRIMARY KEY AUTOINCREMENT, event_id TEXT, user_id TEXT, rating INTEGER, reason TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        INSERT INTO bandit_arm(agent, arm, pulls, reward_sum) VALUES ('t','coach',2,1.0), ('t','coach',3,0.5), ('t','friendly',1,1.0);
+    """)
+    con.close()
+
+    assert storage.migrate() == len(storage.MIGRATIONS)
+    assert storage.migrate() == len(storage.MIGRATIONS)  # idempotent
+    arms = {a["arm"]: (a["pulls"], a["reward_sum"]) for a in storage.get_arms("t")}
+    assert arms == {"coach": (5, 1.5), "friendly": (1, 1.0)}
+
+    storage.upsert_arm("t", "coach", pulled=True)
+    storage.upsert_arm("t", "new")
+    arms = {a["arm"]: a["pulls"] for a in storage.get_arms("t")}
+    assert arms == {"coach": 6, "friendly": 1, "new": 0}
+
+    con = sqlite3.connect(db)
+    indexes = {r[1] for r in con.execute("SELECT * FROM sqlite_master WHERE type='index'")}
+    assert {"ix_feedback_user_id", "ix_feedback_event_id", "ux_bandit_arm_agent_arm"} <= indexes
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    con.close()
+
+def test_record_feedback_many(db):
+    storage.init_db()
+    n = storage.record_feedback_many([{"event_id": f"e{i}", "user_id": "u", "rating": 1 + i % 5} for i in range(500)])
+    assert n == 500
+    with storage.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*), SUM(rating) FROM feedback").one() == (500, 1500)
+
+def test_feedback_bulk_endpoint(db):
+    import services.feedback_agent.app as fa
+    storage.init_db()
+    res = fa.app.test_client().post("/feedback/bulk", json={"items": [
+        {"event_id": "a", "user_id": "u1", "rating": 5, "bandit_arm": "coach"},
+        {"event_id": "b", "user_id": "u2", "rating": 9},
+        {"event_id": "c", "rating": 2, "reason": "too hard"},
+    ]})
+    body = res.get_json()
+    assert res.status_code == 200 and body["logged"] == 2
+    assert [e["index"] for e in body["errors"]] == [1]
+
+def _rollups():
+    with storage.engine.connect() as conn:
+        return sorted(conn.exec_driver_sql("SELECT * FROM feedback_rollup").all())
+
+def test_feedback_rollups_follow_writes_and_rebuild(db):
+    storage.init_db()
+    storage.record_feedback("e0", "u1", 5, None, "coach")
+    storage.record_feedback_many([{"event_id": f"e{i}", "user_id": f"u{i % 3}", "rating": 1 + i % 5,
+                                   "bandit_arm": ["coach", "friendly", None][i % 3]} for i in range(1, 200)])
+    assert storage.get_rollups("all", ["*"])["*"]["n"] == 200
+    u1 = storage.get_rollups("user", ["u1", "nobody"])
+    assert list(u1) == ["u1"] and u1["u1"]["n"] == 68 and sum(u1["u1"][f"r{r}"] for r in range(1, 6)) == 68
+    live = _rollups()
+    assert storage.rebuild_rollups(chunk=64) == 200 and _rollups() == live
+
+    # rows logged while a rebuild runs are counted once
+    seen = []
+    def progress(done, last):
+        seen.append(done)
+        if len(seen) == 2:
+            storage.record_feedback("late", "u1", 4, None, "friendly")
+    assert storage.rebuild_rollups(chunk=64, progress=progress) == 201
+    assert seen == [64, 128, 192, 200]
+    during = _rollups()
+    assert storage.rebuild_rollups() == 201 and _rollups() == during
+    assert storage.get_rollups("user", ["u1"])["u1"]["n"] == 69
+
+def test_migration_seeds_rollups_from_existing_feedback(db):
+    storage.migrate(7)
+    with storage.engine.begin() as conn:
+        conn.exec_driver_sql("""INSERT INTO feedback(event_id, user_id, rating, bandit_arm, created_at)
+                                VALUES ('a', 'u1', 5, 'coach', '2026-10-01 09:00:00'), ('b', 'u1', 2, NULL, '2026-10-02 09:00:00')""")
+    storage.migrate()
+    assert storage.get_rollups("user", ["u1"])["u1"] == {"n": 2, "rating_sum": 7, "r1": 0, "r2": 1, "r3": 0, "r4": 0, "r5": 1}
+    assert set(storage.get_rollups("day", ["2026-10-01", "2026-10-02"])) == {"2026-10-01", "2026-10-02"}
+    assert storage.get_rollups("arm_day", ["coach|2026-10-01"])["coach|2026-10-01"]["n"] == 1
+
+def test_feedback_stats_endpoint(db):
+    import services.feedback_agent.app as fa
+    storage.init_db()
+    client = fa.app.test_client()
+    for rating, arm in ((5, "coach"), (4, "coach"), (1, "friendly")):
+        client.post("/feedback", json={"event_id": "e", "user_id": "u1", "rating": rating, "bandit_arm": arm})
+    res = client.get("/feedback/stats", query_string={"user_id": "u1", "arm": "coach", "days": 3}).get_json()
+    assert res["all"]["n"] == 3 and res["user"]["mean_rating"] == round(10 / 3, 4)
+    assert res["arms"]["coach"] == {"n": 2, "mean_rating": 4.5, "ratings": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1},
+                                    "positive_rate": 1.0, "mean_reward": 0.75}
+    assert [d["n"] for d in res["trend"]["days"]] == [0, 0, 2]
+    assert client.get("/feedback/stats", query_string={"user_id": "ghost"}).get_json()["user"] == {"user_id": "ghost", "n": 0}
+    assert client.get("/feedback/stats", query_string={"day": "yesterday"}).status_code == 400
+
+def test_schema_checked_on_first_use_not_import(db, monkeypatch, capsys):
+    from services.common import migrate
+    monkeypatch.setattr(storage, "AUTO_MIGRATE", False)
+    with pytest.raises(storage.SchemaOutdated):
+        storage.get_arms("t")
+    assert migrate.main(["--db", str(db), "--check"]) == 1
+    assert migrate.main(["--db", str(db), "--target", "3"]) == 0
+    assert migrate.main(["--db", str(db)]) == 0
+    assert capsys.readouterr().out.splitlines()[-1].endswith(f"3 -> {len(storage.MIGRATIONS)} of {len(storage.MIGRATIONS)}")
+    assert storage.get_arms("t") == []
@@ -0,0 +1,66 @@
+import re
+import services.gateway.app as gw
+import services.diet_agent.app as diet
+import services.exercise_agent.app as exercise
+from services.common import telemetry
+from services.common.devserver import serve_in_thread
+
+BODY = {"user_id": "u1", "profile": {"age": 30, "sex": "F", "height_cm": 165, "weight_kg": 60, "activity_level": "light"},
+        "goal": {"type": "muscle_gain"}}
+
+def _timings(header):
+    return {m[0]: float(m[1]) for m in re.findall(r"([\w.]+);dur=([\d.]+)", header)}
+
+def test_trace_id_reaches_agents_and_hops_show_in_server_timing(monkeypatch):
+    monkeypatch.setattr(gw, "PLAN_CACHE", None)  # measure the agent hops, not a cached plan
+    servers = [serve_in_thread(diet.app), serve_in_thread(exercise.app)]
+    seen = []
+    exercise.app.before_request_funcs.setdefault(None, []).append(
+        lambda: seen.append(telemetry.current().id))
+    try:
+        monkeypatch.setattr(gw, "DIET_URL", servers[0][1])
+        monkeypatch.setattr(gw, "EXERCISE_URL", servers[1][1])
+        res = gw.app.test_client().post("/plan/today", json=BODY, headers={"X-Trace-Id": "abc123"})
+    finally:
+        exercise.app.before_request_funcs[None].pop()
+        for server, _ in servers:
+            server.shutdown()
+    assert res.status_code == 200 and res.headers["X-Trace-Id"] == "abc123"
+    assert seen == ["abc123"]
+    t = _timings(res.headers["Server-Timing"])
+    assert {"total", "validate", "assemble", "diet", "diet.app", "exercise", "exercise.app"} <= set(t)
+    assert t["diet"] >= t["diet.app"] and t["total"] >= t["exercise"]
+
+def test_inproc_hops_and_generated_trace_id(monkeypatch):
+    monkeypatch.setattr(gw, "PLAN_CACHE", None)
+    monkeypatch.setattr(gw, "DIET_URL", "inproc://services.diet_agent.app")
+    monkeypatch.setattr(gw, "EXERCISE_URL", "inproc://services.exercise_agent.app")
+    res = gw.app.test_client().post("/plan/today", json=BODY)
+    assert len(res.headers["X-Trace-Id"]) == 16
+    assert {"diet", "exercise"} <= set(_timings(res.headers["Server-Timing"]))
+
+def test_sqlite_time_is_a_span():
+    from services.feedback_agent import app as feedback
+    res = feedback.app.test_client().post("/feedback", json={"event_id": "t1", "user_id": "u1", "rating": 4})
+    assert "db" in _timings(res.headers["Server-Timing"])
+
+def test_metrics_exposition():
+    client = exercise.app.test_client()
+    client.post("/exercise/suggest", json=BODY)
+    client.get("/nope")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert re.search(r'http_requests_total\{service="exercise_agent",route="/exercise/suggest",method="POST",status="200"\} \d+', text)
+    assert 'route="unmatched",method="GET",status="404"' in text
+    assert re.search(r'http_request_duration_seconds_bucket\{service="exercise_agent",route="/exercise/suggest",le="\+Inf"\} \d+', text)
+    assert 'http_requests_in_flight{service="exercise_agent"} 1' in text  # the /metrics request itself
+    assert "# TYPE agent_call_duration_seconds histogram" in text
+
+def test_histogram_buckets_are_cumulative():
+    reg = telemetry.Registry()
+    for s in (0.0005, 0.003, 0.003, 100.0):
+        reg.observe_request("svc", "/r", "GET", 200, s)
+    text = reg.render()
+    assert 'http_request_duration_seconds_bucket{service="svc",route="/r",le="0.001"} 1' in text
+    assert 'http_request_duration_seconds_bucket{service="svc",route="/r",le="0.005"} 3' in text
+    assert 'http_request_duration_seconds_bucket{service="svc",route="/r",le="30.0"} 3' in text
+    assert 'http_request_duration_seconds_count{service="svc",route="/r"} 4' in text
@@ -0,0 +1,82 @@
+import time
+import pytest
+import services.exercise_agent.app as exercise
+from services.exercise_agent.catalog import (ALL_EQUIPMENT, EQUIPMENT_BIT, INJURY_BIT, INJURY_SHIFT, UnknownEquipment, UnknownInjury, WorkoutCatalog,
+                                             equipment_mask, forbid_mask, injury_mask, intensity_mask, parse_windows, suggest_for,
+                                             synthetic_catalog)
+
+CATALOG = synthetic_catalog(100_000, seed=1)
+
+def _minutes(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[3:])
+
+def test_suggestions_respect_equipment_injuries_and_windows():
+    profile = {"injuries": ["knee", "shoulder"], "equipment": ["bands"], "activity_level": "sedentary",
+               "time_windows": ["06:00-06:40", "12:00-12:30", "19:00-20:00"]}
+    windows = parse_windows(profile["time_windows"])
+    picks = suggest_for(CATALOG, profile, {"type": "fat_loss"}, ["dumbbells"])
+    assert len(picks) == 2
+    for w in picks:
+        i = CATALOG.names.index(w["name"])
+        assert not CATALOG.need[i] & ~(EQUIPMENT_BIT["bands"] | EQUIPMENT_BIT["dumbbells"]) & ALL_EQUIPMENT
+        assert not CATALOG.need[i] >> INJURY_SHIFT & (INJURY_BIT["knee"] | INJURY_BIT["shoulder"])
+        assert w["intensity"] != "high"
+        start = _minutes(w["when"])
+        assert any(a == start and start + w["duration_min"] <= b for a, b in windows)
+    assert len({w["when"] for w in picks}) == 2
+
+def test_suggest_matches_full_filter():
+    forbid = forbid_mask(equipment_mask(["kettlebell"]), injury_mask(["lower_back"]), intensity_mask("light"))
+    allowed = CATALOG.candidates("endurance", forbid)
+    naive = [i for i, r in enumerate(CATALOG.records) if "endurance" in r["goals"] and set(r["equipment"]) <= {"kettlebell"}
+             and "lower_back" not in r["contraindications"] and r["intensity"] != "high"]
+    assert sorted(allowed.tolist()) == naive
+    best = CATALOG.suggest("endurance", forbid, parse_windows(["07:00-09:00"]), sessions=1)[0]
+    assert best["name"] == CATALOG.names[allowed[0]]
+
+def test_suggest_latency_microseconds():
+    forbid = forbid_mask(equipment_mask([]), injury_mask(["knee", "wrist"]))
+    CATALOG.suggest("muscle_gain", forbid)
+    t0 = time.perf_counter()
+    for _ in range(200):
+        CATALOG.suggest("muscle_gain", forbid)
+    assert (time.perf_counter() - t0) / 200 < 0.002
+
+def test_no_fit_and_gym_equipment():
+    tiny = WorkoutCatalog([{"name": "Long Ride", "duration_min": 90, "goals": ["endurance"], "equipment": ["bike"]}])
+    assert tiny.suggest("endurance", forbid_mask(equipment_mask(["gym"]), 0)) == [
+        {"name": "Long Ride", "duration_min": 90, "intensity": "medium", "when": "18:00"}]
+    assert tiny.suggest("endurance", forbid_mask(equipment_mask([]), 0)) == []
+    assert tiny.suggest("endurance", 0, parse_windows(["07:00-08:00", "bad"])) == []
+
+def test_agent_uses_profile():
+    goal = {"type": "muscle_gain"}
+    plain = exercise.handle_suggest({"goal": goal})[0]["workouts"]
+    hurt = exercise.handle_suggest({"goal": goal, "profile": {"injuries": ["knee", "wrist"], "time_windows": ["17:00-17:45"]}})[0]["workouts"]
+    assert len(plain) == 2 and len(hurt) == 1 and hurt[0]["when"] == "17:00"
+    assert hurt[0]["name"] not in {"Bodyweight Legs + Glutes", "Push-Up + Plank Ladder"}
+    batch = exercise.handle_batch({"goals": [goal, goal], "profiles": [None, {"injuries": ["knee", "wrist"], "time_windows": ["17:00-17:45"]}]})[0]
+    assert batch["workouts"] == [plain, hurt]
+
+def test_injury_names_are_normalised_or_rejected():
+    assert injury_mask(["Knees", "lower back", "Lower-Back", "shoulders"]) == \
+        INJURY_BIT["knee"] | INJURY_BIT["lower_back"] | INJURY_BIT["shoulder"]
+    with pytest.raises(UnknownInjury) as e:
+        injury_mask(["knee", "tennis elbow", "toe"])
+    assert e.value.names == ["tennis elbow", "toe"]
+    # "knees" used to be dropped, which let a knee-contraindicated session through
+    plans = [exercise.handle_suggest({"profile": {"injuries": injuries}, "goal": {"type": "muscle_gain"}})
+             for injuries in ([], ["knee"], ["knees"])]
+    assert plans[1] == plans[2] != plans[0]
+    body, status = exercise.handle_week({"days": [{"profile": {"injuries": ["bad hamstring"]}, "goal": {}}]})
+    assert status == 400 and body["unknown_injuries"] == ["bad hamstring"]
+
+def test_equipment_names_are_normalised_or_rejected():
+    assert equipment_mask(["Dumbbell", "Pull-up bar", "kettlebells", "resistance bands", "none"]) == \
+        EQUIPMENT_BIT["dumbbells"] | EQUIPMENT_BIT["pullup_bar"] | EQUIPMENT_BIT["kettlebell"] | EQUIPMENT_BIT["bands"]
+    assert equipment_mask(["Full Gym"]) == ALL_EQUIPMENT
+    with pytest.raises(UnknownEquipment) as e:
+        equipment_mask(["barbell", "smith machine"])
+    assert e.value.names == ["smith machine"]
+    body, status = exercise.handle_suggest({"profile": {"equipment": ["trx"]}, "goal": {"type": "muscle_gain"}})
+    assert status == 400 and body["unknown_equipment"] == ["trx"] and "dumbbells" in body["error"]